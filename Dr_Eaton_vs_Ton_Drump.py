@@ -1,7 +1,10 @@
 # Sofia Espino-Frey
 
+import json
 import random
+import re
 import time
+from collections import deque
 
 import sys
 import os
@@ -27,369 +30,542 @@ COLORS = {
 }
 
 
-# This is the function to print text in a specific color.
-def print_color(text, color):
+# This is the function to wrap text in a specific color without printing it.
+def colorize(text, color):
 	# This checks if the color exists in the dictionary.
 	if color in COLORS:
 		# An f-string is used here to wrap the text with the color codes.
-		print(f"{COLORS[color]}{text}{COLORS['reset']}")
-	else:
-		# If the color is invalid, the game just prints the text normally.
-		print(text)
+		return f"{COLORS[color]}{text}{COLORS['reset']}"
+	# If the color is invalid, the game just uses the text normally.
+	return text
+
+
+# This is the function to print text in a specific color.
+def print_color(text, color):
+	print(colorize(text, color))
+
+
+# This matches any of the color codes above, so they can be taken back out of text.
+ANSI_CODE = re.compile('\033\\[[0-9;]*m')
+
+
+# This removes the color codes from text (for logs, pipes and anything else that isn't a terminal).
+def strip_ansi(text):
+	return ANSI_CODE.sub('', text)
 
 
 # This function is called once at the start of the game.
 # It prints the main menu, game goal, and commands for the player.
-def show_instructions():
-	print_color("===============================================================", 'cyan')
-	print("      Dr. Eaton vs. Ton Drump and the Evil Robots      ")
-	print_color("===============================================================", 'cyan')
-	print("\nAt the Hexagon, a petty workplace squabble over a parking spot has escalated. Dr. Eaton is")
-	print("in town for a clean energy meeting a accidentally took Mr. Ton Drump's parking place, even though there")
-	print("is no assigned parking. Mr. Drump threw a KING-sized temper tantrum and swore revenge against Dr. Eaton.")
-	print("Now, Mr. Ton Drump has corrupted the building's helpful robots with his tantrum-fueled code! Dr. Eaton")
-	print("must build a network wide healing device and she needs YOUR help retrieving the items needed to build")
-	print("it and reprogram any evil robots you might encounter along the way!")
-	print("\nYour Mission:")
-	print_color("Collect the 7 missing components for Dr. Gucnew's network-wide healing device:", 'magenta')
-	print_color("  A Peer-Reviewed Fact-Checker, The Civics 101 Patch, A De-Escalation Algorithm,", 'yellow')
-	print_color("  The Green Energy Core, The Tax-the-Rich Capacitor, A Historical Context Drive,", 'yellow')
-	print_color("and The Deregulation Lubricant", 'yellow')
-	print_color("\nYour Starting Toolkit (Single Use):", 'magenta')
-	print_color("  - A Civility Charm: Instantly restores 3 Focus during a Reprogramming Sequence.", 'yellow')
-	print_color("  - The Executive Order: Doubles your reprogramming progress for one turn.", 'yellow')
-	print_color("  - A Golden Parachute: Instantly escape a Reprogramming Sequence.", 'yellow')
-	print("\nYou will also encounter several items during your quest. Some of these items will help, some")
-	print("not so much - but you may only use these items one time per quest. Beware, Mr. Ton Drump's")
-	print("evil corrupted robots lurk around every corner so use your items wisely!")
-	print_color("\nOnce you obtain all 7 missing items, find Mr. Ton Drump and win the game!", 'magenta')
-	print("\n'Good luck, ally,' Dr. Gucnew says with a determined look.")
-	print("'This is a mission of restoration, not retribution. May your logic be sound, your sources peer-reviewed,")
-	print(" and may you prove that civility is not, in fact, a weakness.'")
-	print_color("\nControls:", 'magenta')
-	print_color("  - Movement: NORTH, SOUTH, EAST, WEST", 'green')
-	print_color("  - Actions: SEARCH, USE [item/feature]", 'green')
-	print_color("  - Responses: YES, NO", 'green')
-	print_color("  - Quit Game: EXIT", 'red')
-	print_color("===============================================", 'cyan')
-	input("\nPress Enter to begin your quest...")
+def show_instructions(out=print):
+	out(colorize("===============================================================", 'cyan'))
+	out("      Dr. Eaton vs. Ton Drump and the Evil Robots      ")
+	out(colorize("===============================================================", 'cyan'))
+	out("\nAt the Hexagon, a petty workplace squabble over a parking spot has escalated. Dr. Eaton is")
+	out("in town for a clean energy meeting a accidentally took Mr. Ton Drump's parking place, even though there")
+	out("is no assigned parking. Mr. Drump threw a KING-sized temper tantrum and swore revenge against Dr. Eaton.")
+	out("Now, Mr. Ton Drump has corrupted the building's helpful robots with his tantrum-fueled code! Dr. Eaton")
+	out("must build a network wide healing device and she needs YOUR help retrieving the items needed to build")
+	out("it and reprogram any evil robots you might encounter along the way!")
+	out("\nYour Mission:")
+	out(colorize("Collect the 7 missing components for Dr. Gucnew's network-wide healing device:", 'magenta'))
+	out(colorize("  A Peer-Reviewed Fact-Checker, The Civics 101 Patch, A De-Escalation Algorithm,", 'yellow'))
+	out(colorize("  The Green Energy Core, The Tax-the-Rich Capacitor, A Historical Context Drive,", 'yellow'))
+	out(colorize("and The Deregulation Lubricant", 'yellow'))
+	out(colorize("\nYour Starting Toolkit (Single Use):", 'magenta'))
+	out(colorize("  - A Civility Charm: Instantly restores 3 Focus during a Reprogramming Sequence.", 'yellow'))
+	out(colorize("  - The Executive Order: Doubles your reprogramming progress for one turn.", 'yellow'))
+	out(colorize("  - A Golden Parachute: Instantly escape a Reprogramming Sequence.", 'yellow'))
+	out("\nYou will also encounter several items during your quest. Some of these items will help, some")
+	out("not so much - but you may only use these items one time per quest. Beware, Mr. Ton Drump's")
+	out("evil corrupted robots lurk around every corner so use your items wisely!")
+	out(colorize("\nOnce you obtain all 7 missing items, find Mr. Ton Drump and win the game!", 'magenta'))
+	out("\n'Good luck, ally,' Dr. Gucnew says with a determined look.")
+	out("'This is a mission of restoration, not retribution. May your logic be sound, your sources peer-reviewed,")
+	out(" and may you prove that civility is not, in fact, a weakness.'")
+	out(colorize("\nControls:", 'magenta'))
+	out(colorize("  - Movement: NORTH, SOUTH, EAST, WEST", 'green'))
+	out(colorize("  - Actions: SEARCH, USE [item/feature]", 'green'))
+	out(colorize("  - Lost? HINT points you toward the nearest missing component", 'green'))
+	out(colorize("  - Responses: YES, NO", 'green'))
+	out(colorize("  - Shortcuts: N, S, E, W, SE for SEARCH, Y for YES; chain commands with ; (like N;SE;Y)", 'green'))
+	out(colorize("  - In a fight, SCAN keeps scanning until it's over or your Focus runs low", 'green'))
+	out(colorize("  - Quit Game: EXIT", 'red'))
+	out(colorize("===============================================", 'cyan'))
+
+
+# The controls line never changes, so it's built once instead of every turn.
+CONTROLS_LINE = (f"\n> Controls: {COLORS['green']}SEARCH, USE, EXIT,{COLORS['reset']} or a direction "
+                 f"{COLORS['green']}(NORTH, SOUTH, EAST, WEST){COLORS['reset']}")
 
 
 # This displays the player's current status and controls at the start of each turn.
-def show_status(game_map, current_location, inventory, player_stats, quest_items_to_win):
-	print("\n---------------------------------------------------------------")
+def show_status(game_map, current_location, inventory, player_stats, quest_items_to_win, out=print):
+	out("\n---------------------------------------------------------------")
 	room = game_map[current_location]
-	print(f"> You are in the: {COLORS['cyan']}{room['room_name']}{COLORS['reset']}")
-	print(f"> Your Focus: {COLORS['green']}{player_stats['focus']}{COLORS['reset']}")
-
-	# Here is the logic to count how many quest items the player has collected.
-	inventory_names = [item['name'] if isinstance(item, dict) else item for item in inventory]
-	# This uses a generator expression to efficiently count matches.
-	quest_items_found = sum(1 for item in quest_items_to_win if item in inventory_names)
-	print(
-		f"> Quest Progress: {COLORS['yellow']}{quest_items_found} of {len(quest_items_to_win)}{COLORS['reset']} components found.")
-
-	# This is the list that will hold the formatted inventory strings for display.
-	inventory_display = []
-	for item in inventory:
-		# This checks if the item is a dictionary (a starting item).
-		if isinstance(item, dict):
-			status = "(Used)" if item['used'] else "(Ready)"
-			inventory_display.append(f"{item['name']} {status}")
-		else:
-			inventory_display.append(item)
-	print(f"> Inventory: {COLORS['yellow']}{inventory_display}{COLORS['reset']}")
+	out(f"> You are in the: {COLORS['cyan']}{room['room_name']}{COLORS['reset']}")
+	out(f"> Your Focus: {COLORS['green']}{player_stats['focus']}{COLORS['reset']}")
+
+	# The inventory keeps its quest progress and display text up to date as items come and go.
+	out(
+		f"> Quest Progress: {COLORS['yellow']}{inventory.quest_count} of {len(quest_items_to_win)}{COLORS['reset']} components found.")
+	out(f"> Inventory: {COLORS['yellow']}{inventory.display()}{COLORS['reset']}")
 
 	# This is a status indicator for a temporary buff.
 	if player_stats['logic_filter_active']:
-		print(
+		out(
 			f"> {COLORS['magenta']}Status{COLORS['reset']}: Logic Filter is {COLORS['magenta']}ACTIVE{COLORS['reset']}")
 
 	# This displays the controls every turn for easy reference
-	print(
-		f"\n> Controls: {COLORS['green']}SEARCH, USE, EXIT,{COLORS['reset']} or a direction {COLORS['green']}(NORTH, SOUTH, EAST, WEST){COLORS['reset']}")
+	out(CONTROLS_LINE)
+
+
+# Static screens (like the instructions) are rendered once per style and kept here as finished text.
+SCREEN_CACHE = {}
+
+
+# This returns a whole static screen as one string, with or without colors and with the given
+# line ending. show is a function like show_instructions() that writes the screen line by line.
+def render_screen(show, color=True, newline='\n'):
+	key = (show, color, newline)
+	screen = SCREEN_CACHE.get(key)
+	if screen is None:
+		lines = []
+		show(out=lines.append)
+		screen = '\n'.join(lines) + '\n'
+		if not color:
+			screen = strip_ansi(screen)
+		screen = SCREEN_CACHE[key] = screen.replace('\n', newline)
+	return screen
 
 
 # This function is to get the plyer input agaist a list of valid choices
-def get_player_input(prompt, valid_choices):
+def get_player_input(prompt, valid_choices, io=None):
+	if io is None:
+		io = TerminalIO()
 	while True:
-		user_input = input(prompt).strip().lower()
+		user_input = resolve_choice(io.read(prompt), valid_choices)
 		if user_input in valid_choices:
 			return user_input
 		else:
-			print(f"Invalid command. Please enter one of the following: {', '.join(valid_choices)}")
-
-
-# This function handles the logic for using an item from the inventory
-def handle_use_item(player_stats, inventory, potion_map, in_combat=False):
-	print("\n> Your Inventory:")
-
-	# This is an empty list that will be filled with only the items the player can currently use.
-	usable_items = []
-	for item in inventory:
-		# This condition checks for unused starting items.
-		if isinstance(item, dict) and not item['used']:
-			usable_items.append(item)
-		# This condition checks for any found items that are on the master list of usable wildcard items.
-		elif isinstance(item, str) and item in ['Trickle-Down Economics Textbook', 'Subpoenaed Diary Logs',
-		                                        'Logic Filter',
-		                                        'Suspiciously Well-Preserved Snack Cake', 'An Old Sharpie',
-		                                        'Blank Keycard'] + list(
-			potion_map.keys()):
-			usable_items.append(item)
-
-	if not usable_items:
-		print("  You have no usable items right now.")
-		return 'no_action'
+			io.write(f"Invalid command. Please enter one of the following: {', '.join(valid_choices)}")
+
+
+# Every item in the game is described in items.json: its name, what kind of item it is (quest,
+# wildcard, vial or starting), the description shown when it's found, its menu text, whether it
+# only works in combat, and its effect (an effect type, its parameters and the lines it prints,
+# where a number is a dramatic pause). Adding an item means adding an entry there, not code.
+# A PyInstaller build unpacks items.json with its other resources.
+if hasattr(sys, '_MEIPASS'):
+	ITEM_DATA_PATH = resource_path('items.json')
+else:
+	ITEM_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'items.json')
+
+
+def load_item_catalog(path=ITEM_DATA_PATH):
+	with open(path, encoding='utf-8') as item_file:
+		catalog = json.load(item_file)['items']
+	# Item names are interned, so looking one up usually only has to compare pointers.
+	for entry in catalog:
+		entry['name'] = sys.intern(entry['name'])
+	return catalog
+
 
-	# This is a dictionary of descriptions for the starting items.
-	starting_item_effects = {
-		'Civility Charm': 'Restores 3 Focus',
-		'Executive Order': 'Doubles reprogramming progress for one turn',
-		'Golden Parachute': 'Instantly escape a Reprogramming Sequence'
-	}
+ITEM_CATALOG = load_item_catalog()
 
-	# This loop prints the numbered menu of usable items for the player.
+
+def items_of_kind(kind):
+	return [entry['name'] for entry in ITEM_CATALOG if entry['kind'] == kind]
+
+
+# These are the lists of all possible content that can be placed in the game, in catalog order.
+QUEST_ITEMS = items_of_kind('quest')
+WILDCARD_ITEMS = items_of_kind('wildcard')
+FOCUS_VIALS = items_of_kind('vial')
+
+# These are the items every player starts with.
+STARTING_ITEMS = items_of_kind('starting')
+
+# This is the master list of found items that can be used from the inventory.
+USABLE_WILDCARD_ITEMS = [entry['name'] for entry in ITEM_CATALOG if entry['kind'] == 'wildcard' and 'effect' in entry]
+
+# These items only work during a Reprogramming Sequence.
+COMBAT_ONLY_ITEMS = [entry['name'] for entry in ITEM_CATALOG if entry.get('combat_only')]
+
+# This is the effect text shown next to an item in the usable items menu ("Unknown" if it has none).
+ITEM_MENU_EFFECTS = {entry['name']: entry['menu_effect'] for entry in ITEM_CATALOG if 'menu_effect' in entry}
+
+# This is the dictionary for all the custom item descriptions, shown when an item is found.
+ITEM_DESCRIPTIONS = {entry['name']: entry['description'] for entry in ITEM_CATALOG if 'description' in entry}
+
+
+# This returns the items the player can currently use, in the order they appear in the menu.
+def get_usable_items(inventory):
+	return inventory.usable_items()
+
+
+# This prints the numbered menu of usable items for the player.
+def show_usable_items(usable_items, out=print):
 	for i, item in enumerate(usable_items):
-		item_name = item['name'] if isinstance(item, dict) else item
-		if item_name in starting_item_effects:
-			print(f"  {i + 1}. {item_name}: Effects - {starting_item_effects[item_name]}")
+		out(f"  {i + 1}. {item.name}: Effects - {ITEM_MENU_EFFECTS.get(item.name, 'Unknown')}")
+
+	out(f"  {len(usable_items) + 1}. Cancel")
+
+
+# This prints an item's lines. Numbers in the list are dramatic pauses.
+def say_item_lines(lines, out, pause):
+	for line in lines:
+		if isinstance(line, str):
+			out(line)
 		else:
-			print(f"  {i + 1}. {item_name}: Effects - Unknown")
+			pause(line)
 
-	print(f"  {len(usable_items) + 1}. Cancel")
 
-	# Here is where the game gets the player's choice.
-	item_choices = [str(i + 1) for i in range(len(usable_items) + 1)]
-	item_choice_num = int(get_player_input("> Use which item?: ", item_choices))
+# These are the effect types an item can have. Each one gets the item's parameters from
+# items.json and returns 'flee' if the player escapes, or None if the item was simply used.
+def restore_focus_effect(player_stats, potion_map, item_name, params, out, pause):
+	player_stats['focus'] += params['amount']
+	say_item_lines(params['lines'], out, pause)
 
-	if item_choice_num == len(usable_items) + 1:
-		return 'no_action'
 
-	selected_item_data = usable_items[item_choice_num - 1]
-	item_name = selected_item_data['name'] if isinstance(selected_item_data, dict) else selected_item_data
+def drain_focus_effect(player_stats, potion_map, item_name, params, out, pause):
+	player_stats['focus'] = max(1, player_stats['focus'] - params['amount'])
+	say_item_lines(params['lines'], out, pause)
+
+
+def buff_effect(player_stats, potion_map, item_name, params, out, pause):
+	player_stats[params['flag']] = True
+	say_item_lines(params['lines'], out, pause)
+
+
+def flee_effect(player_stats, potion_map, item_name, params, out, pause):
+	say_item_lines(params['lines'], out, pause)
+	return 'flee'
+
+
+def nothing_effect(player_stats, potion_map, item_name, params, out, pause):
+	say_item_lines(params['lines'], out, pause)
+
+
+# Focus vials have their effects shuffled every game, so theirs comes from the game's potion_map.
+def vial_effect(player_stats, potion_map, item_name, params, out, pause):
+	effect = potion_map[item_name]
+	new_focus = player_stats['focus'] + effect
+	player_stats['focus'] = max(1, new_focus)
+	out(f"> You drink the {item_name}." + (
+		f" You gain {effect} Focus." if effect > 0 else f" You lose {-effect} Focus."))
+
+
+EFFECT_TYPES = {
+	'restore_focus': restore_focus_effect,
+	'drain_focus': drain_focus_effect,
+	'buff': buff_effect,
+	'flee': flee_effect,
+	'nothing': nothing_effect,
+	'vial': vial_effect,
+}
+
+
+# This compiles the catalog into the dispatch table handle_use_item() uses: item name ->
+# (effect function, parameters, combat only). It runs once, when the game starts.
+def compile_item_effects(catalog):
+	table = {}
+	for entry in catalog:
+		if 'effect' not in entry:
+			continue
+		params = entry['effect']
+		if params['type'] not in EFFECT_TYPES:
+			raise ValueError(f"Item {entry['name']!r} has an unknown effect type {params['type']!r}")
+		table[entry['name']] = (EFFECT_TYPES[params['type']], params, bool(entry.get('combat_only')))
+	return table
+
+
+ITEM_EFFECTS = compile_item_effects(ITEM_CATALOG)
+
+
+# This function applies the effect of the item the player picked from the usable items menu.
+# It returns 'no_action', 'item_used' or 'flee' so the caller knows what happened.
+def handle_use_item(player_stats, inventory, potion_map, item_name, in_combat=False, out=print, pause=time.sleep):
+	effect, params, combat_only = ITEM_EFFECTS[item_name]
 
 	# This is the check to see if a combat-only item is being used outside of combat.
-	if not in_combat and item_name in ['Executive Order', 'Golden Parachute', 'Civility Charm']:
-		print(f"> The {item_name} can only be used during a Reprogramming Sequence.")
+	if combat_only and not in_combat:
+		out(f"> The {item_name} can only be used during a Reprogramming Sequence.")
 		return 'no_action'
 
-	# This is the main block of logic that applies the effect of the chosen item.
-	if item_name == 'Civility Charm':
-		player_stats['focus'] += 3
-		print(f"> You use the Civility Charm and restore 3 Focus.")
-		selected_item_data['used'] = True
-	elif item_name == 'Executive Order':
-		player_stats['overclock_active'] = True
-		print(f"> You enact an Executive Order. Your next scan will be supercharged.")
-		selected_item_data['used'] = True
-	elif item_name == 'Golden Parachute':
-		print(f"> You use your Golden Parachute! You can now escape.")
-		selected_item_data['used'] = True
-		return 'flee'
-	elif item_name == 'Trickle-Down Economics Textbook':
-		player_stats['focus'] = max(1, player_stats['focus'] - 3)
-		print(f"> You try to apply its flawed principles. It backfires, instantly draining 3 Focus.")
-		inventory.remove(item_name)
-	elif item_name == 'Subpoenaed Diary Logs':
-		player_stats['subpoena_active'] = True
-		print("> You activate the Subpoenaed Diary Logs! Your next reprogramming roll will have a +2 bonus.")
-		inventory.remove(item_name)
-	elif item_name == 'Logic Filter':
-		player_stats['logic_filter_active'] = True
-		print("> You activate the Logic Filter! It will block the next illogical statement.")
-		inventory.remove(item_name)
-	elif item_name == 'Suspiciously Well-Preserved Snack Cake':
-		player_stats['focus'] = max(1, player_stats['focus'] - 4)
-		print("> You eat the snack cake... a bold choice. You lose 4 Focus.")
-		inventory.remove(item_name)
-	elif item_name == 'An Old Sharpie':
-		player_stats['focus'] = max(1, player_stats['focus'] - 3)
-		print("> You feel a powerful urge to redraw the map to make your path shorter. The effort drains 3 Focus.")
-		inventory.remove(item_name)
-	elif item_name == 'Blank Keycard':
-		print("\n> You hold up the Blank Keycard. It feels strangely important...")
-		time.sleep(2)
-		print("> ... and absolutely nothing happens.")
-		inventory.remove(item_name)
-	elif item_name in potion_map:
-		effect = potion_map[item_name]
-		new_focus = player_stats['focus'] + effect
-		player_stats['focus'] = max(1, new_focus)
-		print(f"> You drink the {item_name}." + (
-			f" You gain {effect} Focus." if effect > 0 else f" You lose {-effect} Focus."))
-		inventory.remove(item_name)
-
-	return 'item_used'
-
-
-# This function handles the "reprogramming" (battle) sequence.
-def reprogramming_sequence(player_stats, robot, inventory, potion_map):
-	# This is the introductory text for the encounter.
-	print_color(f"\n! A {robot['name']} running corrupted code blocks your path!", 'magenta')
-	print_color(f"! You must run a defragmenting sequence to pacify it.", 'magenta')
-	print(
-		f"! Your Focus: {COLORS['green']}{player_stats['focus']}{COLORS['reset']} | Robot's Corruption: {COLORS['red']}{robot['corruption']}{COLORS['reset']}")
+	# Starting items are marked as used and found items leave the inventory.
+	inventory.use(item_name)
 
-	# This is the main loop for the encounter, continuing until it's won or lost.
-	while robot['corruption'] > 0 and player_stats['focus'] > 0:
-		print("\n--- Your Turn ---")
-		print_color("Choose your action:", 'magenta')
-		print("  1. Run Diagnostic Scan (This is your standard action to clear the robot's corrupted code")
-		print("  2. Use an Item (This take you to your usable inventory")
-		print("  3. Forfeit Turn (This skips your turn, but restores 2 Focus points)")
-
-		# This gets the player's choice for their action.
-		player_choice = get_player_input("> Choose (1, 2, or 3): ", ['1', '2', '3'])
-
-		# This block handles the "Run Diagnostic Scan" action.
-		if player_choice == '1':
-			# This is the base progress roll, simulating a 5-sided die.
-			progress = random.randint(1, 5)
-			# This checks if the 'Executive Order' buff is active and applies its effect.
-			if player_stats.get('overclock_active'):
-				progress *= 2
-				print("> Your Executive Order doubles your progress!")
-				player_stats['overclock_active'] = False  # This consumes the buff.
-			# This checks if the 'Subpoenaed Diary Logs' buff is active.
-			if player_stats.get('subpoena_active'):
-				progress += 2
-				print("> The Subpoenaed Diary Logs enhance the scan! +2 progress!")
-				player_stats['subpoena_active'] = False  # This consumes the buff.
-			# This applies the final progress to the robot's corruption.
-			robot['corruption'] -= progress
-			print(f"> You make {progress} points of reprogramming progress.")
-
-		# Using an item consumes the turn
-		elif player_choice == '2':
-			result = handle_use_item(player_stats, inventory, potion_map, in_combat=True)
-			if result == 'flee':
-				return 'flee'
-
-		elif player_choice == '3':
-			player_stats['focus'] += 2
-			print("> You recalibrate, restoring 2 Focus points.")
+	# This applies the effect of the chosen item.
+	return effect(player_stats, potion_map, item_name, params, out, pause) or 'item_used'
 
-		if robot['corruption'] <= 0:
-			print(f"\n> Success! The {robot['name']}'s corruption is cleared.")
-			return 'win'
 
-		time.sleep(2)  # 2-second delay between player's turn and robot turn
+# This prints the introductory text for a reprogramming (battle) encounter.
+def show_combat_intro(player_stats, robot, out=print):
+	out(colorize(f"\n! A {robot['name']} running corrupted code blocks your path!", 'magenta'))
+	out(colorize(f"! You must run a defragmenting sequence to pacify it.", 'magenta'))
+	out(
+		f"! Your Focus: {COLORS['green']}{player_stats['focus']}{COLORS['reset']} | Robot's Corruption: {COLORS['red']}{robot['corruption']}{COLORS['reset']}")
+
 
-		print("\n--- Robot's Turn ---")
-		focus_drain = random.randint(1, robot['max_focus_drain'])
+# This prints the action menu at the start of each of the player's combat turns.
+def show_combat_menu(out=print):
+	out("\n--- Your Turn ---")
+	out(colorize("Choose your action:", 'magenta'))
+	out("  1. Run Diagnostic Scan (This is your standard action to clear the robot's corrupted code")
+	out("  2. Use an Item (This take you to your usable inventory")
+	out("  3. Forfeit Turn (This skips your turn, but restores 2 Focus points)")
+
+
+# This handles the "Run Diagnostic Scan" action.
+def run_diagnostic_scan(player_stats, robot, out=print, rng=random):
+	# This is the base progress roll, simulating a 5-sided die (SCAN_ROLL_MAX sides).
+	progress = rng.randint(1, SCAN_ROLL_MAX)
+	# This checks if the 'Executive Order' buff is active and applies its effect.
+	if player_stats.get('overclock_active'):
+		progress *= 2
+		out("> Your Executive Order doubles your progress!")
+		player_stats['overclock_active'] = False  # This consumes the buff.
+	# This checks if the 'Subpoenaed Diary Logs' buff is active.
+	if player_stats.get('subpoena_active'):
+		progress += 2
+		out("> The Subpoenaed Diary Logs enhance the scan! +2 progress!")
+		player_stats['subpoena_active'] = False  # This consumes the buff.
+	# This applies the final progress to the robot's corruption.
+	robot['corruption'] -= progress
+	out(f"> You make {progress} points of reprogramming progress.")
+	return progress
+
+
+# This handles the "Forfeit Turn" action.
+def forfeit_turn(player_stats, out=print):
+	player_stats['focus'] += 2
+	out("> You recalibrate, restoring 2 Focus points.")
+
+
+# This is the robot's half of a combat round.
+def robot_turn(player_stats, robot, out=print, rng=random):
+	out("\n--- Robot's Turn ---")
+	focus_drain = rng.randint(1, robot['max_focus_drain'])
+
+	# Funny robot resist messages (refocusing battle sequence)
+	attack_messages = [
+		f"> The robot's corrupted code pushes back! You lose {focus_drain} Focus.",
+		f"> The robot insists its Corruption Level is actually zero, the best corruption level, and that everyone agrees. The blatant lie is disorienting. You lose {focus_drain} Focus.",
+		f"> The robot runs a subroutine to calculate the number of dust particles in the room, then declares it to be the largest crowd of dust particles in history, period. The sheer illogicality of the statement drains {focus_drain} Focus."
+	]
 
-		# Funny robot resist messages (refocusing battle sequence)
-		attack_messages = [
-			f"> The robot's corrupted code pushes back! You lose {focus_drain} Focus.",
-			f"> The robot insists its Corruption Level is actually zero, the best corruption level, and that everyone agrees. The blatant lie is disorienting. You lose {focus_drain} Focus.",
-			f"> The robot runs a subroutine to calculate the number of dust particles in the room, then declares it to be the largest crowd of dust particles in history, period. The sheer illogicality of the statement drains {focus_drain} Focus."
-		]
+	if player_stats['logic_filter_active']:
+		out(f"> The robot spews a stream of alternative facts, but your Logic Filter flags")
+		out(f"them all as 'Pants on Fire' and blocks the disorienting effect!")
+		player_stats['logic_filter_active'] = False
+	else:
+		player_stats['focus'] -= focus_drain
+		out(rng.choice(attack_messages))
+
+	out(f"\n-- End of Turn --")
+	out(f"> Your Focus: {player_stats['focus']} | Robot's Corruption: {robot['corruption']}")
+
+
+# Here is the master dictionary that defines the static map layout and connections.
+MAP_LAYOUT = {
+	'Vestibule': {'exits': {'NORTH': 'Den', 'EAST': 'Nook'}, 'room_name': 'Vestibule'},
+	'Nook': {'exits': {'WEST': 'Vestibule', 'NORTH': 'Study', 'EAST': 'Disco'}, 'room_name': 'Nook'},
+	'Den': {'exits': {'SOUTH': 'Vestibule', 'NORTH': 'Alcove', 'EAST': 'Server Room', 'WEST': 'Atrium'},
+	        'room_name': 'Den'},
+	'Study': {'exits': {'WEST': 'Den', 'SOUTH': 'Nook', 'NORTH': 'Keep', 'EAST': 'Game Room'},
+	          'room_name': 'Study'},
+	'Atrium': {'exits': {'NORTH': 'Foundry', 'SOUTH': 'Server Room'}, 'room_name': 'Atrium'},
+	'Server Room': {'exits': {'NORTH': 'Atrium', 'EAST': 'Den'}, 'room_name': 'Server Room'},
+	'Foundry': {'exits': {'SOUTH': 'Atrium', 'EAST': 'Alcove'}, 'room_name': 'Foundry'},
+	'Alcove': {'exits': {'WEST': 'Foundry', 'SOUTH': 'Den', 'EAST': 'Keep'}, 'room_name': 'Alcove',
+	           'special_exit': 'Stairs Up'},
+	'Keep': {'exits': {'WEST': 'Alcove', 'SOUTH': 'Study', 'EAST': 'Cannery'}, 'room_name': 'Keep'},
+	'Cannery': {'exits': {'WEST': 'Keep', 'SOUTH': 'Game Room'}, 'room_name': 'Cannery'},
+	'Game Room': {'exits': {'NORTH': 'Cannery', 'WEST': 'Study', 'SOUTH': 'Disco'}, 'room_name': 'Game Room'},
+	'Disco': {'exits': {'NORTH': 'Game Room', 'WEST': 'Nook'}, 'room_name': 'Disco'},
+	'Sanctuary': {'exits': {'WEST': 'Loft', 'EAST': 'Collection Room', 'SOUTH': 'Haven'}, 'room_name': 'Sanctuary',
+	              'special_exit': 'Stairs Down'},
+	'Loft': {'exits': {'EAST': 'Sanctuary', 'SOUTH': 'Retreat'}, 'room_name': 'Loft'},
+	'Retreat': {'exits': {'NORTH': 'Loft', 'EAST': 'Haven'}, 'room_name': 'Retreat'},
+	'Collection Room': {'exits': {'WEST': 'Sanctuary', 'SOUTH': 'Perch'}, 'room_name': 'Collection Room'},
+	'Perch': {'exits': {'NORTH': 'Collection Room', 'WEST': 'Haven'}, 'room_name': 'Perch'},
+	'Haven': {'exits': {'NORTH': 'Sanctuary', 'EAST': 'Perch', 'WEST': 'Retreat'}, 'room_name': 'Haven'}
+}
 
-		if player_stats['logic_filter_active']:
-			print(f"> The robot spews a stream of alternative facts, but your Logic Filter flags")
-			print(f"them all as 'Pants on Fire' and blocks the disorienting effect!")
-			player_stats['logic_filter_active'] = False
+# This is where every game starts, and where the stairs lead.
+START_LOCATION = 'Vestibule'
+STAIRS_DESTINATIONS = {'Stairs Up': 'Sanctuary', 'Stairs Down': 'Alcove'}
+
+# This is the list of rooms the villain cannot be placed in.
+VILLAIN_SAFE_ZONES = ['Vestibule', 'Alcove', 'Sanctuary']
+
+ROBOTS = [
+	{'name': 'Corrupted Floor Buffer', 'corruption': 2, 'max_focus_drain': 3},
+	{'name': 'Malfunctioning Auto-Stapler', 'corruption': 2, 'max_focus_drain': 3},
+	{'name': 'Aggressive BaristaBot', 'corruption': 4, 'max_focus_drain': 4},
+	{'name': 'TPS Report Drone', 'corruption': 4, 'max_focus_drain': 4},
+	{'name': 'Overzealous Scheduling Robot', 'corruption': 5, 'max_focus_drain': 5},
+	{'name': 'Head of Synergy Enforcement Bot', 'corruption': 6, 'max_focus_drain': 6}
+]
+
+PORTAL_COUNT = 2
+
+# These are the focus vial effects that get shuffled between the three colors every game.
+POTION_EFFECTS = [5, 3, -4]
+
+# This is the Focus every game starts with, and the number of sides on the Diagnostic Scan's die.
+# balance_sweep.py tries other values for these, along with the robots and the vials.
+STARTING_FOCUS = 15
+SCAN_ROLL_MAX = 5
+
+# Each quest item gets one bit, so the inventory can track quest progress as a single number.
+QUEST_ITEM_BITS = {item: 1 << i for i, item in enumerate(QUEST_ITEMS)}
+ALL_QUEST_ITEMS_MASK = (1 << len(QUEST_ITEMS)) - 1
+
+
+# This is one thing in the player's inventory.
+class InventoryItem:
+	__slots__ = ('name', 'starting', 'used')
+
+	def __init__(self, name, starting=False):
+		self.name = name
+		self.starting = starting  # Starting items stay in the inventory (marked "Used") after use.
+		self.used = False
+
+	# This is how the item is shown in the status block.
+	def label(self):
+		if self.starting:
+			return f"{self.name} {'(Used)' if self.used else '(Ready)'}"
+		return self.name
+
+
+# This is the player's inventory. Besides the items themselves (in the order they were picked up),
+# it keeps a few indexes up to date on every change, so the status block, the win check and the
+# usable items menu never have to scan the whole inventory:
+#   - index: item name -> InventoryItem
+#   - usable: the names of the items that can be used right now, in menu order
+#   - quest_mask / quest_count: which quest items are held, and how many
+class Inventory:
+	def __init__(self, starting_items=STARTING_ITEMS, usable_names=None):
+		# These are the found items that can be used (the wildcard items and the focus vials).
+		if usable_names is None:
+			usable_names = USABLE_WILDCARD_ITEMS + FOCUS_VIALS
+		self.usable_names = frozenset(usable_names)
+		self.index = {}
+		self.usable = {}
+		self.quest_mask = 0
+		self.quest_count = 0
+		self._display = None
+		for name in starting_items:
+			self.add_item(InventoryItem(name, starting=True))
+
+	def __contains__(self, name):
+		return name in self.index
+
+	def __iter__(self):
+		return iter(self.index.values())
+
+	def __len__(self):
+		return len(self.index)
+
+	def names(self):
+		return list(self.index)
+
+	def add_item(self, item):
+		self.index[item.name] = item
+		if item.starting or item.name in self.usable_names:
+			self.usable[item.name] = None
+		bit = QUEST_ITEM_BITS.get(item.name, 0)
+		if bit and not self.quest_mask & bit:
+			self.quest_mask |= bit
+			self.quest_count += 1
+		self._display = None
+
+	# This adds an item picked up in a room.
+	def add(self, name):
+		self.add_item(InventoryItem(name))
+
+	def remove(self, name):
+		del self.index[name]
+		self.usable.pop(name, None)
+		bit = QUEST_ITEM_BITS.get(name, 0)
+		if bit and self.quest_mask & bit:
+			self.quest_mask &= ~bit
+			self.quest_count -= 1
+		self._display = None
+
+	# This uses up an item: starting items are marked as used and found items are removed.
+	def use(self, name):
+		item = self.index[name]
+		if item.starting:
+			item.used = True
+			self.usable.pop(name, None)
+			self._display = None
 		else:
-			player_stats['focus'] -= focus_drain
-			print(random.choice(attack_messages))
+			self.remove(name)
 
-		print(f"\n-- End of Turn --")
-		print(f"> Your Focus: {player_stats['focus']} | Robot's Corruption: {robot['corruption']}")
+	def is_usable(self, name):
+		return name in self.usable
 
-	if player_stats['focus'] <= 0:
-		return 'lose'
+	def has_quest_item(self, name):
+		return bool(self.quest_mask & QUEST_ITEM_BITS.get(name, 0))
 
-	return 'win'
+	def has_all_quest_items(self):
+		return self.quest_mask == ALL_QUEST_ITEMS_MASK
 
+	# This is the list of items that can be used right now, in the order they appear in the menu.
+	def usable_items(self):
+		return [self.index[name] for name in self.usable]
 
-# This sets up the game "world", static map, and randomized content.
-def setup_game():
-	# Here is the master dictionary that defines the static map layout and connections.
-	game_map = {
-		'Vestibule': {'exits': {'NORTH': 'Den', 'EAST': 'Nook'}, 'room_name': 'Vestibule'},
-		'Nook': {'exits': {'WEST': 'Vestibule', 'NORTH': 'Study', 'EAST': 'Disco'}, 'room_name': 'Nook'},
-		'Den': {'exits': {'SOUTH': 'Vestibule', 'NORTH': 'Alcove', 'EAST': 'Server Room', 'WEST': 'Atrium'},
-		        'room_name': 'Den'},
-		'Study': {'exits': {'WEST': 'Den', 'SOUTH': 'Nook', 'NORTH': 'Keep', 'EAST': 'Game Room'},
-		          'room_name': 'Study'},
-		'Atrium': {'exits': {'NORTH': 'Foundry', 'SOUTH': 'Server Room'}, 'room_name': 'Atrium'},
-		'Server Room': {'exits': {'NORTH': 'Atrium', 'EAST': 'Den'}, 'room_name': 'Server Room'},
-		'Foundry': {'exits': {'SOUTH': 'Atrium', 'EAST': 'Alcove'}, 'room_name': 'Foundry'},
-		'Alcove': {'exits': {'WEST': 'Foundry', 'SOUTH': 'Den', 'EAST': 'Keep'}, 'room_name': 'Alcove',
-		           'special_exit': 'Stairs Up'},
-		'Keep': {'exits': {'WEST': 'Alcove', 'SOUTH': 'Study', 'EAST': 'Cannery'}, 'room_name': 'Keep'},
-		'Cannery': {'exits': {'WEST': 'Keep', 'SOUTH': 'Game Room'}, 'room_name': 'Cannery'},
-		'Game Room': {'exits': {'NORTH': 'Cannery', 'WEST': 'Study', 'SOUTH': 'Disco'}, 'room_name': 'Game Room'},
-		'Disco': {'exits': {'NORTH': 'Game Room', 'WEST': 'Nook'}, 'room_name': 'Disco'},
-		'Sanctuary': {'exits': {'WEST': 'Loft', 'EAST': 'Collection Room', 'SOUTH': 'Haven'}, 'room_name': 'Sanctuary',
-		              'special_exit': 'Stairs Down'},
-		'Loft': {'exits': {'EAST': 'Sanctuary', 'SOUTH': 'Retreat'}, 'room_name': 'Loft'},
-		'Retreat': {'exits': {'NORTH': 'Loft', 'EAST': 'Haven'}, 'room_name': 'Retreat'},
-		'Collection Room': {'exits': {'WEST': 'Sanctuary', 'SOUTH': 'Perch'}, 'room_name': 'Collection Room'},
-		'Perch': {'exits': {'NORTH': 'Collection Room', 'WEST': 'Haven'}, 'room_name': 'Perch'},
-		'Haven': {'exits': {'NORTH': 'Sanctuary', 'EAST': 'Perch', 'WEST': 'Retreat'}, 'room_name': 'Haven'}
-	}
-
-	# This loop ensures every room has the same set of keys to prevent errors later.
-	for details in game_map.values():
-		details.update({'item': None, 'robot': None, 'villain': False})
-		if 'special_exit' not in details:
-			details['special_exit'] = None
-
-	# These are the lists of all possible content that can be placed in the game.
-	quest_items = ['Peer-Reviewed Fact-Checker', 'Civics 101 Patch', 'De-Escalation Algorithm',
-	               'Green Energy Core', 'Tax-the-Rich Capacitor', 'Historical Context Drive', 'Deregulation Lubricant']
-	wildcard_items = ['Logic Filter', 'Trickle-Down Economics Textbook', 'Subpoenaed Diary Logs',
-	                  'Suspiciously Well-Preserved Snack Cake', 'Blank Keycard', 'An Old Sharpie']
-	focus_vials = ['Red Focus Vial', 'Blue Focus Vial', 'Purple Focus Vial']
-	all_items = quest_items + wildcard_items + focus_vials
-
-	robots = [
-		{'name': 'Corrupted Floor Buffer', 'corruption': 2, 'max_focus_drain': 3},
-		{'name': 'Malfunctioning Auto-Stapler', 'corruption': 2, 'max_focus_drain': 3},
-		{'name': 'Aggressive BaristaBot', 'corruption': 4, 'max_focus_drain': 4},
-		{'name': 'TPS Report Drone', 'corruption': 4, 'max_focus_drain': 4},
-		{'name': 'Overzealous Scheduling Robot', 'corruption': 5, 'max_focus_drain': 5},
-		{'name': 'Head of Synergy Enforcement Bot', 'corruption': 6, 'max_focus_drain': 6}
-	]
+	# This is the inventory as shown in the status block. It's only rebuilt after a change.
+	def display(self):
+		if self._display is None:
+			self._display = str([item.label() for item in self.index.values()])
+		return self._display
 
-	portals = ['Portal', 'Portal']
+
+# This sets up the game "world", static map, and randomized content.
+# All the shuffling uses rng, so a seeded random.Random gives the same world every time.
+def setup_game(rng=random):
+	# Here is a fresh copy of the static map layout for this game. Every room gets the same
+	# set of keys to prevent errors later.
+	game_map = {}
+	for room_key, layout in MAP_LAYOUT.items():
+		game_map[room_key] = {'exits': layout['exits'], 'room_name': layout['room_name'],
+		                      'special_exit': layout.get('special_exit'), 'item': None, 'robot': None, 'villain': False}
+
+	all_items = QUEST_ITEMS + WILDCARD_ITEMS + FOCUS_VIALS
+	robots = [dict(robot) for robot in ROBOTS]
+	portals = ['Portal'] * PORTAL_COUNT
 
 	# Shuffles which potion gets > or < effects
-	potion_effects = [5, 3, -4]
-	random.shuffle(potion_effects)
-	potion_map = {
-		'Red Focus Vial': potion_effects[0],
-		'Blue Focus Vial': potion_effects[1],
-		'Purple Focus Vial': potion_effects[2]
-	}
+	potion_effects = list(POTION_EFFECTS)
+	rng.shuffle(potion_effects)
+	potion_map = dict(zip(FOCUS_VIALS, potion_effects))
 
 	# This gets a list of all possible locations items and bots can be placed.
 	all_locations = list(game_map.keys())
-	all_locations.remove('Vestibule')
+	all_locations.remove(START_LOCATION)
 
-	# This is the list of rooms the villain cannot be placed in.
-	villain_safe_zones = ['Vestibule', 'Alcove', 'Sanctuary']
-	valid_villain_locations = [loc for loc in all_locations if loc not in villain_safe_zones]
+	valid_villain_locations = [loc for loc in all_locations if loc not in VILLAIN_SAFE_ZONES]
 
 	# This is where the villain is randomly placed.
-	villain_location = random.choice(valid_villain_locations)
+	villain_location = rng.choice(valid_villain_locations)
 	game_map[villain_location]['villain'] = True
 
 	# This creates the final list of rooms where content can be placed.
 	available_rooms = [loc for loc in all_locations if loc != villain_location]
-	random.shuffle(available_rooms)
+	rng.shuffle(available_rooms)
 
 	# This places all the items randomly.
-	random.shuffle(all_items)
+	rng.shuffle(all_items)
 	item_placement_rooms = available_rooms[:len(all_items)]
 	for i in range(len(all_items)):
 		room_key = item_placement_rooms[i]
 		game_map[room_key]['item'] = all_items[i]
 
 	# This places all the robots randomly.
-	random.shuffle(robots)
+	rng.shuffle(robots)
 	robot_placement_rooms = available_rooms[:len(robots)]
 	for i in range(len(robots)):
 		room_key = robot_placement_rooms[i]
@@ -397,7 +573,7 @@ def setup_game():
 
 	# This block places the portals in rooms that don't already have a robot.
 	rooms_without_robots = [room for room in available_rooms if room not in robot_placement_rooms]
-	random.shuffle(rooms_without_robots)
+	rng.shuffle(rooms_without_robots)
 	portal_placement_rooms = rooms_without_robots[:len(portals)]
 	for room_key in portal_placement_rooms:
 		game_map[room_key]['special_exit'] = 'Portal'
@@ -406,221 +582,931 @@ def setup_game():
 	return game_map, villain_location, potion_map
 
 
-# This is the main function that runs the game and contains the game loop and logic.
-def main():
-	show_instructions()
-	# Outer loop to control playing again
-	while True:
-		# Here is where the game calls setup_game() to get a new, randomized world for each game.
-		game_map, villain_location, potion_map = setup_game()
+# This returns the room a staircase leads to, or None if the room has no staircase (a portal can
+# replace one). Generated buildings (building.py) have a staircase on every floor, so their rooms
+# say where theirs leads with 'stairs_to'.
+def stairs_destination(room):
+	special_exit = room.get('special_exit')
+	if special_exit not in STAIRS_DESTINATIONS:
+		return None
+	return room.get('stairs_to') or STAIRS_DESTINATIONS[special_exit]
+
+
+# This lists every way out of each room: its exits, plus its staircase as 'STAIRS' if the
+# staircase is still there (a portal can replace one). With portals=True, a portal counts as a
+# way into every room it could drop the player in, which is every room but the villain's office.
+def route_links(game_map, villain_location=None, portals=False):
+	links = {}
+	for room_key in game_map:
+		room = game_map[room_key]
+		room_links = list(room['exits'].items())
+		stairs_to = stairs_destination(room)
+		if stairs_to is not None:
+			room_links.append(('STAIRS', stairs_to))
+		elif portals and room.get('special_exit') == 'Portal':
+			room_links.extend(('PORTAL', destination) for destination in game_map if destination != villain_location)
+		links[room_key] = room_links
+	return links
+
+
+# This is an all-pairs shortest path table. It runs a breadth-first search from every room once,
+# up front, and remembers how many moves it takes to get anywhere and which way to go first.
+class RouteTable:
+	def __init__(self, links):
+		self.distance = {}  # distance[start][goal] is the number of moves (missing if unreachable)
+		self.first_step = {}  # first_step[start][goal] is the direction to take first
+		for start in links:
+			distance = {start: 0}
+			first_step = {start: None}
+			queue = deque([start])
+			while queue:
+				room = queue.popleft()
+				for direction, neighbour in links[room]:
+					if neighbour not in distance:
+						distance[neighbour] = distance[room] + 1
+						first_step[neighbour] = first_step[room] or direction
+						queue.append(neighbour)
+			self.distance[start] = distance
+			self.first_step[start] = first_step
+
+	# This returns the closest of the goal rooms to start, or None if none of them can be reached.
+	def nearest(self, start, goals):
+		distances = self.distance[start]
+		best = None
+		for goal in goals:
+			moves = distances.get(goal)
+			if moves is not None and (best is None or moves < distances[best]):
+				best = goal
+		return best
+
+
+# These are the rooms that have a staircase on the static map.
+STAIRS_ROOMS = [room_key for room_key, layout in MAP_LAYOUT.items()
+                if layout.get('special_exit') in STAIRS_DESTINATIONS]
+
+# This is the route table for the static map, with every staircase in place.
+STATIC_ROUTES = RouteTable(route_links(MAP_LAYOUT))
+
+# Walking routes only change when a portal has replaced a staircase, so there are only a few
+# different tables. They're built the first time they're needed and shared by every game.
+WALKING_ROUTES = {tuple(STAIRS_ROOMS): STATIC_ROUTES}
+
+
+# This returns the walking (exits and stairs) route table for a game's world. Generated buildings
+# are far too big for all-pairs tables, so they work out their own routes.
+def walking_routes(game_map):
+	if hasattr(game_map, 'walking_routes'):
+		return game_map.walking_routes()
+	stairs_left = tuple(room_key for room_key in STAIRS_ROOMS
+	                    if game_map[room_key]['special_exit'] in STAIRS_DESTINATIONS)
+	routes = WALKING_ROUTES.get(stairs_left)
+	if routes is None:
+		routes = WALKING_ROUTES[stairs_left] = RouteTable(route_links(game_map))
+	return routes
+
+
+# This returns the route table for a game's world with its portals included. Portals are placed
+# differently in every game, so this one is built per world.
+def portal_routes(game_map, villain_location):
+	if hasattr(game_map, 'portal_routes'):
+		return game_map.portal_routes()
+	return RouteTable(route_links(game_map, villain_location, portals=True))
+
+
+# There are only a few different sets of exits, so each "Available exits" line is built once.
+EXITS_LINES = {}
+
+
+# This class holds everything about a single game so it can be played one command at a time.
+# Instead of calling input() itself, the session stores the prompt it is waiting on and the
+# terminal, the headless simulator or any other front end answers it by calling feed().
+class GameSession:
+	# Sessions that only replay a game that was already played (like the ones events.py makes event
+	# logs with) set this, so instrumentation.py doesn't count that game's phases twice.
+	untimed = False
+
+	def __init__(self, quiet=False, world=None, odds=None, seed=None, world_setup=setup_game, record=False,
+	             advisor=None, rng=None, status_screens=True):
+		# When quiet is True, the session skips all text and pauses (used for bot runs).
+		self.quiet = quiet
+		self.output = []
+		# This is an optional combat odds table (from combat_odds.py) to show the player during fights.
+		self.odds = odds
+		# This is an optional optimal-play table (from combat_solver.py). With one, the combat menu
+		# gets a fourth option that asks the ADVISOR for the best move.
+		self.advisor = advisor
+
+		# Every random roll in this game comes from the session's own generator, so the seed plus
+		# the commands the player typed are enough to replay the game exactly. A world made ahead of
+		# time (see world_pool.py) comes with its seed and the generator that built it, already past setup.
+		if seed is None:
+			seed = random.getrandbits(64)
+		self.seed = seed
+		self.rng = rng if rng is not None else random.Random(seed)
+		# When record is True, every line fed to the session is kept for the replay log.
+		self.command_log = [] if record else None
+
+		# Here is where the session calls setup_game() (or another world_setup, like the compact
+		# worlds from world.py) to get a new, randomized world, unless it was handed one.
+		if world is None:
+			world = self.build_world(world_setup)
+		self.game_map, self.villain_location, self.potion_map = world
 
 		# This is the dictionary for the player's stats (resets every game).
-		player_stats = {
-			'focus': 15,
+		self.player_stats = {
+			'focus': STARTING_FOCUS,
 			'logic_filter_active': False,
 			'overclock_active': False,
 			'subpoena_active': False
 		}
 		# This is the player's starting inventory.
-		inventory = [
-			{'name': 'Civility Charm', 'used': False},  # Restores 3 focus
-			{'name': 'Executive Order', 'used': False},  # Doubles reprogramming
-			{'name': 'Golden Parachute', 'used': False},  # Instant flee
-		]
+		self.inventory = Inventory()
 		# This is the list of quest items, used for the win condition check.
-		quest_items_to_win = ['Peer-Reviewed Fact-Checker', 'Civics 101 Patch', 'De-Escalation Algorithm',
-		                      'Green Energy Core', 'Tax-the-Rich Capacitor', 'Historical Context Drive',
-		                      'Deregulation Lubricant']
-
-		# This is the dictionary for all the custom item descriptions.
-		item_descriptions = {
-			'Blank Keycard': "You find a beautifully framed, but completely blank, healthcare plan. Its sheer, unadulterated uselessness is almost an art form.",
-			'An Old Sharpie': "You find a thick, black marker. It seems to hum with a strange, world-altering power.",
-			'Subpoenaed Diary Logs': "You find a dusty old diary. The pages are filled with what looks like binary code and complaints about toner cartridges.",
-			'Trickle-Down Economics Textbook': "This looks important, but it seems to be filled with flawed logic.",
-			'Red Focus Vial': "A vial containing a swirling, crimson liquid. It smells faintly of cherries and determination.",
-			'Blue Focus Vial': "A vial of calm, blue liquid. It bubbles gently, like a peaceful spring.",
-			'Purple Focus Vial': "A vial of a deep, mysterious purple fluid. You're not entirely sure if it's supposed to be glowing like that."
-		}
-
-		current_location = 'Vestibule'
-		game_running = True
-
-		# This is the main loop for a single game session.
-		while game_running:
-			show_status(game_map, current_location, inventory, player_stats, quest_items_to_win)
-
-			room = game_map[current_location]
-
-			# This is the combined win/loss condition. It runs first every turn.
-			if room['villain']:
-				inventory_names = [item['name'] if isinstance(item, dict) else item for item in inventory]
-				quest_items_present = all(item in inventory_names for item in quest_items_to_win)
-
-				# This is the win condition check.
-				if quest_items_present:
-					print(
-						"\nYou've entered a pristine, minimalist office. A single, perfectly polished nameplate reads 'Mr. Ton Drump'.")
-					time.sleep(2)
-					print(
-						f"He looks up from a teetering stack of TPS reports, his {COLORS['red']}eyes{COLORS['reset']} narrowing.")
-					time.sleep(2)
-					print("'My parking spot,' he whispers with icy rage. 'You... you know what she did.'")
-					time.sleep(2)
-					print_color(
-						"\nYou hold up the final component and say, 'Looks like your alternative facts just ran into a peer-reviewed reality.'",
-						'green')
-					time.sleep(3)
-					print("\nAs he sputters in confusion, a wave of calming, green energy pulses through the walls.")
-					print("On a monitor behind him, you see security footage of the corrupted robots slowing down,")
-					print("whirring gently, and returning to their peaceful programming.")
-					time.sleep(2)
-					print_color("\n===============================================================", 'cyan')
-					print_color("                 Y O U   W I N ! ! !                 ", 'green')
-					print_color("===============================================================", 'cyan')
-					print(
-						f"You didn't win by {COLORS['red']}fighting{COLORS['reset']}, you won by {COLORS['cyan']}healing{COLORS['reset']}. Congratulations!")
-					print_color("===============================================================", 'cyan')
-					game_running = False
-
-				# This is the lose condition.
-				else:
-					print(
-						"\nYou've entered a pristine, minimalist office. A single, perfectly polished nameplate reads 'Mr. Ton Drump'.")
-					time.sleep(2)
-					print(
-						f"He looks up from a teetering stack of TPS reports, his {COLORS['red']}eyes{COLORS['reset']} narrowing.")
-					time.sleep(2)
-					print("'My parking spot,' he whispers with icy rage. 'You... you know what she did.'")
-					time.sleep(2)
-					print("\nHe presses a button on his desk, and the door slams shut behind you.")
-					print_color("GAME OVER.", 'red')
-					game_running = False
-
-				# This ends the turn after a win or loss.
-				continue
-
-			# This is the "ambush" check for robots (when the player enters a room with a robot).
-			if room['robot'] is not None:
-				robot_to_fight = room['robot']
-				result = reprogramming_sequence(player_stats, robot_to_fight, inventory, potion_map)
-
-				if result == 'win':
-					room['robot'] = None
-					print(f"\nThe {robot_to_fight['name']} has been pacified. The room is now safe.")
-					continue
-				elif result == 'flee':
-					valid_exits = list(room['exits'].keys())
-					flee_direction = random.choice(valid_exits)
-					current_location = room['exits'][flee_direction]
-					print(f"\nYou hastily flee {flee_direction} into the {game_map[current_location]['room_name']}...")
-					continue
-				elif result == 'lose':
-					print_color("GAME OVER.", 'red')
-					game_running = False
-					continue
-
-			# This is the loop for player actions within a single turn.
-			action_taken_this_turn = False
-			while not action_taken_this_turn:
+		self.quest_items_to_win = list(QUEST_ITEMS)
+
+		# The item descriptions never change, so every session shares the same dictionary.
+		self.item_descriptions = ITEM_DESCRIPTIONS
+
+		self.current_location = START_LOCATION
+		# These are the rooms the player has searched, for HINT. The portal route table is only
+		# built if a hint needs it.
+		self.searched = set()
+		self.portal_route_table = None
+
+		# These track what the session is waiting for. The phase says which handler gets the next line,
+		# the prompt is what input() would have shown, and choices limits the accepted answers.
+		self.phase = None
+		self.prompt = None
+		self.choices = None
+		self.in_combat = False
+		self.usable_items = []
+		# Front ends turn this off while the player's typed-ahead commands run, so only the last
+		# of them draws the status screen. Remote clients that draw their own status screens (see
+		# status_protocol.py) start their sessions with status_screens=False and never get one.
+		self.show_status = status_screens
+
+		# These are the counters and the result that front ends and bots look at.
+		self.turns = 0
+		self.commands = 0
+		self.finished = False
+		self.outcome = None
+
+		self.begin_turn()
+
+	def build_world(self, world_setup):
+		return world_setup(self.rng)
+
+	# This adds a line of text to the output, the same way print() would.
+	def say(self, text=''):
+		if not self.quiet:
+			self.output.append(text)
+
+	# This records a dramatic pause. Front ends decide how (and whether) to wait.
+	def pause(self, seconds):
+		if not self.quiet:
+			self.output.append(seconds)
+
+	# This hands everything said since the last call to the front end and clears the buffer.
+	def take_output(self):
+		output = self.output
+		self.output = []
+		return output
+
+	# This sets up the question the session is waiting on.
+	def ask(self, phase, prompt, choices=None):
+		self.phase = phase
+		self.prompt = prompt
+		self.choices = choices
+
+	# This is the one entry point for player input. It works like get_player_input():
+	# answers that aren't in the list of valid choices are rejected and the question stays open.
+	def feed(self, line):
+		if self.finished:
+			return
+		self.commands += 1
+		if self.command_log is not None:
+			self.command_log.append(line)
+		if self.choices is not None:
+			line = line.strip().lower()
+			if line not in self.choices:
+				self.say(f"Invalid command. Please enter one of the following: {', '.join(self.choices)}")
+				return
+		PHASE_HANDLERS[self.phase](self, line)
+
+	# This ends the game with 'win', 'lose' or 'quit'.
+	def end_game(self, outcome):
+		self.finished = True
+		self.outcome = outcome
+		self.phase = None
+		self.prompt = None
+		self.choices = None
+
+	# This is the start of every turn: status, then the win/loss and ambush checks.
+	def begin_turn(self):
+		self.turns += 1
+		if not self.quiet and self.show_status:
+			self.show_turn_status()
+
+		room = self.game_map[self.current_location]
+
+		# This is the combined win/loss condition. It runs first every turn.
+		if room['villain']:
+			self.villain_encounter()
+			return
+
+		# This is the "ambush" check for robots (when the player enters a room with a robot).
+		if room['robot'] is not None:
+			self.in_combat = True
+			show_combat_intro(self.player_stats, room['robot'], out=self.say)
+			self.ask_combat_action()
+			return
+
+		self.ask_command()
+
+	def show_turn_status(self):
+		show_status(self.game_map, self.current_location, self.inventory, self.player_stats,
+		            self.quest_items_to_win, out=self.say)
+
+	# This moves the player into another room and starts their turn there.
+	def move_to(self, location):
+		self.current_location = location
+		self.begin_turn()
+
+	# This says whether the player has every component. In a shared world (shared_world.py) the
+	# components anyone on the team picked up count.
+	def has_all_quest_items(self):
+		return self.inventory.has_all_quest_items()
+
+	# This runs when the player walks into Mr. Ton Drump's office.
+	def villain_encounter(self):
+		quest_items_present = self.has_all_quest_items()
+
+		self.say(
+			"\nYou've entered a pristine, minimalist office. A single, perfectly polished nameplate reads 'Mr. Ton Drump'.")
+		self.pause(2)
+		self.say(
+			f"He looks up from a teetering stack of TPS reports, his {COLORS['red']}eyes{COLORS['reset']} narrowing.")
+		self.pause(2)
+		self.say("'My parking spot,' he whispers with icy rage. 'You... you know what she did.'")
+		self.pause(2)
+
+		# This is the win condition check.
+		if quest_items_present:
+			self.say(colorize(
+				"\nYou hold up the final component and say, 'Looks like your alternative facts just ran into a peer-reviewed reality.'",
+				'green'))
+			self.pause(3)
+			self.say("\nAs he sputters in confusion, a wave of calming, green energy pulses through the walls.")
+			self.say("On a monitor behind him, you see security footage of the corrupted robots slowing down,")
+			self.say("whirring gently, and returning to their peaceful programming.")
+			self.pause(2)
+			self.say(colorize("\n===============================================================", 'cyan'))
+			self.say(colorize("                 Y O U   W I N ! ! !                 ", 'green'))
+			self.say(colorize("===============================================================", 'cyan'))
+			self.say(
+				f"You didn't win by {COLORS['red']}fighting{COLORS['reset']}, you won by {COLORS['cyan']}healing{COLORS['reset']}. Congratulations!")
+			self.say(colorize("===============================================================", 'cyan'))
+			self.end_game('win')
+
+		# This is the lose condition.
+		else:
+			self.say("\nHe presses a button on his desk, and the door slams shut behind you.")
+			self.say(colorize("GAME OVER.", 'red'))
+			self.end_game('lose')
+
+	# This asks the player what to do next in the current room.
+	def ask_command(self):
+		if not self.quiet:
+			exits = tuple(self.game_map[self.current_location]['exits'])
+			exits_line = EXITS_LINES.get(exits)
+			if exits_line is None:
 				# Here is where the game builds the colored string for the available exits.
-				colored_exits = [f"{COLORS['green']}{exit_dir}{COLORS['reset']}" for exit_dir in room['exits'].keys()]
-				print("\n> Available exits:", ", ".join(colored_exits))
-
-				command = input("> What do you do? ").upper().strip()
-
-				# This block handles the SEARCH command.
-				if command == 'SEARCH':
-					print("\n> You search the room...")
-					item_in_room = room.get('item')
-					special_exit = room.get('special_exit')
-
-					# This is the logic that runs if an item is found in the room.
-					if item_in_room:
-						# Here, the game checks if the item has a special description and print it if it does.
-						if item_in_room in item_descriptions:
-							print(f"  {item_descriptions[item_in_room]}")
-
-						# This is the prompt asking the player if they want to collect the item.
-						get_choice = get_player_input(
-							f"> You see a {COLORS['yellow']}{item_in_room}{COLORS['reset']}. Would you like to get it? ({COLORS['green']}YES{COLORS['reset']}/{COLORS['red']}NO{COLORS['reset']}): ",
-							['yes', 'no'])
-
-						# This is the block that runs if the player says 'yes'.
-						if get_choice == 'yes':
-							# Here, the game adds the item to the inventory.
-							inventory.append(item_in_room)
-							# This is where the game removes the item from the room so it can't be picked up again.
-							room['item'] = None
-							print_color(f"> You picked up the {item_in_room}.", 'green')
-
-							# This is the logic to tell the player what kind of item they found.
-							if item_in_room in quest_items_to_win:
-								print_color("> This looks like a crucial component for Dr. Gucnew's device!",
-								            'magenta')
-							elif item_in_room != 'Blank Keycard':
-								print_color("> This item looks like it could be used once during your quest.",
-								            'yellow')
-
-					# This block handles finding stairs or portals.
-					if special_exit:
-						if 'Stairs' in special_exit:  # Stairs
-							prompt = "> You see a grand, winding staircase. Use it? (YES/NO): "
-						# This is the "portal"
-						else:
-							prompt = "> A shimmering portal hums in the corner. Enter it? (YES/NO): "
-
-						use_choice = get_player_input(prompt, ['yes', 'no'])
-						if use_choice == 'yes':
-							if 'Stairs Up' in special_exit:
-								current_location = 'Sanctuary'
-							elif 'Stairs Down' in special_exit:
-								current_location = 'Alcove'
-							else:  # Portal
-								print("\n> You step into the portal...")
-								time.sleep(1)
-								print("> A whirlwind of colors and strange noises envelops you.")
-								time.sleep(1.5)
-								print("> Things get weird.")
-								time.sleep(1)
-								print("> You stumble out into a strange room...")
-								# This makes sure the player can't be transported to the Villains room
-								safe_locs = [loc for loc in game_map.keys() if
-								             loc not in [villain_location]]
-								current_location = random.choice(safe_locs)
-							action_taken_this_turn = True
-
-					if not item_in_room and not special_exit:
-						print("> You find nothing else of interest.")
-
-				# This handles the USE command.
-				elif command == 'USE':
-					handle_use_item(player_stats, inventory, potion_map)
-
-				# This handles all valid movement commands.
-				elif command in room['exits']:
-					current_location = room['exits'][command]
-					action_taken_this_turn = True
-
-				# This handles the EXIT command.
-				elif command == 'EXIT':
-					game_running = False
-					action_taken_this_turn = True
-				else:
-					print("\nInvalid command.")
-
-			# This check is to break out of the main loop if the game ended from an EXIT command.
-			if not game_running:
-				break
+				colored_exits = [f"{COLORS['green']}{exit_dir}{COLORS['reset']}" for exit_dir in exits]
+				exits_line = EXITS_LINES[exits] = "\n> Available exits: " + ", ".join(colored_exits)
+			self.say(exits_line)
+		self.ask('command', "> What do you do? ")
+
+	# This handles a command typed at the "What do you do?" prompt.
+	def handle_command(self, line):
+		command = line.upper().strip()
+		room = self.game_map[self.current_location]
+
+		# This block handles the SEARCH command.
+		if command == 'SEARCH':
+			self.search_room()
+
+		# This handles the USE command.
+		elif command == 'USE':
+			self.open_item_menu(in_combat=False)
+
+		# This handles all valid movement commands.
+		elif command in room['exits']:
+			self.move_to(room['exits'][command])
+
+		# This handles the EXIT command.
+		elif command == 'EXIT':
+			self.end_game('quit')
+
+		# This handles the HINT command. It doesn't use up a turn.
+		elif command == 'HINT':
+			self.give_hint()
+			self.ask_command()
+		else:
+			self.say("\nInvalid command.")
+			self.ask_command()
+
+	# This searches the current room for an item, then for stairs or a portal.
+	def search_room(self):
+		self.searched.add(self.current_location)
+		self.say("\n> You search the room...")
+		item_in_room = self.game_map[self.current_location].get('item')
+
+		# This is the logic that runs if an item is found in the room.
+		if item_in_room:
+			# Here, the game checks if the item has a special description and print it if it does.
+			if item_in_room in self.item_descriptions:
+				self.say(f"  {self.item_descriptions[item_in_room]}")
+
+			# This is the prompt asking the player if they want to collect the item.
+			self.ask('get_item',
+			         f"> You see a {COLORS['yellow']}{item_in_room}{COLORS['reset']}. Would you like to get it? ({COLORS['green']}YES{COLORS['reset']}/{COLORS['red']}NO{COLORS['reset']}): ",
+			         ['yes', 'no'])
+		else:
+			self.search_special_exit(found_item=False)
+
+	# This points the player toward the nearest missing quest component (or, once they have them all,
+	# Mr. Ton Drump's office) using the route tables. If none of those can be reached on foot it
+	# tries the routes through the portals, and after that the nearest room the player hasn't searched.
+	def give_hint(self):
+		here = self.current_location
+		if self.has_all_quest_items():
+			goals = [self.villain_location]
+			goal_name = "Mr. Ton Drump's office"
+		else:
+			goals = [room_key for room_key in self.game_map if self.game_map[room_key]['item'] in QUEST_ITEM_BITS]
+			goal_name = "The nearest missing component"
+
+		routes = walking_routes(self.game_map)
+		goal = routes.nearest(here, goals)
+		if goal is None:
+			if self.portal_route_table is None:
+				self.portal_route_table = portal_routes(self.game_map, self.villain_location)
+			routes = self.portal_route_table
+			goal = routes.nearest(here, goals)
+		if goal is None:
+			routes = walking_routes(self.game_map)
+			goal = routes.nearest(here, [room_key for room_key in self.game_map if room_key not in self.searched])
+			goal_name = "The nearest room you haven't searched"
+		if goal is None:
+			self.say(colorize("\n> HINT: You've searched everywhere you can reach. Try a portal!", 'magenta'))
+			return
+
+		if goal == here:
+			self.say(colorize(f"\n> HINT: {goal_name} is right here. Try SEARCH.", 'magenta'))
+			return
+		moves = routes.distance[here][goal]
+		step = routes.first_step[here][goal]
+		if step == 'STAIRS':
+			advice = "Search for the stairs and take them."
+		elif step == 'PORTAL':
+			advice = "Search for the portal here and take your chances."
+		else:
+			advice = f"Head {step}."
+		plural = '' if moves == 1 else 's'
+		self.say(colorize(f"\n> HINT: {goal_name} is {moves} move{plural} away. {advice}", 'magenta'))
+
+	# This is the block that runs after the player answers whether to pick up an item.
+	def handle_get_item(self, choice):
+		if choice == 'yes':
+			item_in_room = self.pick_up_item()
+			# In a shared world another player can get to the item first, leaving nothing to pick up.
+			if item_in_room is not None:
+				self.say(colorize(f"> You picked up the {item_in_room}.", 'green'))
+
+				# This is the logic to tell the player what kind of item they found.
+				if self.inventory.has_quest_item(item_in_room):
+					self.say(colorize("> This looks like a crucial component for Dr. Gucnew's device!", 'magenta'))
+				elif item_in_room != 'Blank Keycard':
+					self.say(colorize("> This item looks like it could be used once during your quest.", 'yellow'))
+
+		self.search_special_exit(found_item=True)
+
+	# This moves the item in the current room into the inventory and returns it.
+	def pick_up_item(self):
+		room = self.game_map[self.current_location]
+		item_in_room = room['item']
+		# Here, the game adds the item to the inventory.
+		self.inventory.add(item_in_room)
+		# This is where the game removes the item from the room so it can't be picked up again.
+		room['item'] = None
+		return item_in_room
+
+	# This block handles finding stairs or portals at the end of a search.
+	def search_special_exit(self, found_item):
+		special_exit = self.game_map[self.current_location].get('special_exit')
+		if special_exit:
+			if 'Stairs' in special_exit:  # Stairs
+				prompt = "> You see a grand, winding staircase. Use it? (YES/NO): "
+			# This is the "portal"
+			else:
+				prompt = "> A shimmering portal hums in the corner. Enter it? (YES/NO): "
+			self.ask('use_exit', prompt, ['yes', 'no'])
+			return
+
+		if not found_item:
+			self.say("> You find nothing else of interest.")
+		self.ask_command()
+
+	# This runs after the player answers whether to use the stairs or portal.
+	def handle_use_exit(self, choice):
+		if choice == 'no':
+			self.ask_command()
+			return
+
+		stairs_to = stairs_destination(self.game_map[self.current_location])
+		if stairs_to is not None:
+			self.move_to(stairs_to)
+		else:  # Portal
+			self.say("\n> You step into the portal...")
+			self.pause(1)
+			self.say("> A whirlwind of colors and strange noises envelops you.")
+			self.pause(1.5)
+			self.say("> Things get weird.")
+			self.pause(1)
+			self.say("> You stumble out into a strange room...")
+			# This makes sure the player can't be transported to the Villains room
+			safe_locs = [loc for loc in self.game_map.keys() if loc not in [self.villain_location]]
+			self.move_to(self.rng.choice(safe_locs))
+
+	# This shows the usable items menu, in or out of combat.
+	def open_item_menu(self, in_combat):
+		self.say("\n> Your Inventory:")
+		self.usable_items = get_usable_items(self.inventory)
+
+		if not self.usable_items:
+			self.say("  You have no usable items right now.")
+			self.finish_item_use('no_action')
+			return
+
+		show_usable_items(self.usable_items, out=self.say)
+		# Here is where the game gets the player's choice.
+		item_choices = [str(i + 1) for i in range(len(self.usable_items) + 1)]
+		self.ask('use_item', "> Use which item?: ", item_choices)
+
+	# This runs after the player picks a number from the usable items menu.
+	def handle_item_choice(self, choice):
+		item_choice_num = int(choice)
+		if item_choice_num == len(self.usable_items) + 1:
+			result = 'no_action'
+		else:
+			result = self.use_item(self.usable_items[item_choice_num - 1].name)
+		self.usable_items = []
+		self.finish_item_use(result)
+
+	# This uses one item from the inventory and returns what happened ('flee', 'no_action' and so on).
+	def use_item(self, item_name):
+		return handle_use_item(self.player_stats, self.inventory, self.potion_map, item_name,
+		                       in_combat=self.in_combat, out=self.say, pause=self.pause)
+
+	# This sends the game back to wherever the item menu was opened from.
+	def finish_item_use(self, result):
+		if not self.in_combat:
+			self.ask_command()
+		elif result == 'flee':
+			self.end_combat('flee')
+		else:
+			# Using an item consumes the turn
+			self.finish_player_turn()
+
+	# This is the top of the reprogramming loop, continuing until it's won or lost.
+	def ask_combat_action(self):
+		robot = self.game_map[self.current_location]['robot']
+		if robot['corruption'] > 0 and self.player_stats['focus'] > 0:
+			show_combat_menu(out=self.say)
+			if self.advisor is not None:
+				self.say("  4. Ask the ADVISOR (Dr. Gucnew works out your best move. This doesn't use your turn)")
+			odds = self.odds.lookup_session(self) if self.odds is not None and not self.quiet else None
+			if odds is not None:
+				win_chance, focus_loss = odds
+				self.say(f"  Odds if you keep scanning: {COLORS['green']}{win_chance:.0%}{COLORS['reset']} to pacify it, "
+				         f"about {focus_loss:.1f} Focus lost.")
+			self.ask_for_combat_choice()
+		elif self.player_stats['focus'] <= 0:
+			self.end_combat('lose')
+		else:
+			self.end_combat('win')
+
+	def ask_for_combat_choice(self):
+		if self.advisor is not None:
+			self.ask('combat', "> Choose (1, 2, 3, or 4): ", ['1', '2', '3', '4'])
+		else:
+			self.ask('combat', "> Choose (1, 2, or 3): ", ['1', '2', '3'])
+
+	# This handles the player's choice of combat action.
+	def handle_combat_action(self, choice):
+		robot = self.game_map[self.current_location]['robot']
+		if choice == '1':
+			self.scan_robot(robot)
+		elif choice == '2':
+			self.open_item_menu(in_combat=True)
+			return
+		elif choice == '3':
+			forfeit_turn(self.player_stats, out=self.say)
+		elif choice == '4':
+			# With the robot already pacified by someone else there's nothing to advise on, and
+			# finishing the turn ends the fight.
+			if self.ask_advisor():
+				self.ask_for_combat_choice()
+				return
+		self.finish_player_turn()
+
+	# This runs one Diagnostic Scan on the robot. Shared worlds scan under the room's lock.
+	def scan_robot(self, robot):
+		run_diagnostic_scan(self.player_stats, robot, out=self.say, rng=self.rng)
+
+	# This looks the current fight up in the optimal-play table and tells the player the best move.
+	# It returns True once it has given its advice, or False if there's no fight to look up.
+	def ask_advisor(self):
+		advice = self.advisor.lookup_session(self)
+		if advice is None:
+			return False
+		action, chance = advice
+		if action == 'scan':
+			advice = "Run a Diagnostic Scan (1)."
+		elif action == 'forfeit':
+			advice = "Forfeit your turn to recover some Focus (3)."
+		else:
+			number = [item.name for item in self.inventory.usable_items()].index(action) + 1
+			advice = f"Use the {action} (2, then {number})."
+		self.say(colorize(f"\n> ADVISOR: {advice}", 'magenta'))
+		self.say(f"> Playing perfectly from here, you pacify it {COLORS['green']}{chance:.0%}{COLORS['reset']} of the time.")
+		return True
+
+	# This checks for a win after the player's action and then lets the robot respond.
+	def finish_player_turn(self):
+		robot = self.game_map[self.current_location]['robot']
+		if robot['corruption'] <= 0:
+			self.say(f"\n> Success! The {robot['name']}'s corruption is cleared.")
+			self.end_combat('win')
+			return
+
+		self.pause(2)  # 2-second delay between player's turn and robot turn
+		robot_turn(self.player_stats, robot, out=self.say, rng=self.rng)
+		self.ask_combat_action()
+
+	# This wraps up a reprogramming sequence and moves the game on.
+	def end_combat(self, result):
+		self.in_combat = False
+		room = self.game_map[self.current_location]
+		robot = room['robot']
+
+		if result == 'win':
+			room['robot'] = None
+			self.say(f"\nThe {robot['name']} has been pacified. The room is now safe.")
+			self.begin_turn()
+		elif result == 'flee':
+			valid_exits = list(room['exits'].keys())
+			flee_direction = self.rng.choice(valid_exits)
+			destination = room['exits'][flee_direction]
+			self.say(f"\nYou hastily flee {flee_direction} into the {self.game_map[destination]['room_name']}...")
+			self.move_to(destination)
+		elif result == 'lose':
+			self.say(colorize("GAME OVER.", 'red'))
+			self.end_game('lose')
+
+
+# This table connects each phase to the method that handles the answer to its prompt.
+PHASE_HANDLERS = {
+	'command': GameSession.handle_command,
+	'get_item': GameSession.handle_get_item,
+	'use_exit': GameSession.handle_use_exit,
+	'use_item': GameSession.handle_item_choice,
+	'combat': GameSession.handle_combat_action,
+}
+
+
+# This scales the game's dramatic pauses for one session. Fast mode removes them entirely
+# (for bots and tests) and the multiplier speeds them up or slows them down.
+class Pacer:
+	def __init__(self, multiplier=1.0, fast=False):
+		self.multiplier = multiplier
+		self.fast = fast
+
+	def scale(self, seconds):
+		if self.fast:
+			return 0
+		return seconds * self.multiplier
+
+
+# This is the game's input/output interface for a local terminal. Every front end provides
+# the same methods: write() shows a line, write_screen() shows a whole static screen (like the
+# instructions), pause() handles a dramatic pause and read() shows a prompt and returns the line
+# the player typed.
+#
+# Lines are collected into a frame and written to the stream in one go, just before the game
+# pauses or waits for input (or when flush() is called). Colors are only sent to a real terminal:
+# when the output is piped or redirected they are stripped, unless color says otherwise.
+class TerminalIO:
+	def __init__(self, pacer=None, stream=None, color=None):
+		self.pacer = pacer or Pacer()
+		self.stream = stream if stream is not None else sys.stdout
+		if color is None:
+			color = self.stream.isatty()
+		self.color = color
+		self.frame = []
+
+	def write(self, text):
+		self.frame.append(text)
+		self.frame.append('\n')
+
+	def write_screen(self, show):
+		self.frame.append(render_screen(show, self.color))
+
+	def flush(self):
+		if self.frame:
+			text = ''.join(self.frame)
+			self.frame = []
+			self.stream.write(text if self.color else strip_ansi(text))
+		self.stream.flush()
+
+	# A local terminal only ever has one player, so waiting here holds nobody else up.
+	def pause(self, seconds):
+		delay = self.pacer.scale(seconds)
+		if delay > 0:
+			self.flush()
+			time.sleep(delay)
+
+	def read(self, prompt):
+		self.flush()
+		return input(prompt if self.color else strip_ansi(prompt))
+
+
+# These are the words the "What do you do?" prompt understands. Any unique start of one that's at
+# least two letters long works (SE for SEARCH, US for USE), and the single letters N, S, E and W are
+# the four directions. A stray answer to a question shouldn't walk or quit the game, so the starts
+# of YES and NO (like NO for NORTH) don't count, and EXIT has to be typed in full.
+COMMAND_WORDS = ('NORTH', 'SOUTH', 'EAST', 'WEST', 'SEARCH', 'USE', 'EXIT', 'HINT')
+COMMAND_ALIASES = {'N': 'NORTH', 'S': 'SOUTH', 'E': 'EAST', 'W': 'WEST'}
+COMMAND_MIN_LENGTH = 2
+COMMAND_WHOLE_WORDS = ('EXIT',)
+COMMAND_REFUSED = ('YES', 'NO')
+
+
+# This is a prefix tree of words. Every node knows the one word below it (or that there's more
+# than one), so looking up an abbreviation is a walk down its letters. Abbreviations shorter than
+# min_length, abbreviations of the whole_words and every start of the refused words are turned down.
+class PrefixTrie:
+	AMBIGUOUS = object()
+
+	def __init__(self, words, aliases=None, min_length=1, whole_words=(), refused=()):
+		self.aliases = aliases or {}
+		self.min_length = min_length
+		self.whole_words = set(whole_words)
+		self.refused = {word[:end] for word in refused for end in range(1, len(word) + 1)}
+		self.root = self.new_node()
+		for word in words:
+			node = self.root
+			self.note_word(node, word)
+			for letter in word:
+				node = node['children'].setdefault(letter, self.new_node())
+				self.note_word(node, word)
+			node['word'] = word
+
+	def new_node(self):
+		return {'children': {}, 'word': None, 'only': None}
+
+	def note_word(self, node, word):
+		if node['only'] is None:
+			node['only'] = word
+		elif node['only'] != word:
+			node['only'] = self.AMBIGUOUS
+
+	# This returns the word an abbreviation stands for, or None if it's ambiguous or unknown.
+	# A whole word always counts as itself, even when it's also the start of a longer one.
+	def lookup(self, text):
+		if text in self.aliases:
+			return self.aliases[text]
+		if not text:
+			return None
+		node = self.root
+		for letter in text:
+			node = node['children'].get(letter)
+			if node is None:
+				return None
+		if node['word'] is not None:
+			return node['word']
+		word = node['only']
+		if (word is self.AMBIGUOUS or len(text) < self.min_length or text in self.refused or
+				word in self.whole_words):
+			return None
+		return word
+
+
+COMMAND_TRIE = PrefixTrie(COMMAND_WORDS, COMMAND_ALIASES, COMMAND_MIN_LENGTH, COMMAND_WHOLE_WORDS, COMMAND_REFUSED)
+# The combat prompt also takes SCAN, the macro that keeps scanning (see TypeAhead).
+MACRO_TRIE = PrefixTrie(('SCAN',))
+# The tries for the lists of choices (YES/NO, menu numbers) are built the first time each list is asked.
+CHOICE_TRIES = {}
+
+
+# This turns an answer to a question with a list of choices into one of them when it's a
+# unique start of one ("y" for "yes"). Anything else comes back unchanged, to be rejected as usual.
+def resolve_choice(text, choices):
+	text = text.strip().lower()
+	key = tuple(choices)
+	trie = CHOICE_TRIES.get(key)
+	if trie is None:
+		trie = CHOICE_TRIES[key] = PrefixTrie(key)
+	return trie.lookup(text) or text
+
+
+# This is the type-ahead queue between a player and their session. A line can hold several
+# commands separated by semicolons, like "n;e;se;y", and each one is expanded from its
+# abbreviation just before it's fed, at whatever prompt the game has reached by then. Only the
+# last one draws the status screen, so a remote player gets a whole walk back in one round trip.
+#
+# At the combat prompt, "SCAN" (or "SCAN 4") keeps running Diagnostic Scans until the fight ends or
+# the player's Focus drops below the number. Without a number it stops while one more hit from the
+# robot could still be survived.
+#
+# If a command doesn't fit the prompt it reaches (say a fight broke out along the way), it's fed
+# anyway so the game explains, and the rest of the queue is dropped.
+class TypeAhead:
+	def __init__(self, status_screens=True):
+		self.status_screens = status_screens  # False when the client draws its own status screens.
+		self.queue = deque()
+		self.started = False  # Whether the current line's first command has been fed.
+		self.scan_floor = None  # While the SCAN macro runs, the Focus it stops below.
+
+	def add_line(self, line):
+		commands = [command.strip() for command in line.split(';')]
+		self.queue.extend(command for command in commands if command)
+		if not self.queue:
+			# An empty line is still an answer, like pressing Enter at any other prompt.
+			self.queue.append('')
+		self.started = False
+
+	# This says whether the queue is empty, so the front end should read another line.
+	def waiting(self):
+		return not self.queue and self.scan_floor is None
+
+	# This returns the next command to feed the session, or None when there isn't one after all
+	# (the SCAN macro just stopped). Front ends show the output and check waiting() again.
+	def next_command(self, session):
+		if self.scan_floor is not None:
+			command = self.continue_scan(session)
+			if command is not None:
+				return self.send(session, command)
+		if not self.queue:
+			return None
+		text = self.queue.popleft()
+		if session.phase == 'command':
+			command = COMMAND_TRIE.lookup(text.upper())
+		else:
+			command = resolve_choice(text, session.choices)
+			if command not in session.choices:
+				command = None
+			if command is None and session.phase == 'combat':
+				command = self.start_scan(session, text)
+				if command is False:
+					return None
+		if command is None:
+			command = self.send(session, text)
+			self.drop_queue(session)
+			return command
+		return self.send(session, command)
+
+	# This feeds the command after the first on a line back to the player as if they'd typed it at
+	# its prompt, and only lets the session draw a status screen once nothing else is waiting.
+	def send(self, session, command):
+		if self.started:
+			session.say(f"{session.prompt}{command}")
+		self.started = True
+		session.show_status = self.status_screens and not self.queue
+		return command
+
+	# This starts the SCAN macro for text like "scan" or "sc 5", and returns its first scan. It returns
+	# None if the text isn't the macro, and False if the player's Focus is already below the floor.
+	def start_scan(self, session, text):
+		words = text.split()
+		if not words or MACRO_TRIE.lookup(words[0].upper()) is None or len(words) > 2:
+			return None
+		if len(words) == 2:
+			if not words[1].isdigit():
+				return None
+			self.scan_floor = int(words[1])
+		else:
+			# In a shared world another player can pacify the robot while this player is still at the
+			# combat prompt, and then there's no robot to size the floor from. One scan is enough to
+			# find out the fight is over.
+			robot = session.game_map[session.current_location]['robot']
+			if robot is None:
+				return '1'
+			self.scan_floor = robot['max_focus_drain'] + 1
+		command = self.continue_scan(session)
+		return False if command is None else command
+
+	def continue_scan(self, session):
+		if session.phase == 'combat':
+			if session.player_stats['focus'] >= self.scan_floor:
+				return '1'
+			session.say(f"\n> Your Focus is below {self.scan_floor}, so you stop scanning to think it over.")
+			self.drop_queue(session)
+		self.scan_floor = None
+		return None
+
+	def drop_queue(self, session):
+		if self.queue:
+			session.say(f"> (Skipped the rest of what you typed ahead: {'; '.join(self.queue)})")
+			self.queue.clear()
+		session.show_status = self.status_screens
+
+
+# This plays one session, sending its output to the io object and answering its prompts from it.
+# A line can hold several commands (see TypeAhead), which are all played before the next prompt.
+def play_session(session, io):
+	typed = TypeAhead()
+	while True:
+		for line in session.take_output():
+			# Numbers in the output are the dramatic pauses.
+			if isinstance(line, str):
+				io.write(line)
+			else:
+				io.pause(line)
+		if session.finished:
+			return session.outcome
+		if typed.waiting():
+			typed.add_line(io.read(session.prompt))
+		command = typed.next_command(session)
+		if command is not None:
+			session.feed(command)
+
+
+# This is the main function that runs the game and contains the play again loop.
+# Giving a seed makes every game reproducible, and record_path appends each finished game to a replay log.
+def main(io=None, odds=None, seed=None, record_path=None, advisor=None, leaderboard_path=None, player=None):
+	if io is None:
+		io = TerminalIO()
+	seeds = random.Random(seed) if seed is not None else random
+	leaderboard = None
+	if leaderboard_path is not None:
+		import getpass
+		import leaderboard as leaderboard_module
+		leaderboard = leaderboard_module.Leaderboard(leaderboard_path).start()
+		player = player or getpass.getuser()
+	io.write_screen(show_instructions)
+	io.read("\nPress Enter to begin your quest...")
+	# Outer loop to control playing again
+	while True:
+		# Each game gets a brand new session with a new, randomized world.
+		recording = record_path is not None or leaderboard is not None
+		session = GameSession(odds=odds, seed=seeds.getrandbits(64), record=recording, advisor=advisor)
+		started = time.monotonic()
+		play_session(session, io)
+		duration = time.monotonic() - started
+		if record_path is not None:
+			import replay
+			replay.append_record(record_path, replay.record_from_session(session))
+		if leaderboard is not None:
+			import replay
+			leaderboard.add(leaderboard_module.game_row(player, replay.record_from_session(session), duration))
 
 		# This is the "Play Again" feature that runs after a win, loss, or exit.
-		play_again = get_player_input("\n> Would you like to play again? (YES/NO): ", ['yes', 'no'])
+		play_again = get_player_input("\n> Would you like to play again? (YES/NO): ", ['yes', 'no'], io)
 		if play_again == 'no':
 			break  # This breaks the outermost loop and ends the program.
 
-	print("\nThanks for playing!")
+	io.write("\nThanks for playing!")
+	io.flush()
+	if leaderboard is not None:
+		leaderboard.stop()
 
 
 # It ensures that the main() function is called only when the game runs this file directly.
 if __name__ == "__main__":
-	main()
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Dr. Eaton vs. Ton Drump and the Evil Robots")
+	parser.add_argument('--fast', action='store_true', help="skip the dramatic pauses")
+	parser.add_argument('--pace', type=float, default=1.0, help="multiply the dramatic pauses by this much")
+	parser.add_argument('--odds', action='store_true', help="show combat odds during fights (needs NumPy)")
+	parser.add_argument('--advisor', action='store_true', help="offer an ADVISOR option during fights (needs NumPy)")
+	parser.add_argument('--color', choices=['auto', 'always', 'never'], default='auto',
+	                    help="use colors (auto: only when writing to a terminal)")
+	parser.add_argument('--seed', type=int, default=None, help="seed the games so they can be reproduced")
+	parser.add_argument('--record', metavar='PATH', help="append every finished game to this replay log")
+	parser.add_argument('--leaderboard', metavar='PATH', help="add every finished game to this SQLite leaderboard")
+	parser.add_argument('--name', default=None, help="your name on the leaderboard (default: your login name)")
+	args = parser.parse_args()
+
+	odds = None
+	if args.odds:
+		import combat_odds
+		odds = combat_odds.load_or_build()
+	advisor = None
+	if args.advisor:
+		import combat_solver
+		advisor = combat_solver.load_or_build()
+	color = {'auto': None, 'always': True, 'never': False}[args.color]
+	main(TerminalIO(Pacer(args.pace, args.fast), color=color), odds, args.seed, args.record, advisor, args.leaderboard,
+	     args.name)
@@ -0,0 +1,235 @@
+# Balance sweeps for Dr. Eaton vs. Ton Drump.
+#
+# The game's difficulty comes from a handful of constants: how corrupted the robots are and how
+# much Focus they can drain (ROBOTS), the three focus vial effects (POTION_EFFECTS), the Focus a
+# game starts with (STARTING_FOCUS) and the sides on the Diagnostic Scan's die (SCAN_ROLL_MAX).
+# This tool tries many values for them, playing headless bot games with one fixed policy for
+# every combination (a grid) or for a random sample of them, over a pool of worker processes.
+#
+# Every configuration is played in batches, and stops as soon as its win rate is settled: when
+# the 95% confidence interval around it is narrower than --precision either side, or (with
+# --target) when the whole interval is clearly outside the target band. The interval is checked
+# after every batch, so treat it as a stopping rule rather than an exact test. Every configuration
+# plays the same game seeds in the same order, so differences between them aren't just luck of
+# the draw. The results go to a CSV file, one row per configuration.
+#
+# Each worker sets the game module's constants for the configuration it's playing, so sweeps
+# only use the classic setup_game() worlds (the other world builders copy the robots at import).
+#
+# Example:  python balance_sweep.py --starting-focus 10,15,20 --scan-max 4,5,6 --output sweep.csv
+#           python balance_sweep.py --random 50 --drain-offset=-2,-1,0,1,2 --target 0.5
+
+import argparse
+import csv
+import itertools
+import math
+import multiprocessing
+import random
+import time
+
+import Dr_Eaton_vs_Ton_Drump as game
+from simulation import make_policy, play_headless
+
+# These are the game's own values, which every configuration starts from.
+BASE_ROBOTS = [dict(robot) for robot in game.ROBOTS]
+BASE_POTION_EFFECTS = list(game.POTION_EFFECTS)
+
+# This is the z-score for a 95% confidence interval.
+Z_95 = 1.96
+
+# These are the columns of the results file, in order.
+CONFIG_COLUMNS = ('starting_focus', 'scan_max', 'corruption_offset', 'drain_offset', 'potions')
+RESULT_COLUMNS = CONFIG_COLUMNS + ('games', 'wins', 'losses', 'win_rate', 'ci_low', 'ci_high', 'mean_turns',
+                                   'stopped')
+
+
+# This sets the game module's balance constants for one configuration. Robots never go below
+# 1 corruption or 1 maximum Focus drain.
+def apply_balance(config):
+	game.STARTING_FOCUS = config['starting_focus']
+	game.SCAN_ROLL_MAX = config['scan_max']
+	game.POTION_EFFECTS = list(config['potions'])
+	game.ROBOTS = [dict(robot, corruption=max(1, robot['corruption'] + config['corruption_offset']),
+	                    max_focus_drain=max(1, robot['max_focus_drain'] + config['drain_offset']))
+	               for robot in BASE_ROBOTS]
+
+
+# This is the Wilson score interval for a win rate. It behaves well near 0% and 100%, where
+# balance sweeps spend a lot of their time.
+def wilson_interval(wins, games, z=Z_95):
+	if not games:
+		return 0.0, 1.0
+	rate = wins / games
+	denominator = 1 + z * z / games
+	centre = (rate + z * z / (2 * games)) / denominator
+	spread = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / denominator
+	return max(0.0, centre - spread), min(1.0, centre + spread)
+
+
+# This plays one batch of games for one configuration in a worker process. The batch's game
+# seeds (and the bot's own random choices) come from batch_seed, so every configuration gets
+# the same games.
+def play_batch(index, config, batch_seed, games, policy_spec, max_commands):
+	apply_balance(config)
+	seeds = random.Random(batch_seed)
+	wins = losses = turns = 0
+	for _ in range(games):
+		seed = seeds.getrandbits(64)
+		result = play_headless(make_policy(policy_spec, seed), max_commands, seed=seed)
+		wins += result['outcome'] == 'win'
+		losses += result['outcome'] == 'lose'
+		turns += result['turns']
+	return index, games, wins, losses, turns
+
+
+def _play_batch_args(args):
+	return play_batch(*args)
+
+
+# This is where one configuration's sweep stands.
+class ConfigResult:
+	def __init__(self, config):
+		self.config = config
+		self.games = 0
+		self.wins = 0
+		self.losses = 0
+		self.turns = 0
+		self.stopped = None  # Why it stopped: 'settled', 'off target' or 'max games'.
+
+	def add(self, games, wins, losses, turns):
+		self.games += games
+		self.wins += wins
+		self.losses += losses
+		self.turns += turns
+
+	# This decides whether the configuration has been played enough.
+	def check(self, min_games, max_games, precision, target=None, tolerance=0.0):
+		if self.games < min_games:
+			return
+		low, high = wilson_interval(self.wins, self.games)
+		if (high - low) / 2 <= precision:
+			self.stopped = 'settled'
+		elif target is not None and (low > target + tolerance or high < target - tolerance):
+			self.stopped = 'off target'
+		elif self.games >= max_games:
+			self.stopped = 'max games'
+
+	def row(self):
+		low, high = wilson_interval(self.wins, self.games)
+		row = dict(self.config)
+		row['potions'] = '/'.join(str(effect) for effect in self.config['potions'])
+		row.update(games=self.games, wins=self.wins, losses=self.losses,
+		           win_rate=round(self.wins / self.games, 4) if self.games else 0.0,
+		           ci_low=round(low, 4), ci_high=round(high, 4),
+		           mean_turns=round(self.turns / self.games, 2) if self.games else 0.0, stopped=self.stopped)
+		return row
+
+
+# This lists the configurations to try: every combination of the values, or `sample` of them
+# picked at random (without repeats).
+def configurations(values, sample=None, rng=random):
+	grid = [dict(zip(CONFIG_COLUMNS, combination))
+	        for combination in itertools.product(*(values[column] for column in CONFIG_COLUMNS))]
+	if sample is not None and sample < len(grid):
+		grid = rng.sample(grid, sample)
+	return grid
+
+
+# This runs the sweep. Each round sends one batch of every configuration that's still going to
+# the worker pool, then checks which of them have settled.
+def run_sweep(configs, policy_spec='greedy', processes=None, batch_size=200, min_games=400, max_games=10000,
+              precision=0.02, target=None, tolerance=0.0, max_commands=2000, seed=0, progress=None):
+	results = [ConfigResult(config) for config in configs]
+	batch_number = 0
+
+	def jobs(running):
+		batch_seed = seed * 1000003 + batch_number
+		return [(index, results[index].config, batch_seed, batch_size, policy_spec, max_commands) for index in running]
+
+	with multiprocessing.Pool(processes) as pool:
+		running = list(range(len(results)))
+		while running:
+			for index, games, wins, losses, turns in pool.imap_unordered(_play_batch_args, jobs(running)):
+				results[index].add(games, wins, losses, turns)
+			for index in running:
+				results[index].check(min_games, max_games, precision, target, tolerance)
+			running = [index for index in running if results[index].stopped is None]
+			batch_number += 1
+			if progress is not None:
+				progress(batch_number, len(results) - len(running), len(results))
+	return results
+
+
+def write_csv(path, results):
+	with open(path, 'w', newline='') as csv_file:
+		writer = csv.DictWriter(csv_file, fieldnames=RESULT_COLUMNS)
+		writer.writeheader()
+		for result in results:
+			writer.writerow(result.row())
+
+
+def int_list(text):
+	return [int(value) for value in text.split(',')]
+
+
+# Vial effects are written as slash-separated triples, with commas between the triples: 5/3/-4,6/3/-4
+def potions_list(text):
+	return [tuple(int(effect) for effect in triple.split('/')) for triple in text.split(',')]
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Sweep the game's balance constants with headless bot games.")
+	parser.add_argument('--starting-focus', type=int_list, default=[game.STARTING_FOCUS], metavar='LIST')
+	parser.add_argument('--scan-max', type=int_list, default=[game.SCAN_ROLL_MAX], metavar='LIST',
+	                    help="sides on the Diagnostic Scan's die")
+	parser.add_argument('--corruption-offset', type=int_list, default=[0], metavar='LIST',
+	                    help="added to every robot's corruption (write negative lists as --corruption-offset=-1,0,1)")
+	parser.add_argument('--drain-offset', type=int_list, default=[0], metavar='LIST',
+	                    help="added to every robot's maximum Focus drain")
+	parser.add_argument('--potions', type=potions_list, default=[tuple(BASE_POTION_EFFECTS)], metavar='LIST',
+	                    help="vial effects, like 5/3/-4,6/3/-4")
+	parser.add_argument('--random', type=int, default=None, metavar='N', help="try N random configurations, not the grid")
+	parser.add_argument('--policy', choices=('greedy', 'vials', 'random'), default='greedy',
+	                    help="the bot to play with (only vials and random ever drink Focus vials)")
+	parser.add_argument('--processes', type=int, default=None, help="worker processes (default: one per core)")
+	parser.add_argument('--batch-size', type=int, default=200)
+	parser.add_argument('--min-games', type=int, default=400)
+	parser.add_argument('--max-games', type=int, default=10000)
+	parser.add_argument('--precision', type=float, default=0.02, help="stop once the win rate is known to within this")
+	parser.add_argument('--target', type=float, default=None, help="stop early once a win rate is clearly off this")
+	parser.add_argument('--tolerance', type=float, default=0.05, help="how far off --target still counts as on target")
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--output', default='balance_sweep.csv')
+	args = parser.parse_args()
+	# The greedy bot never drinks a vial, so every vial setting would get the same win rate.
+	if args.policy == 'greedy' and args.potions != [tuple(BASE_POTION_EFFECTS)]:
+		parser.error("the greedy bot never drinks Focus vials, so --potions needs --policy vials")
+
+	values = {'starting_focus': args.starting_focus, 'scan_max': args.scan_max,
+	          'corruption_offset': args.corruption_offset, 'drain_offset': args.drain_offset, 'potions': args.potions}
+	configs = configurations(values, args.random, random.Random(args.seed))
+
+	def progress(batch_number, done, total):
+		print(f"  round {batch_number}: {done} of {total} configurations settled", flush=True)
+
+	start = time.perf_counter()
+	results = run_sweep(configs, args.policy, args.processes, args.batch_size, args.min_games, args.max_games,
+	                    args.precision, args.target, args.tolerance, seed=args.seed, progress=progress)
+	elapsed = time.perf_counter() - start
+	write_csv(args.output, results)
+
+	games = sum(result.games for result in results)
+	print(f"\n{len(results)} configurations, {games:,} games in {elapsed:.1f}s ({games / elapsed:,.0f} games/s), "
+	      f"{games / (len(results) * args.max_games):.1%} of the games without early stopping")
+	for stopped in ('settled', 'off target', 'max games'):
+		count = sum(1 for result in results if result.stopped == stopped)
+		if count:
+			print(f"  {stopped:<11} {count}")
+	if args.target is not None:
+		best = min(results, key=lambda result: abs(result.wins / result.games - args.target))
+		print(f"Closest to {args.target:.0%}: {best.row()}")
+	print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+	main()
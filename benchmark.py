@@ -0,0 +1,272 @@
+# Benchmark suite for Dr. Eaton vs. Ton Drump.
+#
+# Times the game's hot paths with no terminal, no printing and no pauses:
+#   - setup_game() worlds per second
+#   - reprogramming sequences (fights) per second, for each robot
+#   - handle_use_item() calls per second
+#   - complete scripted games per second, replayed from a fixed corpus of recorded bot games
+#   - per-turn latency (p50/p99) with the full game text being built, as a player would see it
+#   - memory per turn, from tracemalloc: the peak extra memory a turn needs while it runs and
+#     what it leaves allocated afterwards (tracemalloc tracks memory, not a count of allocations)
+#
+# Every step runs a few times and keeps its best result, which is far steadier than a single run
+# on a busy machine. Results are printed and can be saved as JSON. Comparing against an earlier
+# JSON file flags every metric that got worse by more than the threshold, and exits with status 1
+# if any did, so it can be run between commits to catch performance regressions.
+#
+# Example:  python benchmark.py --output before.json
+#           python benchmark.py --compare before.json --output after.json
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from Dr_Eaton_vs_Ton_Drump import (FOCUS_VIALS, ROBOTS, STARTING_FOCUS, STARTING_ITEMS, USABLE_WILDCARD_ITEMS,
+                                   GameSession, Inventory, handle_use_item, robot_turn, run_diagnostic_scan, setup_game)
+from replay import WORLD_SETUPS, record_bot_games
+
+# Metric names say which way is better: rates end in '_per_second' (higher is better) and
+# everything else (microseconds, bytes) is better lower.
+HIGHER_IS_BETTER = '_per_second'
+
+# These are the sizes of a normal run. --quick divides them all by ten.
+DEFAULT_SCALE = {
+	'worlds': 50000,
+	'fights_per_robot': 50000,
+	'item_uses': 200000,
+	'games': 2000,
+}
+
+
+def discard(*args):
+	pass
+
+
+def percentile(sorted_values, fraction):
+	if not sorted_values:
+		return 0.0
+	return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def bench_setup(worlds):
+	rng = random.Random(1)
+	start = time.perf_counter()
+	for _ in range(worlds):
+		setup_game(rng)
+	return {'setup_worlds_per_second': worlds / (time.perf_counter() - start)}
+
+
+# This plays one reprogramming sequence the way GameSession does, scanning every turn, until the
+# robot is pacified or the player runs out of Focus.
+def play_fight(robot_template, rng):
+	robot = dict(robot_template)
+	player_stats = {'focus': STARTING_FOCUS, 'logic_filter_active': False, 'overclock_active': False, 'subpoena_active': False}
+	while robot['corruption'] > 0 and player_stats['focus'] > 0:
+		run_diagnostic_scan(player_stats, robot, out=discard, rng=rng)
+		if robot['corruption'] <= 0:
+			return True
+		robot_turn(player_stats, robot, out=discard, rng=rng)
+	return robot['corruption'] <= 0
+
+
+def bench_fights(fights):
+	rng = random.Random(2)
+	results = {}
+	for robot in ROBOTS:
+		start = time.perf_counter()
+		for _ in range(fights):
+			play_fight(robot, rng)
+		key = robot['name'].lower().replace(' ', '_').replace('-', '_')
+		results[f"fights_per_second.{key}"] = fights / (time.perf_counter() - start)
+	return results
+
+
+# Every call picks up the next item and uses it (in combat, so the combat-only items work too).
+def bench_use_item(calls):
+	player_stats = {'focus': STARTING_FOCUS, 'logic_filter_active': False, 'overclock_active': False, 'subpoena_active': False}
+	potion_map = dict(zip(FOCUS_VIALS, [5, 3, -4]))
+	names = STARTING_ITEMS + USABLE_WILDCARD_ITEMS + FOCUS_VIALS
+	inventory = Inventory(starting_items=())
+	start = time.perf_counter()
+	for i in range(calls):
+		name = names[i % len(names)]
+		if name in inventory:
+			inventory.remove(name)
+		inventory.add(name)
+		handle_use_item(player_stats, inventory, potion_map, name, in_combat=True, out=discard, pause=discard)
+		player_stats['focus'] = STARTING_FOCUS
+	return {'handle_use_item_calls_per_second': calls / (time.perf_counter() - start)}
+
+
+# This is the fixed corpus the game benchmarks replay: greedy bot games on seeded worlds.
+def scripted_corpus(games):
+	state = random.getstate()
+	random.seed(3)
+	try:
+		return record_bot_games(games, 'greedy')
+	finally:
+		random.setstate(state)
+
+
+def bench_scripted_games(records):
+	commands = sum(len(record.commands) for record in records)
+	start = time.perf_counter()
+	for record in records:
+		session = GameSession(quiet=True, seed=record.seed, world_setup=WORLD_SETUPS[record.world])
+		for command in record.commands:
+			session.feed(command)
+	elapsed = time.perf_counter() - start
+	return {'scripted_games_per_second': len(records) / elapsed, 'scripted_commands_per_second': commands / elapsed}
+
+
+# This times every command of the corpus with the game text turned on, the way a player's turn runs.
+def bench_turn_latency(records):
+	latencies = []
+	clock = time.perf_counter
+	for record in records:
+		session = GameSession(seed=record.seed, world_setup=WORLD_SETUPS[record.world])
+		session.take_output()
+		for command in record.commands:
+			start = clock()
+			session.feed(command)
+			session.take_output()
+			latencies.append(clock() - start)
+	latencies.sort()
+	return {'turn_latency_p50_us': percentile(latencies, 0.50) * 1e6,
+	        'turn_latency_p99_us': percentile(latencies, 0.99) * 1e6}
+
+
+def bench_turn_memory(records):
+	peaks = []
+	kept = 0
+	turns = 0
+	tracemalloc.start()
+	try:
+		for record in records:
+			session = GameSession(seed=record.seed, world_setup=WORLD_SETUPS[record.world])
+			session.take_output()
+			for command in record.commands:
+				before = tracemalloc.get_traced_memory()[0]
+				tracemalloc.reset_peak()
+				session.feed(command)
+				session.take_output()
+				current, peak = tracemalloc.get_traced_memory()
+				peaks.append(peak - before)
+				kept += current - before
+				turns += 1
+	finally:
+		tracemalloc.stop()
+	peaks.sort()
+	return {'turn_peak_bytes_p50': percentile(peaks, 0.50), 'turn_peak_bytes_p99': percentile(peaks, 0.99),
+	        'turn_kept_bytes_mean': kept / max(turns, 1)}
+
+
+def git_commit():
+	try:
+		return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+		                      check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def is_better(name, value, other):
+	return value > other if HIGHER_IS_BETTER in name else value < other
+
+
+# This runs one step `repeat` times and keeps the best value of each of its metrics.
+def best_of(step, repeat):
+	best = {}
+	for _ in range(repeat):
+		for name, value in step().items():
+			if name not in best or is_better(name, value, best[name]):
+				best[name] = value
+	return best
+
+
+# This runs the whole suite and returns its results as a dictionary, ready to be saved as JSON.
+def run_suite(scale=DEFAULT_SCALE, repeat=3, log=print):
+	metrics = {}
+	steps = [
+		("setup_game()", lambda: bench_setup(scale['worlds'])),
+		("fights", lambda: bench_fights(scale['fights_per_robot'])),
+		("handle_use_item()", lambda: bench_use_item(scale['item_uses'])),
+	]
+	for label, step in steps:
+		log(f"  {label}...")
+		metrics.update(best_of(step, repeat))
+
+	log("  recording the scripted corpus...")
+	records = scripted_corpus(scale['games'])
+	for label, step in (("scripted games", bench_scripted_games), ("turn latency", bench_turn_latency),
+	                    ("turn memory", bench_turn_memory)):
+		log(f"  {label}...")
+		metrics.update(best_of(lambda: step(records), repeat))
+
+	return {
+		'commit': git_commit(),
+		'python': platform.python_version(),
+		'machine': platform.machine(),
+		'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'scale': dict(scale),
+		'repeat': repeat,
+		'metrics': metrics,
+	}
+
+
+# This compares two result files and returns (metric, old, new, change) for every metric that got
+# worse by more than threshold (0.10 is 10%).
+def find_regressions(old, new, threshold=0.10):
+	regressions = []
+	for name, new_value in new['metrics'].items():
+		old_value = old['metrics'].get(name)
+		if not old_value:
+			continue
+		change = (new_value - old_value) / old_value
+		worse = -change if HIGHER_IS_BETTER in name else change
+		if worse > threshold:
+			regressions.append((name, old_value, new_value, change))
+	return regressions
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the game's hot paths.")
+	parser.add_argument('--output', help="save the results to this JSON file")
+	parser.add_argument('--compare', help="compare against an earlier JSON results file")
+	parser.add_argument('--threshold', type=float, default=0.10, help="regression threshold (0.10 is 10%%)")
+	parser.add_argument('--quick', action='store_true', help="run a tenth of the normal work")
+	parser.add_argument('--repeat', type=int, default=3, help="runs of each step (the best one is kept)")
+	args = parser.parse_args()
+
+	scale = {name: max(1, size // 10) if args.quick else size for name, size in DEFAULT_SCALE.items()}
+	print("Running benchmarks:")
+	results = run_suite(scale, args.repeat)
+
+	print()
+	for name, value in results['metrics'].items():
+		print(f"{name:<62} {value:>14,.1f}")
+
+	if args.output:
+		with open(args.output, 'w') as results_file:
+			json.dump(results, results_file, indent=2)
+		print(f"\nSaved to {args.output}")
+
+	if args.compare:
+		with open(args.compare) as old_file:
+			old = json.load(old_file)
+		regressions = find_regressions(old, results, args.threshold)
+		print(f"\nCompared with {args.compare} (commit {old.get('commit')}):")
+		if not regressions:
+			print(f"  no metric got more than {args.threshold:.0%} worse")
+		for name, old_value, new_value, change in regressions:
+			print(f"  REGRESSION {name}: {old_value:,.1f} -> {new_value:,.1f} ({change:+.1%})")
+		if regressions:
+			sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
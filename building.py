@@ -0,0 +1,626 @@
+# Procedurally generated buildings for Dr. Eaton vs. Ton Drump.
+#
+# Instead of the fixed 18-room Hexagon, generate_building() makes a building of any size: floors
+# of width x height rooms, each floor a maze, every floor joined to the next by a staircase like
+# Alcove and Sanctuary, with portals, robots, items and Mr. Ton Drump scattered through it.
+#
+# A building is never built all at once. generate_building() only picks a seed, the villain's
+# office and the rooms the items are in. Everything else is worked out from the seed when it's
+# needed, so it comes out the same every time:
+#   - Rooms live in chunks of CHUNK_ROOMS rooms. The first time a room in a chunk is looked at, the
+#     whole chunk is built from its own seeded generator: its doors, robots and portals. Only the
+#     last max_chunks chunks used are kept. The least recently used one is dropped when a new one is
+#     built, and rebuilt exactly the same if it's needed again.
+#   - Each floor is a "binary tree" maze: every room opens a door north or east (one random byte
+#     each, turned into doors with bytes.translate), except along the north and east walls, where
+#     only one way is possible. Following those doors always leads to the floor's north-east corner,
+#     so every room on a floor can reach every other one. A few rooms get both doors, which adds loops.
+#   - Each floor's staircases come from the floor's own seed. Staircases are never replaced by
+#     portals, so the whole building stays reachable on foot.
+#   - What the player changes (items picked up, robots pacified or worn down) is kept separately as
+#     a small delta, and applied on top of whatever a chunk says.
+#
+# So a building's memory depends on max_chunks and on what the player has done, not on its size.
+#
+# BuildingMap wraps a building so GameSession can play on it like on setup_game()'s dictionary.
+#
+# Example:  python building.py     (build time and memory at 10^3, 10^5 and 10^6 rooms)
+
+import random
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+
+from Dr_Eaton_vs_Ton_Drump import (FOCUS_VIALS, MAP_LAYOUT, POTION_EFFECTS, QUEST_ITEMS, ROBOTS, START_LOCATION,
+                                   WILDCARD_ITEMS)
+from world import (PORTAL, ROBOT_CORRUPTION, ROBOT_MAX_FOCUS_DRAIN, ROBOT_NAMES, SPECIAL_EXIT_NAMES, STAIRS_DOWN,
+                   STAIRS_UP)
+
+# These are the two doors a room can open. A room's south and west doors are the north door of
+# the room below it and the east door of the room to its west.
+NORTH_DOOR, EAST_DOOR = 1, 2
+
+# This turns a random byte into a room's doors: its low bit picks north or east, and about one
+# room in ten (LOOP_CUTOFF out of 128) opens both.
+LOOP_CUTOFF = 13
+DOOR_TABLE = bytes((NORTH_DOOR | EAST_DOOR) if (byte >> 1) < LOOP_CUTOFF else (NORTH_DOOR if byte & 1 else EAST_DOOR)
+                   for byte in range(256))
+
+# Rooms are named after the Hexagon's rooms, plus their floor and number ("Den 3-41").
+# The building's first room, where the game starts, is the Vestibule.
+ROOM_KINDS = tuple(name for name in MAP_LAYOUT if name != START_LOCATION)
+
+# This is how many robots there are per room, unless generate_building() is told otherwise. The
+# Hexagon has one for every three rooms, which would make a big building a very long fight.
+DEFAULT_ROBOT_DENSITY = 0.1
+
+# Rooms are built this many at a time, and a building keeps this many chunks unless told otherwise.
+CHUNK_ROOMS = 1024
+DEFAULT_MAX_CHUNKS = 64
+
+# This is how many floors' staircases a building remembers before it starts over.
+STAIRS_CACHE_FLOORS = 256
+
+# Each chunk tries to put a portal in this many of its rooms (a room that's taken is skipped).
+PORTALS_PER_CHUNK = 2
+
+# This is how many rooms generate_building() tries for Mr. Ton Drump's office before giving up.
+OFFICE_TRIES = 10000
+
+ALL_ITEMS = QUEST_ITEMS + WILDCARD_ITEMS + FOCUS_VIALS
+
+
+# This turns a robot density into a translate table: bytes below the cutoff become a robot
+# (kind + 1), the rest become 0. The cutoff is a multiple of the number of robots, so every
+# kind is equally likely.
+def robot_table(density):
+	kinds = len(ROBOTS)
+	cutoff = min(256 // kinds, round(density * 256 / kinds)) * kinds
+	return bytes(byte % kinds + 1 if byte < cutoff else 0 for byte in range(256))
+
+
+# This is one built chunk of rooms: one byte per room for each of its doors, robot and special exit.
+class Chunk:
+	__slots__ = ('doors', 'robots', 'special_exits')
+
+	def __init__(self, doors, robots, special_exits):
+		self.doors = doors
+		self.robots = robots  # robot id + 1, 0 for none
+		self.special_exits = special_exits  # the special exit codes from world.py
+
+
+# This is one generated building.
+class Building:
+	def __init__(self, seed, floors, width, height, robot_density=DEFAULT_ROBOT_DENSITY, max_chunks=DEFAULT_MAX_CHUNKS):
+		self.seed = seed
+		self.floors = floors
+		self.width = width
+		self.height = height
+		self.rooms_per_floor = width * height
+		self.room_count = floors * self.rooms_per_floor
+		self.robot_table = robot_table(robot_density)
+		self.start = 0
+		self.villain = None
+		self.items = {}  # room -> item name, where the items start out
+		self.potion_effects = ()
+		self.stairs = {}  # floor -> (staircase up, staircase down), for the floors used lately
+
+		# These are the chunks that are built right now, least recently used first.
+		self.chunks = OrderedDict()
+		self.max_chunks = max_chunks
+		self.chunks_built = 0
+		self.chunks_evicted = 0
+
+		# This is the player's delta: everything they've changed since the building was generated.
+		self.items_taken = set()
+		self.robots_pacified = set()
+		self.corruption = {}  # room -> corruption of a robot that has been fought, if it's still there
+
+	# Every chunk and floor gets its own generator, seeded from the building's seed and its number.
+	def rng_for(self, kind, number):
+		return random.Random(f"{self.seed}/{kind}/{number}")
+
+	# This returns (staircase up, staircase down) for a floor, with None for the top floor's way up
+	# and the bottom floor's way down. Floor f's staircase up leads to floor f + 1's staircase down.
+	# The last few floors asked about are remembered, since seeding a generator isn't free.
+	def floor_stairs(self, floor):
+		stairs = self.stairs.get(floor)
+		if stairs is not None:
+			return stairs
+		rng = self.rng_for('stairs', floor)
+		first = floor * self.rooms_per_floor
+		up = down = None
+		if floor < self.floors - 1:
+			up = self.start
+			while up == self.start:
+				up = first + rng.randrange(self.rooms_per_floor)
+		if floor > 0:
+			down = self.start
+			while down == self.start or down == up:
+				down = first + rng.randrange(self.rooms_per_floor)
+		if len(self.stairs) >= STAIRS_CACHE_FLOORS:
+			self.stairs.clear()
+		stairs = self.stairs[floor] = (up, down)
+		return stairs
+
+	def stairs_up(self, floor):
+		return self.floor_stairs(floor)[0]
+
+	def stairs_down(self, floor):
+		return self.floor_stairs(floor)[1]
+
+	# This returns the room a room's staircase leads to, or None.
+	def stairs_to(self, room):
+		special_exit = self.special_exit(room)
+		if special_exit == STAIRS_UP:
+			return self.stairs_down(room // self.rooms_per_floor + 1)
+		if special_exit == STAIRS_DOWN:
+			return self.stairs_up(room // self.rooms_per_floor - 1)
+		return None
+
+	def is_stairs(self, room):
+		return room in self.floor_stairs(room // self.rooms_per_floor)
+
+	# This returns the chunk a room is in, building it if it isn't there.
+	def chunk(self, room):
+		index = room // CHUNK_ROOMS
+		chunk = self.chunks.get(index)
+		if chunk is None:
+			chunk = self.chunks[index] = self.build_chunk(index)
+			self.chunks_built += 1
+			if len(self.chunks) > self.max_chunks:
+				self.chunks.popitem(last=False)
+				self.chunks_evicted += 1
+		else:
+			self.chunks.move_to_end(index)
+		return chunk
+
+	def build_chunk(self, index):
+		first = index * CHUNK_ROOMS
+		size = min(CHUNK_ROOMS, self.room_count - first)
+		last = first + size - 1
+		width = self.width
+		rng = self.rng_for('chunk', index)
+		doors = bytearray(rng.randbytes(size).translate(DOOR_TABLE))
+		robots = bytearray(rng.randbytes(size).translate(self.robot_table))
+		special_exits = bytearray(size)
+
+		# The rooms along the east wall can only open north, and the north wall can only open east.
+		east_wall = first + (width - 1 - first % width) % width
+		if east_wall <= last:
+			count = (last - east_wall) // width + 1
+			doors[east_wall - first::width] = bytes([NORTH_DOOR]) * count
+		for floor in range(first // self.rooms_per_floor, last // self.rooms_per_floor + 1):
+			north_wall = floor * self.rooms_per_floor
+			low = max(north_wall, first)
+			high = min(north_wall + width, last + 1)
+			if low < high:
+				doors[low - first:high - first] = bytes([EAST_DOOR]) * (high - low)
+			corner = north_wall + width - 1  # This is where every path on the floor ends up.
+			if first <= corner <= last:
+				doors[corner - first] = 0
+
+			for room, code in ((self.stairs_up(floor), STAIRS_UP), (self.stairs_down(floor), STAIRS_DOWN)):
+				if room is not None and first <= room <= last:
+					special_exits[room - first] = code
+
+		for room in (self.start, self.villain):
+			if first <= room <= last:
+				robots[room - first] = 0
+
+		for offset in rng.sample(range(size), min(size, PORTALS_PER_CHUNK)):
+			room = first + offset
+			if not special_exits[offset] and not robots[offset] and room != self.start and room != self.villain:
+				special_exits[offset] = PORTAL
+		return Chunk(doors, robots, special_exits)
+
+	def doors(self, room):
+		return self.chunk(room).doors[room % CHUNK_ROOMS]
+
+	def special_exit(self, room):
+		return self.chunk(room).special_exits[room % CHUNK_ROOMS]
+
+	# This returns the id + 1 of the robot in a room (0 for none), with pacified robots gone.
+	def robot(self, room):
+		if room in self.robots_pacified:
+			return 0
+		return self.chunk(room).robots[room % CHUNK_ROOMS]
+
+	def item(self, room):
+		if room in self.items_taken:
+			return None
+		return self.items.get(room)
+
+	# This is roughly how many bytes the building holds: its built chunks, plus its items and delta.
+	def nbytes(self):
+		chunk_bytes = sum(3 * len(chunk.doors) for chunk in self.chunks.values())
+		return chunk_bytes + 100 * (len(self.items) + len(self.items_taken) + len(self.robots_pacified) +
+		                            len(self.corruption))
+
+	def room_name(self, room):
+		if room == self.start:
+			return START_LOCATION
+		floor, number = divmod(room, self.rooms_per_floor)
+		return f"{ROOM_KINDS[room % len(ROOM_KINDS)]} {floor + 1}-{number + 1}"
+
+	# This turns a room name back into its number. It raises KeyError for names not in the building.
+	def room_id(self, name):
+		if name == START_LOCATION:
+			return self.start
+		try:
+			label = name.rpartition(' ')[2]
+			floor, number = label.split('-')
+			room = (int(floor) - 1) * self.rooms_per_floor + int(number) - 1
+		except ValueError:
+			raise KeyError(name) from None
+		if not 0 <= room < self.room_count or self.room_name(room) != name:
+			raise KeyError(name)
+		return room
+
+	def has_room(self, name):
+		try:
+			self.room_id(name)
+		except KeyError:
+			return False
+		return True
+
+	# This returns the doors out of a room as (direction, room) pairs.
+	def neighbours(self, room):
+		width = self.width
+		doors = self.doors(room)
+		links = []
+		if doors & NORTH_DOOR:
+			links.append(('NORTH', room - width))
+		if room % self.rooms_per_floor // width + 1 < self.height and self.doors(room + width) & NORTH_DOOR:
+			links.append(('SOUTH', room + width))
+		if doors & EAST_DOOR:
+			links.append(('EAST', room + 1))
+		if room % width > 0 and self.doors(room - 1) & EAST_DOOR:
+			links.append(('WEST', room - 1))
+		return links
+
+	# This returns every way out of a room on foot: its doors, plus its staircase as 'STAIRS'.
+	def walking_links(self, room):
+		links = self.neighbours(room)
+		stairs_to = self.stairs_to(room)
+		if stairs_to is not None:
+			links.append(('STAIRS', stairs_to))
+		return links
+
+
+# This generates a new building. It only places what has to be known up front: the villain, who is
+# never at the start or on a staircase, and the items, which stay out of the start and the
+# villain's office. The rest of the building is built a chunk at a time when it's needed.
+#
+# The office is always a dead end, a room with only one way in. Every room can be reached from the
+# start, and a dead end is never on the way to anywhere else, so every item can still be reached
+# without walking into Mr. Ton Drump. (Checking that with a search would mean walking the whole
+# building, which takes seconds for a million rooms.)
+def generate_building(rng=random, floors=10, width=10, height=10, robot_density=DEFAULT_ROBOT_DENSITY,
+                      max_chunks=DEFAULT_MAX_CHUNKS):
+	building = Building(rng.getrandbits(64), floors, width, height, robot_density, max_chunks)
+	if building.rooms_per_floor < 3 or building.room_count < len(ALL_ITEMS) + 2 * floors + 2:
+		raise ValueError("the building is too small for its staircases and items")
+
+	# The rooms tried are built with the candidate as the office (it decides where robots and
+	# portals can't go), so the chunks are thrown away afterwards and rebuilt for the real one.
+	for _ in range(OFFICE_TRIES):
+		villain = rng.randrange(building.room_count)
+		if villain == building.start or building.is_stairs(villain):
+			continue
+		building.villain = villain
+		if len(building.walking_links(villain)) == 1:
+			break
+	else:
+		raise ValueError("the building has no dead end for Mr. Ton Drump's office")
+	building.chunks.clear()
+
+	# Each item goes in a random room, trying again if that room is taken.
+	for item in rng.sample(ALL_ITEMS, len(ALL_ITEMS)):
+		room = building.start
+		while room == building.start or room == villain or room in building.items:
+			room = rng.randrange(building.room_count)
+		building.items[room] = item
+
+	potion_effects = POTION_EFFECTS[:]
+	rng.shuffle(potion_effects)
+	building.potion_effects = tuple(potion_effects)
+	return building
+
+
+# This checks that every room can be reached on foot (doors and stairs, no portals) from the
+# start, and returns how many rooms it reached. It runs one breadth-first search over room numbers.
+# With avoid, the search never goes into that room (or counts it), like a player keeping out of
+# Mr. Ton Drump's office.
+def count_reachable(building, avoid=None):
+	seen = bytearray(building.room_count)
+	seen[building.start] = 1
+	if avoid is not None:
+		seen[avoid] = 1
+	queue = deque([building.start])
+	reached = 1
+	while queue:
+		room = queue.popleft()
+		for _, neighbour in building.walking_links(room):
+			if not seen[neighbour]:
+				seen[neighbour] = 1
+				reached += 1
+				queue.append(neighbour)
+	return reached
+
+
+# These are the first steps a route can take.
+STEP_NAMES = (None, 'NORTH', 'SOUTH', 'EAST', 'WEST', 'STAIRS', 'PORTAL')
+STEP_CODES = {name: code for code, name in enumerate(STEP_NAMES)}
+
+
+# These are routes for a building, with the same distance/first_step/nearest() interface as the
+# game's RouteTable. A building is far too big to route every pair of rooms up front, so this runs
+# a breadth-first search from the start room it's asked about, only as far as it needs to, and
+# picks up where it left off if it's asked about a room further away. It keeps the last search.
+class BuildingRoutes:
+	def __init__(self, building, portals=False):
+		self.building = building
+		self.portals = portals
+		self.start = None
+		self.distance = RouteRows(self, 0)
+		self.first_step = RouteRows(self, 1)
+
+	def begin(self, start):
+		if start == self.start:
+			return
+		origin = self.building.room_id(start)
+		self.start = start
+		self.distances = {origin: 0}
+		self.steps = {origin: 0}
+		self.order = [origin]  # The rooms in the order the search reaches them, nearest first.
+		self.expanded = 0  # How many rooms of order have had their links followed.
+		# Once the search reaches a portal, every room it hasn't reached (except the villain's office)
+		# is one step further than the portal. This is (distance, first step) through the portal.
+		self.through_portal = None
+
+	# This follows the links of the next room in the search. It returns False when there are none left.
+	def expand(self):
+		if self.expanded == len(self.order):
+			return False
+		building = self.building
+		room = self.order[self.expanded]
+		self.expanded += 1
+		distances = self.distances
+		steps = self.steps
+		for direction, neighbour in building.walking_links(room):
+			if neighbour not in distances:
+				distances[neighbour] = distances[room] + 1
+				steps[neighbour] = steps[room] or STEP_CODES[direction]
+				self.order.append(neighbour)
+		if self.portals and self.through_portal is None and building.special_exit(room) == PORTAL:
+			self.through_portal = (distances[room] + 1, steps[room] or STEP_CODES['PORTAL'])
+		return True
+
+	# This returns (distance, first step code) from the current start to a room, or None.
+	def lookup(self, room):
+		while True:
+			if room in self.distances:
+				return self.distances[room], self.steps[room]
+			if self.through_portal is not None and room != self.building.villain:
+				return self.through_portal
+			if not self.expand():
+				return None
+
+	def nearest(self, start, goals):
+		goals = list(goals)
+		wanted = set(goals)
+		if not wanted:
+			return None
+		self.begin(start)
+		building = self.building
+		checked = 0
+		while True:
+			while checked < len(self.order):
+				room = self.order[checked]
+				if self.through_portal is not None and self.distances[room] > self.through_portal[0]:
+					break
+				checked += 1
+				if building.room_name(room) in wanted:
+					return building.room_name(room)
+			# No goal is closer than the portal, which can reach any of them but the villain's office.
+			if self.through_portal is not None:
+				villain = building.room_name(building.villain)
+				for goal in goals:
+					if goal != villain and building.has_room(goal):
+						return goal
+			if not self.expand():
+				return None
+
+
+# This is one row of a BuildingRoutes table (the distance or first step from one start), read by room name.
+class RouteRow:
+	__slots__ = ('routes', 'which')
+
+	def __init__(self, routes, which):
+		self.routes = routes
+		self.which = which
+
+	def get(self, room_name, default=None):
+		try:
+			found = self.routes.lookup(self.routes.building.room_id(room_name))
+		except KeyError:
+			return default
+		if found is None:
+			return default
+		return STEP_NAMES[found[1]] if self.which else found[0]
+
+	def __getitem__(self, room_name):
+		value = self.get(room_name)
+		if value is None:
+			raise KeyError(room_name)
+		return value
+
+
+class RouteRows:
+	__slots__ = ('routes', 'which')
+
+	def __init__(self, routes, which):
+		self.routes = routes
+		self.which = which
+
+	def __getitem__(self, start):
+		self.routes.begin(start)
+		return RouteRow(self.routes, self.which)
+
+
+# This lets the game treat a robot in a building like the robot dictionaries from setup_game().
+class BuildingRobot:
+	__slots__ = ('building', 'room')
+
+	def __init__(self, building, room):
+		self.building = building
+		self.room = room
+
+	def __getitem__(self, key):
+		robot_id = self.building.robot(self.room) - 1
+		if key == 'corruption':
+			return self.building.corruption.get(self.room, ROBOT_CORRUPTION[robot_id])
+		if key == 'name':
+			return ROBOT_NAMES[robot_id]
+		if key == 'max_focus_drain':
+			return ROBOT_MAX_FOCUS_DRAIN[robot_id]
+		raise KeyError(key)
+
+	def __setitem__(self, key, value):
+		if key != 'corruption':
+			raise KeyError(key)
+		self.building.corruption[self.room] = value
+
+
+# This lets the game treat one room of a building like a room dictionary from setup_game().
+class BuildingRoom:
+	__slots__ = ('building', 'room')
+
+	def __init__(self, building, room):
+		self.building = building
+		self.room = room
+
+	def __getitem__(self, key):
+		building = self.building
+		room = self.room
+		if key == 'exits':
+			return {direction: building.room_name(neighbour) for direction, neighbour in building.neighbours(room)}
+		if key == 'special_exit':
+			return SPECIAL_EXIT_NAMES[building.special_exit(room)]
+		if key == 'stairs_to':
+			destination = building.stairs_to(room)
+			return None if destination is None else building.room_name(destination)
+		if key == 'robot':
+			return BuildingRobot(building, room) if building.robot(room) else None
+		if key == 'item':
+			return building.item(room)
+		if key == 'villain':
+			return building.villain == room
+		if key == 'room_name':
+			return building.room_name(room)
+		raise KeyError(key)
+
+	def get(self, key, default=None):
+		try:
+			return self[key]
+		except KeyError:
+			return default
+
+	# The game only ever clears a room's item or robot. Both go into the building's delta.
+	def __setitem__(self, key, value):
+		if value is not None:
+			raise ValueError("only clearing an item or robot is supported")
+		if key == 'item':
+			self.building.items_taken.add(self.room)
+		elif key == 'robot':
+			self.building.robots_pacified.add(self.room)
+			self.building.corruption.pop(self.room, None)
+		else:
+			raise KeyError(key)
+
+
+# This is a mapping from room name to BuildingRoom, shaped like setup_game()'s game_map.
+class BuildingMap:
+	__slots__ = ('building', 'routes')
+
+	def __init__(self, building):
+		self.building = building
+		self.routes = {}
+
+	def __getitem__(self, room_name):
+		return BuildingRoom(self.building, self.building.room_id(room_name))
+
+	def __contains__(self, room_name):
+		return self.building.has_room(room_name)
+
+	def __iter__(self):
+		return map(self.building.room_name, range(self.building.room_count))
+
+	def __len__(self):
+		return self.building.room_count
+
+	def keys(self):
+		return iter(self)
+
+	def values(self):
+		return (BuildingRoom(self.building, room) for room in range(self.building.room_count))
+
+	def items(self):
+		return zip(iter(self), self.values())
+
+	# These are the game's walking_routes() and portal_routes() for this building.
+	def walking_routes(self):
+		return self.route_table(False)
+
+	def portal_routes(self):
+		return self.route_table(True)
+
+	def route_table(self, portals):
+		routes = self.routes.get(portals)
+		if routes is None:
+			routes = self.routes[portals] = BuildingRoutes(self.building, portals)
+		return routes
+
+
+# This is the building version of setup_game(). It returns the same three things. The default
+# building has 10 floors of 10 x 10 rooms.
+def setup_building_game(rng=random, floors=10, width=10, height=10):
+	building = generate_building(rng, floors, width, height)
+	potion_map = dict(zip(FOCUS_VIALS, building.potion_effects))
+	return BuildingMap(building), building.room_name(building.villain), potion_map
+
+
+# These are the benchmark sizes: (floors, width, height) for 10^3, 10^5 and 10^6 rooms.
+BENCHMARK_SHAPES = ((10, 10, 10), (40, 50, 50), (100, 100, 100))
+
+
+def main():
+	print(f"{'rooms':>10} {'generate':>10} {'build all':>10} {'per room':>9} {'peak memory':>12} {'kept':>9} "
+	      f"{'rebuilt':>8} {'reachable':>10}")
+	for floors, width, height in BENCHMARK_SHAPES:
+		rng = random.Random(1)
+		start = time.perf_counter()
+		building = generate_building(rng, floors, width, height)
+		generated = time.perf_counter() - start
+
+		# Building every chunk once shows what materializing the whole building costs, and the
+		# memory afterwards shows that only max_chunks of them are kept.
+		tracemalloc.start()
+		start = time.perf_counter()
+		for room in range(0, building.room_count, CHUNK_ROOMS):
+			building.chunk(room)
+		built = time.perf_counter() - start
+		kept, peak = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+
+		# The reachability check walks the building room by room, so chunks are dropped and rebuilt as it goes.
+		before = building.chunks_built
+		reachable = count_reachable(building)
+		rooms = building.room_count
+		print(f"{rooms:>10,} {generated * 1e6:>8.0f}us {built * 1e3:>8.1f}ms {built / rooms * 1e9:>7.0f}ns "
+		      f"{peak / 1e6:>10.2f}MB {kept / 1e3:>7.0f}KB {building.chunks_built - before:>8,} {reachable / rooms:>10.0%}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,216 @@
+# Monte Carlo odds tables for reprogramming sequences, vectorized with NumPy.
+#
+# Millions of fights are played at once as NumPy arrays, for every robot in ROBOTS, every
+# corruption level it can have left, a grid of starting Focus values and every combination of
+# the Executive Order, Subpoenaed Diary Logs, Logic Filter and Civility Charm buffs. The
+# simulated player runs a Diagnostic Scan every turn, except that it spends the Civility Charm
+# (if it has one) once its Focus is low enough for a single hit to finish it.
+#
+# The result is a table of win probabilities and expected Focus loss, saved to disk as a .npz
+# file and reloaded in milliseconds, so the game and balancing tools can look odds up instead of
+# simulating them on demand.
+#
+# Example:  python combat_odds.py --samples 20000
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import Dr_Eaton_vs_Ton_Drump as game
+from Dr_Eaton_vs_Ton_Drump import ROBOTS
+
+# Bump this whenever the simulated combat rules change, so old cache files are rebuilt.
+TABLE_VERSION = 1
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'combat_odds.npz')
+
+# These are the buffs, in bit order. A table's last axis is indexed by the bitmask of active buffs.
+BUFFS = ('overclock_active', 'subpoena_active', 'logic_filter_active', 'civility_charm')
+OVERCLOCK, SUBPOENA, LOGIC_FILTER, CIVILITY_CHARM = (1 << bit for bit in range(len(BUFFS)))
+
+MAX_FOCUS = 40
+MAX_CORRUPTION = max(robot['corruption'] for robot in ROBOTS)
+
+
+# This turns a set of buff flags into the index of the table's last axis.
+def buff_index(overclock=False, subpoena=False, logic_filter=False, civility_charm=False):
+	return ((OVERCLOCK if overclock else 0) | (SUBPOENA if subpoena else 0) |
+	        (LOGIC_FILTER if logic_filter else 0) | (CIVILITY_CHARM if civility_charm else 0))
+
+
+# This plays `samples` fights for every (corruption, focus, buffs) cell against one kind of robot.
+# Each cell's fights are a column of a (corruption, focus, buffs, samples) array, so every round
+# of every fight is a handful of whole-array operations. scan_max is the sides on the scan's die
+# (the game's SCAN_ROLL_MAX by default).
+def simulate_robot(max_focus_drain, samples, rng, max_corruption=MAX_CORRUPTION, max_focus=MAX_FOCUS,
+                   chunk_size=2000, scan_max=None):
+	if scan_max is None:
+		scan_max = game.SCAN_ROLL_MAX
+	buff_count = 1 << len(BUFFS)
+	cell_shape = (max_corruption, max_focus, buff_count)
+	wins = np.zeros(cell_shape, dtype=np.int64)
+	focus_lost = np.zeros(cell_shape, dtype=np.int64)
+	rounds = np.zeros(cell_shape, dtype=np.int64)
+
+	start_corruption = np.arange(1, max_corruption + 1, dtype=np.int16)[:, None, None, None]
+	start_focus = np.arange(1, max_focus + 1, dtype=np.int16)[None, :, None, None]
+	buffs = np.arange(buff_count, dtype=np.int16)[None, None, :, None]
+
+	done = 0
+	while done < samples:
+		n = min(chunk_size, samples - done)
+		done += n
+		shape = cell_shape + (n,)
+
+		corruption = np.broadcast_to(start_corruption, shape).copy()
+		focus = np.broadcast_to(start_focus, shape).copy()
+		overclock = np.broadcast_to((buffs & OVERCLOCK) != 0, shape).copy()
+		subpoena = np.broadcast_to((buffs & SUBPOENA) != 0, shape).copy()
+		logic_filter = np.broadcast_to((buffs & LOGIC_FILTER) != 0, shape).copy()
+		charm = np.broadcast_to((buffs & CIVILITY_CHARM) != 0, shape).copy()
+		fight_rounds = np.zeros(shape, dtype=np.int16)
+
+		while True:
+			# This is the loop condition from reprogramming_sequence(): keep going until it's won or lost.
+			active = (corruption > 0) & (focus > 0)
+			if not active.any():
+				break
+			fight_rounds += active
+
+			# The player's turn: spend the Civility Charm when one more hit could be fatal, otherwise scan.
+			use_charm = active & charm & (focus <= max_focus_drain)
+			scan = active & ~use_charm
+			focus += np.where(use_charm, 3, 0).astype(np.int16)
+			charm &= ~use_charm
+
+			progress = rng.integers(1, scan_max + 1, size=shape, dtype=np.int16)
+			progress = np.where(overclock, progress * 2, progress)
+			progress += np.where(subpoena, 2, 0).astype(np.int16)
+			corruption -= np.where(scan, progress, 0).astype(np.int16)
+			overclock &= ~scan
+			subpoena &= ~scan
+
+			# The robot's turn, unless the scan just pacified it. The Logic Filter blocks one hit.
+			robot_acts = active & (corruption > 0)
+			blocked = robot_acts & logic_filter
+			logic_filter &= ~blocked
+			drain = rng.integers(1, max_focus_drain + 1, size=shape, dtype=np.int16)
+			focus -= np.where(robot_acts & ~blocked, drain, 0).astype(np.int16)
+
+		wins += (corruption <= 0).sum(axis=-1)
+		focus_lost += (start_focus - np.maximum(focus, 0)).sum(axis=-1)
+		rounds += fight_rounds.sum(axis=-1)
+
+	return wins / samples, focus_lost / samples, rounds / samples
+
+
+# This holds a finished odds table and answers lookups in constant time.
+class CombatOddsTable:
+	def __init__(self, robot_names, robot_stats, samples, win_probability, expected_focus_loss, mean_rounds,
+	             version=TABLE_VERSION, scan_max=None):
+		self.robot_names = list(robot_names)
+		self.robot_index = {name: i for i, name in enumerate(self.robot_names)}
+		self.robot_stats = np.asarray(robot_stats)
+		self.samples = int(samples)
+		self.win_probability = win_probability  # (robot, corruption - 1, focus - 1, buffs)
+		self.expected_focus_loss = expected_focus_loss
+		self.mean_rounds = mean_rounds
+		self.version = int(version)
+		self.scan_max = game.SCAN_ROLL_MAX if scan_max is None else int(scan_max)
+
+	# This looks up (win probability, expected Focus loss) for one fight.
+	def lookup(self, robot_name, corruption, focus, overclock=False, subpoena=False, logic_filter=False,
+	           civility_charm=False):
+		robot = self.robot_index[robot_name]
+		corruption = min(max(corruption, 1), self.win_probability.shape[1])
+		focus = min(max(focus, 1), self.win_probability.shape[2])
+		buffs = buff_index(overclock, subpoena, logic_filter, civility_charm)
+		cell = (robot, corruption - 1, focus - 1, buffs)
+		return float(self.win_probability[cell]), float(self.expected_focus_loss[cell])
+
+	# This looks up the odds for the fight a GameSession is in right now, or returns None if the
+	# robot is gone (in a shared world, another player can pacify it first).
+	def lookup_session(self, session):
+		robot = session.game_map[session.current_location]['robot']
+		if robot is None:
+			return None
+		stats = session.player_stats
+		return self.lookup(robot['name'], robot['corruption'], stats['focus'], stats['overclock_active'],
+		                   stats['subpoena_active'], stats['logic_filter_active'],
+		                   session.inventory.is_usable('Civility Charm'))
+
+	def save(self, path=DEFAULT_PATH):
+		np.savez(path, version=self.version, scan_max=self.scan_max, samples=self.samples,
+		         robot_names=np.array(self.robot_names),
+		         robot_stats=self.robot_stats, win_probability=self.win_probability,
+		         expected_focus_loss=self.expected_focus_loss, mean_rounds=self.mean_rounds)
+
+	@classmethod
+	def load(cls, path=DEFAULT_PATH):
+		with np.load(path) as data:
+			return cls(data['robot_names'].tolist(), data['robot_stats'], data['samples'], data['win_probability'],
+			           data['expected_focus_loss'], data['mean_rounds'], data['version'], data['scan_max'])
+
+
+# This is (corruption, max_focus_drain) for every robot, used to notice when the balance has changed.
+def current_robot_stats():
+	return np.array([[robot['corruption'], robot['max_focus_drain']] for robot in ROBOTS], dtype=np.int16)
+
+
+# This simulates a full table for every robot in ROBOTS, with the game's scan die as it is now
+# (a balance sweep can change it).
+def build_table(samples=10000, seed=None):
+	rng = np.random.default_rng(seed)
+	scan_max = game.SCAN_ROLL_MAX
+	results = [simulate_robot(robot['max_focus_drain'], samples, rng, scan_max=scan_max) for robot in ROBOTS]
+	win_probability, expected_focus_loss, mean_rounds = (np.stack(part).astype(np.float32) for part in zip(*results))
+	return CombatOddsTable([robot['name'] for robot in ROBOTS], current_robot_stats(), samples, win_probability,
+	                       expected_focus_loss, mean_rounds, scan_max=scan_max)
+
+
+# This loads the cached table, or builds and saves a new one if there isn't a usable cache.
+def load_or_build(path=DEFAULT_PATH, samples=10000, seed=None):
+	if os.path.exists(path):
+		try:
+			table = CombatOddsTable.load(path)
+		except (OSError, ValueError, KeyError):
+			table = None
+		if (table is not None and table.version == TABLE_VERSION and table.samples >= samples and
+				table.scan_max == game.SCAN_ROLL_MAX and
+				np.array_equal(table.robot_stats, current_robot_stats()) and
+				table.robot_names == [robot['name'] for robot in ROBOTS]):
+			return table
+
+	table = build_table(samples, seed)
+	table.save(path)
+	return table
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Build the Monte Carlo combat odds table.")
+	parser.add_argument('--samples', type=int, default=10000, help="fights per table cell")
+	parser.add_argument('--seed', type=int, default=None)
+	parser.add_argument('--path', default=DEFAULT_PATH)
+	args = parser.parse_args()
+
+	start = time.perf_counter()
+	table = build_table(args.samples, args.seed)
+	elapsed = time.perf_counter() - start
+	table.save(args.path)
+	fights = table.win_probability.size * args.samples
+	print(f"Simulated {fights:,} fights in {elapsed:.1f}s ({fights / elapsed:,.0f} fights/s) -> {args.path}")
+
+	start = time.perf_counter()
+	CombatOddsTable.load(args.path)
+	print(f"Reloaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+	print(f"\nWin probability at {game.STARTING_FOCUS} Focus, full corruption, no buffs:")
+	for robot in ROBOTS:
+		win, loss = table.lookup(robot['name'], robot['corruption'], game.STARTING_FOCUS)
+		print(f"  {robot['name']:<34} {win:6.1%}  (expected Focus loss {loss:.2f})")
+
+
+if __name__ == "__main__":
+	main()
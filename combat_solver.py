@@ -0,0 +1,309 @@
+# Optimal play for reprogramming sequences, solved once with value iteration (needs NumPy).
+#
+# A fight is a small, discrete game: the robot's corruption and max_focus_drain, the player's
+# Focus, the three buffs (Executive Order, Subpoenaed Diary Logs, Logic Filter) and which
+# combat-useful items are still unused. Every turn the player picks Scan, Forfeit or one of those
+# items, then the robot drains 1 to max_focus_drain Focus (unless the Logic Filter blocks it).
+#
+# This module works out the best action for every one of those states at once, as NumPy arrays,
+# by repeating the Bellman backup until the values stop changing. The result is a table with
+# one best action (and the chance of pacifying the robot when playing that way) per state, so
+# the game's ADVISOR and the simulator's "optimal" bots answer with a single array lookup.
+#
+# What "best" means is set by the rewards below: pacifying the robot is worth 1, escaping with
+# the Golden Parachute 0.6 and losing 0, plus a little for every point of Focus and every item
+# still left over for the fights to come. Every round the robot gets costs a tiny bit, so the
+# solver doesn't stall by forfeiting to build up Focus. An item is worth a little more than the
+# most Focus a vial gives, so vials are saved for when they're needed.
+#
+# Focus vials have different effects in every game, so the table has one item slot per helpful
+# effect in POTION_EFFECTS and each held vial is mapped to its slot with the game's potion_map.
+#
+# Example:  python combat_solver.py --benchmark
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import Dr_Eaton_vs_Ton_Drump as game
+from Dr_Eaton_vs_Ton_Drump import POTION_EFFECTS, ROBOTS
+
+# Bump this whenever the combat rules or the rewards change, so old cache files are rebuilt.
+SOLVER_VERSION = 1
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'combat_policy.npz')
+
+WIN_REWARD = 1.0
+FLEE_REWARD = 0.6
+FOCUS_WEIGHT = 0.01
+ITEM_WEIGHT = 0.06
+TURN_COST = 0.002
+
+MAX_FOCUS = 40
+MAX_CORRUPTION = max(robot['corruption'] for robot in ROBOTS)
+
+# These are the buffs, in bit order. The table's buff axis is indexed by the bitmask of active buffs.
+OVERCLOCK, SUBPOENA, LOGIC_FILTER = 1, 2, 4
+BUFF_COUNT = 8
+
+# These are the items that can make a difference in a fight, one bit each in the item mask.
+# The items that only ever drain Focus (including the vial that does) and the Blank Keycard, which
+# does nothing, are left out, because using one is never better than forfeiting the turn.
+HELPFUL_VIAL_EFFECTS = tuple(effect for effect in POTION_EFFECTS if effect > 0)
+ITEM_SLOTS = ('Civility Charm', 'Executive Order', 'Golden Parachute', 'Subpoenaed Diary Logs',
+              'Logic Filter') + tuple(f"Focus Vial ({effect:+d})" for effect in HELPFUL_VIAL_EFFECTS)
+SLOT_INDEX = {name: slot for slot, name in enumerate(ITEM_SLOTS)}
+VIAL_SLOTS = {effect: SLOT_INDEX[f"Focus Vial ({effect:+d})"] for effect in HELPFUL_VIAL_EFFECTS}
+
+# This is what each slot does: ('focus', amount, floor) changes Focus (vials never drop it below
+# floor), ('buff', bit) turns a buff on and ('flee',) ends the fight.
+SLOT_EFFECTS = (('focus', 3, None), ('buff', OVERCLOCK), ('flee',), ('buff', SUBPOENA), ('buff', LOGIC_FILTER)) + \
+               tuple(('focus', effect, 1) for effect in HELPFUL_VIAL_EFFECTS)
+
+# Actions in the table: 0 scans, 1 forfeits and 2 + slot uses the item in that slot.
+SCAN, FORFEIT, FIRST_ITEM = 0, 1, 2
+
+
+# This solves every fight against robots with one max_focus_drain. slots picks which item slots
+# are in play (all of them by default); bit i of the item mask is slots[i]. scan_max is the sides
+# on the scan's die (the game's SCAN_ROLL_MAX by default).
+# It returns (best action, chance to pacify the robot) arrays indexed by
+# [corruption, focus, buffs, item mask], plus how many backups it took to converge.
+#
+# Each backup improves two arrays at once: the values, which pick the best action, and the chance
+# of pacifying the robot when taking the action currently picked. Both settle together.
+def solve(max_focus_drain, slots=None, max_corruption=MAX_CORRUPTION, max_focus=MAX_FOCUS, tolerance=1e-6,
+          max_iterations=5000, scan_max=None):
+	if scan_max is None:
+		scan_max = game.SCAN_ROLL_MAX
+	if slots is None:
+		slots = range(len(ITEM_SLOTS))
+	effects = [SLOT_EFFECTS[slot] for slot in slots]
+	mask_count = 1 << len(effects)
+	shape = (max_corruption + 1, max_focus + 1, BUFF_COUNT, mask_count)
+
+	focus = np.arange(max_focus + 1)
+	masks = np.arange(mask_count)
+	items_left = np.array([bin(mask).count('1') for mask in masks])
+	leftovers = FOCUS_WEIGHT * focus[:, None] + ITEM_WEIGHT * items_left[None, :]  # (focus, mask)
+	win_value = (WIN_REWARD + leftovers).astype(np.float32)
+	flee_value = (FLEE_REWARD + leftovers).astype(np.float32)
+	win_chance = np.ones((max_focus + 1, mask_count), dtype=np.float32)
+	flee_chance = np.zeros((max_focus + 1, mask_count), dtype=np.float32)
+
+	values = np.zeros(shape, dtype=np.float32)
+	chance = np.zeros(shape, dtype=np.float32)
+	for iteration in range(1, max_iterations + 1):
+		best = policy = None
+		for action, q in action_values(values, max_focus_drain, effects, win_value, flee_value, scan_max, TURN_COST):
+			if best is None:
+				best, policy = q, np.zeros(shape, dtype=np.int8)
+			else:
+				better = q > best + 1e-6
+				best = np.where(better, q, best)
+				policy[better] = action
+
+		following = np.zeros(shape, dtype=np.float32)
+		for action, q in action_values(chance, max_focus_drain, effects, win_chance, flee_chance, scan_max):
+			following = np.where(policy == action, q, following)
+
+		for array in (best, following):
+			array[:, 0] = 0.0  # Out of Focus: the fight is lost.
+			array[0] = 0.0  # No corruption left is never a state the player acts in.
+		change = max(np.abs(best - values).max(), np.abs(following - chance).max())
+		values, chance = best, following
+		if change < tolerance:
+			break
+
+	return policy, chance, iteration
+
+
+# This yields (action, value of taking it) for every action, given the current values of every
+# state. win and flee are the values of ending the fight those ways, indexed by [focus, mask], and
+# turn_cost is taken off every time the robot gets a turn.
+def action_values(values, max_focus_drain, effects, win, flee, scan_max, turn_cost=0.0):
+	max_corruption = values.shape[0] - 1
+	max_focus = values.shape[1] - 1
+	mask_count = values.shape[3]
+	focus = np.arange(max_focus + 1)
+	corruption = np.arange(max_corruption + 1)
+	buffs = np.arange(BUFF_COUNT)
+	masks = np.arange(mask_count)
+
+	# This is the value of the robot's turn, from each state the player could leave it in. With the
+	# Logic Filter up the attack is blocked; otherwise every drain is equally likely and dropping to
+	# 0 Focus loses (values[:, 0] is always 0).
+	robot_turn = np.zeros_like(values)
+	for drain in range(1, max_focus_drain + 1):
+		robot_turn += values[:, np.maximum(focus - drain, 0)]
+	robot_turn /= np.float32(max_focus_drain)
+	blocked = (buffs & LOGIC_FILTER) != 0
+	robot_turn[:, :, blocked] = values[:, :, buffs[blocked] & ~LOGIC_FILTER]
+	if turn_cost:
+		robot_turn -= np.float32(turn_cost)
+
+	# Scan: roll 1 to scan_max, doubled by the Executive Order and +2 with the Diary Logs, which are both used up.
+	scan = np.zeros_like(values)
+	for buff in range(BUFF_COUNT):
+		multiplier = 2 if buff & OVERCLOCK else 1
+		bonus = 2 if buff & SUBPOENA else 0
+		after = buff & ~(OVERCLOCK | SUBPOENA)
+		for roll in range(1, scan_max + 1):
+			left = corruption - (roll * multiplier + bonus)
+			scan[:, :, buff] += np.where((left <= 0)[:, None, None], win[None],
+			                             robot_turn[np.maximum(left, 0), :, after])
+	scan /= np.float32(scan_max)
+	yield SCAN, scan
+
+	# Forfeit: restore 2 Focus, then the robot acts.
+	yield FORFEIT, robot_turn[:, np.minimum(focus + 2, max_focus)]
+
+	# Items: each one is only possible in states whose mask still has it.
+	for bit, effect in enumerate(effects):
+		held = (masks >> bit & 1) == 1
+		without = masks & ~(1 << bit)
+		if effect[0] == 'focus':
+			_, amount, floor = effect
+			new_focus = focus + amount
+			if floor is not None:
+				new_focus = np.maximum(new_focus, floor)
+			q = robot_turn[:, np.clip(new_focus, 0, max_focus)]
+		elif effect[0] == 'buff':
+			q = robot_turn[:, :, buffs | effect[1]]
+		else:
+			q = np.broadcast_to(flee[None, :, None, :], values.shape)
+		yield FIRST_ITEM + bit, np.where(held, q[..., without], -np.inf)
+
+
+# This holds the solved policy for every robot strength and answers lookups in constant time.
+class CombatPolicyTable:
+	def __init__(self, drains, policy, win_probability, version=SOLVER_VERSION, scan_max=None):
+		self.drains = [int(drain) for drain in drains]
+		self.drain_index = {drain: i for i, drain in enumerate(self.drains)}
+		self.policy = policy  # (drain, corruption, focus, buffs, item mask)
+		self.win_probability = win_probability
+		self.version = int(version)
+		self.scan_max = game.SCAN_ROLL_MAX if scan_max is None else int(scan_max)
+
+	# This looks up (best action, chance to pacify the robot playing that way) for one fight.
+	def lookup(self, max_focus_drain, corruption, focus, buffs=0, item_mask=0):
+		corruption = min(max(corruption, 1), self.policy.shape[1] - 1)
+		focus = min(max(focus, 1), self.policy.shape[2] - 1)
+		cell = (self.drain_index[max_focus_drain], corruption, focus, buffs, item_mask)
+		return int(self.policy[cell]), float(self.win_probability[cell])
+
+	# This looks up the fight a GameSession is in right now. It returns the best action as 'scan',
+	# 'forfeit' or the name of the inventory item to use, and the chance of pacifying the robot,
+	# or None if the robot is gone (another player in a shared world pacified it).
+	def lookup_session(self, session):
+		robot = session.game_map[session.current_location]['robot']
+		if robot is None:
+			return None
+		stats = session.player_stats
+		buffs = ((OVERCLOCK if stats['overclock_active'] else 0) | (SUBPOENA if stats['subpoena_active'] else 0) |
+		         (LOGIC_FILTER if stats['logic_filter_active'] else 0))
+		slot_items = {}
+		for name in session.inventory.usable:
+			if name in SLOT_INDEX:
+				slot_items[SLOT_INDEX[name]] = name
+			elif session.potion_map.get(name) in VIAL_SLOTS:
+				slot_items[VIAL_SLOTS[session.potion_map[name]]] = name
+		item_mask = sum(1 << slot for slot in slot_items)
+
+		action, chance = self.lookup(robot['max_focus_drain'], robot['corruption'], stats['focus'], buffs, item_mask)
+		if action == SCAN:
+			return 'scan', chance
+		if action == FORFEIT:
+			return 'forfeit', chance
+		return slot_items[action - FIRST_ITEM], chance
+
+	def save(self, path=DEFAULT_PATH):
+		np.savez_compressed(path, version=self.version, scan_max=self.scan_max, drains=np.array(self.drains),
+		                    policy=self.policy, win_probability=self.win_probability)
+
+	@classmethod
+	def load(cls, path=DEFAULT_PATH):
+		with np.load(path) as data:
+			return cls(data['drains'], data['policy'], data['win_probability'], data['version'], data['scan_max'])
+
+
+# These are the different max_focus_drain values the robots have.
+def robot_drains():
+	return sorted({robot['max_focus_drain'] for robot in ROBOTS})
+
+
+# This solves the full table, for every robot strength and every item, with the game's scan die
+# as it is now (a balance sweep can change it).
+def build_table():
+	drains = robot_drains()
+	scan_max = game.SCAN_ROLL_MAX
+	results = [solve(drain, scan_max=scan_max) for drain in drains]
+	policy = np.stack([result[0] for result in results])
+	win_probability = np.stack([result[1] for result in results])
+	return CombatPolicyTable(drains, policy, win_probability, scan_max=scan_max)
+
+
+# This loads the cached table, or solves and saves a new one if there isn't a usable cache.
+def load_or_build(path=DEFAULT_PATH):
+	if os.path.exists(path):
+		try:
+			table = CombatPolicyTable.load(path)
+		except (OSError, ValueError, KeyError):
+			table = None
+		if (table is not None and table.version == SOLVER_VERSION and table.scan_max == game.SCAN_ROLL_MAX and
+				table.drains == robot_drains() and
+				table.policy.shape[1] == MAX_CORRUPTION + 1 and table.policy.shape[-1] == 1 << len(ITEM_SLOTS)):
+			return table
+
+	table = build_table()
+	table.save(path)
+	return table
+
+
+# This is how the advisor and the benchmark describe an action.
+def describe_action(action):
+	if action == SCAN:
+		return 'Scan'
+	if action == FORFEIT:
+		return 'Forfeit'
+	return ITEM_SLOTS[action - FIRST_ITEM]
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Solve optimal play for reprogramming sequences.")
+	parser.add_argument('--path', default=DEFAULT_PATH)
+	parser.add_argument('--benchmark', action='store_true', help="time the solver against how many items are in play")
+	args = parser.parse_args()
+
+	if args.benchmark:
+		print(f"{'items':>5} {'states':>10} {'backups':>8} {'seconds':>8}   (max_focus_drain 6)")
+		for count in range(len(ITEM_SLOTS) + 1):
+			start = time.perf_counter()
+			policy, _, iterations = solve(6, slots=range(count))
+			elapsed = time.perf_counter() - start
+			print(f"{count:>5} {policy.size:>10,} {iterations:>8} {elapsed:>8.2f}")
+
+	start = time.perf_counter()
+	table = build_table()
+	elapsed = time.perf_counter() - start
+	table.save(args.path)
+	print(f"Solved {table.policy.size:,} states in {elapsed:.1f}s -> {args.path}")
+
+	start = time.perf_counter()
+	CombatPolicyTable.load(args.path)
+	print(f"Reloaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+	all_items = (1 << len(ITEM_SLOTS)) - 1
+	focus = game.STARTING_FOCUS
+	print(f"\nBest opening at {focus} Focus, full corruption, every item in hand / no items:")
+	for robot in ROBOTS:
+		action, chance = table.lookup(robot['max_focus_drain'], robot['corruption'], focus, 0, all_items)
+		bare_action, bare_chance = table.lookup(robot['max_focus_drain'], robot['corruption'], focus)
+		print(f"  {robot['name']:<34} {describe_action(action):<22} {chance:6.1%}   "
+		      f"{describe_action(bare_action):<8} {bare_chance:6.1%}")
+
+
+if __name__ == "__main__":
+	main()
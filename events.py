@@ -0,0 +1,280 @@
+# Gameplay event logs for Dr. Eaton vs. Ton Drump, and streaming analytics over them.
+#
+# A replay log (replay.py) keeps just enough to play a game again. An event log keeps what
+# happened in it, one compact JSON line per turn, so it can be analysed without replaying anything:
+#
+#   {"game":7,"turn":3,"room":"Library","commands":["SEARCH","yes","no"],"focus":-2,"picked":["Flux Capacitor"]}
+#   {"game":7,"turn":4,"room":"Atrium","commands":["1","1","1"],"focus":-5,"robot":"Copy Bot","combat":"win"}
+#
+# "game" is the game's seed and "focus" is how much Focus the turn gained or lost. Keys with
+# nothing to say ("picked", "used", "robot", "combat") are left out. After a game's last turn
+# comes one line about the whole game:
+#
+#   {"game":7,"end":"win","turns":41,"villain":"Server Room","components_turn":37}
+#
+# Every game's lines are written in one go when it ends, so games never interleave, even when
+# a server appends to the log from many sessions.
+#
+# The report reads the log one line at a time and only keeps running totals (one per villain
+# room, robot and item), so it runs in the same small amount of memory on a log of any size.
+#
+# Examples:  python events.py record events.jsonl --games 10000
+#            python events.py convert corpus.dglog events.jsonl     (events for games in a replay log)
+#            python events.py report events.jsonl
+
+import argparse
+import json
+import os
+import random
+import time
+
+try:
+	import resource  # Only there on Unix, for the peak memory in the report.
+except ImportError:
+	resource = None
+
+from Dr_Eaton_vs_Ton_Drump import QUEST_ITEMS, GameSession
+from replay import WORLD_KINDS, WORLD_SETUPS, read_records
+
+
+# This session keeps an event for every turn it plays. The turn that's being played is in
+# self.turn until the next one starts (or the game ends) and it's moved to self.events.
+class EventLoggingSession(GameSession):
+	untimed = True
+
+	def __init__(self, **kwargs):
+		self.events = []
+		self.turn = None
+		self.turn_focus = 0
+		self.components_turn = None
+		self.game_closed = False
+		super().__init__(**kwargs)
+
+	def feed(self, line):
+		if self.turn is not None and not self.finished:
+			self.turn['commands'].append(line)
+		super().feed(line)
+
+	def begin_turn(self):
+		self.close_turn()
+		self.turn = {'game': self.seed, 'turn': self.turns + 1, 'room': self.current_location, 'commands': []}
+		self.turn_focus = self.player_stats['focus']
+		robot = self.game_map[self.current_location]['robot']
+		if robot is not None and not self.game_map[self.current_location]['villain']:
+			self.turn['robot'] = robot['name']
+		super().begin_turn()
+
+	def pick_up_item(self):
+		item_in_room = super().pick_up_item()
+		self.turn.setdefault('picked', []).append(item_in_room)
+		if self.components_turn is None and self.has_all_quest_items():
+			self.components_turn = self.turns
+		return item_in_room
+
+	def use_item(self, item_name):
+		self.turn.setdefault('used', []).append(item_name)
+		return super().use_item(item_name)
+
+	def end_combat(self, result):
+		self.turn['combat'] = result
+		super().end_combat(result)
+
+	def end_game(self, outcome):
+		super().end_game(outcome)
+		self.close_game()
+
+	# This moves the turn being played into the events, with its Focus change.
+	def close_turn(self):
+		if self.turn is None:
+			return
+		focus = self.player_stats['focus'] - self.turn_focus
+		if focus:
+			self.turn['focus'] = focus
+		self.events.append(self.turn)
+		self.turn = None
+
+	# This adds the line about the whole game. A game that never finished (a bot that ran out of
+	# commands, or a player who disconnected) ends as a 'timeout'.
+	def close_game(self):
+		if self.game_closed:
+			return
+		self.game_closed = True
+		self.close_turn()
+		self.events.append({'game': self.seed, 'end': self.outcome or 'timeout', 'turns': self.turns,
+		                    'villain': self.villain_location, 'components_turn': self.components_turn})
+
+
+# This replays a game from a replay log and returns the finished EventLoggingSession.
+def replay_game(record):
+	session = EventLoggingSession(quiet=True, seed=record.seed, world_setup=WORLD_SETUPS[record.world])
+	for command in record.commands:
+		session.feed(command)
+	session.close_game()
+	return session
+
+
+# This replays a game from a replay log and returns its events.
+def game_events(record):
+	return replay_game(record).events
+
+
+# This adds one game's events to an event log, in a single write.
+def append_events(path, events):
+	lines = ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events)
+	with open(path, 'a') as event_file:
+		event_file.write(lines)
+
+
+# This yields every event in an event log, one line at a time. Lines that aren't whole events
+# (like the end of a log whose writer was killed mid-write) are skipped.
+def read_events(path):
+	with open(path, encoding='utf-8', buffering=1 << 20) as event_file:
+		for line in event_file:
+			try:
+				yield json.loads(line)
+			except ValueError:
+				continue
+
+
+# These are the running totals behind the report. Each dictionary has one entry per villain room,
+# robot or item, so none of them grow with the size of the log.
+class EventStats:
+	def __init__(self):
+		self.turns = 0
+		self.games = 0
+		self.outcomes = {'win': 0, 'lose': 0, 'quit': 0, 'timeout': 0}
+		self.villain_rooms = {}  # room: [games, wins]
+		self.robots = {}  # robot: [fights, losses, fled]
+		self.used = {}  # item: times used
+		self.picked = {}  # item: times picked up
+		self.components_games = 0
+		self.components_turns = 0
+
+	def add(self, event):
+		if 'end' in event:
+			self.add_game(event)
+			return
+		self.turns += 1
+		robot = event.get('robot')
+		if robot is not None:
+			fights = self.robots.setdefault(robot, [0, 0, 0])
+			fights[0] += 1
+			combat = event.get('combat')
+			if combat == 'lose':
+				fights[1] += 1
+			elif combat == 'flee':
+				fights[2] += 1
+		for item in event.get('used', ()):
+			self.used[item] = self.used.get(item, 0) + 1
+		for item in event.get('picked', ()):
+			self.picked[item] = self.picked.get(item, 0) + 1
+
+	def add_game(self, event):
+		outcome = event['end']
+		self.games += 1
+		self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+		room = self.villain_rooms.setdefault(event['villain'], [0, 0])
+		room[0] += 1
+		if outcome == 'win':
+			room[1] += 1
+		if event['components_turn'] is not None:
+			self.components_games += 1
+			self.components_turns += event['components_turn']
+
+	def report(self):
+		games = max(self.games, 1)
+		lines = [f"{self.games:,} games, {self.turns:,} turns"]
+		lines.append('  ' + ', '.join(f"{outcome} {count / games:.1%}" for outcome, count in self.outcomes.items()))
+
+		lines.append(f"\n{'villain room':<40} {'games':>10} {'win rate':>9}")
+		for room, (played, wins) in sorted(self.villain_rooms.items(), key=lambda pair: -pair[1][0])[:20]:
+			lines.append(f"{room:<40} {played:>10,} {wins / played:>9.1%}")
+		if len(self.villain_rooms) > 20:
+			lines.append(f"  ... and {len(self.villain_rooms) - 20:,} more rooms")
+
+		lines.append(f"\n{'robot':<40} {'fights':>10} {'deaths':>9} {'fled':>9}")
+		for robot, (fights, losses, fled) in sorted(self.robots.items()):
+			lines.append(f"{robot:<40} {fights:>10,} {losses / fights:>9.1%} {fled / fights:>9.1%}")
+
+		lines.append(f"\n{'item':<40} {'picked up':>10} {'used':>9}")
+		for item in sorted(set(self.picked) | set(self.used), key=lambda name: -self.used.get(name, 0)):
+			lines.append(f"{item:<40} {self.picked.get(item, 0):>10,} {self.used.get(item, 0):>9,}")
+
+		if self.components_games:
+			lines.append(f"\nAll {len(QUEST_ITEMS)} components collected in {self.components_games / games:.1%} of games, "
+			             f"after {self.components_turns / self.components_games:.1f} turns on average")
+		else:
+			lines.append(f"\nNo game collected all {len(QUEST_ITEMS)} components")
+		return '\n'.join(lines)
+
+
+# This streams the logs through a fresh EventStats and returns it.
+def analyse(paths):
+	stats = EventStats()
+	for path in paths:
+		for event in read_events(path):
+			stats.add(event)
+	return stats
+
+
+# This plays bot games (using the simulator's policies) and appends their events to a log.
+def record_bot_events(path, games, policy_spec='greedy', world='classic', max_commands=2000):
+	from simulation import make_policy
+
+	for _ in range(games):
+		session = EventLoggingSession(quiet=True, world_setup=WORLD_SETUPS[world])
+		policy = make_policy(policy_spec, session.seed)
+		while not session.finished and session.commands < max_commands:
+			session.feed(policy(session))
+		session.close_game()
+		append_events(path, session.events)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Write gameplay event logs and report on them.")
+	subcommands = parser.add_subparsers(dest='command', required=True)
+
+	record_parser = subcommands.add_parser('record', help="play bot games and append their events to a log")
+	record_parser.add_argument('path')
+	record_parser.add_argument('--games', type=int, default=1000)
+	record_parser.add_argument('--policy', default='greedy')
+	record_parser.add_argument('--world', choices=WORLD_KINDS, default='classic')
+	record_parser.add_argument('--seed', type=int, default=None, help="seed for the bots and game seeds")
+
+	convert_parser = subcommands.add_parser('convert', help="replay the games in a replay log and append their events")
+	convert_parser.add_argument('replay_log')
+	convert_parser.add_argument('path')
+
+	report_parser = subcommands.add_parser('report', help="stream through event logs and print the totals")
+	report_parser.add_argument('paths', nargs='+')
+
+	args = parser.parse_args()
+
+	start = time.perf_counter()
+	if args.command == 'record':
+		if args.seed is not None:
+			random.seed(args.seed)
+		record_bot_events(args.path, args.games, args.policy, args.world)
+		print(f"Recorded {args.games:,} games in {time.perf_counter() - start:.2f}s, "
+		      f"{args.path} is now {os.path.getsize(args.path):,} bytes")
+
+	elif args.command == 'convert':
+		games = 0
+		for record in read_records(args.replay_log):
+			append_events(args.path, game_events(record))
+			games += 1
+		print(f"Converted {games:,} games in {time.perf_counter() - start:.2f}s")
+
+	elif args.command == 'report':
+		stats = analyse(args.paths)
+		elapsed = time.perf_counter() - start
+		size = sum(os.path.getsize(path) for path in args.paths)
+		print(stats.report())
+		print(f"\nRead {size / 1e6:,.1f} MB in {elapsed:.2f}s ({size / 1e6 / max(elapsed, 1e-9):,.1f} MB/s)")
+		if resource is not None:
+			# ru_maxrss is in kilobytes on Linux.
+			print(f"Peak memory {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+	main()
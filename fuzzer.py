@@ -0,0 +1,410 @@
+# Coverage-guided fuzzer for Dr. Eaton vs. Ton Drump's game loop.
+#
+# The fuzzer plays headless GameSessions with made-up commands, mostly answers the session will take
+# (its choices, or moves and searches at the "What do you do?" prompt) and now and then junk. It never
+# starts from the beginning of a game if it can help it. Whenever a command takes the game somewhere
+# it hasn't been before, the session is snapshotted (snapshot.py) and goes into the corpus, and every
+# new run restores one of those snapshots and plays a short burst of commands from there. A state two
+# hundred commands deep costs one restore instead of two hundred commands.
+#
+# "Somewhere it hasn't been before" is coverage of the game's states rather than its lines of code:
+# a state is the question being asked, the room, whether there's a fight on, the components held, the
+# Focus (in bands of 4) and the outcome, and the fuzzer keeps every pair of states that one command
+# moved between. Line tracing would slow every command down many times over.
+#
+# After every command the fuzzer checks for:
+#   crash        the command raised an exception
+#   hang         the commands took longer than --hang-seconds (an infinite loop, most likely)
+#   broken       the session is in a state the game should never get into, like a fight with no robot
+#   unwinnable   the world could be won at the start, but from here a component, or Mr. Ton Drump's
+#                office, can't be reached any more (a portal or a flight counts as a way anywhere it
+#                could lead, and robots count as beatable)
+#
+# Each kind of failure (the same check failing at the same question, or the same exception from the
+# same line) is shrunk to the shortest list of commands from the start of its game that still fails the
+# same way, printed, and appended to a replay log (replay.py), so
+# `python replay.py show fuzz_failures.dglog --index N` plays it back with its text.
+#
+# Example:  python fuzzer.py --seconds 60
+#           python fuzzer.py --world compact --text --seconds 300 --failures compact_failures.dglog
+
+import argparse
+import random
+import signal
+import time
+import traceback
+
+from Dr_Eaton_vs_Ton_Drump import PHASE_HANDLERS, QUEST_ITEM_BITS, QUEST_ITEMS, GameSession, stairs_destination
+from replay import WORLD_SETUPS, ReplayRecord, append_record
+from snapshot import copy_session, restore_session, snapshot_session
+from solvability import flood
+
+# Snapshots only cover worlds with the game's own map, so these are the worlds that can be fuzzed.
+FUZZ_WORLDS = ('classic', 'compact')
+
+# These are the commands tried at the "What do you do?" prompt, as often as they appear here.
+# EXIT ends the game, so it's rare.
+COMMANDS = ('NORTH', 'SOUTH', 'EAST', 'WEST') * 6 + ('SEARCH',) * 8 + ('USE',) * 3 + ('HINT',) * 2 + ('EXIT',)
+
+# These are typed now and then at any prompt, to make sure the game turns them down.
+JUNK = ('', '   ', 'xyzzy', '0', '99', '-1', 'YES', 'north', 'maybe', '\x1b[A', 'é')
+JUNK_CHANCE = 0.03
+
+# This is how many components there are to find.
+QUEST_TOTAL = len(QUEST_ITEMS)
+
+
+class Hang(Exception):
+	pass
+
+
+def raise_hang(signum, frame):
+	raise Hang()
+
+
+# This is a place in the game the fuzzer can start from again: a snapshot, plus the commands that
+# got there from the start of the game, for the reproducer.
+class CorpusEntry:
+	__slots__ = ('seed', 'snapshot', 'commands', 'winnable')
+
+	def __init__(self, seed, snapshot, commands, winnable):
+		self.seed = seed
+		self.snapshot = snapshot
+		self.commands = commands
+		self.winnable = winnable  # Whether the world could be won at the start.
+
+
+# This is one kind of failure, with the commands that first showed it and (after shrinking) the fewest that do.
+class Failure:
+	def __init__(self, signature, detail, seed, commands):
+		self.signature = signature
+		self.detail = detail
+		self.seed = seed
+		self.commands = commands
+		self.shrunk = commands
+		self.count = 1
+
+
+# This is the state a command moves the game into, for coverage.
+def state_key(session):
+	focus = session.player_stats['focus']
+	return (session.phase, session.current_location, session.in_combat, session.inventory.quest_count,
+	        0 if focus <= 0 else min(focus, 20) // 4 + 1, session.outcome)
+
+
+# This is how one world's rooms connect, for the unwinnable check. Exits never change during a game,
+# so the links are worked out once. A portal can lead to any room but the office.
+class WorldShape:
+	def __init__(self, session):
+		self.room_bits = {room_key: 1 << index for index, room_key in enumerate(session.game_map)}
+		self.office = self.room_bits[session.villain_location]
+		self.open_rooms = (1 << len(self.room_bits)) - 1 & ~self.office
+		self.links = []
+		for room_key, room in session.game_map.items():
+			neighbours = 0
+			for neighbour in room['exits'].values():
+				neighbours |= self.room_bits[neighbour]
+			stairs_to = stairs_destination(room)
+			if stairs_to is not None:
+				neighbours |= self.room_bits[stairs_to]
+			elif room.get('special_exit') == 'Portal':
+				neighbours |= self.open_rooms
+			self.links.append(neighbours)
+		self.results = {}  # (room, components held): whether the game can still be won
+
+	# This says whether every missing component, and then the office, can still be reached from where the player is.
+	def can_win(self, session):
+		key = (session.current_location, session.inventory.quest_count)
+		result = self.results.get(key)
+		if result is None:
+			quest_rooms = 0
+			in_rooms = 0
+			for room_key, room in session.game_map.items():
+				if room['item'] in QUEST_ITEM_BITS:
+					quest_rooms |= self.room_bits[room_key]
+					in_rooms += 1
+			start = self.room_bits[session.current_location]
+			reached, nearby = flood(start, start, self.open_rooms, self.links)
+			result = (in_rooms + session.inventory.quest_count >= QUEST_TOTAL and quest_rooms & ~reached == 0
+			          and (reached | nearby) & self.office != 0)
+			self.results[key] = result
+		return result
+
+
+# This looks for anything wrong with a session between commands, and returns what it is (or None).
+def check_session(session, shape, winnable):
+	if session.finished:
+		if session.outcome not in ('win', 'lose', 'quit'):
+			return 'broken', "the game finished without an outcome"
+		return None
+	if session.phase not in PHASE_HANDLERS or session.prompt is None:
+		return 'broken', "the game is waiting for an answer to no question"
+	if session.current_location == session.villain_location:
+		return 'broken', "the player is in Mr. Ton Drump's office and the game is still on"
+	robot = session.game_map[session.current_location]['robot']
+	if session.in_combat and robot is None:
+		return 'broken', "the player is fighting a robot that isn't there"
+	if not session.in_combat and (robot is not None or session.phase == 'combat'):
+		return 'broken', "the player is next to a robot without a fight"
+	if winnable and not shape.can_win(session):
+		return 'unwinnable', "a component or the office can't be reached any more"
+	return None
+
+
+class Fuzzer:
+	def __init__(self, world='classic', seed=0, max_length=8, forks=8, text=False, hang_seconds=1.0,
+	             new_game_chance=0.01, corpus_size=20000):
+		self.world = world
+		self.world_setup = WORLD_SETUPS[world]
+		self.rng = random.Random(seed)
+		self.max_length = max_length
+		self.forks = forks
+		self.quiet = not text
+		self.hang_seconds = hang_seconds
+		self.new_game_chance = new_game_chance
+		self.corpus_size = corpus_size
+		self.corpus = []
+		self.coverage = set()
+		self.shapes = {}  # seed: WorldShape
+		self.failures = {}  # signature: Failure
+		self.sequences = 0
+		self.commands = 0
+		self.restores = 0
+		# Hangs are caught with an alarm signal, which only Unix has.
+		self.alarm = hasattr(signal, 'setitimer')
+		if self.alarm:
+			signal.signal(signal.SIGALRM, raise_hang)
+
+	def shape(self, seed, session):
+		shape = self.shapes.get(seed)
+		if shape is None:
+			if len(self.shapes) >= 4096:
+				self.shapes.clear()
+			shape = self.shapes[seed] = WorldShape(session)
+		return shape
+
+	def arm(self):
+		if self.alarm:
+			signal.setitimer(signal.ITIMER_REAL, self.hang_seconds)
+
+	def disarm(self):
+		if self.alarm:
+			signal.setitimer(signal.ITIMER_REAL, 0)
+
+	# This picks the next command with a single random number: the bottom JUNK_CHANCE of it picks junk and
+	# the rest picks one of the session's choices (or one of COMMANDS).
+	def pick_command(self, session):
+		roll = self.rng.random()
+		if roll < JUNK_CHANCE:
+			return JUNK[int(roll / JUNK_CHANCE * len(JUNK))]
+		choices = session.choices if session.choices is not None else COMMANDS
+		return choices[int((roll - JUNK_CHANCE) / (1 - JUNK_CHANCE) * len(choices))]
+
+	# This adds a place to the corpus. Once it's full, new places replace old ones at random.
+	def keep(self, entry):
+		if len(self.corpus) < self.corpus_size:
+			self.corpus.append(entry)
+		else:
+			self.corpus[self.rng.randrange(self.corpus_size)] = entry
+
+	# This restores a corpus entry (or, with entry None, starts a new game) once, and plays a burst of
+	# commands from each of `forks` in-memory copies of it. The alarm covers all of them, and goes off
+	# if they take more than hang_seconds between them.
+	def run_entry(self, entry):
+		seed = entry.seed if entry is not None else self.rng.getrandbits(64)
+		commands = entry.commands if entry is not None else ()
+		self.arm()
+		try:
+			try:
+				if entry is None:
+					base = GameSession(quiet=self.quiet, seed=seed, world_setup=self.world_setup)
+					shape = self.shape(seed, base)
+					entry = CorpusEntry(seed, snapshot_session(base), (), shape.can_win(base))
+					self.keep(entry)
+				else:
+					base = restore_session(entry.snapshot, quiet=self.quiet)
+					shape = self.shape(seed, base)
+					self.restores += 1
+				rng_state = base.rng.getstate()
+			except Hang:
+				self.fail(('hang',), f"no answer within {self.hang_seconds}s", seed, commands)
+				return
+			except Exception as error:
+				self.fail(*crash_signature(error), seed, commands)
+				return
+			for _ in range(self.forks):
+				self.run_sequence(entry, copy_session(base, rng_state), shape)
+		finally:
+			self.disarm()
+
+	# This plays one burst of commands on a session forked from a corpus entry.
+	def run_sequence(self, entry, session, shape):
+		self.sequences += 1
+		played = []
+		key = state_key(session)
+		try:
+			for _ in range(1 + int(self.rng.random() * self.max_length)):
+				command = self.pick_command(session)
+				played.append(command)
+				phase = session.phase
+				session.feed(command)
+				session.take_output()
+				problem = check_session(session, shape, entry.winnable)
+				if problem is not None:
+					kind, detail = problem
+					self.fail((kind, detail, phase), detail, entry.seed, entry.commands + tuple(played))
+					return
+				next_key = state_key(session)
+				edge = (key, next_key)
+				if edge not in self.coverage:
+					self.coverage.add(edge)
+					if not session.finished:
+						self.keep(CorpusEntry(entry.seed, snapshot_session(session), entry.commands + tuple(played),
+						                      entry.winnable))
+				key = next_key
+				if session.finished:
+					return
+		except Hang:
+			self.fail(('hang',), f"no answer within {self.hang_seconds}s", entry.seed, entry.commands + tuple(played))
+			self.arm()  # For the forks still to go.
+		except Exception as error:
+			self.fail(*crash_signature(error), entry.seed, entry.commands + tuple(played))
+		finally:
+			self.commands += len(played)
+
+	def fail(self, signature, detail, seed, commands):
+		failure = self.failures.get(signature)
+		if failure is not None:
+			failure.count += 1
+			# The shortest example so far is the best one to shrink.
+			if len(commands) < len(failure.commands):
+				failure.seed, failure.commands = seed, commands
+			return
+		self.failures[signature] = Failure(signature, detail, seed, commands)
+
+	# This fuzzes until the time or the number of sequences runs out.
+	def run(self, seconds=None, sequences=None, progress=None, every=5.0):
+		start = last = time.perf_counter()
+		rng = self.rng
+		while True:
+			if sequences is not None and self.sequences >= sequences:
+				break
+			now = time.perf_counter()
+			if seconds is not None and now - start >= seconds:
+				break
+			if progress is not None and now - last >= every:
+				progress(self, now - start)
+				last = now
+			if not self.corpus or rng.random() < self.new_game_chance:
+				self.run_entry(None)
+			else:
+				self.run_entry(rng.choice(self.corpus))
+		return time.perf_counter() - start
+
+	# This plays commands from the start of a game and returns the failure's signature and how many commands it
+	# took, or (None, None) if nothing went wrong.
+	def reproduce(self, seed, commands):
+		self.arm()
+		played = 0
+		try:
+			session = GameSession(quiet=self.quiet, seed=seed, world_setup=self.world_setup)
+			shape = WorldShape(session)
+			winnable = shape.can_win(session)
+			for command in commands:
+				played += 1
+				phase = session.phase
+				session.feed(command)
+				session.take_output()
+				problem = check_session(session, shape, winnable)
+				if problem is not None:
+					kind, detail = problem
+					return (kind, detail, phase), played
+				if session.finished:
+					break
+		except Hang:
+			return ('hang',), played
+		except Exception as error:
+			return crash_signature(error)[0], played
+		finally:
+			self.disarm()
+		return None, None
+
+	# This shrinks a failure's commands with delta debugging: it keeps cutting chunks out (halves, then
+	# quarters and so on, down to single commands) as long as what's left still fails the same way.
+	def shrink(self, failure):
+		commands = list(failure.commands)
+		signature, played = self.reproduce(failure.seed, commands)
+		if signature != failure.signature:
+			return commands  # It only happens after a restore, which is a bug in snapshot.py.
+		commands = commands[:played]
+		chunks = 2
+		while len(commands) >= 2:
+			size = -(-len(commands) // chunks)
+			for start in range(0, len(commands), size):
+				candidate = commands[:start] + commands[start + size:]
+				signature, played = self.reproduce(failure.seed, candidate)
+				if signature == failure.signature:
+					commands = candidate[:played]
+					chunks = max(chunks - 1, 2)
+					break
+			else:
+				if chunks >= len(commands):
+					break
+				chunks = min(chunks * 2, len(commands))
+		failure.shrunk = commands
+		return commands
+
+
+# This is an exception's signature (its type and the line it came from) and a description of it.
+def crash_signature(error):
+	frame = traceback.extract_tb(error.__traceback__)[-1]
+	place = f"{frame.filename.rsplit('/', 1)[-1]}:{frame.lineno} in {frame.name}"
+	return ('crash', type(error).__name__, place), f"{type(error).__name__}: {error} ({place})"
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Fuzz the game loop from snapshots, looking for crashes, hangs "
+	                                             "and unwinnable games.")
+	parser.add_argument('--world', choices=FUZZ_WORLDS, default='classic')
+	parser.add_argument('--seconds', type=float, default=60.0)
+	parser.add_argument('--sequences', type=int, default=None, help="stop after this many sequences instead")
+	parser.add_argument('--max-length', type=int, default=8, help="the most commands in one sequence")
+	parser.add_argument('--forks', type=int, default=8, help="sequences to play from each snapshot restored")
+	parser.add_argument('--text', action='store_true', help="run the game's text too (slower, but fuzzes that code)")
+	parser.add_argument('--hang-seconds', type=float, default=1.0, help="how long a sequence can take before it's a hang")
+	parser.add_argument('--corpus-size', type=int, default=20000, help="the most snapshots to keep")
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--failures', default='fuzz_failures.dglog', help="append the shrunk failures to this replay log")
+	args = parser.parse_args()
+
+	fuzzer = Fuzzer(args.world, args.seed, args.max_length, args.forks, args.text, args.hang_seconds,
+	                corpus_size=args.corpus_size)
+
+	def progress(fuzzer, elapsed):
+		print(f"  {elapsed:6.0f}s  {fuzzer.sequences:>11,} sequences ({fuzzer.sequences / elapsed:,.0f}/s), "
+		      f"{fuzzer.commands / elapsed:,.0f} commands/s, {len(fuzzer.coverage):,} state edges, "
+		      f"corpus {len(fuzzer.corpus):,}, failures {len(fuzzer.failures)}", flush=True)
+
+	seconds = None if args.sequences is not None else args.seconds
+	elapsed = fuzzer.run(seconds, args.sequences, progress)
+	print(f"\n{fuzzer.sequences:,} sequences, {fuzzer.commands:,} commands in {elapsed:.1f}s "
+	      f"({fuzzer.sequences / elapsed:,.0f} sequences/s, {fuzzer.commands / elapsed:,.0f} commands/s), "
+	      f"{fuzzer.restores:,} from snapshots")
+	print(f"{len(fuzzer.coverage):,} state edges covered, {len(fuzzer.corpus):,} snapshots in the corpus")
+
+	if not fuzzer.failures:
+		print("No failures found.")
+		return
+	print(f"\n{len(fuzzer.failures)} kinds of failure:")
+	for failure in fuzzer.failures.values():
+		before = len(failure.commands)
+		commands = fuzzer.shrink(failure)
+		append_record(args.failures, ReplayRecord(args.world, failure.seed, commands))
+		print(f"\n{failure.signature[0]}: {failure.detail} (seen {failure.count:,} times)")
+		print(f"  seed {failure.seed}, shrunk from {before} to {len(commands)} commands:")
+		print(f"  {' ; '.join(repr(command) for command in commands)}")
+	print(f"\nAppended the reproducers to {args.failures} (python replay.py show {args.failures} --index N)")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,416 @@
+# Telnet-style game server for Dr. Eaton vs. Ton Drump.
+# Every connected player gets their own GameSession, run as an asyncio coroutine, so one
+# process can host thousands of players without a thread or process per player.
+#
+# Example:  python game_server.py --port 4000
+#           telnet localhost 4000
+
+import argparse
+import asyncio
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from Dr_Eaton_vs_Ton_Drump import GameSession, Pacer, TypeAhead, render_screen, resolve_choice, show_instructions
+from events import append_events, replay_game
+from leaderboard import Leaderboard, game_row_from_session
+from replay import append_record, record_from_session
+from shared_world import SharedGameSession, SharedWorld
+from snapshot import SnapshotStore
+from status_protocol import DELTA_HELLO, StatusChannel
+
+# This matches the option negotiation bytes that telnet clients send, so they can be thrown away.
+TELNET_COMMAND = re.compile(rb'\xff[\xfb-\xfe].|\xff[\xf0-\xfa]')
+
+
+# This is the network version of the game's input/output interface. It has the same
+# write/write_screen/pause/read methods as TerminalIO, except read() is a coroutine. Like
+# TerminalIO, it gathers text and sends it to the socket in one write, at the next pause or prompt.
+#
+# Pauses never wait. Instead, text written after a pause goes on a timeline and a timer
+# sends it to the player when the pause is over, so the event loop is free the whole time.
+class StreamIO:
+	def __init__(self, reader, writer, pacer=None):
+		self.reader = reader
+		self.writer = writer
+		self.pacer = pacer or Pacer()
+		self.loop = asyncio.get_running_loop()
+		self.pending = []  # Text written since the last pause.
+		self.ready_at = 0.0  # The loop time when the last pause is over.
+		self.timeline = deque()  # (send time, bytes) chunks waiting for a pause to end.
+		self.timer = None
+
+	def write(self, text):
+		self.pending.append(text.replace('\n', '\r\n') + '\r\n')
+
+	# Telnet players get the pre-rendered, colored version of static screens with telnet line endings.
+	def write_screen(self, show):
+		self.pending.append(render_screen(show, True, '\r\n'))
+
+	def pause(self, seconds):
+		delay = self.pacer.scale(seconds)
+		if delay <= 0:
+			return
+		self.release_pending()
+		self.ready_at = max(self.ready_at, self.loop.time()) + delay
+
+	# This hands pending text to the socket now, or to the timeline if a pause is still running.
+	def release_pending(self):
+		if not self.pending:
+			return
+		data = ''.join(self.pending).encode()
+		self.pending = []
+		if not self.timeline and self.ready_at <= self.loop.time():
+			self.writer.write(data)
+		else:
+			self.timeline.append((self.ready_at, data))
+			self.start_timer()
+
+	def start_timer(self):
+		if self.timer is None and self.timeline:
+			self.timer = self.loop.call_at(self.timeline[0][0], self.send_due_text)
+
+	def send_due_text(self):
+		self.timer = None
+		now = self.loop.time()
+		while self.timeline and self.timeline[0][0] <= now:
+			self.writer.write(self.timeline.popleft()[1])
+		self.start_timer()
+
+	async def flush(self):
+		self.release_pending()
+		await self.writer.drain()
+
+	# This waits (without blocking anyone else) until everything on the timeline has been sent.
+	async def finish(self):
+		await self.flush()
+		remaining = self.ready_at - self.loop.time()
+		if remaining > 0:
+			await asyncio.sleep(remaining)
+		self.send_due_text()
+		await self.writer.drain()
+
+	def close(self):
+		if self.timer is not None:
+			self.timer.cancel()
+			self.timer = None
+		self.writer.close()
+
+	async def read(self, prompt):
+		self.pending.append(prompt)
+		await self.flush()
+		data = await self.reader.readline()
+		if not data:
+			raise ConnectionResetError("player disconnected")
+		return TELNET_COMMAND.sub(b'', data).decode('utf-8', errors='replace').rstrip('\r\n')
+
+
+# This is the async version of get_player_input() for network players.
+async def get_player_input_async(prompt, valid_choices, io):
+	while True:
+		user_input = resolve_choice(await io.read(prompt), valid_choices)
+		if user_input in valid_choices:
+			return user_input
+		io.write(f"Invalid command. Please enter one of the following: {', '.join(valid_choices)}")
+
+
+# This is the async version of play_session(): the same loop, but waiting never blocks other players.
+# It returns the finished session.
+#
+# With a hibernation store, a player who hasn't answered within idle_seconds has their session
+# packed into a snapshot and dropped, and it is restored when their answer arrives. That way
+# the server's memory grows with the players who are actually playing, not everyone connected.
+#
+# Like play_session(), a line can hold several commands. They're all played before the next
+# prompt, so a player on a slow link only waits for one round trip.
+#
+# With a status channel (for clients that draw their own status block), the fields that changed
+# are sent just before each prompt instead (see status_protocol.py).
+async def play_session_async(session, io, store=None, key=None, idle_seconds=None, channel=None):
+	typed = TypeAhead(status_screens=channel is None)
+	if channel is not None:
+		channel.reset()
+	while True:
+		for line in session.take_output():
+			# Numbers in the output are the dramatic pauses.
+			if isinstance(line, str):
+				io.write(line)
+			else:
+				io.pause(line)
+		if session.finished:
+			return session
+		if not typed.waiting():
+			command = typed.next_command(session)
+			if command is not None:
+				session.feed(command)
+			continue
+		if channel is not None:
+			update = channel.update_line(session)
+			if update is not None:
+				io.write(update)
+		if store is None:
+			typed.add_line(await io.read(session.prompt))
+			continue
+
+		answer = asyncio.ensure_future(io.read(session.prompt))
+		done, _ = await asyncio.wait({answer}, timeout=idle_seconds)
+		if not done:
+			odds, quiet, advisor = session.odds, session.quiet, session.advisor
+			store.hibernate(key, session)
+			session = None
+			try:
+				line = await answer
+			except BaseException:
+				store.discard(key)
+				raise
+			session = store.wake(key, odds, quiet, advisor)
+		else:
+			line = answer.result()
+		typed.add_line(line)
+
+
+# This keeps simple counters about the server so load tests have something to report.
+class ServerStats:
+	def __init__(self):
+		self.started = time.perf_counter()
+		self.active_sessions = 0
+		self.peak_sessions = 0
+		self.total_sessions = 0
+		self.games_played = 0
+		self.store = None
+		self.pool = None
+		self.shared_world = None
+		self.leaderboard = None
+		self.game_logger = None  # The thread that writes finished games to the replay log, event log and leaderboard.
+
+	def report(self):
+		elapsed = time.perf_counter() - self.started
+		cpu = time.process_time()
+		report = (f"sessions: {self.total_sessions} total, {self.active_sessions} active, {self.peak_sessions} peak | "
+		          f"games: {self.games_played} | uptime {elapsed:.1f}s, cpu {cpu:.2f}s")
+		if self.store is not None:
+			report += f" | hibernated {self.store.hibernated}, woken {self.store.woken}"
+		if self.pool is not None:
+			report += f" | pool hits {self.pool.hits}, misses {self.pool.misses}"
+		if self.leaderboard is not None:
+			report += f" | {self.leaderboard.report()}"
+		return report
+
+
+# This is the coroutine that runs one connected player from the instructions to "Thanks for playing!"
+async def serve_player(io, stats, odds=None, record_path=None, store=None, key=None, idle_seconds=None,
+                       advisor=None, pool=None, events_path=None, leaderboard=None, player=None):
+	io.write_screen(show_instructions)
+	# A client that draws its own status block says so here, instead of just pressing Enter.
+	channel = None
+	if await io.read("\r\nPress Enter to begin your quest...") == DELTA_HELLO:
+		channel = StatusChannel()
+	status_screens = channel is None
+	while True:
+		if stats.shared_world is not None:
+			# Everyone plays in the same Hexagon until a team wins it, then the next players get a new one.
+			# Shared games can't be replayed on their own, so they aren't recorded, hibernated or put on the leaderboard.
+			if stats.shared_world.winner is not None:
+				stats.shared_world = SharedWorld()
+			session = SharedGameSession(stats.shared_world, f"Player {key}", odds=odds, advisor=advisor,
+			                            status_screens=status_screens)
+			await play_session_async(session, io, channel=channel)
+			stats.games_played += 1
+		else:
+			# The event log and the leaderboard's row are made by replaying the game once it's over, so
+			# sessions keep their commands for them too.
+			record = record_path is not None or events_path is not None or leaderboard is not None
+			if pool is not None:
+				seed, rng, world = pool.take()
+				session = GameSession(odds=odds, world=world, seed=seed, record=record, advisor=advisor, rng=rng,
+				                      status_screens=status_screens)
+			else:
+				session = GameSession(odds=odds, record=record, advisor=advisor, status_screens=status_screens)
+			started = time.monotonic()
+			session = await play_session_async(session, io, store, key, idle_seconds, channel)
+			duration = time.monotonic() - started
+			stats.games_played += 1
+			if record:
+				await asyncio.get_running_loop().run_in_executor(
+					stats.game_logger, log_finished_game, record_from_session(session), record_path, events_path,
+					leaderboard, player or f"Player {key}", duration)
+
+		play_again = await get_player_input_async("\r\n> Would you like to play again? (YES/NO): ", ['yes', 'no'], io)
+		if play_again == 'no':
+			break
+
+	io.write("\nThanks for playing!")
+	await io.finish()
+
+
+# This appends a finished game to the replay log, and replays it to make its event log lines and
+# leaderboard row. It runs on the server's game logging thread, so neither the file writes nor the
+# replay ever hold up the other players, and it's the only thread that appends to the logs.
+def log_finished_game(record, record_path, events_path, leaderboard, player, duration):
+	if record_path is not None:
+		append_record(record_path, record)
+	if events_path is None and leaderboard is None:
+		return
+	finished = replay_game(record)
+	if events_path is not None:
+		append_events(events_path, finished.events)
+	if leaderboard is not None:
+		leaderboard.add(game_row_from_session(player, finished, duration))
+
+
+# This starts the server and returns it along with its stats.
+# Every connection gets its own Pacer, built from the pace and fast settings. Every player
+# shares the same combat odds table and advisor table, if there are any. With a record_path, every finished game
+# is appended to that replay log. With hibernate_after, sessions idle for that many seconds are
+# hibernated, in memory or (with hibernate_dir) as files in that directory. With a pool (a started
+# world_pool.WorldPool), new games take their worlds from it instead of building them. With
+# shared_world, every player joins the same Hexagon (see shared_world.py). With an events_path, every
+# finished game's turns are appended to that event log (see events.py). With a leaderboard (a started
+# leaderboard.Leaderboard), every finished game is added to it, under the player's IP address.
+async def start_server(host='0.0.0.0', port=4000, max_sessions=10000, pace=1.0, fast=False, odds=None,
+                       record_path=None, hibernate_after=None, hibernate_dir=None, advisor=None, pool=None,
+                       shared_world=False, events_path=None, leaderboard=None):
+	stats = ServerStats()
+	store = SnapshotStore(hibernate_dir) if hibernate_after is not None else None
+	stats.store = store
+	stats.pool = pool
+	stats.leaderboard = leaderboard
+	if record_path is not None or events_path is not None or leaderboard is not None:
+		stats.game_logger = ThreadPoolExecutor(max_workers=1, thread_name_prefix='game-log')
+	if shared_world:
+		stats.shared_world = SharedWorld()
+
+	async def handle_connection(reader, writer):
+		if stats.active_sessions >= max_sessions:
+			writer.write(b"The Hexagon is full right now. Please try again later.\r\n")
+			writer.close()
+			return
+
+		stats.active_sessions += 1
+		stats.total_sessions += 1
+		stats.peak_sessions = max(stats.peak_sessions, stats.active_sessions)
+		io = StreamIO(reader, writer, Pacer(pace, fast))
+		peer = writer.get_extra_info('peername')
+		try:
+			await serve_player(io, stats, odds, record_path, store, stats.total_sessions, hibernate_after, advisor,
+			                   pool, events_path, leaderboard, peer[0] if peer else None)
+		except (ConnectionError, asyncio.IncompleteReadError):
+			pass
+		finally:
+			stats.active_sessions -= 1
+			io.close()
+
+	server = await asyncio.start_server(handle_connection, host, port)
+	return server, stats
+
+
+# This writes the phase metrics out every `every` seconds, as a Prometheus text file, JSON lines or both.
+async def export_metrics(metrics, prometheus_path, jsonl_path, every):
+	while True:
+		await asyncio.sleep(every)
+		if prometheus_path:
+			metrics.write_prometheus(prometheus_path)
+		if jsonl_path:
+			metrics.append_json_line(jsonl_path)
+
+
+async def run_server(host, port, max_sessions, pace, fast, odds, record_path, hibernate_after, hibernate_dir,
+                     advisor, metrics=None, prometheus_path=None, jsonl_path=None, metrics_every=10.0, pool=None,
+                     shared_world=False, events_path=None, leaderboard=None):
+	server, stats = await start_server(host, port, max_sessions, pace, fast, odds, record_path, hibernate_after,
+	                                   hibernate_dir, advisor, pool, shared_world, events_path, leaderboard)
+	addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+	print(f"Serving Dr. Eaton vs. Ton Drump on {addresses}", flush=True)
+	exporter = None
+	if metrics is not None:
+		exporter = asyncio.ensure_future(export_metrics(metrics, prometheus_path, jsonl_path, metrics_every))
+	try:
+		async with server:
+			await server.serve_forever()
+	finally:
+		if stats.game_logger is not None:
+			# This waits for the games that finished last to be logged.
+			stats.game_logger.shutdown()
+		print(stats.report(), flush=True)
+		if pool is not None:
+			print(pool.report(), flush=True)
+		if exporter is not None:
+			exporter.cancel()
+			print(metrics.report(), flush=True)
+			if prometheus_path:
+				metrics.write_prometheus(prometheus_path)
+			if jsonl_path:
+				metrics.append_json_line(jsonl_path)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Host Dr. Eaton vs. Ton Drump for many players over TCP.")
+	parser.add_argument('--host', default='0.0.0.0')
+	parser.add_argument('--port', type=int, default=4000)
+	parser.add_argument('--max-sessions', type=int, default=10000)
+	parser.add_argument('--pace', type=float, default=1.0, help="multiply the dramatic pauses by this much")
+	parser.add_argument('--fast', action='store_true', help="skip the dramatic pauses (for bots and tests)")
+	parser.add_argument('--odds', action='store_true', help="show combat odds during fights (needs NumPy)")
+	parser.add_argument('--advisor', action='store_true', help="offer an ADVISOR option during fights (needs NumPy)")
+	parser.add_argument('--record', metavar='PATH', help="append every finished game to this replay log")
+	parser.add_argument('--events', metavar='PATH', help="append every finished game's turns to this event log")
+	parser.add_argument('--leaderboard', metavar='PATH', help="add every finished game to this SQLite leaderboard")
+	parser.add_argument('--hibernate-after', type=float, default=None, metavar='SECONDS',
+	                    help="snapshot and drop sessions that have been idle this long")
+	parser.add_argument('--hibernate-dir', default=None, help="keep hibernated sessions as files here (default: memory)")
+	parser.add_argument('--metrics', metavar='PATH', help="time the game's phases and write them to this Prometheus text file")
+	parser.add_argument('--metrics-jsonl', metavar='PATH', help="time the game's phases and append them to this JSON-lines file")
+	parser.add_argument('--metrics-every', type=float, default=10.0, metavar='SECONDS',
+	                    help="how often the metrics are written out")
+	parser.add_argument('--world-pool', type=int, default=0, metavar='SIZE',
+	                    help="keep at least this many worlds made ahead of time, so new games start at once")
+	parser.add_argument('--shared-world', action='store_true',
+	                    help="put every player in the same Hexagon, sharing its items, robots and villain")
+	parser.add_argument('--fair-worlds', action='store_true',
+	                    help="only hand out worlds that pass the solvability check (uses a world pool)")
+	args = parser.parse_args()
+
+	odds = None
+	if args.odds:
+		import combat_odds
+		odds = combat_odds.load_or_build()
+	advisor = None
+	if args.advisor:
+		import combat_solver
+		advisor = combat_solver.load_or_build()
+	metrics = None
+	if args.metrics or args.metrics_jsonl:
+		import instrumentation
+		metrics = instrumentation.instrument()
+	pool = None
+	if args.world_pool or args.fair_worlds:
+		import world_pool
+		size = args.world_pool or 4
+		validate = world_pool.check_world
+		if args.fair_worlds:
+			import solvability
+			validate = solvability.is_fair
+		pool = world_pool.WorldPool(min_size=size, max_size=max(size, 256), validate=validate).start()
+		if metrics is not None:
+			metrics.collectors['world_pool'] = pool
+	leaderboard = None
+	if args.leaderboard:
+		leaderboard = Leaderboard(args.leaderboard).start()
+
+	try:
+		asyncio.run(run_server(args.host, args.port, args.max_sessions, args.pace, args.fast, odds, args.record,
+		                       args.hibernate_after, args.hibernate_dir, advisor, metrics, args.metrics,
+		                       args.metrics_jsonl, args.metrics_every, pool, args.shared_world, args.events,
+		                       leaderboard))
+	except KeyboardInterrupt:
+		pass
+	finally:
+		if pool is not None:
+			pool.stop()
+		if leaderboard is not None:
+			leaderboard.stop()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,267 @@
+# Per-phase instrumentation for Dr. Eaton vs. Ton Drump.
+#
+# Hooks sit at the key points of the game loop and record how often each phase runs and how long
+# it takes, in a timing histogram per phase, plus a count per room so the hot rooms stand out:
+#
+#   world_setup   building a new world for a session
+#   status        drawing the status screen at the start of a turn
+#   command       handling a command typed at "What do you do?" (this includes any search or move it starts)
+#   search        searching a room
+#   move          walking, taking the stairs, a portal or fleeing into a room (this includes that room's turn)
+#   item_use      using an item from the menu
+#   combat_turn   one combat action and the robot's reply
+#   villain       walking into Mr. Ton Drump's office
+#
+# Hooks cost nothing while metrics are off: instrument() swaps timing wrappers in for those
+# GameSession methods (and the PHASE_HANDLERS entries), and for the subclasses' own versions of
+# them (like SharedGameSession.move_to), and uninstrument() puts the originals back.
+# The metrics can be written out as a Prometheus text file or as JSON lines.
+#
+# Example:  python instrumentation.py --games 2000 --prometheus metrics.prom --jsonl metrics.jsonl
+
+import argparse
+import json
+import os
+import time
+from bisect import bisect_left
+
+import Dr_Eaton_vs_Ton_Drump as game
+from replay import WORLD_SETUPS, record_bot_games
+
+# This connects each phase to the GameSession method it times.
+PHASE_METHODS = {
+	'world_setup': 'build_world',
+	'status': 'show_turn_status',
+	'command': 'handle_command',
+	'search': 'search_room',
+	'move': 'move_to',
+	'item_use': 'handle_item_choice',
+	'combat_turn': 'handle_combat_action',
+	'villain': 'villain_encounter',
+}
+
+# These are the upper bounds of the histogram buckets, in seconds: 1, 2.5 and 5 times every
+# power of ten from a microsecond up to a second.
+BUCKET_BOUNDS = tuple(step * 10.0 ** power for power in range(-6, 0) for step in (1, 2.5, 5)) + (1.0,)
+
+
+class Histogram:
+	def __init__(self):
+		self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)  # The last bucket is everything over a second.
+		self.count = 0
+		self.sum = 0.0
+
+	def observe(self, seconds):
+		self.buckets[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+		self.count += 1
+		self.sum += seconds
+
+	# This estimates a percentile as the upper bound of the bucket it falls in.
+	def percentile(self, fraction):
+		if not self.count:
+			return 0.0
+		rank = fraction * self.count
+		seen = 0
+		for bound, count in zip(BUCKET_BOUNDS, self.buckets):
+			seen += count
+			if seen >= rank:
+				return bound
+		return float('inf')
+
+
+# This holds every phase's histogram and the count of each phase per room. Other parts of the
+# server (like the world pool) can add themselves to collectors, by name, to be exported alongside;
+# each needs a prometheus_lines() and a summary() method.
+class Metrics:
+	def __init__(self):
+		self.started = time.time()
+		self.phases = {phase: Histogram() for phase in PHASE_METHODS}
+		self.rooms = {phase: {} for phase in PHASE_METHODS}
+		self.collectors = {}
+
+	def observe(self, phase, seconds, room=None):
+		self.phases[phase].observe(seconds)
+		if room is not None:
+			rooms = self.rooms[phase]
+			rooms[room] = rooms.get(room, 0) + 1
+
+	# This returns the busiest rooms, as (room, visits) pairs, counting the moves into each room.
+	def hot_rooms(self, limit=5, phase='move'):
+		return sorted(self.rooms[phase].items(), key=lambda pair: -pair[1])[:limit]
+
+	def to_prometheus(self):
+		lines = ["# HELP dr_eaton_phase_seconds Time spent in each phase of the game loop.",
+		         "# TYPE dr_eaton_phase_seconds histogram"]
+		for phase, histogram in self.phases.items():
+			total = 0
+			for bound, count in zip(BUCKET_BOUNDS, histogram.buckets):
+				total += count
+				lines.append(f'dr_eaton_phase_seconds_bucket{{phase="{phase}",le="{bound:g}"}} {total}')
+			lines.append(f'dr_eaton_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {histogram.count}')
+			lines.append(f'dr_eaton_phase_seconds_sum{{phase="{phase}"}} {histogram.sum:.9f}')
+			lines.append(f'dr_eaton_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+		lines.append("# HELP dr_eaton_room_phase_total How often each phase ran in each room.")
+		lines.append("# TYPE dr_eaton_room_phase_total counter")
+		for phase, rooms in self.rooms.items():
+			for room, count in sorted(rooms.items()):
+				lines.append(f'dr_eaton_room_phase_total{{phase="{phase}",room="{room}"}} {count}')
+		for collector in self.collectors.values():
+			lines.extend(collector.prometheus_lines())
+		return '\n'.join(lines) + '\n'
+
+	# Prometheus scrapers can read this file at any time, so it is written to a temporary
+	# file first and then moved into place.
+	def write_prometheus(self, path):
+		temporary = path + '.tmp'
+		with open(temporary, 'w') as metrics_file:
+			metrics_file.write(self.to_prometheus())
+		os.replace(temporary, path)
+
+	# This is one JSON line with the totals so far. Appending one every so often gives a time series.
+	def to_json_line(self):
+		phases = {}
+		for phase, histogram in self.phases.items():
+			phases[phase] = {
+				'count': histogram.count,
+				'seconds': round(histogram.sum, 9),
+				'p50_us': histogram.percentile(0.50) * 1e6,
+				'p99_us': histogram.percentile(0.99) * 1e6,
+			}
+		line = {'time': round(time.time(), 3), 'uptime': round(time.time() - self.started, 3),
+		        'phases': phases, 'hot_rooms': dict(self.hot_rooms())}
+		for name, collector in self.collectors.items():
+			line[name] = collector.summary()
+		return json.dumps(line)
+
+	def append_json_line(self, path):
+		with open(path, 'a') as metrics_file:
+			metrics_file.write(self.to_json_line() + '\n')
+
+	def report(self):
+		lines = [f"{'phase':<12} {'count':>10} {'mean us':>10} {'p50 us':>10} {'p99 us':>10}"]
+		for phase, histogram in self.phases.items():
+			mean = histogram.sum / histogram.count * 1e6 if histogram.count else 0.0
+			lines.append(f"{phase:<12} {histogram.count:>10,} {mean:>10.1f} "
+			             f"{histogram.percentile(0.50) * 1e6:>10g} {histogram.percentile(0.99) * 1e6:>10g}")
+		rooms = ', '.join(f"{room} ({count:,})" for room, count in self.hot_rooms())
+		lines.append(f"hot rooms: {rooms or 'none yet'}")
+		for collector in self.collectors.values():
+			lines.append(collector.report())
+		return '\n'.join(lines)
+
+
+# This wraps a GameSession method so every call is timed and counted against the room the player
+# is in when it's done. A world is built before the session has a room, so world_setup isn't counted by room.
+# Untimed sessions (replays of games that were already counted) go straight to the method.
+#
+# A subclass's version of a method usually calls the base class's with super(), and both are
+# wrapped. Only the wrapper the session's own class uses does the timing, so that call isn't
+# counted twice.
+def timed(method, phase, metrics):
+	clock = time.perf_counter
+	name = PHASE_METHODS[phase]
+
+	if phase == 'world_setup':
+		def wrapper(session, *args):
+			if session.untimed or getattr(type(session), name) is not wrapper:
+				return method(session, *args)
+			start = clock()
+			result = method(session, *args)
+			metrics.observe(phase, clock() - start)
+			return result
+	else:
+		def wrapper(session, *args):
+			if session.untimed or getattr(type(session), name) is not wrapper:
+				return method(session, *args)
+			start = clock()
+			result = method(session, *args)
+			metrics.observe(phase, clock() - start, session.current_location)
+			return result
+
+	wrapper.original = method
+	wrapper.__name__ = name
+	return wrapper
+
+
+# This is GameSession and every subclass of it that has been imported so far.
+def session_classes():
+	classes = [game.GameSession]
+	for session_class in classes:
+		classes.extend(session_class.__subclasses__())
+	return classes
+
+
+# This turns the hooks on for every session in this process and returns the metrics they fill in.
+# Subclasses imported after this is called keep their own versions of the methods untimed.
+def instrument(metrics=None):
+	uninstrument()
+	metrics = metrics or Metrics()
+	for session_class in session_classes():
+		for phase, name in PHASE_METHODS.items():
+			method = session_class.__dict__.get(name)
+			if method is None:
+				continue
+			wrapper = timed(method, phase, metrics)
+			setattr(session_class, name, wrapper)
+			if session_class is game.GameSession:
+				for key, handler in game.PHASE_HANDLERS.items():
+					if handler is method:
+						game.PHASE_HANDLERS[key] = wrapper
+	return metrics
+
+
+# This puts the plain methods back, so the hooks cost nothing again.
+def uninstrument():
+	for session_class in session_classes():
+		for name in PHASE_METHODS.values():
+			method = session_class.__dict__.get(name)
+			original = getattr(method, 'original', None)
+			if original is None:
+				continue
+			setattr(session_class, name, original)
+			if session_class is game.GameSession:
+				for key, handler in game.PHASE_HANDLERS.items():
+					if handler is method:
+						game.PHASE_HANDLERS[key] = original
+
+
+def play_corpus(records):
+	for record in records:
+		session = game.GameSession(seed=record.seed, world_setup=WORLD_SETUPS[record.world])
+		for command in record.commands:
+			session.feed(command)
+			session.take_output()
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Play bot games with the phase hooks on and export the metrics.")
+	parser.add_argument('--games', type=int, default=1000)
+	parser.add_argument('--policy', default='greedy')
+	parser.add_argument('--prometheus', metavar='PATH', help="write the metrics to this Prometheus text file")
+	parser.add_argument('--jsonl', metavar='PATH', help="append the metrics to this JSON-lines file")
+	args = parser.parse_args()
+
+	records = record_bot_games(args.games, args.policy)
+
+	# The same games are played with the hooks off and on, to show what they cost.
+	start = time.perf_counter()
+	play_corpus(records)
+	plain = time.perf_counter() - start
+	metrics = instrument()
+	start = time.perf_counter()
+	play_corpus(records)
+	hooked = time.perf_counter() - start
+	uninstrument()
+
+	print(metrics.report())
+	print(f"\n{len(records):,} games: {plain:.2f}s with the hooks off, {hooked:.2f}s on ({hooked / plain - 1:+.1%})")
+	if args.prometheus:
+		metrics.write_prometheus(args.prometheus)
+		print(f"Wrote {args.prometheus}")
+	if args.jsonl:
+		metrics.append_json_line(args.jsonl)
+		print(f"Appended to {args.jsonl}")
+
+
+if __name__ == "__main__":
+	main()
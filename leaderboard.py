@@ -0,0 +1,278 @@
+# A local SQLite leaderboard and run history for Dr. Eaton vs. Ton Drump.
+#
+# Every finished game becomes one row of the games table: who played it, when it finished, how
+# it ended, how many turns it took, the Focus left at the end, how many items were used, how many
+# robots were pacified, the game's seed (so it can be looked up in a replay log or played again)
+# and how long it took in seconds.
+#
+# Game loops never wait for the database. Leaderboard.add() only puts the row on a queue, and one
+# writer thread takes everything that's queued (up to batch_size rows) and writes it in a single
+# transaction, so the busier the server is, the bigger the batches get. The database is in WAL
+# mode, so readers (like the top subcommand, run while a server is writing) don't block the writer
+# and the writer doesn't block them.
+#
+# The three queries the leaderboard answers each have their own index, so they read a handful of
+# index entries however many games there are:
+#   fastest wins          wins only, by turns, then seconds        (index fastest_wins)
+#   most Focus left       wins only, by Focus left, then turns     (index most_focus)
+#   a player's history    one player's games, newest first         (index player_history)
+#
+# Examples:  python leaderboard.py top leaderboard.db
+#            python leaderboard.py history leaderboard.db 127.0.0.1
+#            python leaderboard.py benchmark /tmp/bench.db --rows 10000000
+
+import argparse
+import os
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+from events import replay_game
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+	id INTEGER PRIMARY KEY,
+	player TEXT NOT NULL,
+	finished_at REAL NOT NULL,
+	outcome TEXT NOT NULL,
+	turns INTEGER NOT NULL,
+	focus INTEGER NOT NULL,
+	items_used INTEGER NOT NULL,
+	robots_pacified INTEGER NOT NULL,
+	seed INTEGER NOT NULL,
+	duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fastest_wins ON games (turns, duration) WHERE outcome = 'win';
+CREATE INDEX IF NOT EXISTS most_focus ON games (focus DESC, turns) WHERE outcome = 'win';
+CREATE INDEX IF NOT EXISTS player_history ON games (player, finished_at DESC);
+'''
+
+COLUMNS = ('player', 'finished_at', 'outcome', 'turns', 'focus', 'items_used', 'robots_pacified', 'seed', 'duration')
+INSERT = f"INSERT INTO games ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+# The partial indexes only get used when the query says outcome = 'win' itself, not through a parameter.
+FASTEST_WINS = f"SELECT {', '.join(COLUMNS)} FROM games WHERE outcome = 'win' ORDER BY turns, duration LIMIT ?"
+MOST_FOCUS = f"SELECT {', '.join(COLUMNS)} FROM games WHERE outcome = 'win' ORDER BY focus DESC, turns LIMIT ?"
+HISTORY = f"SELECT {', '.join(COLUMNS)} FROM games WHERE player = ? ORDER BY finished_at DESC LIMIT ?"
+
+
+# Seeds are unsigned 64-bit numbers and SQLite's integers are signed, so the top half wraps around.
+def seed_to_sql(seed):
+	return seed - (1 << 64) if seed >= 1 << 63 else seed
+
+
+def seed_from_sql(value):
+	return value + (1 << 64) if value < 0 else value
+
+
+def connect(path):
+	connection = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+	connection.execute('PRAGMA journal_mode=WAL')
+	# In WAL mode, NORMAL only syncs at checkpoints: a power cut can lose the last few batches,
+	# but never corrupts the database.
+	connection.execute('PRAGMA synchronous=NORMAL')
+	return connection
+
+
+# This is a game's row for the leaderboard, worked out by replaying it from its replay record
+# (which is how the server already makes event logs).
+def game_row(player, record, duration, finished_at=None):
+	session = replay_game(record)
+	return game_row_from_session(player, session, duration, finished_at)
+
+
+# This is the row for a finished EventLoggingSession.
+def game_row_from_session(player, session, duration, finished_at=None):
+	items_used = robots_pacified = 0
+	for event in session.events:
+		items_used += len(event.get('used', ()))
+		robots_pacified += event.get('combat') == 'win'
+	return (player, time.time() if finished_at is None else finished_at, session.outcome or 'timeout', session.turns,
+	        session.player_stats['focus'], items_used, robots_pacified, seed_to_sql(session.seed), round(duration, 3))
+
+
+def row_dict(row):
+	result = dict(zip(COLUMNS, row))
+	result['seed'] = seed_from_sql(result['seed'])
+	return result
+
+
+class Leaderboard:
+	def __init__(self, path, batch_size=5000):
+		self.path = path
+		self.batch_size = batch_size
+		self.reader = connect(path)
+		self.reader.executescript(SCHEMA)
+		self.rows = queue.Queue()
+		self.written = 0
+		self.batches = 0
+		self.failed = 0
+		self.thread = None
+
+	def start(self):
+		self.thread = threading.Thread(target=self.run, name='leaderboard', daemon=True)
+		self.thread.start()
+		return self
+
+	# This writes whatever is still queued and stops the writer.
+	def stop(self):
+		if self.thread is not None:
+			self.rows.put(None)
+			self.thread.join()
+			self.thread = None
+		self.reader.close()
+
+	# This queues one game's row (see game_row()). It never waits for the database.
+	def add(self, row):
+		self.rows.put(row)
+
+	# This waits until every row queued so far is in the database.
+	def flush(self):
+		self.rows.join()
+
+	# This is the writer thread. It blocks until there's a row, then takes every row that's
+	# already waiting behind it, up to batch_size, and writes them all in one transaction.
+	def run(self):
+		connection = connect(self.path)
+		# Every insert lands somewhere in the middle of the player_history index, so the writer
+		# gets a bigger page cache (64 MB) and checkpoints the WAL less often (every ~40 MB).
+		connection.execute('PRAGMA cache_size=-65536')
+		connection.execute('PRAGMA wal_autocheckpoint=10000')
+		running = True
+		while running:
+			batch = [self.rows.get()]
+			while len(batch) < self.batch_size:
+				try:
+					batch.append(self.rows.get_nowait())
+				except queue.Empty:
+					break
+			if batch[-1] is None:
+				batch.pop()
+				running = False
+			if batch:
+				try:
+					with connection:
+						connection.executemany(INSERT, batch)
+					self.written += len(batch)
+					self.batches += 1
+				except sqlite3.Error as error:
+					# A full disk or a locked database shouldn't take the game server down with it.
+					self.failed += len(batch)
+					print(f"Leaderboard: couldn't write {len(batch)} games: {error}", file=sys.stderr, flush=True)
+			for _ in range(len(batch) + (not running)):
+				self.rows.task_done()
+		connection.close()
+
+	def fastest_wins(self, limit=10):
+		return [row_dict(row) for row in self.reader.execute(FASTEST_WINS, (limit,))]
+
+	def most_focus(self, limit=10):
+		return [row_dict(row) for row in self.reader.execute(MOST_FOCUS, (limit,))]
+
+	def history(self, player, limit=20):
+		return [row_dict(row) for row in self.reader.execute(HISTORY, (player, limit))]
+
+	def report(self):
+		return f"leaderboard: {self.written:,} games written in {self.batches:,} batches, {self.failed:,} failed"
+
+
+def print_rows(title, rows):
+	print(f"\n{title}")
+	print(f"  {'player':<20} {'outcome':<8} {'turns':>6} {'focus':>6} {'items':>6} {'robots':>7} {'seconds':>9}  seed")
+	for row in rows:
+		print(f"  {row['player']:<20} {row['outcome']:<8} {row['turns']:>6} {row['focus']:>6} {row['items_used']:>6} "
+		      f"{row['robots_pacified']:>7} {row['duration']:>9.1f}  {row['seed']}")
+
+
+# This makes up a plausible game row for the benchmark.
+def synthetic_row(rng, players, now):
+	outcome = rng.choices(('win', 'lose', 'quit'), (45, 45, 10))[0]
+	return (f"player{rng.randrange(players)}", now - rng.random() * 86400 * 365, outcome, rng.randint(5, 200),
+	        rng.randint(1, 40) if outcome == 'win' else rng.randint(-8, 0), rng.randint(0, 8), rng.randint(0, 9),
+	        seed_to_sql(rng.getrandbits(64)), round(rng.uniform(30, 3600), 3))
+
+
+def percentile(times, fraction):
+	times = sorted(times)
+	return times[min(len(times) - 1, int(fraction * len(times)))]
+
+
+# This fills a database with made-up games through a Leaderboard (so through its queue and
+# writer thread) and then times the three queries against it.
+def benchmark(path, rows, players, batch_size, queries, seed):
+	rng = random.Random(seed)
+	leaderboard = Leaderboard(path, batch_size).start()
+	before = leaderboard.reader.execute('SELECT count(*) FROM games').fetchone()[0]
+	now = time.time()
+	start = time.perf_counter()
+	for done in range(1, rows + 1):
+		leaderboard.add(synthetic_row(rng, players, now))
+		# Making up rows is quicker than writing them, so don't let the queue grow without end.
+		if done % 100000 == 0:
+			leaderboard.flush()
+		if done % 1000000 == 0:
+			print(f"  {done:,} rows queued, {leaderboard.written:,} written, "
+			      f"{done / (time.perf_counter() - start):,.0f} rows/s", flush=True)
+	leaderboard.flush()
+	elapsed = time.perf_counter() - start
+	print(f"Inserted {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s, "
+	      f"{leaderboard.batches:,} batches of {rows / max(leaderboard.batches, 1):,.0f} on average)")
+	total = before + rows
+	print(f"{path} has {total:,} games and is {os.path.getsize(path) / 1e6:,.1f} MB")
+
+	checks = [('fastest wins (top 10)', FASTEST_WINS, lambda: (10,)),
+	          ('most Focus left (top 10)', MOST_FOCUS, lambda: (10,)),
+	          ('player history (last 20)', HISTORY, lambda: (f"player{rng.randrange(players)}", 20))]
+	print(f"\n{'query':<26} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}  plan")
+	for name, sql, parameters in checks:
+		plan = '; '.join(row[-1] for row in leaderboard.reader.execute('EXPLAIN QUERY PLAN ' + sql, parameters()))
+		times = []
+		for _ in range(queries):
+			arguments = parameters()
+			query_start = time.perf_counter()
+			leaderboard.reader.execute(sql, arguments).fetchall()
+			times.append((time.perf_counter() - query_start) * 1000)
+		print(f"{name:<26} {percentile(times, 0.5):>8.3f} {percentile(times, 0.99):>8.3f} {max(times):>8.3f}  {plan}")
+	leaderboard.stop()
+
+
+def main():
+	parser = argparse.ArgumentParser(description="The SQLite leaderboard and run history.")
+	subcommands = parser.add_subparsers(dest='command', required=True)
+
+	top_parser = subcommands.add_parser('top', help="show the fastest wins and the wins with the most Focus left")
+	top_parser.add_argument('path')
+	top_parser.add_argument('--limit', type=int, default=10)
+
+	history_parser = subcommands.add_parser('history', help="show one player's games, newest first")
+	history_parser.add_argument('path')
+	history_parser.add_argument('player')
+	history_parser.add_argument('--limit', type=int, default=20)
+
+	benchmark_parser = subcommands.add_parser('benchmark', help="time inserts and queries on made-up games")
+	benchmark_parser.add_argument('path')
+	benchmark_parser.add_argument('--rows', type=int, default=1000000)
+	benchmark_parser.add_argument('--players', type=int, default=100000)
+	benchmark_parser.add_argument('--batch-size', type=int, default=5000)
+	benchmark_parser.add_argument('--queries', type=int, default=1000, help="how many times to run each query")
+	benchmark_parser.add_argument('--seed', type=int, default=0)
+
+	args = parser.parse_args()
+	if args.command == 'benchmark':
+		benchmark(args.path, args.rows, args.players, args.batch_size, args.queries, args.seed)
+		return
+
+	leaderboard = Leaderboard(args.path)
+	if args.command == 'top':
+		print_rows("Fastest wins", leaderboard.fastest_wins(args.limit))
+		print_rows("Most Focus left", leaderboard.most_focus(args.limit))
+	else:
+		print_rows(f"Games played by {args.player}", leaderboard.history(args.player, args.limit))
+	leaderboard.stop()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,151 @@
+# Load generator for game_server.py.
+# It opens many concurrent telnet-style connections, plays random games on each one and
+# reports round-trip latency, throughput and (with --spawn-server) sessions per CPU core.
+#
+# Example:  python load_generator.py --spawn-server --clients 500 --games 3
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import signal
+import subprocess
+import sys
+import time
+
+# Every prompt the server sends ends with one of these and is not followed by a newline.
+PROMPT_ENDINGS = ('? ', ': ', '...')
+
+# After this many commands in one game the bot types EXIT, so a wandering bot can't play forever.
+MAX_COMMANDS_PER_GAME = 300
+
+
+# This reads from the server until it is waiting on a prompt and returns that prompt's line.
+async def read_prompt(reader):
+	buffer = ''
+	while True:
+		chunk = await reader.read(65536)
+		if not chunk:
+			return None
+		buffer += chunk.decode('utf-8', errors='replace')
+		last_line = buffer.rsplit('\n', 1)[-1]
+		if last_line.endswith(PROMPT_ENDINGS):
+			return last_line
+
+
+# This picks a random but sensible answer for whatever the server just asked.
+def choose_answer(prompt, rng, games_left, commands):
+	if 'Press Enter' in prompt:
+		return ''
+	if 'play again' in prompt:
+		return 'yes' if games_left > 0 else 'no'
+	if 'What do you do?' in prompt:
+		if commands >= MAX_COMMANDS_PER_GAME:
+			return 'EXIT'
+		return rng.choice(['NORTH', 'SOUTH', 'EAST', 'WEST', 'SEARCH', 'SEARCH'])
+	if 'Choose (1, 2, or 3)' in prompt or 'Use which item?' in prompt:
+		return '1'
+	if 'YES' in prompt:
+		return rng.choice(['yes', 'no'])
+	return ''
+
+
+# This is one simulated player. It returns the list of round-trip latencies it measured.
+async def run_client(host, port, games, seed):
+	rng = random.Random(seed)
+	reader, writer = await asyncio.open_connection(host, port)
+	latencies = []
+	games_left = games
+	commands = 0
+	try:
+		prompt = await read_prompt(reader)
+		while prompt is not None:
+			if 'play again' in prompt:
+				games_left -= 1
+				commands = 0
+			answer = choose_answer(prompt, rng, games_left, commands)
+			commands += 1
+
+			sent = time.perf_counter()
+			writer.write(answer.encode() + b'\r\n')
+			await writer.drain()
+			prompt = await read_prompt(reader)
+			latencies.append(time.perf_counter() - sent)
+	finally:
+		writer.close()
+	return latencies
+
+
+def percentile(sorted_values, fraction):
+	if not sorted_values:
+		return 0.0
+	index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+	return sorted_values[index]
+
+
+async def run_load(host, port, clients, games):
+	start = time.perf_counter()
+	tasks = [run_client(host, port, games, seed) for seed in range(clients)]
+	results = await asyncio.gather(*tasks, return_exceptions=True)
+	elapsed = time.perf_counter() - start
+
+	latencies = sorted(latency for result in results if isinstance(result, list) for latency in result)
+	failures = [result for result in results if isinstance(result, BaseException)]
+	return {
+		'clients': clients,
+		'failed_clients': len(failures),
+		'elapsed_seconds': elapsed,
+		'round_trips': len(latencies),
+		'round_trips_per_second': len(latencies) / elapsed if elapsed else 0.0,
+		'p50_ms': percentile(latencies, 0.50) * 1000,
+		'p99_ms': percentile(latencies, 0.99) * 1000,
+	}
+
+
+# This starts game_server.py in a child process and waits until it is listening.
+def spawn_server(port, fast):
+	server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'game_server.py')
+	command = [sys.executable, server_script, '--host', '127.0.0.1', '--port', str(port)]
+	if fast:
+		command.append('--fast')
+	process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+	process.stdout.readline()  # "Serving Dr. Eaton vs. Ton Drump on ..."
+	return process
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Load test game_server.py with many simulated players.")
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=4000)
+	parser.add_argument('--clients', type=int, default=100, help="concurrent players")
+	parser.add_argument('--games', type=int, default=1, help="games per player")
+	parser.add_argument('--spawn-server', action='store_true', help="start a local server and measure its CPU time")
+	parser.add_argument('--fast', action='store_true', help="start the local server without dramatic pauses")
+	args = parser.parse_args()
+
+	server = spawn_server(args.port, args.fast) if args.spawn_server else None
+	try:
+		report = asyncio.run(run_load(args.host, args.port, args.clients, args.games))
+	finally:
+		if server is not None:
+			server.send_signal(signal.SIGINT)
+			server_report = server.stdout.read().strip()
+			server.wait()
+
+	for key, value in report.items():
+		print(f"{key:<24} {value:.2f}" if isinstance(value, float) else f"{key:<24} {value}")
+
+	if server is not None:
+		print(f"server                   {server_report}")
+		cpu_seconds = resource.getrusage(resource.RUSAGE_CHILDREN)
+		cpu_seconds = cpu_seconds.ru_utime + cpu_seconds.ru_stime
+		# A core that is busy 100% of the time could hold this many players at the measured pace.
+		busy_fraction = cpu_seconds / report['elapsed_seconds']
+		if busy_fraction:
+			print(f"server_cpu_seconds       {cpu_seconds:.2f}")
+			print(f"sessions_per_core        {args.clients / busy_fraction:.0f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,254 @@
+# Replay logs for Dr. Eaton vs. Ton Drump.
+#
+# Every GameSession draws all of its randomness from its own seeded generator, so a game is
+# fully described by its seed, the kind of world it was built on and the lines the player typed.
+# This module stores exactly that in a compact binary log and plays it back at full speed, with
+# no pauses and no text, which makes a corpus of recorded games a regression test (each record
+# also stores how the game ended) and a benchmark.
+#
+# Log file layout: the 8-byte header b'DGRLOG\x00\x01', then any number of records:
+#   world kind (1 byte) | seed (8 bytes, little endian) | outcome (1 byte) | turns (varint)
+#   | command count (varint) | commands
+# Each command is one byte: an index into COMMAND_TOKENS, or 0xFF followed by a varint length
+# and the UTF-8 text for anything not in the table.
+#
+# Examples:  python replay.py record corpus.dglog --games 10000 --policy greedy
+#            python replay.py check corpus.dglog
+#            python replay.py show corpus.dglog --index 3
+
+import argparse
+import os
+import random
+import time
+
+from Dr_Eaton_vs_Ton_Drump import GameSession, setup_game
+from building import setup_building_game
+from solvability import setup_fair_game
+from world import setup_compact_game
+
+LOG_HEADER = b'DGRLOG\x00\x01'
+
+# These are the one-byte commands. Never reorder this table; only add to the end.
+COMMAND_TOKENS = ('NORTH', 'SOUTH', 'EAST', 'WEST', 'SEARCH', 'USE', 'EXIT', 'yes', 'no', '',
+                  '1', '2', '3', '4', '5', '6', '7', '8', '9', '10',
+                  'north', 'south', 'east', 'west', 'search', 'use', 'exit', 'YES', 'NO', 'y', 'n')
+COMMAND_CODES = {command: code for code, command in enumerate(COMMAND_TOKENS)}
+LITERAL = 0xFF
+
+# These are the kinds of world a record can be replayed on, in byte order.
+WORLD_KINDS = ('classic', 'compact', 'building', 'fair')
+WORLD_SETUPS = {'classic': setup_game, 'compact': setup_compact_game, 'building': setup_building_game,
+                'fair': setup_fair_game}
+
+OUTCOMES = (None, 'win', 'lose', 'quit')
+
+
+# This is one recorded game.
+class ReplayRecord:
+	__slots__ = ('world', 'seed', 'commands', 'outcome', 'turns')
+
+	def __init__(self, world, seed, commands, outcome=None, turns=0):
+		self.world = world
+		self.seed = seed
+		self.commands = commands
+		self.outcome = outcome
+		self.turns = turns
+
+
+# This builds a record from a session that was created with record=True.
+def record_from_session(session, world='classic'):
+	return ReplayRecord(world, session.seed, list(session.command_log), session.outcome, session.turns)
+
+
+def write_varint(buffer, value):
+	while value >= 0x80:
+		buffer.append((value & 0x7F) | 0x80)
+		value >>= 7
+	buffer.append(value)
+
+
+# This reads the varint at `position` and returns it with the position just after it.
+def read_varint(data, position):
+	value = 0
+	shift = 0
+	while True:
+		byte = data[position]
+		position += 1
+		value |= (byte & 0x7F) << shift
+		if byte < 0x80:
+			return value, position
+		shift += 7
+
+
+# This appends a list of typed commands to a buffer: a count, then one token per command.
+def encode_commands(buffer, commands):
+	write_varint(buffer, len(commands))
+	for command in commands:
+		code = COMMAND_CODES.get(command)
+		if code is not None:
+			buffer.append(code)
+		else:
+			text = command.encode('utf-8')
+			buffer.append(LITERAL)
+			write_varint(buffer, len(text))
+			buffer += text
+
+
+def decode_commands(data, position):
+	count, position = read_varint(data, position)
+	commands = []
+	for _ in range(count):
+		code = data[position]
+		position += 1
+		if code == LITERAL:
+			length, position = read_varint(data, position)
+			commands.append(bytes(data[position:position + length]).decode('utf-8'))
+			position += length
+		else:
+			commands.append(COMMAND_TOKENS[code])
+	return commands, position
+
+
+def encode_record(record):
+	buffer = bytearray()
+	buffer.append(WORLD_KINDS.index(record.world))
+	buffer += record.seed.to_bytes(8, 'little')
+	buffer.append(OUTCOMES.index(record.outcome))
+	write_varint(buffer, record.turns)
+	encode_commands(buffer, record.commands)
+	return bytes(buffer)
+
+
+# This decodes the record starting at `position` and returns it with the position just after it.
+def decode_record(data, position=0):
+	world = WORLD_KINDS[data[position]]
+	seed = int.from_bytes(data[position + 1:position + 9], 'little')
+	outcome = OUTCOMES[data[position + 9]]
+	turns, position = read_varint(data, position + 10)
+	commands, position = decode_commands(data, position)
+	return ReplayRecord(world, seed, commands, outcome, turns), position
+
+
+# This writes records to a log file, adding the header if the file is new.
+def write_records(path, records, append=False):
+	new_file = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+	with open(path, 'ab' if append else 'wb') as log_file:
+		chunk = bytearray(LOG_HEADER if new_file else b'')
+		for record in records:
+			chunk += encode_record(record)
+		log_file.write(chunk)
+
+
+# This adds one finished game to a log file. One write per game keeps concurrent appends whole.
+def append_record(path, record):
+	write_records(path, [record], append=True)
+
+
+# This yields every record in a log file.
+def read_records(path):
+	with open(path, 'rb') as log_file:
+		data = log_file.read()
+	if not data.startswith(LOG_HEADER):
+		raise ValueError(f"{path} is not a replay log")
+	position = len(LOG_HEADER)
+	while position < len(data):
+		record, position = decode_record(data, position)
+		yield record
+
+
+# This plays a record back with no text and no pauses and returns the finished session.
+def replay(record, quiet=True):
+	session = GameSession(quiet=quiet, seed=record.seed, world_setup=WORLD_SETUPS[record.world])
+	for command in record.commands:
+		session.feed(command)
+	return session
+
+
+# This replays a record and checks it still ends the same way. It returns None if it does,
+# or a description of the difference.
+def check_record(record):
+	session = replay(record)
+	if session.outcome != record.outcome or session.turns != record.turns:
+		return (f"expected {record.outcome} after {record.turns} turns, "
+		        f"got {session.outcome} after {session.turns} turns")
+	return None
+
+
+# This plays bot games (using the simulator's policies) and returns their records.
+def record_bot_games(games, policy_spec='greedy', world='classic', max_commands=2000):
+	from simulation import make_policy
+
+	records = []
+	for _ in range(games):
+		session = GameSession(quiet=True, world_setup=WORLD_SETUPS[world], record=True)
+		policy = make_policy(policy_spec, session.seed)
+		while not session.finished and session.commands < max_commands:
+			session.feed(policy(session))
+		records.append(record_from_session(session, world))
+	return records
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Record, check and show replay logs.")
+	subcommands = parser.add_subparsers(dest='command', required=True)
+
+	record_parser = subcommands.add_parser('record', help="record bot games into a log")
+	record_parser.add_argument('path')
+	record_parser.add_argument('--games', type=int, default=1000)
+	record_parser.add_argument('--policy', default='greedy')
+	record_parser.add_argument('--world', choices=WORLD_KINDS, default='classic')
+	record_parser.add_argument('--seed', type=int, default=None, help="seed for the bots and game seeds")
+
+	check_parser = subcommands.add_parser('check', help="replay every game in a log and check the results")
+	check_parser.add_argument('path')
+
+	show_parser = subcommands.add_parser('show', help="print the text of one recorded game")
+	show_parser.add_argument('path')
+	show_parser.add_argument('--index', type=int, default=0)
+
+	args = parser.parse_args()
+
+	if args.command == 'record':
+		if args.seed is not None:
+			random.seed(args.seed)
+		records = record_bot_games(args.games, args.policy, args.world)
+		write_records(args.path, records)
+		size = os.path.getsize(args.path)
+		commands = sum(len(record.commands) for record in records)
+		print(f"Recorded {len(records)} games ({commands} commands) in {size:,} bytes "
+		      f"({size / max(commands, 1):.2f} bytes/command)")
+
+	elif args.command == 'check':
+		records = list(read_records(args.path))
+		start = time.perf_counter()
+		failures = 0
+		for i, record in enumerate(records):
+			problem = check_record(record)
+			if problem:
+				failures += 1
+				print(f"record {i} (seed {record.seed}): {problem}")
+		elapsed = time.perf_counter() - start
+		commands = sum(len(record.commands) for record in records)
+		print(f"Replayed {len(records)} games, {commands} commands in {elapsed:.2f}s "
+		      f"({len(records) / elapsed:,.0f} games/s, {commands / elapsed:,.0f} commands/s), {failures} mismatches")
+		if failures:
+			raise SystemExit(1)
+
+	elif args.command == 'show':
+		for i, record in enumerate(read_records(args.path)):
+			if i == args.index:
+				session = GameSession(seed=record.seed, world_setup=WORLD_SETUPS[record.world])
+				for command in record.commands:
+					for line in session.take_output():
+						if isinstance(line, str):
+							print(line)
+					print(f"{session.prompt}{command}")
+					session.feed(command)
+				for line in session.take_output():
+					if isinstance(line, str):
+						print(line)
+				break
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,296 @@
+# Shared worlds for Dr. Eaton vs. Ton Drump: several players in one Hexagon at once.
+#
+# Every player still has a GameSession of their own (their Focus, inventory and prompts), but the
+# sessions share one world: the items, the robots and Mr. Ton Drump's office. An item picked up
+# by one player is gone for everybody, and players in the same room fight the same robot, so
+# their Diagnostic Scans all chip away at the same corruption. The components count for the whole
+# team: once the team has all seven, whoever walks into the office wins the game for everyone.
+#
+# Every room has its own lock. While a session handles a command it holds the lock of the room
+# the player is in, and when the player moves it lets go of that room before taking the next one,
+# so a session never holds two rooms at once and can't deadlock. That makes each room work like a
+# little actor: players in the same room take turns, and players in different rooms never wait
+# for each other. Picking up an item and pacifying a robot happen inside that lock, so two players
+# can never both get the same item or both get the credit for the same robot. The team's
+# components and the winner have a small lock of their own, only ever taken inside a room's.
+#
+# Shared games depend on what the other players did, so they can't be replayed from one seed
+# and their commands, and they aren't recorded or hibernated.
+#
+# Example:  python shared_world.py --players 64     (the stress test: many players, same rooms)
+
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from Dr_Eaton_vs_Ton_Drump import (ALL_QUEST_ITEMS_MASK, COLORS, QUEST_ITEM_BITS, QUEST_ITEMS, START_LOCATION,
+                                   STARTING_ITEMS, GameSession, setup_game)
+
+
+class SharedWorld:
+	def __init__(self, world=None, global_lock=False):
+		if world is None:
+			world = setup_game()
+		self.game_map, self.villain_location, self.potion_map = world
+		# With global_lock, every room shares one lock. That's only here for the stress test to compare against.
+		if global_lock:
+			lock = threading.Lock()
+			self.room_locks = dict.fromkeys(self.game_map, lock)
+		else:
+			self.room_locks = {room_key: threading.Lock() for room_key in self.game_map}
+		self.team_lock = threading.Lock()
+		self.quest_mask = 0  # The components anyone on the team has picked up, one bit each.
+		self.winner = None
+
+		# These are for the stress test's checks and report: who got what, and how often a player
+		# had to wait for a room another player was in.
+		self.pickups = []  # (room, item, player name)
+		self.pacified = []  # (room, robot name, player name)
+		self.contended = 0
+
+	def world(self):
+		return self.game_map, self.villain_location, self.potion_map
+
+	def lock_room(self, room_key):
+		lock = self.room_locks[room_key]
+		if not lock.acquire(blocking=False):
+			self.contended += 1
+			lock.acquire()
+
+	def unlock_room(self, room_key):
+		self.room_locks[room_key].release()
+
+	def add_quest_item(self, item):
+		with self.team_lock:
+			self.quest_mask |= QUEST_ITEM_BITS[item]
+
+	def has_all_quest_items(self):
+		return self.quest_mask == ALL_QUEST_ITEMS_MASK
+
+	# This records the first player to win. It returns True if that was this player.
+	def claim_win(self, name):
+		with self.team_lock:
+			if self.winner is None:
+				self.winner = name
+				return True
+			return False
+
+
+# This is one player's session in a shared world. The changes from GameSession are all about
+# holding the right room's lock and about another player having got somewhere first.
+class SharedGameSession(GameSession):
+	def __init__(self, shared, name, **kwargs):
+		self.shared = shared
+		self.name = name
+		shared.lock_room(START_LOCATION)
+		try:
+			super().__init__(world=shared.world(), **kwargs)
+		finally:
+			shared.unlock_room(START_LOCATION)
+
+	def feed(self, line):
+		self.shared.lock_room(self.current_location)
+		try:
+			super().feed(line)
+		finally:
+			self.shared.unlock_room(self.current_location)
+
+	# The player lets go of the room they're leaving before taking the one they're going into.
+	def move_to(self, location):
+		self.shared.unlock_room(self.current_location)
+		self.shared.lock_room(location)
+		super().move_to(location)
+
+	def begin_turn(self):
+		winner = self.shared.winner
+		if winner is not None and winner != self.name:
+			self.say(f"\n{winner} has reached Mr. Ton Drump with the last of the components. Your team wins!")
+			self.end_game('win')
+			return
+		super().begin_turn()
+
+	def show_turn_status(self):
+		super().show_turn_status()
+		found = bin(self.shared.quest_mask).count('1')
+		self.say(f"> Team Progress: {COLORS['yellow']}{found} of {len(QUEST_ITEMS)}{COLORS['reset']} components found by your team.")
+
+	def has_all_quest_items(self):
+		return self.shared.has_all_quest_items()
+
+	def villain_encounter(self):
+		super().villain_encounter()
+		if self.outcome == 'win':
+			self.shared.claim_win(self.name)
+
+	def pick_up_item(self):
+		room = self.game_map[self.current_location]
+		if room['item'] is None:
+			self.say("> Another player got to it first.")
+			return None
+		item_in_room = super().pick_up_item()
+		self.shared.pickups.append((self.current_location, item_in_room, self.name))
+		if item_in_room in QUEST_ITEM_BITS:
+			self.shared.add_quest_item(item_in_room)
+		return item_in_room
+
+	# Another player can pacify the robot between this player's turns, which ends the fight.
+	def scan_robot(self, robot):
+		if robot is not None:
+			super().scan_robot(robot)
+
+	def finish_player_turn(self):
+		if self.game_map[self.current_location]['robot'] is None:
+			self.say("\n> Another player finished reprogramming the robot. The room is now safe.")
+			self.in_combat = False
+			self.begin_turn()
+			return
+		super().finish_player_turn()
+
+	def end_combat(self, result):
+		if result == 'win':
+			robot = self.game_map[self.current_location]['robot']
+			self.shared.pacified.append((self.current_location, robot['name'], self.name))
+		super().end_combat(result)
+
+
+# This bot keeps players crowding the same few rooms: it searches everywhere, takes everything,
+# always scans in a fight, and wanders to a random exit (or through the stairs and portals).
+class CrowdPolicy:
+	def __init__(self, rng):
+		self.rng = rng
+		self.searched = set()
+
+	def __call__(self, session):
+		phase = session.phase
+		if phase == 'command':
+			location = session.current_location
+			if location not in self.searched:
+				self.searched.add(location)
+				return 'SEARCH'
+			if self.rng.random() < 0.2:
+				self.searched.discard(location)
+			return self.rng.choice(list(session.game_map[location]['exits']))
+		if phase == 'get_item':
+			return 'yes'
+		if phase == 'use_exit':
+			return self.rng.choice(('yes', 'no'))
+		if phase == 'combat':
+			return '1'
+		return session.choices[-1]
+
+
+# This plays one player's games on the shared world until it's won or the commands run out.
+# A crash in any player's thread is kept in errors, so the stress test fails on it.
+def play_crowd(shared, name, seed, max_commands, sessions, errors):
+	try:
+		play_crowd_games(shared, name, seed, max_commands, sessions)
+	except Exception as error:
+		errors.append(f"{name}: {error!r}")
+
+
+def play_crowd_games(shared, name, seed, max_commands, sessions):
+	rng = random.Random(seed)
+	policy = CrowdPolicy(rng)
+	session = SharedGameSession(shared, name, quiet=True, seed=seed)
+	sessions.append(session)
+	while session.commands < max_commands and shared.winner is None:
+		if session.finished:
+			# A player who lost starts again in the same world, so the crowd stays big.
+			session = SharedGameSession(shared, name, quiet=True, seed=rng.getrandbits(64))
+			sessions.append(session)
+			policy = CrowdPolicy(rng)
+			continue
+		session.feed(policy(session))
+
+
+# This checks that nothing was handed out twice: every item is either still in its room or in
+# exactly one player's inventory, every robot is either still there or was pacified exactly once,
+# and the team's components are the ones the players picked up. It returns a list of problems.
+def audit(shared, original, sessions):
+	problems = []
+	game_map = shared.game_map
+	picked = Counter(item for room_key, item, name in shared.pickups)
+	held = Counter()
+	for session in sessions:
+		for item in session.inventory.names():
+			if item not in STARTING_ITEMS:
+				held[item] += 1
+	for room_key, (item, robot) in original.items():
+		if item is not None:
+			still_there = game_map[room_key]['item'] == item
+			if still_there + picked[item] != 1 or held[item] > picked[item]:
+				problems.append(f"{item}: {'in its room, ' if still_there else ''}picked up {picked[item]} times, held {held[item]} times")
+		if robot is not None:
+			credits = sum(1 for pacified_room, name, player in shared.pacified if pacified_room == room_key)
+			still_there = game_map[room_key]['robot'] is not None
+			if still_there + credits != 1:
+				problems.append(f"{robot} in the {room_key}: pacified {credits} times, {'still' if still_there else 'not'} there")
+	team = 0
+	for item in picked:
+		if item in QUEST_ITEM_BITS:
+			team |= QUEST_ITEM_BITS[item]
+	if team != shared.quest_mask:
+		problems.append(f"team components {shared.quest_mask:07b}, but the players picked up {team:07b}")
+	return problems
+
+
+def stress(players, max_commands, seed, global_lock):
+	rng = random.Random(seed)
+	world = setup_game(rng)
+	original = {room_key: (room['item'], room['robot']['name'] if room['robot'] else None)
+	            for room_key, room in world[0].items()}
+	shared = SharedWorld(world, global_lock=global_lock)
+	sessions = []
+	errors = []
+	threads = [threading.Thread(target=play_crowd, args=(shared, f"Player {i + 1}", rng.getrandbits(64), max_commands,
+	                                                     sessions, errors))
+	           for i in range(players)]
+	start = time.perf_counter()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.perf_counter() - start
+	commands = sum(session.commands for session in sessions)
+	return shared, errors + audit(shared, original, sessions), commands, elapsed
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Stress test a shared world: many players in the same rooms at once.")
+	parser.add_argument('--players', type=int, default=64)
+	parser.add_argument('--commands', type=int, default=500, help="commands per player")
+	parser.add_argument('--rounds', type=int, default=50, help="shared worlds to play through")
+	parser.add_argument('--seed', type=int, default=1)
+	parser.add_argument('--switch-interval', type=float, default=1e-5,
+	                    help="seconds between thread switches (small values shake out more races)")
+	args = parser.parse_args()
+
+	sys.setswitchinterval(args.switch_interval)
+	failed = False
+	for global_lock in (False, True):
+		label = "one global lock" if global_lock else "a lock per room"
+		commands = elapsed = contended = wins = pickups = pacified = 0
+		for round_number in range(args.rounds):
+			shared, problems, played, seconds = stress(args.players, args.commands, args.seed + round_number, global_lock)
+			commands += played
+			elapsed += seconds
+			contended += shared.contended
+			wins += shared.winner is not None
+			pickups += len(shared.pickups)
+			pacified += len(shared.pacified)
+			for problem in problems:
+				print(f"  PROBLEM (world {round_number + 1}): {problem}")
+				failed = True
+		print(f"{label:<16} {args.players} players x {args.rounds} worlds: {commands:,} commands in {elapsed:.2f}s "
+		      f"({commands / elapsed:,.0f}/s), {contended:,} waits for a busy room, "
+		      f"{pickups} pickups, {pacified} robots pacified, {wins} team wins")
+	print("FAILED" if failed else "OK: no crashes, and every item and robot was handed out at most once")
+	if failed:
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
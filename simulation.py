@@ -0,0 +1,349 @@
+# Headless batch simulator for Dr. Eaton vs. Ton Drump.
+# It plays complete games with no input(), print() or time.sleep() calls, using a bot "policy"
+# to answer every prompt, and can spread the games over a pool of worker processes.
+#
+# Example:  python simulation.py --games 100000 --policy greedy --processes 8
+
+import argparse
+import multiprocessing
+import random
+import time
+from collections import deque
+
+from Dr_Eaton_vs_Ton_Drump import FOCUS_VIALS, GameSession, setup_game, stairs_destination, walking_routes
+from building import setup_building_game
+from solvability import setup_fair_game
+from world import setup_compact_game
+
+# This caps how many commands a bot gets per game, so a wandering bot can't run forever.
+DEFAULT_MAX_COMMANDS = 2000
+
+
+# Every bot makes its random choices with its own generator (see make_policy()), so a bot game can
+# be played again from its seed.
+
+# This policy answers every prompt with a random valid choice.
+class RandomPolicy:
+	def __init__(self, rng=None):
+		self.rng = rng if rng is not None else random.Random()
+
+	def __call__(self, session):
+		if session.choices is not None:
+			return self.rng.choice(session.choices)
+		room = session.game_map[session.current_location]
+		return self.rng.choice(list(room['exits']) + ['SEARCH', 'USE'])
+
+
+# This policy plays like a sensible player: it searches every room once, picks everything up,
+# walks to the nearest room it hasn't searched yet and spends its starting items in combat.
+class GreedyPolicy:
+	def __init__(self, rng=None):
+		self.rng = rng if rng is not None else random.Random()
+		self.searched = set()
+		self.take_exit = False
+		self.wanted_item = None
+
+	def __call__(self, session):
+		phase = session.phase
+		if phase == 'command':
+			return self.choose_command(session)
+		if phase == 'get_item':
+			return 'yes'
+		if phase == 'use_exit':
+			take_exit = self.take_exit
+			self.take_exit = False
+			return 'yes' if take_exit else 'no'
+		if phase == 'combat':
+			return self.choose_combat_action(session)
+		if phase == 'use_item':
+			return self.choose_item(session)
+		return session.choices[0]
+
+	def choose_command(self, session):
+		location = session.current_location
+		if location not in self.searched:
+			self.searched.add(location)
+			return 'SEARCH'
+
+		step = self.next_step(session)
+		if step in ('STAIRS', 'PORTAL'):
+			# Stairs and portals are only offered at the end of a search, so search again and say yes.
+			self.take_exit = True
+			return 'SEARCH'
+		return step
+
+	# This looks up the closest room that hasn't been searched yet in the world's route table.
+	def next_step(self, session):
+		game_map = session.game_map
+		start = session.current_location
+		routes = walking_routes(game_map)
+		goal = routes.nearest(start, [location for location in game_map if location not in self.searched])
+		if goal is not None:
+			return routes.first_step[start][goal]
+
+		# Every room we can walk to has been searched, so just wander (stairs and portals included)
+		# until the villain's office turns up. A portal can sit on top of the only staircase.
+		options = [direction for direction, _ in stair_and_exit_links(game_map, start)]
+		if game_map[start]['special_exit'] == 'Portal':
+			options.append('PORTAL')
+		return self.rng.choice(options)
+
+	def choose_combat_action(self, session):
+		stats = session.player_stats
+		robot = session.game_map[session.current_location]['robot']
+		ready = session.inventory.usable
+
+		if stats['focus'] <= robot['max_focus_drain']:
+			if 'Civility Charm' in ready:
+				self.wanted_item = 'Civility Charm'
+				return '2'
+			if 'Golden Parachute' in ready:
+				self.wanted_item = 'Golden Parachute'
+				return '2'
+		if robot['corruption'] >= 4 and 'Executive Order' in ready and not stats['overclock_active']:
+			self.wanted_item = 'Executive Order'
+			return '2'
+		return '1'
+
+	def choose_item(self, session):
+		for i, item in enumerate(session.usable_items):
+			if item.name == self.wanted_item:
+				self.wanted_item = None
+				return str(i + 1)
+		# The item we wanted isn't there any more, so cancel.
+		return str(len(session.usable_items) + 1)
+
+
+# This policy plays like GreedyPolicy, but once one more hit could finish it and the Civility Charm
+# is gone, it drinks a Focus vial before reaching for the Golden Parachute. Like a player, it doesn't
+# know what a vial does until it drinks it, so the vial effects change how well it does.
+class VialPolicy(GreedyPolicy):
+	def choose_combat_action(self, session):
+		stats = session.player_stats
+		robot = session.game_map[session.current_location]['robot']
+		ready = session.inventory.usable
+		if stats['focus'] <= robot['max_focus_drain'] and 'Civility Charm' not in ready:
+			for vial in FOCUS_VIALS:
+				if vial in ready:
+					self.wanted_item = vial
+					return '2'
+		return super().choose_combat_action(session)
+
+
+# This policy explores like GreedyPolicy but fights by the optimal-play table from combat_solver.py.
+# The table is loaded (or solved and cached) the first time a process builds one of these bots.
+class OptimalPolicy(GreedyPolicy):
+	table = None
+
+	def __init__(self, rng=None):
+		super().__init__(rng)
+		if OptimalPolicy.table is None:
+			import combat_solver
+			OptimalPolicy.table = combat_solver.load_or_build()
+
+	def choose_combat_action(self, session):
+		advice = self.table.lookup_session(session)
+		# With no robot left to look up (a shared world), scanning just finishes the turn.
+		if advice is None:
+			return '1'
+		action, _ = advice
+		if action == 'scan':
+			return '1'
+		if action == 'forfeit':
+			return '3'
+		self.wanted_item = action
+		return '2'
+
+
+# This policy plays back a fixed list of commands, then quits.
+class ScriptedPolicy:
+	def __init__(self, commands=(), rng=None):
+		self.commands = deque(commands)
+
+	def __call__(self, session):
+		if self.commands:
+			return self.commands.popleft()
+		if session.choices is not None:
+			return session.choices[-1]
+		return 'EXIT'
+
+
+# These are the ways to build a world. Compact worlds are cheaper to set up and much smaller,
+# but every room lookup goes through a view, so full games play faster on classic worlds.
+WORLD_SETUPS = {
+	'classic': setup_game,
+	'compact': setup_compact_game,
+	'building': setup_building_game,
+	'fair': setup_fair_game,
+}
+
+# This is the registry of policies, so worker processes can build them by name.
+POLICIES = {
+	'random': RandomPolicy,
+	'greedy': GreedyPolicy,
+	'vials': VialPolicy,
+	'optimal': OptimalPolicy,
+	'scripted': ScriptedPolicy,
+}
+
+
+# This yields (direction, room) pairs for the ordinary exits of a room plus its staircase, if any.
+# The staircase shows up with the direction 'STAIRS'.
+def stair_and_exit_links(game_map, location):
+	room = game_map[location]
+	for direction, neighbour in room['exits'].items():
+		yield direction, neighbour
+	stairs_to = stairs_destination(room)
+	if stairs_to is not None:
+		yield 'STAIRS', stairs_to
+
+
+# This builds a fresh policy from either a name or a (name, keyword arguments) pair. With a seed
+# (the game's), the bot's choices come from a generator seeded from it, so the game seed alone
+# replays the whole bot game. The seed is turned into a string first, so the bot's generator
+# doesn't roll the same numbers as the game's.
+def make_policy(policy_spec, seed=None):
+	rng = random.Random(None if seed is None else f"bot {seed}")
+	if isinstance(policy_spec, str):
+		return POLICIES[policy_spec](rng=rng)
+	name, kwargs = policy_spec
+	return POLICIES[name](rng=rng, **kwargs)
+
+
+# This plays one complete game with no I/O and returns a small dictionary describing how it went.
+def play_headless(policy, max_commands=DEFAULT_MAX_COMMANDS, world_setup=setup_game, seed=None):
+	session = GameSession(quiet=True, seed=seed, world_setup=world_setup)
+	while not session.finished and session.commands < max_commands:
+		session.feed(policy(session))
+	return {
+		'outcome': session.outcome or 'timeout',
+		'turns': session.turns,
+		'commands': session.commands,
+		'focus': session.player_stats['focus'],
+	}
+
+
+# This is an empty set of running totals. Workers send these back instead of per-game results
+# so that millions of games don't have to be shipped between processes.
+def new_totals():
+	return {
+		'games': 0,
+		'outcomes': {'win': 0, 'lose': 0, 'quit': 0, 'timeout': 0},
+		'turns': 0,
+		'commands': 0,
+		'win_turns': 0,
+		'min_turns': None,
+		'max_turns': 0,
+	}
+
+
+# This adds one game's result to a set of running totals.
+def add_result(totals, result):
+	turns = result['turns']
+	totals['games'] += 1
+	totals['outcomes'][result['outcome']] += 1
+	totals['turns'] += turns
+	totals['commands'] += result['commands']
+	if result['outcome'] == 'win':
+		totals['win_turns'] += turns
+	if totals['min_turns'] is None or turns < totals['min_turns']:
+		totals['min_turns'] = turns
+	totals['max_turns'] = max(totals['max_turns'], turns)
+
+
+# This merges the totals from one worker into the overall totals.
+def merge_totals(totals, other):
+	totals['games'] += other['games']
+	for outcome, count in other['outcomes'].items():
+		totals['outcomes'][outcome] += count
+	for key in ('turns', 'commands', 'win_turns'):
+		totals[key] += other[key]
+	if other['min_turns'] is not None and (totals['min_turns'] is None or other['min_turns'] < totals['min_turns']):
+		totals['min_turns'] = other['min_turns']
+	totals['max_turns'] = max(totals['max_turns'], other['max_turns'])
+
+
+# This plays a chunk of games in one process and returns their totals.
+def run_chunk(games, policy_spec, max_commands=DEFAULT_MAX_COMMANDS, world='classic'):
+	totals = new_totals()
+	world_setup = WORLD_SETUPS[world]
+	for _ in range(games):
+		seed = random.getrandbits(64)
+		add_result(totals, play_headless(make_policy(policy_spec, seed), max_commands, world_setup, seed))
+	return totals
+
+
+# Each worker reseeds the random module, which picks the game seeds. Forked workers would
+# otherwise all inherit the same random state from the parent and play identical games.
+def _seed_worker():
+	random.seed()
+
+
+def _run_chunk_args(args):
+	return run_chunk(*args)
+
+
+# This runs a batch of games, split into chunks over a pool of worker processes,
+# and returns the combined totals with a few summary statistics added.
+def run_batch(games, policy_spec='greedy', processes=None, chunk_size=1000, max_commands=DEFAULT_MAX_COMMANDS,
+              world='classic'):
+	start_time = time.perf_counter()
+	chunks = [chunk_size] * (games // chunk_size)
+	if games % chunk_size:
+		chunks.append(games % chunk_size)
+
+	totals = new_totals()
+	if processes == 1:
+		for chunk in chunks:
+			merge_totals(totals, run_chunk(chunk, policy_spec, max_commands, world))
+	else:
+		with multiprocessing.Pool(processes, initializer=_seed_worker) as pool:
+			jobs = [(chunk, policy_spec, max_commands, world) for chunk in chunks]
+			for chunk_totals in pool.imap_unordered(_run_chunk_args, jobs):
+				merge_totals(totals, chunk_totals)
+
+	elapsed = time.perf_counter() - start_time
+	return summarize(totals, elapsed)
+
+
+# This turns the raw totals into the statistics people actually want to read.
+def summarize(totals, elapsed):
+	games = totals['games']
+	wins = totals['outcomes']['win']
+	summary = dict(totals)
+	summary['elapsed_seconds'] = elapsed
+	summary['games_per_hour'] = games / elapsed * 3600 if elapsed else 0.0
+	summary['win_rate'] = wins / games if games else 0.0
+	summary['loss_rate'] = totals['outcomes']['lose'] / games if games else 0.0
+	summary['mean_turns'] = totals['turns'] / games if games else 0.0
+	summary['mean_turns_to_win'] = totals['win_turns'] / wins if wins else 0.0
+	return summary
+
+
+def print_summary(summary):
+	print(f"Games played:      {summary['games']}")
+	for outcome, count in summary['outcomes'].items():
+		print(f"  {outcome:<8} {count:>10}")
+	print(f"Win rate:          {summary['win_rate']:.2%}")
+	print(f"Loss rate:         {summary['loss_rate']:.2%}")
+	print(f"Mean turns:        {summary['mean_turns']:.1f} (min {summary['min_turns']}, max {summary['max_turns']})")
+	print(f"Mean turns to win: {summary['mean_turns_to_win']:.1f}")
+	print(f"Elapsed:           {summary['elapsed_seconds']:.2f}s ({summary['games_per_hour']:,.0f} games/hour)")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Run headless games of Dr. Eaton vs. Ton Drump.")
+	parser.add_argument('--games', type=int, default=10000)
+	parser.add_argument('--policy', choices=sorted(POLICIES), default='greedy')
+	parser.add_argument('--processes', type=int, default=None, help="worker processes (default: one per core)")
+	parser.add_argument('--chunk-size', type=int, default=1000)
+	parser.add_argument('--max-commands', type=int, default=DEFAULT_MAX_COMMANDS)
+	parser.add_argument('--world', choices=sorted(WORLD_SETUPS), default='classic')
+	args = parser.parse_args()
+
+	summary = run_batch(args.games, args.policy, args.processes, args.chunk_size, args.max_commands, args.world)
+	print_summary(summary)
+
+
+if __name__ == "__main__":
+	main()
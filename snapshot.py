@@ -0,0 +1,441 @@
+# Save/restore snapshots for Dr. Eaton vs. Ton Drump sessions.
+#
+# A snapshot is the complete state of a GameSession between two commands, packed into a few
+# kilobytes of bytes: the world (who and what is left in each room), the player, the inventory,
+# the question the session is waiting on (including the middle of a Reprogramming Sequence) and
+# the exact state of the session's random generator, so a restored game carries on precisely
+# as the original would have.
+#
+# The static parts of a game (the map layout, item descriptions, robot stats) are never stored;
+# they are rebuilt from the game's own tables on restore. Text the front end hasn't taken yet
+# with take_output() is not stored either, so take a snapshot after the output is sent.
+#
+# SnapshotStore keeps hibernated sessions as snapshots, in memory or as files in a directory,
+# so an idle player costs a few kilobytes instead of a whole live session.
+#
+# Snapshot layout (all numbers little endian):
+#   b'DGS' | version (1 byte) | flags (1 byte) | seed (8 bytes) | focus (2 bytes, signed)
+#   | location | villain | phase | outcome (1 byte each) | turns, commands (varints)
+#   | potion effects (1 signed byte per focus vial)
+#   | per room: item code, robot code, special exit code (1 byte each)
+#   | corruption (1 signed byte per robot) | searched rooms (4 byte bitmask by room id)
+#   | inventory count, then 1 byte per item
+#   | prompt (token byte, or 0xFF + varint length + UTF-8) | random generator state (625 x 4 bytes)
+#   | [gauss_next (8 byte double)] | [command log, as in replay.py]
+#
+# Example:  python snapshot.py     (checks restored games play on identically and times them)
+
+import argparse
+import os
+import random
+import struct
+import time
+import tracemalloc
+from array import array
+
+from Dr_Eaton_vs_Ton_Drump import (FOCUS_VIALS, ITEM_DESCRIPTIONS, MAP_LAYOUT, QUEST_ITEMS, ROBOTS, STARTING_ITEMS,
+                                   GameSession, Inventory, InventoryItem)
+from replay import LITERAL, decode_commands, encode_commands, read_varint, write_varint
+from world import ITEM_NAMES as WORLD_ITEM_NAMES
+from world import SPECIAL_EXIT_NAMES, TOPOLOGY, OverlayMap, WorldOverlay
+
+SNAPSHOT_MAGIC = b'DGS'
+# Bump this whenever the layout changes. Snapshots from other versions are refused.
+SNAPSHOT_VERSION = 2
+
+# These are the flag bits.
+COMPACT_WORLD = 1
+IN_COMBAT = 2
+FINISHED = 4
+LOGIC_FILTER = 8
+OVERCLOCK = 16
+SUBPOENA = 32
+RECORDING = 64
+GAUSS_NEXT = 128
+
+# Rooms are numbered in MAP_LAYOUT order (the same order as the compact world's topology).
+ROOM_NAMES = TOPOLOGY.room_names
+ROOM_IDS = TOPOLOGY.room_ids
+
+# Every item the player can hold gets a code, in the same order as the compact world's item ids so
+# its room bytes can be copied as they are. In the room bytes 0 means "no item", so a room stores
+# the code plus one. In the inventory bytes, the top bit marks a used starting item.
+ITEM_NAMES = WORLD_ITEM_NAMES + tuple(STARTING_ITEMS)
+ITEM_CODES = {name: code for code, name in enumerate(ITEM_NAMES)}
+USED = 0x80
+
+ROBOT_NAMES = tuple(robot['name'] for robot in ROBOTS)
+ROBOT_CODES = {name: code for code, name in enumerate(ROBOT_NAMES)}
+
+PHASES = (None, 'command', 'get_item', 'use_exit', 'use_item', 'combat')
+OUTCOMES = (None, 'win', 'lose', 'quit')
+
+# These are the prompts that never change, stored as one byte. Never reorder this table.
+PROMPTS = ("> What do you do? ", "> Choose (1, 2, or 3): ", "> Use which item?: ",
+           "> You see a grand, winding staircase. Use it? (YES/NO): ",
+           "> A shimmering portal hums in the corner. Enter it? (YES/NO): ", "> Choose (1, 2, 3, or 4): ")
+PROMPT_CODES = {prompt: code for code, prompt in enumerate(PROMPTS)}
+
+HEADER = struct.Struct('<3sBBQhBBBB')
+# This is the Mersenne Twister's 624 words of state plus its position.
+RNG_STATE = struct.Struct('<625I')
+
+
+# This is the list of answers each phase accepts. The item menu's depends on how many items are on
+# it, and the combat menu has a fourth option when there's an advisor.
+def phase_choices(phase, usable_count, advisor=None):
+	if phase in ('get_item', 'use_exit'):
+		return ['yes', 'no']
+	if phase == 'combat':
+		return ['1', '2', '3', '4'] if advisor is not None else ['1', '2', '3']
+	if phase == 'use_item':
+		return [str(i + 1) for i in range(usable_count + 1)]
+	return None
+
+
+# This packs a session into a snapshot.
+def snapshot_session(session):
+	stats = session.player_stats
+	game_map = session.game_map
+	compact = isinstance(game_map, OverlayMap)
+	version, rng_state, gauss_next = session.rng.getstate()
+
+	flags = ((COMPACT_WORLD if compact else 0) | (IN_COMBAT if session.in_combat else 0) |
+	         (FINISHED if session.finished else 0) | (LOGIC_FILTER if stats['logic_filter_active'] else 0) |
+	         (OVERCLOCK if stats['overclock_active'] else 0) | (SUBPOENA if stats['subpoena_active'] else 0) |
+	         (RECORDING if session.command_log is not None else 0) | (GAUSS_NEXT if gauss_next is not None else 0))
+	buffer = bytearray(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, session.seed, stats['focus'],
+	                               ROOM_IDS[session.current_location], ROOM_IDS[session.villain_location],
+	                               PHASES.index(session.phase), OUTCOMES.index(session.outcome)))
+	write_varint(buffer, session.turns)
+	write_varint(buffer, session.commands)
+	buffer += array('b', [session.potion_map[vial] for vial in FOCUS_VIALS]).tobytes()
+
+	# This is every room's item, robot and special exit, plus what's left of every robot's corruption.
+	corruption = array('b', [robot['corruption'] for robot in ROBOTS])
+	if compact:
+		overlay = game_map.overlay
+		buffer += overlay.items
+		buffer += overlay.robots
+		buffer += overlay.special_exits
+		corruption = overlay.corruption
+	else:
+		items = bytearray(len(ROOM_NAMES))
+		robots = bytearray(len(ROOM_NAMES))
+		special_exits = bytearray(len(ROOM_NAMES))
+		for room_id, room_name in enumerate(ROOM_NAMES):
+			room = game_map[room_name]
+			if room['item'] is not None:
+				items[room_id] = ITEM_CODES[room['item']] + 1
+			robot = room['robot']
+			if robot is not None:
+				robot_code = ROBOT_CODES[robot['name']]
+				robots[room_id] = robot_code + 1
+				corruption[robot_code] = robot['corruption']
+			special_exits[room_id] = SPECIAL_EXIT_NAMES.index(room['special_exit'])
+		buffer += items
+		buffer += robots
+		buffer += special_exits
+	buffer += corruption.tobytes()
+	buffer += sum(1 << ROOM_IDS[room_name] for room_name in session.searched).to_bytes(4, 'little')
+
+	buffer.append(len(session.inventory))
+	for item in session.inventory:
+		buffer.append(ITEM_CODES[item.name] | (USED if item.used else 0))
+
+	prompt = session.prompt or ''
+	code = PROMPT_CODES.get(prompt)
+	if code is not None:
+		buffer.append(code)
+	else:
+		text = prompt.encode('utf-8')
+		buffer.append(LITERAL)
+		write_varint(buffer, len(text))
+		buffer += text
+
+	buffer += RNG_STATE.pack(*rng_state)
+	if gauss_next is not None:
+		buffer += struct.pack('<d', gauss_next)
+	if session.command_log is not None:
+		encode_commands(buffer, session.command_log)
+	return bytes(buffer)
+
+
+# This rebuilds the world's game_map, the same shape setup_game() (or setup_compact_game()) makes.
+def restore_world(compact, items, robots, special_exits, corruption, villain, potion_effects):
+	if compact:
+		return OverlayMap(WorldOverlay(bytearray(items), bytearray(robots), corruption, bytearray(special_exits),
+		                               villain, potion_effects))
+
+	game_map = {}
+	for room_id, room_name in enumerate(ROOM_NAMES):
+		layout = MAP_LAYOUT[room_name]
+		robot = None
+		if robots[room_id]:
+			robot_code = robots[room_id] - 1
+			robot = dict(ROBOTS[robot_code])
+			robot['corruption'] = corruption[robot_code]
+		game_map[room_name] = {'exits': layout['exits'], 'room_name': layout['room_name'],
+		                       'special_exit': SPECIAL_EXIT_NAMES[special_exits[room_id]],
+		                       'item': ITEM_NAMES[items[room_id] - 1] if items[room_id] else None,
+		                       'robot': robot, 'villain': room_id == villain}
+	return game_map
+
+
+# This unpacks a snapshot into a live session, ready for its next feed().
+def restore_session(data, odds=None, quiet=False, advisor=None):
+	magic, version, flags, seed, focus, location, villain, phase, outcome = HEADER.unpack_from(data)
+	if magic != SNAPSHOT_MAGIC:
+		raise ValueError("not a game snapshot")
+	if version != SNAPSHOT_VERSION:
+		raise ValueError(f"snapshot version {version} is not supported (expected {SNAPSHOT_VERSION})")
+	turns, position = read_varint(data, HEADER.size)
+	commands, position = read_varint(data, position)
+
+	potion_effects = array('b', data[position:position + len(FOCUS_VIALS)])
+	position += len(FOCUS_VIALS)
+	room_count = len(ROOM_NAMES)
+	items = data[position:position + room_count]
+	robots = data[position + room_count:position + 2 * room_count]
+	special_exits = data[position + 2 * room_count:position + 3 * room_count]
+	position += 3 * room_count
+	corruption = array('b', data[position:position + len(ROBOTS)])
+	position += len(ROBOTS)
+	searched_mask = int.from_bytes(data[position:position + 4], 'little')
+	position += 4
+
+	inventory = Inventory(starting_items=())
+	for _ in range(data[position]):
+		position += 1
+		code = data[position]
+		name = ITEM_NAMES[code & ~USED]
+		item = InventoryItem(name, starting=name in STARTING_ITEMS)
+		inventory.add_item(item)
+		if code & USED:
+			inventory.use(name)
+	position += 1
+
+	prompt_code = data[position]
+	position += 1
+	if prompt_code == LITERAL:
+		length, position = read_varint(data, position)
+		prompt = bytes(data[position:position + length]).decode('utf-8')
+		position += length
+	else:
+		prompt = PROMPTS[prompt_code]
+
+	rng_state = RNG_STATE.unpack_from(data, position)
+	position += RNG_STATE.size
+	gauss_next = None
+	if flags & GAUSS_NEXT:
+		gauss_next = struct.unpack_from('<d', data, position)[0]
+		position += 8
+	command_log = None
+	if flags & RECORDING:
+		command_log, position = decode_commands(data, position)
+
+	# The session is put together field by field, because GameSession() would build and start a new game.
+	session = GameSession.__new__(GameSession)
+	session.quiet = quiet
+	session.output = []
+	session.odds = odds
+	session.advisor = advisor
+	session.seed = seed
+	# setstate() overwrites the whole generator, so there's no point seeding it first.
+	session.rng = random.Random.__new__(random.Random)
+	session.rng.setstate((3, rng_state, gauss_next))
+	session.command_log = command_log
+	session.game_map = restore_world(flags & COMPACT_WORLD, items, robots, special_exits, corruption, villain,
+	                                 tuple(potion_effects))
+	session.villain_location = ROOM_NAMES[villain]
+	session.potion_map = dict(zip(FOCUS_VIALS, potion_effects))
+	session.player_stats = {
+		'focus': focus,
+		'logic_filter_active': bool(flags & LOGIC_FILTER),
+		'overclock_active': bool(flags & OVERCLOCK),
+		'subpoena_active': bool(flags & SUBPOENA)
+	}
+	session.inventory = inventory
+	session.quest_items_to_win = list(QUEST_ITEMS)
+	session.item_descriptions = ITEM_DESCRIPTIONS
+	session.current_location = ROOM_NAMES[location]
+	session.searched = {room_name for room_id, room_name in enumerate(ROOM_NAMES) if searched_mask >> room_id & 1}
+	session.portal_route_table = None
+	session.phase = PHASES[phase]
+	session.in_combat = bool(flags & IN_COMBAT)
+	session.usable_items = inventory.usable_items() if session.phase == 'use_item' else []
+	session.show_status = True
+	session.prompt = prompt if session.phase is not None else None
+	session.choices = phase_choices(session.phase, len(session.usable_items), advisor)
+	session.turns = turns
+	session.commands = commands
+	session.finished = bool(flags & FINISHED)
+	session.outcome = OUTCOMES[outcome]
+	return session
+
+
+# This makes an independent copy of a live session without packing it into bytes, for forking one
+# session many times in memory (fuzzer.py). Only the parts of a session that change during a game are
+# copied; the rest (the exits, the vial effects, the choices) is shared with the original. Getting the
+# generator's state is the slowest part, so a caller copying the same session over and over can pass
+# rng_state (the session's rng.getstate()) in.
+def copy_session(session, rng_state=None):
+	copy = GameSession.__new__(GameSession)
+	copy.__dict__.update(session.__dict__)
+	copy.output = []
+	copy.rng = random.Random.__new__(random.Random)
+	copy.rng.setstate(rng_state if rng_state is not None else session.rng.getstate())
+	if session.command_log is not None:
+		copy.command_log = list(session.command_log)
+
+	game_map = session.game_map
+	if isinstance(game_map, OverlayMap):
+		overlay = game_map.overlay
+		copy.game_map = OverlayMap(WorldOverlay(bytearray(overlay.items), bytearray(overlay.robots),
+		                                        array('b', overlay.corruption), overlay.special_exits,
+		                                        overlay.villain, overlay.potion_effects))
+	else:
+		copy.game_map = {}
+		for room_key, room in game_map.items():
+			room = dict(room)
+			if room['robot'] is not None:
+				room['robot'] = dict(room['robot'])
+			copy.game_map[room_key] = room
+
+	inventory = Inventory.__new__(Inventory)
+	inventory.__dict__.update(session.inventory.__dict__)
+	# Only a starting item that hasn't been used yet can change (found items are removed when they're
+	# used), so every other item is shared.
+	inventory.index = dict(session.inventory.index)
+	for name, item in inventory.index.items():
+		if item.starting and not item.used:
+			inventory.index[name] = InventoryItem(name, starting=True)
+	inventory.usable = dict(session.inventory.usable)
+	copy.inventory = inventory
+	copy.usable_items = [inventory.index[item.name] for item in session.usable_items]
+	copy.player_stats = dict(session.player_stats)
+	copy.searched = set(session.searched)
+	return copy
+
+
+# This holds hibernated sessions as snapshots under a key. With a directory, every snapshot is
+# a file there; without one, snapshots stay in memory as bytes.
+class SnapshotStore:
+	def __init__(self, directory=None):
+		self.directory = directory
+		self.snapshots = {}
+		self.hibernated = 0
+		self.woken = 0
+		if directory is not None:
+			os.makedirs(directory, exist_ok=True)
+
+	def path(self, key):
+		return os.path.join(self.directory, f"{key}.dgsnap")
+
+	def __len__(self):
+		if self.directory is None:
+			return len(self.snapshots)
+		return sum(1 for name in os.listdir(self.directory) if name.endswith('.dgsnap'))
+
+	# This snapshots a session and stores it. The caller should drop its own reference to the session.
+	def hibernate(self, key, session):
+		data = snapshot_session(session)
+		if self.directory is None:
+			self.snapshots[key] = data
+		else:
+			with open(self.path(key), 'wb') as snapshot_file:
+				snapshot_file.write(data)
+		self.hibernated += 1
+		return len(data)
+
+	# This restores a hibernated session and removes its snapshot from the store.
+	def wake(self, key, odds=None, quiet=False, advisor=None):
+		if self.directory is None:
+			data = self.snapshots.pop(key)
+		else:
+			with open(self.path(key), 'rb') as snapshot_file:
+				data = snapshot_file.read()
+			os.remove(self.path(key))
+		self.woken += 1
+		return restore_session(data, odds, quiet, advisor)
+
+	# This throws a snapshot away, for players who disconnect while hibernated.
+	def discard(self, key):
+		if self.directory is None:
+			self.snapshots.pop(key, None)
+		elif os.path.exists(self.path(key)):
+			os.remove(self.path(key))
+
+
+# This plays random commands on a session, on restored copies of it taken every turn and on
+# copy_session() copies, and returns how many snapshots were checked. A mismatch raises AssertionError.
+def check_round_trips(games, world_setup, rng):
+	checked = 0
+	for _ in range(games):
+		session = GameSession(seed=rng.getrandbits(64), world_setup=world_setup, record=True)
+		session.take_output()
+		while not session.finished and session.commands < 400:
+			copy = restore_session(snapshot_session(session))
+			assert snapshot_session(copy) == snapshot_session(session)
+			fork = copy_session(session)
+			assert snapshot_session(fork) == snapshot_session(session)
+			if session.choices is not None:
+				command = rng.choice(session.choices)
+			else:
+				command = rng.choice(['NORTH', 'SOUTH', 'EAST', 'WEST', 'SEARCH', 'SEARCH', 'USE', 'HINT'])
+			session.feed(command)
+			copy.feed(command)
+			fork.feed(command)
+			output = session.take_output()
+			assert copy.take_output() == output
+			assert fork.take_output() == output
+			checked += 1
+	return checked
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Check and time session snapshots.")
+	parser.add_argument('--games', type=int, default=200, help="random games to check snapshots against")
+	parser.add_argument('--repeat', type=int, default=20000, help="snapshot/restore calls to time")
+	args = parser.parse_args()
+
+	from world import setup_compact_game
+	from Dr_Eaton_vs_Ton_Drump import setup_game
+
+	rng = random.Random(1)
+	for label, world_setup in (('classic', setup_game), ('compact', setup_compact_game)):
+		checked = check_round_trips(args.games, world_setup, rng)
+		print(f"{label}: {checked} snapshots restored and played on identically")
+
+	# This times a session in the middle of its first fight (or on its first turn if it starts safe).
+	session = GameSession(quiet=True, seed=7)
+	data = snapshot_session(session)
+	start = time.perf_counter()
+	for _ in range(args.repeat):
+		snapshot_session(session)
+	snapshot_time = (time.perf_counter() - start) / args.repeat
+	start = time.perf_counter()
+	for _ in range(args.repeat):
+		restore_session(data)
+	restore_time = (time.perf_counter() - start) / args.repeat
+	start = time.perf_counter()
+	for _ in range(args.repeat):
+		copy_session(session)
+	copy_time = (time.perf_counter() - start) / args.repeat
+
+	tracemalloc.start()
+	before = tracemalloc.take_snapshot()
+	live = [GameSession(quiet=True) for _ in range(1000)]
+	after = tracemalloc.take_snapshot()
+	tracemalloc.stop()
+	live_bytes = sum(stat.size_diff for stat in after.compare_to(before, 'filename')) / len(live)
+
+	print(f"snapshot size   {len(data):>8,} bytes")
+	print(f"live session    {live_bytes:>8,.0f} bytes")
+	print(f"snapshot        {snapshot_time * 1e6:>8.1f} us")
+	print(f"restore         {restore_time * 1e6:>8.1f} us")
+	print(f"copy in memory  {copy_time * 1e6:>8.1f} us")
+
+
+if __name__ == "__main__":
+	main()
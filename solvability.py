@@ -0,0 +1,319 @@
+# World solvability checker for Dr. Eaton vs. Ton Drump.
+#
+# setup_game() places everything at random, so some worlds can't be won at all (Mr. Ton Drump's
+# office cuts off a quest component, since walking in there ends the game) and some are very
+# hard (the components sit behind the toughest robots, with nothing nearby to restore Focus).
+# check_world() looks at a world before anyone plays it:
+#
+#   - Reachability: can every quest component, and then the villain's office, be reached from the
+#     start without walking through the office? Stairs count. Portals count too (a portal can drop
+#     the player in any room but the office, so it counts as a way into all of them), but a world
+#     that can only be finished through one is needs_portal, not solvable: where a portal drops the
+#     player is down to luck, so it isn't fair to count on it.
+#   - Focus: which robots does the cheapest collection route have to fight, and how much Focus do
+#     those fights cost in a bad case, against the Focus the player has plus whatever restores it
+#     along that route?
+#
+# Every room is one bit of an integer, so reachability is a few bitwise ORs, and every set of
+# robots the route could fight is tried (there are only 64 for the six robots). The cost of a fight
+# is worked out exactly, as a distribution of Focus lost when scanning every turn; the cost of a
+# route is the FOCUS_COST_PERCENTILE point of the sum of its fights. The real worst case (a 1 on
+# every scan, the biggest hit every turn) costs 80 Focus for all six robots, which no world could pass.
+#
+# Generated buildings (building.py) are far too big for the robot search, so they only get the
+# reachability check, on foot and one room at a time. Their Focus isn't checked.
+#
+# setup_fair_game() is setup_game() with rejection sampling: it keeps drawing worlds from the same
+# generator until one passes, so a seed still gives the same world every time.
+#
+# Example:  python solvability.py --worlds 20000
+
+import argparse
+import random
+import time
+from collections import deque
+
+import Dr_Eaton_vs_Ton_Drump as game
+from Dr_Eaton_vs_Ton_Drump import ITEM_CATALOG, QUEST_ITEM_BITS, START_LOCATION, setup_game, stairs_destination
+
+# A route's cost is the Focus its fights take at this point of their combined distribution,
+# so a world passes if the player gets through its fights at least 999 times in 1000.
+FOCUS_COST_PERCENTILE = 0.999
+
+# This is how many worlds setup_fair_game() draws before it gives up.
+MAX_TRIES = 1000
+
+# The starting items that restore Focus are always there. The wildcards that restore it and the
+# Logic Filter (which blocks one robot's attack) only help if the route passes their rooms.
+STARTING_RESTORE = sum(entry['effect']['amount'] for entry in ITEM_CATALOG
+                       if entry['kind'] == 'starting' and entry.get('effect', {}).get('type') == 'restore_focus')
+RESTORE_ITEMS = {entry['name']: entry['effect']['amount'] for entry in ITEM_CATALOG
+                 if entry['kind'] == 'wildcard' and entry.get('effect', {}).get('type') == 'restore_focus'}
+BLOCKING_ITEMS = [entry['name'] for entry in ITEM_CATALOG
+                  if entry['kind'] == 'wildcard' and entry.get('effect', {}).get('flag') == 'logic_filter_active']
+
+# These are the results of check_world(). Only solvable worlds are fair.
+SOLVABLE, NEEDS_PORTAL, CUT_OFF, TOO_HARD = 'solvable', 'needs_portal', 'cut_off', 'too_hard'
+
+
+# This is the distribution of Focus lost in one fight against a robot, as {focus_lost: chance},
+# when the player scans every turn: each scan takes 1 to scan_max corruption, and every turn the
+# robot survives it drains 1 to max_focus_drain Focus.
+def fight_cost(corruption, max_focus_drain, scan_max):
+	roll_chance = 1.0 / scan_max
+	costs = {0: {0: 1.0}}
+	for left in range(1, corruption + 1):
+		outcome = {}
+		for progress in range(1, scan_max + 1):
+			if progress >= left:
+				outcome[0] = outcome.get(0, 0.0) + roll_chance
+				continue
+			for lost, chance in costs[left - progress].items():
+				for drain in range(1, max_focus_drain + 1):
+					outcome[lost + drain] = outcome.get(lost + drain, 0.0) + roll_chance * chance / max_focus_drain
+		costs[left] = outcome
+	return costs[corruption]
+
+
+# These are the costs of every fight and every route worked out so far, keyed by the robots'
+# (corruption, max_focus_drain) and the sides on the scan's die. There are only a few dozen
+# different sets of robots.
+FIGHT_COSTS = {}
+ROUTE_COSTS = {}
+
+
+# This returns the Focus a set of fights costs at FOCUS_COST_PERCENTILE. The robots are a sorted
+# tuple of (corruption, max_focus_drain) pairs.
+def route_cost(robots, scan_max):
+	cost = ROUTE_COSTS.get((robots, scan_max))
+	if cost is not None:
+		return cost
+	total = {0: 1.0}
+	for robot in robots:
+		fight = FIGHT_COSTS.get((robot, scan_max))
+		if fight is None:
+			fight = FIGHT_COSTS[robot, scan_max] = fight_cost(*robot, scan_max)
+		combined = {}
+		for lost, chance in total.items():
+			for more, more_chance in fight.items():
+				combined[lost + more] = combined.get(lost + more, 0.0) + chance * more_chance
+		total = combined
+	seen = 0.0
+	cost = max(total)
+	for lost in sorted(total):
+		seen += total[lost]
+		if seen >= FOCUS_COST_PERCENTILE:
+			cost = lost
+			break
+	ROUTE_COSTS[robots, scan_max] = cost
+	return cost
+
+
+# This is what check_world() found out about a world.
+class Verdict:
+	def __init__(self, result, needs_portal=False, robots=(), focus_cost=0, focus_budget=0):
+		self.result = result
+		self.needs_portal = needs_portal  # True if the route only works through a portal.
+		self.robots = robots  # The rooms whose robots the cheapest route fights.
+		self.focus_cost = focus_cost
+		self.focus_budget = focus_budget
+
+	@property
+	def fair(self):
+		return self.result == SOLVABLE
+
+	def __repr__(self):
+		return (f"Verdict({self.result}, needs_portal={self.needs_portal}, robots={list(self.robots)}, "
+		        f"focus_cost={self.focus_cost}, focus_budget={self.focus_budget})")
+
+
+# This spreads reached out from the rooms in frontier, moving only through rooms in allowed. It
+# returns every room (as bits) it gets to, and every room next to those: the nearby rooms so far,
+# plus the neighbours of each room it spreads from.
+def flood(reached, frontier, allowed, adjacency, nearby=0):
+	while frontier:
+		spread = 0
+		while frontier:
+			low = frontier & -frontier
+			spread |= adjacency[low.bit_length() - 1]
+			frontier ^= low
+		nearby |= spread
+		frontier = spread & allowed & ~reached
+		reached |= frontier
+	return reached, nearby
+
+
+# This is the reachability check for a generated building: a breadth-first search on foot from
+# the start that never goes into the office, like count_reachable() in building.py.
+def check_building(building):
+	seen = bytearray(building.room_count)
+	seen[building.start] = 1
+	seen[building.villain] = 1
+	queue = deque([building.start])
+	office_found = False
+	while queue:
+		room = queue.popleft()
+		for _, neighbour in building.walking_links(room):
+			if neighbour == building.villain:
+				office_found = True
+			elif not seen[neighbour]:
+				seen[neighbour] = 1
+				queue.append(neighbour)
+	if office_found and all(seen[room] for room, item in building.items.items() if item in QUEST_ITEM_BITS):
+		return Verdict(SOLVABLE)
+	return Verdict(CUT_OFF)
+
+
+def check_world(world):
+	game_map, villain_location, potion_map = world
+	if hasattr(game_map, 'building'):
+		return check_building(game_map.building)
+
+	# These are the same links as route_links(), with every room's neighbours as one bitmask.
+	room_bits = {room_key: 1 << index for index, room_key in enumerate(game_map)}
+	office = room_bits[villain_location]
+	open_rooms = (1 << len(room_bits)) - 1 & ~office
+	walking = []
+	portal_rooms = quest_rooms = robot_rooms = blocking_rooms = 0
+	robots = {}
+	restores = {}
+	for room_key, room in game_map.items():
+		bit = room_bits[room_key]
+		neighbours = 0
+		for neighbour in room['exits'].values():
+			neighbours |= room_bits[neighbour]
+		stairs_to = stairs_destination(room)
+		if stairs_to is not None:
+			neighbours |= room_bits[stairs_to]
+		elif room.get('special_exit') == 'Portal':
+			portal_rooms |= bit
+		walking.append(neighbours)
+
+		item = room['item']
+		if item in QUEST_ITEM_BITS:
+			quest_rooms |= bit
+		elif item in RESTORE_ITEMS:
+			restores[bit] = RESTORE_ITEMS[item]
+		elif item in potion_map and potion_map[item] > 0:
+			restores[bit] = potion_map[item]
+		elif item in BLOCKING_ITEMS:
+			blocking_rooms |= bit
+		robot = room['robot']
+		if robot is not None:
+			robot_rooms |= bit
+			robots[bit] = (room_key, (robot['corruption'], robot['max_focus_drain']))
+	portals = [neighbours | open_rooms if portal_rooms >> index & 1 else neighbours
+	           for index, neighbours in enumerate(walking)]
+
+	# This is the reachability check, with every robot fought and nothing else in the way.
+	start = room_bits[START_LOCATION]
+
+	def collects_everything(reached, nearby):
+		return quest_rooms & ~reached == 0 and nearby & office
+
+	if not collects_everything(*flood(start, start, open_rooms, portals)):
+		return Verdict(CUT_OFF)
+	needs_portal = not collects_everything(*flood(start, start, open_rooms, walking))
+	adjacency = portals if needs_portal else walking
+
+	# This looks for the set of robots to fight that leaves the most Focus spare. Fighting a robot
+	# the player can't get to yet changes nothing, so the search only ever adds a robot next to the
+	# rooms reached so far, and spreads out from its room. Fights only ever cost more as robots are
+	# added, so once a set costs more than the best spare plus every restore in the world, nothing
+	# that adds to it can do better.
+	# The balance constants are read from the game each time, so a balance sweep's changes count.
+	scan_max = game.SCAN_ROLL_MAX
+	starting_budget = game.STARTING_FOCUS + STARTING_RESTORE
+	most_budget = starting_budget + sum(restores.values())
+	most_blocked = max(stats[1] for room_key, stats in robots.values()) if robots and blocking_rooms else 0
+	best = None
+	reached, nearby = flood(start, start, open_rooms & ~robot_rooms, adjacency)
+	queue = deque([(0, (), reached, nearby)])  # Fewest fights first, so a good answer turns up early.
+	seen = {0}
+	while queue:
+		fought, stats, reached, nearby = queue.popleft()
+		cost = route_cost(stats, scan_max)
+		if best is not None and most_budget - cost + most_blocked <= best[0]:
+			continue
+		if collects_everything(reached, nearby):
+			if fought and reached & blocking_rooms:
+				cost -= max(max_focus_drain for corruption, max_focus_drain in stats)
+			budget = starting_budget
+			if restores:
+				budget += sum(amount for bit, amount in restores.items() if reached & bit)
+			if best is None or budget - cost > best[0]:
+				best = (budget - cost, fought, cost, budget)
+
+		next_robots = nearby & robot_rooms & ~fought
+		while next_robots:
+			robot_bit = next_robots & -next_robots
+			next_robots ^= robot_bit
+			now_fought = fought | robot_bit
+			if now_fought in seen:
+				continue
+			seen.add(now_fought)
+			allowed = open_rooms & ~(robot_rooms & ~now_fought)
+			now_stats = tuple(sorted(stats + (robots[robot_bit][1],)))
+			queue.append((now_fought, now_stats, *flood(reached | robot_bit, robot_bit, allowed, adjacency, nearby)))
+
+	spare, fought, cost, budget = best
+	fought_rooms = [robots[bit][0] for bit in robots if fought & bit]
+	# The player needs at least 1 Focus left at the end, so the cost must stay under the budget.
+	if spare <= 0:
+		result = TOO_HARD
+	elif needs_portal:
+		result = NEEDS_PORTAL
+	else:
+		result = SOLVABLE
+	return Verdict(result, needs_portal, fought_rooms, cost, budget)
+
+
+def is_fair(world):
+	return check_world(world).fair
+
+
+# This is setup_game() (or another world_setup) with the unfair worlds thrown away.
+def setup_fair_game(rng=random, world_setup=setup_game):
+	for _ in range(MAX_TRIES):
+		world = world_setup(rng)
+		if is_fair(world):
+			return world
+	raise RuntimeError(f"no fair world in {MAX_TRIES} tries")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Check how many generated worlds are solvable and what rejecting the rest costs.")
+	parser.add_argument('--worlds', type=int, default=20000)
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args()
+
+	rng = random.Random(args.seed)
+	worlds = [setup_game(rng) for _ in range(args.worlds)]
+	results = {SOLVABLE: 0, NEEDS_PORTAL: 0, CUT_OFF: 0, TOO_HARD: 0}
+	start = time.perf_counter()
+	for world in worlds:
+		results[check_world(world).result] += 1
+	checking = time.perf_counter() - start
+
+	print(f"{args.worlds:,} worlds from setup_game():")
+	for result, count in results.items():
+		print(f"  {result:<12} {count:>8,} ({count / args.worlds:.1%})")
+	print(f"check_world(): {checking / args.worlds * 1e6:.1f}us per world")
+
+	rng = random.Random(args.seed)
+	start = time.perf_counter()
+	for _ in range(args.worlds):
+		setup_game(rng)
+	plain = time.perf_counter() - start
+	rng = random.Random(args.seed)
+	start = time.perf_counter()
+	for _ in range(args.worlds):
+		setup_fair_game(rng)
+	fair = time.perf_counter() - start
+	print(f"setup_game():      {plain / args.worlds * 1e6:8.1f}us per world")
+	print(f"setup_fair_game(): {fair / args.worlds * 1e6:8.1f}us per world ({fair / plain:.1f}x, "
+	      f"{args.worlds / results[SOLVABLE]:.2f} candidates per world)")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,249 @@
+# Status updates for remote clients of Dr. Eaton vs. Ton Drump, sent as changes instead of screens.
+#
+# A telnet player gets the whole status block at the start of every turn: the room, Focus, quest
+# progress, the full inventory, the Logic Filter line and the controls. Most of it hasn't changed
+# since the last turn. A client that says hello with DELTA_HELLO (at the "Press Enter" prompt)
+# gets no status blocks. Instead, just before each prompt, the server sends one line with the
+# fields that changed since the last one it sent, and the client draws the status block itself:
+#
+#   \x1e{"full":1,"room":"Vestibule","focus":15,"quest":0,"goal":7,"filter":0,"inv":["Civility Charm (Ready)", ...]}
+#   \x1e{"room":"Den"}
+#   \x1e{"focus":11,"inv":[1,1,["Executive Order (Used)"]]}
+#
+# Every update line starts with the ASCII record separator (STATUS_MARK), so it can't be mistaken
+# for the game's text. The first update of each game has "full" and every field. After that, the
+# inventory changes as a splice, [start, how many to delete, [labels to insert]], which covers
+# picking something up, using it up and marking a starting item Used. Everything else is text, as before.
+#
+# Examples:  python status_protocol.py client --port 4000     (the reference client)
+#            python status_protocol.py report --games 500      (bytes per turn, with and without)
+
+import argparse
+import asyncio
+import json
+import sys
+
+from Dr_Eaton_vs_Ton_Drump import COLORS, CONTROLS_LINE, GameSession, strip_ansi
+from replay import WORLD_SETUPS, record_bot_games
+
+STATUS_MARK = '\x1e'
+DELTA_HELLO = STATUS_MARK + 'hello delta 1'
+
+# Every prompt the server sends ends with one of these and is not followed by a newline.
+PROMPT_ENDINGS = ('? ', ': ', '...')
+
+
+# This is everything the status block shows, as plain values. In a shared world (shared_world.py)
+# that includes the team's progress.
+def status_fields(session):
+	player_stats = session.player_stats
+	fields = {
+		'room': session.game_map[session.current_location]['room_name'],
+		'focus': player_stats['focus'],
+		'quest': session.inventory.quest_count,
+		'goal': len(session.quest_items_to_win),
+		'filter': int(player_stats['logic_filter_active']),
+		'inv': [item.label() for item in session.inventory],
+	}
+	shared = getattr(session, 'shared', None)
+	if shared is not None:
+		fields['team'] = bin(shared.quest_mask).count('1')
+	return fields
+
+
+# This is the smallest single splice that turns the list old into new.
+def splice(old, new):
+	start = 0
+	limit = min(len(old), len(new))
+	while start < limit and old[start] == new[start]:
+		start += 1
+	end = 0
+	while end < limit - start and old[-1 - end] == new[-1 - end]:
+		end += 1
+	return [start, len(old) - start - end, new[start:len(new) - end]]
+
+
+# This is the update that turns the fields a client has (None for nothing yet) into the new ones.
+def status_update(old, new):
+	if old is None:
+		return dict(new, full=1)
+	update = {}
+	for key, value in new.items():
+		if value != old[key]:
+			update[key] = splice(old[key], value) if key == 'inv' else value
+	return update
+
+
+# This applies an update to a client's copy of the fields and returns the new copy.
+def apply_update(fields, update):
+	if 'full' in update:
+		fields = dict(update)
+		del fields['full']
+		return fields
+	for key, value in update.items():
+		if key == 'inv':
+			start, deleted, inserted = value
+			fields['inv'][start:start + deleted] = inserted
+		else:
+			fields[key] = value
+	return fields
+
+
+def encode_update(update):
+	return STATUS_MARK + json.dumps(update, separators=(',', ':'))
+
+
+def decode_update(line):
+	return json.loads(line[len(STATUS_MARK):])
+
+
+# This is the server's end of one connection: it remembers what the client was last sent.
+class StatusChannel:
+	def __init__(self):
+		self.sent = None
+
+	# This starts over for a new game, so its first update is a full one.
+	def reset(self):
+		self.sent = None
+
+	# This returns the update line for the session's status now, or None if nothing changed.
+	def update_line(self, session):
+		fields = status_fields(session)
+		update = status_update(self.sent, fields)
+		self.sent = fields
+		if not update:
+			return None
+		return encode_update(update)
+
+
+# This draws the status block from the fields, the way show_status() does on the server.
+def render_status(fields, out=print):
+	out("\n---------------------------------------------------------------")
+	out(f"> You are in the: {COLORS['cyan']}{fields['room']}{COLORS['reset']}")
+	out(f"> Your Focus: {COLORS['green']}{fields['focus']}{COLORS['reset']}")
+	out(f"> Quest Progress: {COLORS['yellow']}{fields['quest']} of {fields['goal']}{COLORS['reset']} components found.")
+	out(f"> Inventory: {COLORS['yellow']}{fields['inv']}{COLORS['reset']}")
+	if fields['filter']:
+		out(f"> {COLORS['magenta']}Status{COLORS['reset']}: Logic Filter is {COLORS['magenta']}ACTIVE{COLORS['reset']}")
+	out(CONTROLS_LINE)
+	if 'team' in fields:
+		out(f"> Team Progress: {COLORS['yellow']}{fields['team']} of {fields['goal']}{COLORS['reset']} components found by your team.")
+
+
+# This is the reference client. It prints the game's text as it arrives, keeps its own copy of
+# the status fields up to date from the update lines, and draws the status block whenever they change.
+async def run_client(host, port, color):
+	reader, writer = await asyncio.open_connection(host, port)
+	loop = asyncio.get_running_loop()
+	fields = None
+	said_hello = False
+	buffer = ''
+
+	def show(text):
+		sys.stdout.write(text if color else strip_ansi(text))
+
+	while True:
+		chunk = await reader.read(65536)
+		if not chunk:
+			break
+		buffer += chunk.decode('utf-8', errors='replace').replace('\r\n', '\n')
+		lines = buffer.split('\n')
+		buffer = lines.pop()
+		for line in lines:
+			if line.startswith(STATUS_MARK):
+				fields = apply_update(fields, decode_update(line))
+				render_status(fields, lambda text: show(text + '\n'))
+			else:
+				show(line + '\n')
+		# Whatever's left without a newline is either a prompt or the first part of a line still on its way.
+		if buffer.endswith(PROMPT_ENDINGS) and not buffer.startswith(STATUS_MARK):
+			show(buffer)
+			buffer = ''
+			sys.stdout.flush()
+			answer = await loop.run_in_executor(None, sys.stdin.readline)
+			if not answer:
+				break
+			answer = answer.rstrip('\n')
+			if not said_hello:
+				# The first prompt is "Press Enter to begin", which is where the client says hello.
+				answer = DELTA_HELLO
+				said_hello = True
+			writer.write((answer + '\r\n').encode())
+		sys.stdout.flush()
+	writer.close()
+
+
+# This is how many bytes StreamIO puts on the wire for a line of text.
+def wire_bytes(text):
+	return len((text.replace('\n', '\r\n') + '\r\n').encode())
+
+
+# This replays a recorded game with its text on and counts the bytes a telnet player would get,
+# with status blocks (the way the server always did) or with update lines instead.
+def measure(record, delta):
+	session = GameSession(seed=record.seed, world_setup=WORLD_SETUPS[record.world], status_screens=not delta)
+	channel = StatusChannel()
+	text = status = 0
+	for command in record.commands + [None]:
+		for line in session.take_output():
+			if isinstance(line, str):
+				text += wire_bytes(line)
+		if session.finished or command is None:
+			break
+		if delta:
+			update = channel.update_line(session)
+			if update is not None:
+				status += wire_bytes(update)
+		text += len(session.prompt.encode())
+		session.feed(command)
+	return text, status, session.turns
+
+
+# This compares the two ways of sending the status over the same recorded bot games.
+def report(games, policy, world):
+	records = record_bot_games(games, policy, world)
+	turns = screens_text = delta_text = delta_status = 0
+	for record in records:
+		text, _, game_turns = measure(record, False)
+		screens_text += text
+		turns += game_turns
+		text, status, _ = measure(record, True)
+		delta_text += text
+		delta_status += status
+	status_blocks = screens_text - delta_text
+	print(f"{games:,} {policy} games, {turns:,} turns")
+	print(f"  status blocks  {status_blocks / turns:8.1f} bytes/turn")
+	print(f"  status updates {delta_status / turns:8.1f} bytes/turn "
+	      f"({1 - delta_status / status_blocks:.1%} less)")
+	print(f"  everything sent: {screens_text / turns:.1f} bytes/turn with status blocks, "
+	      f"{(delta_text + delta_status) / turns:.1f} with updates "
+	      f"({1 - (delta_text + delta_status) / screens_text:.1%} less)")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Status updates as changes: the reference client and a bytes report.")
+	subcommands = parser.add_subparsers(dest='command', required=True)
+
+	client_parser = subcommands.add_parser('client', help="play on a game_server.py with status updates")
+	client_parser.add_argument('--host', default='localhost')
+	client_parser.add_argument('--port', type=int, default=4000)
+	client_parser.add_argument('--color', choices=['auto', 'always', 'never'], default='auto')
+
+	report_parser = subcommands.add_parser('report', help="compare the bytes sent per turn with and without updates")
+	report_parser.add_argument('--games', type=int, default=500)
+	report_parser.add_argument('--policy', default='greedy')
+	report_parser.add_argument('--world', choices=sorted(WORLD_SETUPS), default='classic')
+
+	args = parser.parse_args()
+	if args.command == 'client':
+		color = {'auto': sys.stdout.isatty(), 'always': True, 'never': False}[args.color]
+		try:
+			asyncio.run(run_client(args.host, args.port, color))
+		except KeyboardInterrupt:
+			pass
+	else:
+		report(args.games, args.policy, args.world)
+
+
+if __name__ == "__main__":
+	main()
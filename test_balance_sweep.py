@@ -0,0 +1,97 @@
+# Tests for the balance sweeps in balance_sweep.py.
+
+import csv
+import random
+import sys
+
+import pytest
+
+import balance_sweep
+import Dr_Eaton_vs_Ton_Drump as game
+from balance_sweep import (BASE_POTION_EFFECTS, BASE_ROBOTS, ConfigResult, apply_balance, configurations,
+                           play_batch, potions_list, run_sweep, wilson_interval, write_csv)
+
+BASE_CONFIG = {'starting_focus': game.STARTING_FOCUS, 'scan_max': game.SCAN_ROLL_MAX, 'corruption_offset': 0,
+               'drain_offset': 0, 'potions': tuple(BASE_POTION_EFFECTS)}
+
+
+# apply_balance() changes the game module itself, so every test puts the game's values back afterwards.
+@pytest.fixture(autouse=True)
+def balance(monkeypatch):
+	for name in ('STARTING_FOCUS', 'SCAN_ROLL_MAX', 'POTION_EFFECTS', 'ROBOTS'):
+		monkeypatch.setattr(game, name, getattr(game, name))
+
+
+def test_configurations_change_the_games_constants():
+	apply_balance(dict(BASE_CONFIG, starting_focus=9, scan_max=7, corruption_offset=-100, drain_offset=2,
+	                   potions=(1, 2, 3)))
+	assert game.STARTING_FOCUS == 9 and game.SCAN_ROLL_MAX == 7 and game.POTION_EFFECTS == [1, 2, 3]
+	assert all(robot['corruption'] == 1 for robot in game.ROBOTS)
+	assert [robot['max_focus_drain'] for robot in game.ROBOTS] == [
+		robot['max_focus_drain'] + 2 for robot in BASE_ROBOTS]
+	apply_balance(BASE_CONFIG)
+	assert game.ROBOTS == BASE_ROBOTS
+
+
+def test_wilson_intervals():
+	assert wilson_interval(0, 0) == (0.0, 1.0)
+	low, high = wilson_interval(50, 100)
+	assert low < 0.5 < high and high - 0.5 == pytest.approx(0.5 - low)
+	assert wilson_interval(0, 100)[0] == 0.0 and wilson_interval(100, 100)[1] == pytest.approx(1.0)
+	wider = wilson_interval(5, 10)
+	assert wider[1] - wider[0] > high - low
+
+
+@pytest.mark.parametrize('games, wins, target, stopped', (
+	(100, 50, None, None),  # not enough games yet
+	(4000, 2000, None, 'settled'),
+	(400, 40, 0.5, 'off target'),
+	(400, 200, 0.5, None),  # close to the target, but not settled
+	(1000, 500, None, 'max games'),
+))
+def test_configurations_stop_when_their_win_rate_is_known(games, wins, target, stopped):
+	result = ConfigResult(BASE_CONFIG)
+	result.add(games, wins, games - wins, 10 * games)
+	result.check(min_games=400, max_games=1000, precision=0.02, target=target, tolerance=0.05)
+	assert result.stopped == stopped
+
+
+def test_grids_and_samples():
+	values = {'starting_focus': [10, 15], 'scan_max': [4, 5, 6], 'corruption_offset': [0], 'drain_offset': [-1, 1],
+	          'potions': potions_list('5/3/-4,6/3/-4')}
+	grid = configurations(values)
+	assert len(grid) == 24
+	assert len({tuple(config.values()) for config in grid}) == 24
+	sample = configurations(values, 5, random.Random(1))
+	assert len(sample) == 5 and all(config in grid for config in sample)
+	assert configurations(values, 100) == grid
+
+
+# Every configuration plays the same seeds, so the same batch always gives the same results.
+def test_batches_are_repeatable_and_feel_the_balance():
+	same = play_batch(0, BASE_CONFIG, 7, 30, 'greedy', 2000)
+	assert play_batch(0, BASE_CONFIG, 7, 30, 'greedy', 2000) == same
+	easy = play_batch(1, dict(BASE_CONFIG, starting_focus=60, corruption_offset=-3), 7, 30, 'greedy', 2000)
+	hard = play_batch(2, dict(BASE_CONFIG, starting_focus=3, drain_offset=3), 7, 30, 'greedy', 2000)
+	assert easy[2] > same[2] > hard[2]
+
+
+def test_a_small_sweep_writes_its_csv(tmp_path):
+	configs = [BASE_CONFIG, dict(BASE_CONFIG, starting_focus=2, drain_offset=4)]
+	results = run_sweep(configs, processes=2, batch_size=20, min_games=40, max_games=60, precision=0.2)
+	assert all(result.stopped is not None and 40 <= result.games <= 60 for result in results)
+	path = tmp_path / 'sweep.csv'
+	write_csv(path, results)
+	with open(path, newline='') as csv_file:
+		rows = list(csv.DictReader(csv_file))
+	assert [int(row['starting_focus']) for row in rows] == [BASE_CONFIG['starting_focus'], 2]
+	assert rows[0]['potions'] == '/'.join(str(effect) for effect in BASE_POTION_EFFECTS)
+	assert float(rows[0]['win_rate']) > float(rows[1]['win_rate'])
+
+
+def test_the_greedy_bot_cant_sweep_vials(monkeypatch, capsys):
+	monkeypatch.setattr(sys, 'argv', ['balance_sweep.py', '--potions', '6/3/-4'])
+	with pytest.raises(SystemExit) as exit_info:
+		balance_sweep.main()
+	assert exit_info.value.code == 2
+	assert "--potions needs --policy vials" in capsys.readouterr().err
@@ -0,0 +1,90 @@
+# Tests for the benchmark suite in benchmark.py: its results, and how it spots regressions.
+
+import json
+import random
+import sys
+
+import pytest
+
+import benchmark
+from benchmark import best_of, find_regressions, percentile, run_suite, scripted_corpus
+
+TINY_SCALE = {'worlds': 20, 'fights_per_robot': 5, 'item_uses': 50, 'games': 3}
+
+
+def results(**metrics):
+	return {'commit': 'abc1234', 'metrics': metrics}
+
+
+def test_percentiles():
+	values = list(range(100))
+	assert percentile(values, 0.50) == 50
+	assert percentile(values, 0.99) == 99
+	assert percentile(values, 1.0) == 99
+	assert percentile([], 0.5) == 0.0
+
+
+# Rates keep their highest run, and times and sizes their lowest.
+def test_best_of_keeps_the_best_run_of_each_metric():
+	runs = iter([{'games_per_second': 10, 'turn_latency_p50_us': 30},
+	             {'games_per_second': 12, 'turn_latency_p50_us': 35},
+	             {'games_per_second': 11, 'turn_latency_p50_us': 25}])
+	assert best_of(lambda: next(runs), 3) == {'games_per_second': 12, 'turn_latency_p50_us': 25}
+
+
+def test_regressions_go_by_each_metrics_direction():
+	old = results(games_per_second=100.0, turn_latency_p50_us=10.0, turn_peak_bytes_p50=1000)
+	new = results(games_per_second=85.0, turn_latency_p50_us=12.0, turn_peak_bytes_p50=500)
+	assert [name for name, *_ in find_regressions(old, new)] == ['games_per_second', 'turn_latency_p50_us']
+	assert find_regressions(old, new, threshold=0.25) == []
+	faster = results(games_per_second=200.0, turn_latency_p50_us=5.0, turn_peak_bytes_p50=1000)
+	assert find_regressions(old, faster) == []
+
+
+def test_new_and_zero_metrics_are_not_regressions():
+	old = results(turn_kept_bytes_mean=0)
+	new = results(turn_kept_bytes_mean=64, setup_worlds_per_second=1.0)
+	assert find_regressions(old, new) == []
+
+
+def test_the_corpus_is_fixed_and_leaves_random_alone():
+	random.seed(11)
+	state = random.getstate()
+	first = scripted_corpus(3)
+	assert random.getstate() == state
+	assert [(record.seed, record.commands) for record in first] == [
+		(record.seed, record.commands) for record in scripted_corpus(3)]
+
+
+def test_a_tiny_suite_saves_as_json():
+	suite = run_suite(TINY_SCALE, repeat=1, log=lambda line: None)
+	saved = json.loads(json.dumps(suite))
+	assert saved['scale'] == TINY_SCALE and saved['repeat'] == 1
+	metrics = saved['metrics']
+	for name in ('setup_worlds_per_second', 'handle_use_item_calls_per_second', 'scripted_games_per_second',
+	             'turn_latency_p50_us', 'turn_latency_p99_us', 'turn_peak_bytes_p99'):
+		assert metrics[name] > 0
+	assert len([name for name in metrics if name.startswith('fights_per_second.')]) == len(benchmark.ROBOTS)
+
+
+def run_main(monkeypatch, tmp_path, old_metrics, new_metrics):
+	old_path = tmp_path / 'before.json'
+	old_path.write_text(json.dumps(results(**old_metrics)))
+	monkeypatch.setattr(benchmark, 'run_suite', lambda scale, repeat: results(**new_metrics))
+	monkeypatch.setattr(sys, 'argv', ['benchmark.py', '--quick', '--compare', str(old_path),
+	                                  '--output', str(tmp_path / 'after.json')])
+	benchmark.main()
+	return json.loads((tmp_path / 'after.json').read_text())
+
+
+def test_main_exits_with_status_1_on_a_regression(monkeypatch, tmp_path, capsys):
+	with pytest.raises(SystemExit) as exit_info:
+		run_main(monkeypatch, tmp_path, {'games_per_second': 100.0}, {'games_per_second': 50.0})
+	assert exit_info.value.code == 1
+	assert "REGRESSION games_per_second" in capsys.readouterr().out
+
+
+def test_main_passes_without_one(monkeypatch, tmp_path, capsys):
+	saved = run_main(monkeypatch, tmp_path, {'games_per_second': 100.0}, {'games_per_second': 95.0})
+	assert saved['metrics'] == {'games_per_second': 95.0}
+	assert "no metric got more than 10% worse" in capsys.readouterr().out
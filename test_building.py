@@ -0,0 +1,114 @@
+# Tests for the multi-floor buildings in building.py.
+
+import random
+
+import pytest
+
+from building import START_LOCATION, BuildingMap, count_reachable, generate_building
+
+
+def small_building(seed=1, floors=3, width=6, height=5):
+	return generate_building(random.Random(seed), floors, width, height)
+
+
+# Room names and room numbers have to turn into each other, for every room in the building.
+def test_room_names_and_numbers_are_inverse():
+	building = small_building()
+	names = set()
+	for room in range(building.room_count):
+		name = building.room_name(room)
+		assert building.room_id(name) == room
+		names.add(name)
+	assert len(names) == building.room_count
+	assert building.room_name(building.start) == START_LOCATION
+
+
+@pytest.mark.parametrize('name', ('Nowhere', 'Office 0-1', 'Office 4-1', 'Office 1-x', ''))
+def test_unknown_room_names_are_refused(name):
+	building = small_building()
+	assert not building.has_room(name)
+	with pytest.raises(KeyError):
+		building.room_id(name)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_every_room_is_reachable_on_foot(seed):
+	building = small_building(seed)
+	assert count_reachable(building) == building.room_count
+
+
+# Doors go both ways: if a room has a door to its neighbour, the neighbour has one back.
+def test_doors_go_both_ways():
+	building = small_building()
+	for room in range(building.room_count):
+		for _, neighbour in building.walking_links(room):
+			assert room in [back for _, back in building.walking_links(neighbour)]
+
+
+def test_items_and_the_villain_stay_out_of_the_start():
+	building = small_building()
+	assert building.villain != building.start
+	assert not building.is_stairs(building.villain)
+	assert building.start not in building.items
+	assert building.villain not in building.items
+
+
+def test_buildings_that_are_too_small_are_refused():
+	with pytest.raises(ValueError):
+		generate_building(random.Random(1), 1, 2, 2)
+
+
+# The walking routes run their search lazily, but have to agree with the doors.
+def test_walking_routes_follow_the_doors():
+	building = small_building()
+	game_map = BuildingMap(building)
+	routes = game_map.walking_routes()
+	for room in range(building.room_count):
+		name = building.room_name(room)
+		if room == building.start:
+			continue
+		step = routes.first_step[START_LOCATION][name]
+		assert step in game_map[START_LOCATION]['exits'] or step == 'STAIRS'
+		assert routes.distance[START_LOCATION][name] >= 1
+
+
+# Chunks are rebuilt from their own seeds, so a chunk that was thrown out comes back the same.
+def test_evicted_chunks_are_rebuilt_the_same():
+	building = generate_building(random.Random(3), 40, 10, 10, max_chunks=1)
+	first = building.chunk(0)
+	doors = bytes(first.doors), bytes(first.robots), bytes(first.special_exits)
+	evicted = building.chunks_evicted
+	building.chunk(building.room_count - 1)
+	assert len(building.chunks) == 1
+	assert building.chunks_evicted == evicted + 1
+	again = building.chunk(0)
+	assert again is not first
+	assert (bytes(again.doors), bytes(again.robots), bytes(again.special_exits)) == doors
+
+
+# A building with room for only a couple of chunks still has to be walkable end to end.
+def test_reachability_with_few_chunks_kept():
+	building = generate_building(random.Random(4), 30, 10, 10, max_chunks=2)
+	assert count_reachable(building) == building.room_count
+	assert building.chunks_evicted > 0
+	assert len(building.chunks) <= 2
+
+
+# What the player changes lives outside the chunks, so it survives eviction.
+def test_changes_survive_eviction():
+	building = generate_building(random.Random(5), 30, 10, 10, max_chunks=1)
+	room = next(room for room in range(building.room_count) if building.robot(room))
+	game_map = BuildingMap(building)
+	game_map[building.room_name(room)]['robot'] = None
+	building.chunk(building.room_count - 1)
+	assert building.robot(room) == 0
+	assert game_map[building.room_name(room)]['robot'] is None
+
+
+# Mr. Ton Drump's office is a dead end, so every other room (and every item in one) can be reached
+# without walking into it.
+@pytest.mark.parametrize('seed', range(60))
+def test_items_can_be_reached_without_the_office(seed):
+	building = generate_building(random.Random(seed))
+	assert len(building.walking_links(building.villain)) == 1
+	assert count_reachable(building, avoid=building.villain) == building.room_count - 1
@@ -0,0 +1,85 @@
+# Tests for the Monte Carlo combat odds tables in combat_odds.py.
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import Dr_Eaton_vs_Ton_Drump as game
+import combat_odds
+from combat_odds import CombatOddsTable, buff_index, build_table, load_or_build, simulate_robot
+from Dr_Eaton_vs_Ton_Drump import ROBOTS
+
+
+@pytest.fixture(scope='module')
+def table():
+	return build_table(samples=200, seed=1)
+
+
+def test_a_robot_on_its_last_point_always_loses():
+	wins, focus_lost, rounds = simulate_robot(3, 300, np.random.default_rng(0), max_corruption=4, max_focus=6)
+	assert (wins[0] == 1).all()
+	# Without the Civility Charm the first scan ends it, before the robot gets a turn.
+	no_charm = slice(0, combat_odds.CIVILITY_CHARM)
+	assert (focus_lost[0, :, no_charm] == 0).all()
+	assert (rounds[0, :, no_charm] == 1).all()
+
+
+def test_more_focus_and_less_corruption_never_hurt():
+	wins, _, _ = simulate_robot(4, 4000, np.random.default_rng(0), max_corruption=8, max_focus=12)
+	plain = wins[..., 0]
+	assert ((plain >= 0) & (plain <= 1)).all()
+	assert (np.diff(plain, axis=1) >= -0.05).all()
+	assert (np.diff(plain, axis=0) <= 0.05).all()
+	assert plain[-1, -1] > plain[-1, 0]
+
+
+def test_buffs_help():
+	wins, _, _ = simulate_robot(4, 4000, np.random.default_rng(0), max_corruption=8, max_focus=8)
+	for buff in (combat_odds.OVERCLOCK, combat_odds.SUBPOENA, combat_odds.LOGIC_FILTER,
+	             combat_odds.CIVILITY_CHARM):
+		assert wins[7, 3, buff] > wins[7, 3, 0]
+
+
+def test_the_same_seed_builds_the_same_table(table):
+	again = build_table(samples=200, seed=1)
+	assert np.array_equal(again.win_probability, table.win_probability)
+	assert np.array_equal(again.expected_focus_loss, table.expected_focus_loss)
+
+
+def test_lookups_stay_inside_the_table(table):
+	robot = ROBOTS[0]['name']
+	assert table.lookup(robot, 0, 0) == table.lookup(robot, 1, 1)
+	assert table.lookup(robot, 500, 500) == table.lookup(robot, combat_odds.MAX_CORRUPTION, combat_odds.MAX_FOCUS)
+	win, loss = table.lookup(robot, 1, 10, logic_filter=True)
+	assert win == 1.0 and loss == 0.0
+	cell = (0, 4, 9, buff_index(overclock=True, civility_charm=True))
+	assert table.lookup(robot, 5, 10, overclock=True, civility_charm=True) == (
+		pytest.approx(float(table.win_probability[cell])), pytest.approx(float(table.expected_focus_loss[cell])))
+
+
+def test_tables_load_back_the_same(table, tmp_path):
+	path = tmp_path / 'odds.npz'
+	table.save(path)
+	loaded = CombatOddsTable.load(path)
+	assert loaded.robot_names == table.robot_names
+	assert loaded.samples == table.samples and loaded.scan_max == table.scan_max
+	assert np.array_equal(loaded.win_probability, table.win_probability)
+	assert np.array_equal(loaded.mean_rounds, table.mean_rounds)
+
+
+# The cache is only reused while it still matches the game's robots and scan die.
+def test_stale_caches_are_rebuilt(table, tmp_path, monkeypatch):
+	path = tmp_path / 'odds.npz'
+	table.save(path)
+	assert np.array_equal(load_or_build(path, samples=100).win_probability, table.win_probability)
+	assert load_or_build(path, samples=300, seed=2).samples == 300
+	monkeypatch.setattr(game, 'SCAN_ROLL_MAX', game.SCAN_ROLL_MAX + 2)
+	rebuilt = load_or_build(path, samples=100, seed=2)
+	assert rebuilt.scan_max == game.SCAN_ROLL_MAX
+	assert CombatOddsTable.load(path).scan_max == game.SCAN_ROLL_MAX
+
+
+def test_broken_caches_are_rebuilt(tmp_path):
+	path = tmp_path / 'odds.npz'
+	path.write_bytes(b'not a table')
+	assert load_or_build(path, samples=50, seed=3).samples == 50
@@ -0,0 +1,76 @@
+# Tests for the optimal-play table in combat_solver.py and the game's ADVISOR option.
+
+from collections import deque
+
+import pytest
+
+pytest.importorskip('numpy')
+
+import combat_solver
+from Dr_Eaton_vs_Ton_Drump import GameSession
+
+
+@pytest.fixture(scope='module')
+def table():
+	return combat_solver.build_table()
+
+
+# This walks a new game into the nearest robot's room, keeping out of the office, and returns it
+# at the combat prompt.
+def session_in_a_fight(**kwargs):
+	for seed in range(100):
+		session = GameSession(quiet=True, seed=seed, **kwargs)
+		session.feed('')
+		game_map = session.game_map
+		paths = {session.current_location: []}
+		queue = deque([session.current_location])
+		path = None
+		while queue and path is None:
+			room_key = queue.popleft()
+			for direction, next_room in game_map[room_key]['exits'].items():
+				if next_room in paths or game_map[next_room]['villain']:
+					continue
+				paths[next_room] = paths[room_key] + [direction]
+				if game_map[next_room]['robot'] is not None:
+					path = paths[next_room]
+					break
+				queue.append(next_room)
+		if path is None:
+			continue
+		for direction in path:
+			session.feed(direction)
+		if session.in_combat:
+			return session
+	raise AssertionError("no world with a robot to walk to")
+
+
+# Asking the ADVISOR doesn't use the player's turn: the robot doesn't get to drain any Focus.
+def test_asking_the_advisor_is_free(table):
+	session = session_in_a_fight(advisor=table)
+	focus = session.player_stats['focus']
+	corruption = session.game_map[session.current_location]['robot']['corruption']
+	session.quiet = False
+	session.take_output()
+	session.feed('4')
+	text = ''.join(line for line in session.take_output() if isinstance(line, str))
+	assert 'ADVISOR' in text
+	assert "Robot's Turn" not in text
+	assert session.player_stats['focus'] == focus
+	assert session.game_map[session.current_location]['robot']['corruption'] == corruption
+	assert session.in_combat
+	assert session.phase == 'combat'
+	assert session.choices == ['1', '2', '3', '4']
+
+
+def test_the_table_has_a_move_for_every_fight(table):
+	session = session_in_a_fight(advisor=table)
+	action, chance = table.lookup_session(session)
+	assert action == 'scan' or action == 'forfeit' or action in session.inventory
+	assert 0.0 <= chance <= 1.0
+
+
+# More Focus never makes a fight harder to win.
+def test_more_focus_is_never_worse(table):
+	for drain in table.drains:
+		chances = [table.lookup(drain, 10, focus)[1] for focus in range(1, 20)]
+		assert chances == sorted(chances)
@@ -0,0 +1,69 @@
+# Tests for the gameplay event logs and streaming report in events.py.
+
+import random
+
+from events import analyse, append_events, game_events, read_events, record_bot_events, replay_game
+from instrumentation import instrument, uninstrument
+from replay import record_bot_games
+
+
+# Every game's turns come in order, and its last line is the one about the whole game.
+def test_bot_games_log_their_turns(tmp_path):
+	path = tmp_path / 'events.jsonl'
+	random.seed(1)
+	record_bot_events(path, 10)
+	games = {}
+	for event in read_events(path):
+		games.setdefault(event['game'], []).append(event)
+	assert len(games) == 10
+	for events in games.values():
+		*turns, end = events
+		assert 'end' in end
+		assert end['turns'] == len(turns)
+		assert [turn['turn'] for turn in turns] == list(range(1, len(turns) + 1))
+		assert all(turn['commands'] for turn in turns[:-1])
+
+
+# A game's events are the same whether the game was just played or replayed from its record.
+def test_replayed_games_end_like_the_recorded_ones():
+	random.seed(2)
+	for record in record_bot_games(10, 'greedy'):
+		end = game_events(record)[-1]
+		assert end['end'] == (record.outcome or 'timeout')
+		assert end['turns'] == record.turns
+
+
+# A writer killed halfway through a line leaves a broken last line, which the reader skips.
+def test_broken_lines_are_skipped(tmp_path):
+	path = tmp_path / 'events.jsonl'
+	append_events(path, [{'game': 1, 'turn': 1, 'room': 'Vestibule', 'commands': ['SEARCH']}])
+	with open(path, 'a') as event_file:
+		event_file.write('{"game":1,"tu')
+	assert list(read_events(path)) == [{'game': 1, 'turn': 1, 'room': 'Vestibule', 'commands': ['SEARCH']}]
+
+
+def test_the_report_counts_every_game_and_turn(tmp_path):
+	path = tmp_path / 'events.jsonl'
+	random.seed(3)
+	records = record_bot_games(20, 'greedy')
+	for record in records:
+		append_events(path, game_events(record))
+	stats = analyse([path, path])
+	assert stats.games == 40
+	assert sum(stats.outcomes.values()) == 40
+	assert stats.turns == 2 * sum(record.turns for record in records)
+	assert 'games' in stats.report()
+
+
+# The server replays every finished game for its event log and leaderboard. Those replays aren't
+# games anyone played, so they mustn't count in the metrics a second time.
+def test_replayed_games_are_not_timed():
+	random.seed(4)
+	records = record_bot_games(5, 'greedy')
+	metrics = instrument()
+	try:
+		for record in records:
+			replay_game(record)
+	finally:
+		uninstrument()
+	assert all(histogram.count == 0 for histogram in metrics.phases.values())
@@ -0,0 +1,69 @@
+# Tests for the fuzzer in fuzzer.py, and the in-memory session copies it forks from (snapshot.py).
+
+import pytest
+
+from Dr_Eaton_vs_Ton_Drump import GameSession
+from fuzzer import Fuzzer
+from replay import WORLD_SETUPS
+from snapshot import copy_session, snapshot_session
+
+
+def played_session(world='classic', seed=21):
+	session = GameSession(quiet=True, seed=seed, world_setup=WORLD_SETUPS[world])
+	for command in ('', 'SEARCH', 'yes', 'EAST', 'SEARCH', 'yes', 'NORTH'):
+		if session.finished:
+			break
+		session.feed(command)
+	return session
+
+
+# A fork is played on its own, so nothing it does can show up in the session it was copied from.
+@pytest.mark.parametrize('world', ('classic', 'compact'))
+def test_copies_dont_change_the_original(world):
+	session = played_session(world)
+	before = snapshot_session(session)
+	fork = copy_session(session)
+	for command in ('SEARCH', 'yes', 'yes', 'WEST', 'SEARCH', 'yes', '1', '1', '2', '1', 'SOUTH', 'SEARCH', 'yes'):
+		if fork.finished:
+			break
+		fork.feed(command)
+	assert snapshot_session(session) == before
+	assert snapshot_session(fork) != before
+
+
+def test_copies_can_share_one_generator_state():
+	session = played_session()
+	rng_state = session.rng.getstate()
+	first = copy_session(session, rng_state)
+	second = copy_session(session, rng_state)
+	first.rng.random()
+	assert second.rng.getstate() == rng_state
+	assert session.rng.getstate() == rng_state
+
+
+def test_the_game_fuzzes_clean():
+	fuzzer = Fuzzer('classic', seed=1)
+	fuzzer.run(sequences=400)
+	assert fuzzer.failures == {}
+	assert fuzzer.sequences >= 400
+	assert fuzzer.restores > 0
+	assert len(fuzzer.coverage) > 10
+
+
+# A bug planted in HINT, a few turns into a game, has to be found, reproduced from the start of its
+# game and shrunk to a handful of commands.
+def test_a_planted_bug_is_found_and_shrunk(monkeypatch):
+	def broken_hint(session):
+		if session.turns >= 3:
+			raise ZeroDivisionError("planted")
+	monkeypatch.setattr(GameSession, 'give_hint', broken_hint)
+	fuzzer = Fuzzer('classic', seed=2)
+	fuzzer.run(sequences=2000)
+	crashes = [failure for signature, failure in fuzzer.failures.items() if signature[:2] == ('crash', 'ZeroDivisionError')]
+	assert len(crashes) == 1
+	failure = crashes[0]
+	shrunk = fuzzer.shrink(failure)
+	assert len(shrunk) <= len(failure.commands)
+	assert shrunk[-1] == 'HINT'
+	assert fuzzer.reproduce(failure.seed, shrunk)[0] == failure.signature
+	assert len(shrunk) < 20
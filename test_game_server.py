@@ -0,0 +1,121 @@
+# Tests for the asyncio game server in game_server.py, played over real sockets on localhost.
+
+import asyncio
+import time
+
+from Dr_Eaton_vs_Ton_Drump import Pacer
+from game_server import StreamIO, start_server
+from replay import read_records
+from status_protocol import DELTA_HELLO, STATUS_MARK
+
+
+# This starts a server on a free port, runs each client's lines through it at the same time, and
+# returns every client's transcript along with the server's stats. A line that's a number is a
+# wait of that many seconds instead.
+def play(clients, **options):
+	async def run_client(port, lines):
+		reader, writer = await asyncio.open_connection('127.0.0.1', port)
+		for line in lines:
+			if isinstance(line, float):
+				await asyncio.sleep(line)
+			else:
+				writer.write(line if isinstance(line, bytes) else line.encode() + b'\r\n')
+		await writer.drain()
+		transcript = await asyncio.wait_for(reader.read(), 10.0)
+		writer.close()
+		return transcript.decode()
+
+	async def run():
+		server, stats = await start_server('127.0.0.1', 0, fast=True, **options)
+		port = server.sockets[0].getsockname()[1]
+		async with server:
+			transcripts = await asyncio.gather(*(run_client(port, lines) for lines in clients))
+		if stats.game_logger is not None:
+			stats.game_logger.shutdown()
+		return transcripts, stats
+
+	return asyncio.run(run())
+
+
+def test_a_player_quits_and_leaves(tmp_path):
+	path = tmp_path / 'games.dglog'
+	(transcript,), stats = play([['', 'EXIT', 'no']], record_path=str(path))
+	assert 'Press Enter to begin your quest' in transcript
+	assert transcript.rstrip().endswith('Thanks for playing!')
+	assert '\r\n' in transcript and '\n' not in transcript.replace('\r\n', '')
+	assert (stats.total_sessions, stats.active_sessions, stats.games_played) == (1, 0, 1)
+	record, = read_records(path)
+	assert (record.commands, record.outcome) == (['EXIT'], 'quit')
+
+
+# Telnet clients send option negotiation bytes, which are thrown away before the line is read.
+def test_telnet_negotiation_is_ignored():
+	(transcript,), stats = play([[b'\xff\xfb\x01\xff\xfd\x03\r\n', b'\xff\xfb\x18EXIT\r\n', 'no']])
+	assert 'Invalid command' not in transcript
+	assert 'Thanks for playing!' in transcript
+
+
+def test_many_players_at_once(tmp_path):
+	path = tmp_path / 'games.dglog'
+	clients = [['', 'SEARCH', 'no', 'HINT', 'EXIT', 'yes', '', 'EXIT', 'no'] for _ in range(20)]
+	transcripts, stats = play(clients, record_path=str(path))
+	assert all(transcript.count('Thanks for playing!') == 1 for transcript in transcripts)
+	assert stats.peak_sessions <= 20
+	assert stats.games_played == 40
+	assert len(list(read_records(path))) == 40
+
+
+def test_a_full_server_turns_players_away():
+	transcripts, stats = play([[]], max_sessions=0)
+	assert transcripts == ["The Hexagon is full right now. Please try again later.\r\n"]
+
+
+# A client that says hello gets update lines instead of status blocks.
+def test_delta_clients_get_status_updates():
+	(transcript,), stats = play([[DELTA_HELLO, 'HINT', 'EXIT', 'no']])
+	updates = [line for line in transcript.split('\r\n') if line.startswith(STATUS_MARK)]
+	assert '"full":1' in updates[0]
+	assert '> You are in the:' not in transcript
+
+
+# A player who goes quiet is hibernated, and woken with their game as it was when they answer.
+def test_idle_players_are_hibernated_and_woken():
+	(transcript,), stats = play([['', 0.2, 'SEARCH', 0.2, 'no', 'EXIT', 'no']], hibernate_after=0.05)
+	assert stats.store.hibernated >= 2
+	assert stats.store.woken == stats.store.hibernated
+	assert len(stats.store) == 0
+	assert 'Thanks for playing!' in transcript
+
+
+class FakeWriter:
+	def __init__(self):
+		self.chunks = []
+
+	def write(self, data):
+		self.chunks.append((time.monotonic(), data))
+
+	async def drain(self):
+		pass
+
+	def close(self):
+		pass
+
+
+# Text after a pause isn't sent until the pause is over, but nothing waits for it.
+def test_pauses_hold_text_back_without_blocking():
+	async def run():
+		writer = FakeWriter()
+		io = StreamIO(None, writer, Pacer(0.1))
+		start = time.monotonic()
+		io.write("before")
+		io.pause(1)
+		io.write("after")
+		await io.flush()
+		assert [data for sent, data in writer.chunks] == [b"before\r\n"]
+		assert time.monotonic() - start < 0.05
+		await io.finish()
+		return start, writer.chunks
+
+	start, chunks = asyncio.run(run())
+	assert [data for sent, data in chunks] == [b"before\r\n", b"after\r\n"]
+	assert chunks[1][0] - start >= 0.09
@@ -0,0 +1,91 @@
+# Tests for the per-phase hooks in instrumentation.py.
+
+import json
+import random
+
+import pytest
+
+import Dr_Eaton_vs_Ton_Drump as game
+from instrumentation import BUCKET_BOUNDS, PHASE_METHODS, Histogram, instrument, play_corpus, uninstrument
+from replay import record_bot_games
+
+
+@pytest.fixture
+def metrics():
+	yield instrument()
+	uninstrument()
+
+
+def counts(metrics):
+	return {phase: histogram.count for phase, histogram in metrics.phases.items()}
+
+
+def test_played_games_are_counted(metrics):
+	random.seed(1)
+	records = record_bot_games(5, 'greedy')
+	before = counts(metrics)
+	play_corpus(records)
+	after = counts(metrics)
+	assert after['world_setup'] - before['world_setup'] == 5
+	assert after['move'] > before['move']
+	assert sum(metrics.rooms['move'].values()) == after['move']
+
+
+def test_uninstrument_puts_the_plain_methods_back():
+	plain = {name: getattr(game.GameSession, name) for name in PHASE_METHODS.values()}
+	handlers = dict(game.PHASE_HANDLERS)
+	instrument()
+	assert any(getattr(game.GameSession, name) is not method for name, method in plain.items())
+	uninstrument()
+	assert {name: getattr(game.GameSession, name) for name in PHASE_METHODS.values()} == plain
+	assert game.PHASE_HANDLERS == handlers
+
+
+def test_histograms_bucket_and_estimate_percentiles():
+	histogram = Histogram()
+	for _ in range(99):
+		histogram.observe(2e-6)
+	histogram.observe(0.3)
+	assert histogram.count == 100
+	assert histogram.percentile(0.5) == pytest.approx(2.5e-6)
+	assert histogram.percentile(1.0) == pytest.approx(0.5)
+	histogram.observe(5.0)
+	assert histogram.buckets[len(BUCKET_BOUNDS)] == 1
+
+
+# Both exports carry the same counts: the Prometheus +Inf bucket and the JSON line's count.
+def test_exports_agree(metrics):
+	random.seed(3)
+	play_corpus(record_bot_games(3, 'greedy'))
+	text = metrics.to_prometheus()
+	line = json.loads(metrics.to_json_line())
+	for phase, histogram in metrics.phases.items():
+		assert f'dr_eaton_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {histogram.count}' in text
+		assert line['phases'][phase]['count'] == histogram.count
+	assert line['hot_rooms'] == dict(metrics.hot_rooms())
+
+
+# SharedGameSession has its own move_to and villain_encounter. They have to be timed, and timed
+# once, though each calls GameSession's with super().
+def test_subclass_methods_are_timed_once(monkeypatch):
+	from shared_world import SharedGameSession, stress
+
+	calls = []
+	plain_move_to = SharedGameSession.move_to
+
+	def counted_move_to(session, location):
+		calls.append(location)
+		plain_move_to(session, location)
+
+	monkeypatch.setattr(SharedGameSession, 'move_to', counted_move_to)
+	metrics = instrument()
+	try:
+		assert SharedGameSession.move_to is not counted_move_to
+		shared, problems, commands, elapsed = stress(4, 100, 2, False)
+	finally:
+		uninstrument()
+	assert problems == []
+	assert SharedGameSession.move_to is counted_move_to
+	assert len(calls) > 0
+	assert metrics.phases['move'].count == len(calls)
+	assert sum(metrics.rooms['move'].values()) == len(calls)
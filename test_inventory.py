@@ -0,0 +1,69 @@
+# Tests for the indexed Inventory in Dr_Eaton_vs_Ton_Drump.py.
+
+from Dr_Eaton_vs_Ton_Drump import (ALL_QUEST_ITEMS_MASK, FOCUS_VIALS, QUEST_ITEMS, STARTING_ITEMS, USABLE_WILDCARD_ITEMS,
+                                   WILDCARD_ITEMS, Inventory)
+
+
+def test_starting_items_are_ready_and_usable():
+	inventory = Inventory()
+	assert inventory.names() == STARTING_ITEMS
+	assert [item.name for item in inventory.usable_items()] == STARTING_ITEMS
+	assert all(item.label().endswith('(Ready)') for item in inventory)
+	assert inventory.quest_count == 0
+
+
+# Starting items stay in the inventory once they're used, but leave the menu.
+def test_using_a_starting_item_marks_it_used():
+	inventory = Inventory()
+	name = STARTING_ITEMS[0]
+	inventory.use(name)
+	assert name in inventory
+	assert not inventory.is_usable(name)
+	assert inventory.index[name].label() == f"{name} (Used)"
+	assert name not in [item.name for item in inventory.usable_items()]
+
+
+def test_using_a_found_item_removes_it():
+	inventory = Inventory(starting_items=())
+	vial = FOCUS_VIALS[0]
+	inventory.add(vial)
+	assert inventory.is_usable(vial)
+	inventory.use(vial)
+	assert vial not in inventory
+	assert len(inventory) == 0
+
+
+# Wildcards without an effect can be carried but never show up in the menu.
+def test_only_usable_found_items_go_in_the_menu():
+	inventory = Inventory(starting_items=())
+	useless = [name for name in WILDCARD_ITEMS if name not in USABLE_WILDCARD_ITEMS]
+	for name in useless + USABLE_WILDCARD_ITEMS:
+		inventory.add(name)
+	assert [item.name for item in inventory.usable_items()] == USABLE_WILDCARD_ITEMS
+
+
+def test_quest_progress_follows_adds_and_removes():
+	inventory = Inventory(starting_items=())
+	for count, name in enumerate(QUEST_ITEMS, 1):
+		inventory.add(name)
+		assert inventory.quest_count == count
+		assert inventory.has_quest_item(name)
+	assert inventory.has_all_quest_items()
+	assert inventory.quest_mask == ALL_QUEST_ITEMS_MASK
+
+	inventory.remove(QUEST_ITEMS[0])
+	assert not inventory.has_all_quest_items()
+	assert not inventory.has_quest_item(QUEST_ITEMS[0])
+	assert inventory.quest_count == len(QUEST_ITEMS) - 1
+
+
+# The status block's text is cached, so it has to change whenever the inventory does.
+def test_display_is_rebuilt_after_every_change():
+	inventory = Inventory()
+	before = inventory.display()
+	inventory.use(STARTING_ITEMS[0])
+	used = inventory.display()
+	assert used != before
+	inventory.add(QUEST_ITEMS[0])
+	assert inventory.display() == str([item.label() for item in inventory])
+	assert inventory.display() != used
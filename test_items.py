@@ -0,0 +1,109 @@
+# Tests for the item catalog in items.json and the item effects in Dr_Eaton_vs_Ton_Drump.py.
+
+import json
+
+import pytest
+
+from Dr_Eaton_vs_Ton_Drump import (COMBAT_ONLY_ITEMS, EFFECT_TYPES, FOCUS_VIALS, ITEM_CATALOG, ITEM_EFFECTS,
+                                   QUEST_ITEMS, STARTING_ITEMS, USABLE_WILDCARD_ITEMS, Inventory, compile_item_effects,
+                                   handle_use_item, load_item_catalog)
+
+
+def fresh_stats(focus=10):
+	return {'focus': focus, 'logic_filter_active': False, 'overclock_active': False, 'subpoena_active': False}
+
+
+# This uses one item the player is holding and returns (result, stats, inventory, lines, pauses).
+def use(name, focus=10, in_combat=True, potion_map=None):
+	stats = fresh_stats(focus)
+	inventory = Inventory()
+	if name not in inventory:
+		inventory.add(name)
+	lines = []
+	pauses = []
+	result = handle_use_item(stats, inventory, potion_map or {}, name, in_combat, out=lines.append,
+	                         pause=pauses.append)
+	return result, stats, inventory, lines, pauses
+
+
+def test_the_catalog_loads_every_kind_of_item():
+	names = [entry['name'] for entry in ITEM_CATALOG]
+	assert len(names) == len(set(names))
+	assert {entry['kind'] for entry in ITEM_CATALOG} == {'quest', 'wildcard', 'vial', 'starting'}
+	assert len(QUEST_ITEMS) == 7 and len(FOCUS_VIALS) == 3
+	assert STARTING_ITEMS == ['Civility Charm', 'Executive Order', 'Golden Parachute']
+	assert COMBAT_ONLY_ITEMS == STARTING_ITEMS
+
+
+# Everything the player can use has a handler, and quest items never do.
+def test_every_usable_item_has_an_effect():
+	assert set(ITEM_EFFECTS) == set(USABLE_WILDCARD_ITEMS + FOCUS_VIALS + STARTING_ITEMS)
+	assert not set(ITEM_EFFECTS) & set(QUEST_ITEMS)
+	for effect, params, combat_only in ITEM_EFFECTS.values():
+		assert effect is EFFECT_TYPES[params['type']]
+
+
+def test_unknown_effect_types_are_rejected():
+	with pytest.raises(ValueError, match="unknown effect type 'teleport'"):
+		compile_item_effects([{'name': 'Warp Pen', 'kind': 'wildcard', 'effect': {'type': 'teleport'}}])
+
+
+# A new item only needs an entry in the catalog.
+def test_items_can_be_added_without_code(tmp_path):
+	path = tmp_path / 'items.json'
+	path.write_text(json.dumps({'items': [{'name': 'Fresh Coffee', 'kind': 'wildcard', 'effect': {
+		'type': 'restore_focus', 'amount': 2, 'lines': ["> You drink the coffee.", 1]}}]}))
+	catalog = load_item_catalog(path)
+	effect, params, combat_only = compile_item_effects(catalog)['Fresh Coffee']
+	stats = fresh_stats()
+	lines = []
+	pauses = []
+	assert effect(stats, {}, 'Fresh Coffee', params, lines.append, pauses.append) is None
+	assert stats['focus'] == 12 and lines == ["> You drink the coffee."] and pauses == [1]
+	assert not combat_only
+
+
+def test_restore_focus():
+	result, stats, inventory, lines, _ = use('Civility Charm')
+	assert result == 'item_used' and stats['focus'] == 13
+	assert not inventory.is_usable('Civility Charm')
+	assert lines == ["> You use the Civility Charm and restore 3 Focus."]
+
+
+def test_combat_only_items_wait_for_a_fight():
+	result, stats, inventory, lines, _ = use('Golden Parachute', in_combat=False)
+	assert result == 'no_action' and inventory.is_usable('Golden Parachute')
+	assert lines == ["> The Golden Parachute can only be used during a Reprogramming Sequence."]
+
+
+def test_flee():
+	assert use('Golden Parachute')[0] == 'flee'
+
+
+@pytest.mark.parametrize('name, flag', (('Logic Filter', 'logic_filter_active'),
+                                        ('Subpoenaed Diary Logs', 'subpoena_active'),
+                                        ('Executive Order', 'overclock_active')))
+def test_buffs_set_their_flag(name, flag):
+	result, stats, inventory, _, _ = use(name)
+	assert result == 'item_used' and stats[flag]
+	assert sum(stats[key] is True for key in stats) == 1
+
+
+def test_drained_focus_never_drops_below_one():
+	assert use('Suspiciously Well-Preserved Snack Cake', focus=10)[1]['focus'] == 6
+	assert use('Suspiciously Well-Preserved Snack Cake', focus=3)[1]['focus'] == 1
+
+
+def test_some_items_do_nothing_slowly():
+	result, stats, inventory, lines, pauses = use('Blank Keycard', in_combat=False)
+	assert result == 'item_used' and stats == fresh_stats()
+	assert 'Blank Keycard' not in inventory
+	assert pauses == [2] and lines[-1] == "> ... and absolutely nothing happens."
+
+
+def test_vials_follow_the_games_potion_map():
+	potion_map = dict(zip(FOCUS_VIALS, (5, -4, -20)))
+	assert use(FOCUS_VIALS[0], potion_map=potion_map)[1]['focus'] == 15
+	_, stats, _, lines, _ = use(FOCUS_VIALS[1], potion_map=potion_map)
+	assert stats['focus'] == 6 and lines == [f"> You drink the {FOCUS_VIALS[1]}. You lose 4 Focus."]
+	assert use(FOCUS_VIALS[2], potion_map=potion_map)[1]['focus'] == 1
@@ -0,0 +1,71 @@
+# Tests for the SQLite leaderboard in leaderboard.py.
+
+import random
+
+import pytest
+
+from leaderboard import Leaderboard, game_row, seed_from_sql, seed_to_sql
+from replay import record_bot_games
+
+
+# Seeds are unsigned 64-bit numbers, and have to survive SQLite's signed integers.
+@pytest.mark.parametrize('seed', (0, 1, 2 ** 63 - 1, 2 ** 63, 2 ** 63 + 1, 2 ** 64 - 1))
+def test_seeds_wrap_around_and_back(seed):
+	value = seed_to_sql(seed)
+	assert -2 ** 63 <= value < 2 ** 63
+	assert seed_from_sql(value) == seed
+
+
+def row(player, finished_at, outcome, turns, focus, seed=2 ** 64 - 1, duration=60.0):
+	return (player, finished_at, outcome, turns, focus, 0, 0, seed_to_sql(seed), duration)
+
+
+@pytest.fixture
+def leaderboard(tmp_path):
+	board = Leaderboard(str(tmp_path / 'leaderboard.db'), batch_size=2).start()
+	yield board
+	board.stop()
+
+
+def test_the_leaderboard_ranks_wins(leaderboard):
+	leaderboard.add(row('ann', 1.0, 'win', 30, 4))
+	leaderboard.add(row('bob', 2.0, 'win', 12, 2, duration=90.0))
+	leaderboard.add(row('cat', 3.0, 'win', 12, 9, duration=30.0))
+	leaderboard.add(row('dan', 4.0, 'lose', 5, -3))
+	leaderboard.flush()
+	assert leaderboard.written == 4
+	assert [game['player'] for game in leaderboard.fastest_wins()] == ['cat', 'bob', 'ann']
+	assert [game['player'] for game in leaderboard.most_focus(2)] == ['cat', 'ann']
+	assert leaderboard.fastest_wins(1)[0]['seed'] == 2 ** 64 - 1
+
+
+def test_a_players_history_is_newest_first(leaderboard):
+	for finished_at in (5.0, 1.0, 3.0):
+		leaderboard.add(row('ann', finished_at, 'quit', 2, 15))
+	leaderboard.add(row('bob', 4.0, 'win', 9, 9))
+	leaderboard.flush()
+	assert [game['finished_at'] for game in leaderboard.history('ann')] == [5.0, 3.0, 1.0]
+	assert len(leaderboard.history('ann', 2)) == 2
+	assert leaderboard.history('nobody') == []
+
+
+# The writer takes its last rows when it's stopped, and the database keeps them for the next start.
+def test_stopping_writes_whatever_is_queued(tmp_path):
+	path = str(tmp_path / 'leaderboard.db')
+	board = Leaderboard(path).start()
+	for turns in range(10):
+		board.add(row('ann', float(turns), 'win', turns + 1, 1))
+	board.stop()
+	board = Leaderboard(path)
+	assert len(board.history('ann', 100)) == 10
+	board.stop()
+
+
+# A row worked out from a replay record matches how the game went.
+def test_rows_come_from_replayed_games():
+	random.seed(4)
+	for record in record_bot_games(5, 'greedy'):
+		player, finished_at, outcome, turns, focus, items_used, robots_pacified, seed, duration = game_row('ann', record, 1.5)
+		assert (player, turns, duration) == ('ann', record.turns, 1.5)
+		assert outcome == (record.outcome or 'timeout')
+		assert seed_from_sql(seed) == record.seed
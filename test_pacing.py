@@ -0,0 +1,50 @@
+# Tests for the Pacer and the dramatic pauses in Dr_Eaton_vs_Ton_Drump.py.
+
+import io
+
+import pytest
+
+import Dr_Eaton_vs_Ton_Drump as game
+from Dr_Eaton_vs_Ton_Drump import GameSession, Pacer, TerminalIO
+
+
+@pytest.mark.parametrize('multiplier, seconds, delay', ((1.0, 2, 2), (0.5, 2, 1.0), (0.0, 3, 0.0), (3.0, 1.5, 4.5)))
+def test_pacers_scale_pauses(multiplier, seconds, delay):
+	assert Pacer(multiplier).scale(seconds) == delay
+
+
+def test_fast_pacers_drop_every_pause():
+	assert Pacer(5.0, fast=True).scale(10) == 0
+
+
+# Sessions only record their pauses. They never wait themselves, and quiet ones record nothing.
+def test_sessions_record_pauses_for_the_front_end():
+	session = GameSession(seed=1)
+	session.feed('')
+	session.take_output()
+	session.pause(2)
+	assert session.take_output() == [2]
+	quiet = GameSession(quiet=True, seed=1)
+	quiet.pause(2)
+	assert quiet.take_output() == []
+
+
+# The terminal waits in place, for the scaled time, after showing everything written so far.
+def test_the_terminal_shows_the_text_then_waits(monkeypatch):
+	stream = io.StringIO()
+	waits = []
+	monkeypatch.setattr(game.time, 'sleep', lambda seconds: waits.append((seconds, stream.getvalue())))
+	terminal = TerminalIO(Pacer(0.5), stream, color=False)
+	terminal.write("The robot whirs.")
+	terminal.pause(2)
+	terminal.pause(0)
+	assert waits == [(1.0, "The robot whirs.\n")]
+
+
+def test_the_terminal_skips_pauses_when_fast(monkeypatch):
+	waits = []
+	monkeypatch.setattr(game.time, 'sleep', waits.append)
+	terminal = TerminalIO(Pacer(fast=True), io.StringIO(), color=False)
+	terminal.write("The robot whirs.")
+	terminal.pause(2)
+	assert waits == []
@@ -0,0 +1,83 @@
+# Tests for seeded sessions and the binary replay log in replay.py.
+
+import random
+
+import pytest
+
+from Dr_Eaton_vs_Ton_Drump import GameSession
+from replay import (WORLD_KINDS, WORLD_SETUPS, ReplayRecord, check_record, read_records, read_varint, record_bot_games,
+                    record_from_session, replay, write_records, write_varint)
+
+
+def test_varints_round_trip():
+	for value in (0, 1, 127, 128, 300, 16383, 16384, 2 ** 32, 2 ** 64 - 1):
+		buffer = bytearray()
+		write_varint(buffer, value)
+		assert read_varint(buffer, 0) == (value, len(buffer))
+
+
+# The same seed has to give the same world, whichever way the world is built.
+@pytest.mark.parametrize('world', WORLD_KINDS)
+def test_a_seed_builds_the_same_world(world):
+	first = GameSession(quiet=True, seed=1234, world_setup=WORLD_SETUPS[world])
+	second = GameSession(quiet=True, seed=1234, world_setup=WORLD_SETUPS[world])
+	assert first.villain_location == second.villain_location
+	assert first.potion_map == second.potion_map
+	for room_key in ('Vestibule', first.villain_location):
+		assert first.game_map[room_key]['item'] == second.game_map[room_key]['item']
+
+
+# Bot games replayed from their records have to end the same way, after the same number of turns.
+@pytest.mark.parametrize('world', ('classic', 'compact', 'fair'))
+def test_bot_games_replay_exactly(world):
+	random.seed(7)
+	for record in record_bot_games(30, 'greedy', world):
+		assert check_record(record) is None
+
+
+# Typed junk (and text that isn't ASCII) is kept as it was typed, next to the one-byte command tokens.
+def test_logs_round_trip(tmp_path):
+	path = tmp_path / 'games.dglog'
+	records = [ReplayRecord('classic', 2 ** 64 - 1, ['NORTH', 'SEARCH', 'yes', 'xyzzy', 'é', '', '1'], 'lose', 3),
+	           ReplayRecord('compact', 0, [], None, 0)]
+	write_records(path, records)
+	write_records(path, [ReplayRecord('fair', 5, ['EXIT'], 'quit', 1)], append=True)
+	read = list(read_records(path))
+	assert [(r.world, r.seed, r.commands, r.outcome, r.turns) for r in read] == [
+		('classic', 2 ** 64 - 1, ['NORTH', 'SEARCH', 'yes', 'xyzzy', 'é', '', '1'], 'lose', 3),
+		('compact', 0, [], None, 0),
+		('fair', 5, ['EXIT'], 'quit', 1)]
+
+
+def test_other_files_are_not_read_as_logs(tmp_path):
+	path = tmp_path / 'not_a_log'
+	path.write_bytes(b'hello')
+	with pytest.raises(ValueError):
+		list(read_records(path))
+
+
+# The text and pauses don't use the game's random numbers, so a game plays the same with them on.
+def test_text_doesnt_change_a_replay():
+	random.seed(11)
+	for record in record_bot_games(10, 'greedy'):
+		session = replay(record, quiet=False)
+		assert (session.outcome, session.turns) == (record.outcome, record.turns)
+
+
+# A recording session's log is exactly what it was fed.
+def test_sessions_record_their_commands():
+	session = GameSession(quiet=True, seed=99, record=True)
+	for command in ('', 'SEARCH', 'no', 'EAST', 'HINT'):
+		session.feed(command)
+	record = record_from_session(session)
+	assert record.seed == 99
+	assert record.commands == ['', 'SEARCH', 'no', 'EAST', 'HINT']
+
+
+# The bots roll with generators seeded from the game seed, so recording twice gives the same games.
+def test_bot_games_are_reproducible():
+	random.seed(3)
+	first = record_bot_games(20, 'random')
+	random.seed(3)
+	second = record_bot_games(20, 'random')
+	assert [(r.seed, r.commands) for r in first] == [(r.seed, r.commands) for r in second]
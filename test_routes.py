@@ -0,0 +1,112 @@
+# Tests for the route tables and the HINT command in Dr_Eaton_vs_Ton_Drump.py.
+
+import random
+import re
+
+from Dr_Eaton_vs_Ton_Drump import (MAP_LAYOUT, QUEST_ITEM_BITS, STATIC_ROUTES, GameSession, RouteTable, portal_routes,
+                                   route_links, setup_game, stairs_destination, strip_ansi, walking_routes)
+
+
+# This is a plain breadth-first search from one room, written separately from RouteTable to check it.
+def bfs(game_map, start):
+	distance = {start: 0}
+	frontier = [start]
+	while frontier:
+		next_frontier = []
+		for room_key in frontier:
+			room = game_map[room_key]
+			neighbours = list(room['exits'].values())
+			if stairs_destination(room) is not None:
+				neighbours.append(stairs_destination(room))
+			for neighbour in neighbours:
+				if neighbour not in distance:
+					distance[neighbour] = distance[room_key] + 1
+					next_frontier.append(neighbour)
+		frontier = next_frontier
+	return distance
+
+
+# This follows a table's first steps from start to goal and returns how many moves it took.
+def follow(links, routes, start, goal):
+	moves = 0
+	room = start
+	while room != goal:
+		step = routes.first_step[room][goal]
+		room = next(neighbour for direction, neighbour in links[room] if direction == step)
+		moves += 1
+	return moves
+
+
+def test_the_static_table_matches_a_search_from_every_room():
+	for start in MAP_LAYOUT:
+		assert STATIC_ROUTES.distance[start] == bfs(MAP_LAYOUT, start)
+
+
+# Portals replace some staircases, so each world's walking table is checked against its own map.
+def test_walking_tables_match_each_world():
+	rng = random.Random(8)
+	for _ in range(50):
+		game_map, _, _ = setup_game(rng)
+		routes = walking_routes(game_map)
+		links = route_links(game_map)
+		for start in game_map:
+			assert routes.distance[start] == bfs(game_map, start)
+			for goal, moves in routes.distance[start].items():
+				assert follow(links, routes, start, goal) == moves
+
+
+def test_worlds_with_the_same_stairs_share_a_table():
+	rng = random.Random(3)
+	tables = {}
+	for _ in range(50):
+		game_map, _, _ = setup_game(rng)
+		stairs = tuple(sorted(room_key for room_key in game_map if stairs_destination(game_map[room_key])))
+		routes = walking_routes(game_map)
+		assert tables.setdefault(stairs, routes) is routes
+
+
+def test_a_portal_reaches_every_room_but_the_office():
+	game_map, villain, _ = setup_game(random.Random(5))
+	links = route_links(game_map, villain, portals=True)
+	routes = portal_routes(game_map, villain)
+	for portal in (room_key for room_key in game_map if game_map[room_key]['special_exit'] == 'Portal'):
+		destinations = {neighbour for direction, neighbour in links[portal] if direction == 'PORTAL'}
+		assert destinations == set(game_map) - {villain}
+		assert all(routes.distance[portal][room_key] <= 1 for room_key in destinations)
+
+
+def test_nearest_picks_the_closest_reachable_goal():
+	routes = RouteTable({'a': [('EAST', 'b')], 'b': [('EAST', 'c'), ('WEST', 'a')], 'c': [], 'd': []})
+	assert routes.nearest('a', ['c', 'b']) == 'b'
+	assert routes.nearest('a', ['d']) is None
+	assert routes.nearest('c', ['a', 'd']) is None
+	assert routes.first_step['a']['c'] == 'EAST'
+
+
+# HINT doesn't use up a turn, and points the way the walking table says.
+def test_hints_point_toward_the_nearest_component():
+	for seed in range(30):
+		session = GameSession(seed=seed)
+		session.take_output()
+		turns = session.turns
+		session.feed('HINT')
+		hint = next(strip_ansi(line) for line in session.take_output() if 'HINT' in str(line))
+		assert session.turns == turns and session.phase == 'command'
+		goals = [room_key for room_key in session.game_map if session.game_map[room_key]['item'] in QUEST_ITEM_BITS]
+		routes = walking_routes(session.game_map)
+		goal = routes.nearest(session.current_location, goals)
+		if goal is None:
+			continue
+		moves = int(re.search(r'is (\d+) moves? away', hint).group(1))
+		assert moves == routes.distance[session.current_location][goal]
+		step = routes.first_step[session.current_location][goal]
+		assert (f"Head {step}." in hint) if step != 'STAIRS' else ("stairs" in hint)
+
+
+def test_hints_say_when_a_component_is_right_here():
+	session = GameSession(seed=2)
+	session.current_location = next(room_key for room_key in session.game_map
+	                                if session.game_map[room_key]['item'] in QUEST_ITEM_BITS)
+	session.take_output()
+	session.feed('HINT')
+	assert any("is right here. Try SEARCH." in strip_ansi(str(line)) for line in session.take_output())
@@ -0,0 +1,96 @@
+# Tests for shared worlds in shared_world.py, where a teammate can end a fight under a player.
+
+import random
+from collections import deque
+
+import pytest
+
+from Dr_Eaton_vs_Ton_Drump import TypeAhead, setup_game
+from shared_world import SharedGameSession, SharedWorld, stress
+
+
+# This finds the directions from a player's room to the nearest robot, keeping out of the office.
+def path_to_robot(session):
+	game_map = session.game_map
+	start = session.current_location
+	paths = {start: []}
+	queue = deque([start])
+	while queue:
+		room_key = queue.popleft()
+		for direction, next_room in game_map[room_key]['exits'].items():
+			if next_room in paths or game_map[next_room]['villain']:
+				continue
+			paths[next_room] = paths[room_key] + [direction]
+			if game_map[next_room]['robot'] is not None:
+				return paths[next_room]
+			queue.append(next_room)
+	return None
+
+
+# This walks two teammates into the same robot's room, and has the first one scan until the robot
+# is pacified. It returns the second one, who is still at the combat prompt.
+def teammate_after_the_fight(**kwargs):
+	for seed in range(100):
+		shared = SharedWorld(setup_game(random.Random(seed)))
+		first = SharedGameSession(shared, 'first', quiet=True, seed=seed)
+		second = SharedGameSession(shared, 'second', quiet=True, seed=seed + 1000, **kwargs)
+		first.feed('')
+		second.feed('')
+		path = path_to_robot(first)
+		if path is None:
+			continue
+		for direction in path:
+			first.feed(direction)
+			second.feed(direction)
+		while first.in_combat and not first.finished:
+			first.feed('1')
+		if not first.finished:
+			assert second.in_combat
+			assert second.game_map[second.current_location]['robot'] is None
+			return second
+	raise AssertionError("no world where the first player won their fight")
+
+
+def check_the_fight_is_over(session):
+	assert not session.in_combat
+	assert session.phase == 'command'
+	assert not session.finished
+
+
+def test_scanning_a_robot_that_is_already_gone():
+	session = teammate_after_the_fight()
+	session.feed('1')
+	check_the_fight_is_over(session)
+
+
+def test_the_scan_macro_after_a_teammate_won():
+	session = teammate_after_the_fight()
+	typed = TypeAhead()
+	typed.add_line('scan')
+	command = typed.next_command(session)
+	assert typed.scan_floor is None
+	session.feed(command)
+	check_the_fight_is_over(session)
+
+
+def test_asking_the_advisor_after_a_teammate_won():
+	combat_solver = pytest.importorskip('combat_solver')
+	session = teammate_after_the_fight(advisor=combat_solver.build_table())
+	session.feed('4')
+	check_the_fight_is_over(session)
+
+
+def test_the_odds_after_a_teammate_won():
+	combat_odds = pytest.importorskip('combat_odds')
+	session = teammate_after_the_fight(odds=combat_odds.build_table(samples=200, seed=1))
+	session.quiet = False
+	session.feed('1')
+	check_the_fight_is_over(session)
+
+
+# A small run of the stress test: no crashes, and nothing handed out twice.
+@pytest.mark.parametrize('global_lock', (False, True))
+def test_a_crowd_shares_the_world_fairly(global_lock):
+	shared, problems, commands, elapsed = stress(8, 150, 3, global_lock)
+	assert problems == []
+	assert commands > 0
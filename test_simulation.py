@@ -0,0 +1,77 @@
+# Tests for the headless batch simulator and its bot policies in simulation.py.
+
+import random
+
+import pytest
+
+from simulation import (WORLD_SETUPS, add_result, make_policy, merge_totals, new_totals, play_headless, run_batch,
+                        run_chunk)
+
+
+# A game seed alone replays the whole bot game, since the bot's generator is seeded from it.
+@pytest.mark.parametrize('policy', ('random', 'greedy', 'vials'))
+def test_a_seed_plays_the_same_bot_game(policy):
+	for seed in (0, 1, 2 ** 64 - 1):
+		first = play_headless(make_policy(policy, seed), seed=seed)
+		second = play_headless(make_policy(policy, seed), seed=seed)
+		assert first == second
+
+
+def test_bots_roll_differently_from_the_game():
+	policy = make_policy('random', 5)
+	game = random.Random(5)
+	assert [policy.rng.random() for _ in range(5)] != [game.random() for _ in range(5)]
+
+
+@pytest.mark.parametrize('world', sorted(WORLD_SETUPS))
+def test_greedy_bots_finish_games_on_every_world(world):
+	for seed in range(3):
+		result = play_headless(make_policy('greedy', seed), world_setup=WORLD_SETUPS[world], seed=seed)
+		assert result['outcome'] in ('win', 'lose', 'quit', 'timeout')
+		assert 0 < result['commands'] <= 2000
+
+
+# The greedy bot plays like a sensible player, so it should win far more often than a random one.
+def test_the_greedy_bot_beats_the_random_one():
+	random.seed(1)
+	greedy = run_chunk(60, 'greedy')
+	random_bot = run_chunk(60, 'random')
+	assert greedy['outcomes']['win'] > random_bot['outcomes']['win']
+
+
+def test_scripted_bots_play_their_commands_then_quit():
+	result = play_headless(make_policy(('scripted', {'commands': ['', 'SEARCH', 'no']})), seed=3)
+	assert result['outcome'] == 'quit'
+
+
+def test_max_commands_stops_a_game():
+	result = play_headless(make_policy(('scripted', {'commands': ['', 'HINT', 'HINT', 'HINT', 'HINT']})), 3, seed=3)
+	assert result == {'outcome': 'timeout', 'turns': 1, 'commands': 3, 'focus': 15}
+
+
+# Totals from separate workers add up to the same as one set of totals over every game.
+def test_merged_totals_match_one_set_of_totals():
+	results = [{'outcome': outcome, 'turns': turns, 'commands': turns * 3, 'focus': 1}
+	           for outcome, turns in (('win', 10), ('lose', 4), ('timeout', 30), ('win', 7))]
+	whole = new_totals()
+	for result in results:
+		add_result(whole, result)
+	first, second = new_totals(), new_totals()
+	for result in results[:1]:
+		add_result(first, result)
+	for result in results[1:]:
+		add_result(second, result)
+	merged = new_totals()
+	merge_totals(merged, new_totals())
+	merge_totals(merged, first)
+	merge_totals(merged, second)
+	assert merged == whole
+	assert (whole['min_turns'], whole['max_turns'], whole['win_turns']) == (4, 30, 17)
+
+
+def test_batches_split_into_chunks():
+	random.seed(2)
+	summary = run_batch(25, 'greedy', processes=1, chunk_size=10)
+	assert summary['games'] == 25
+	assert sum(summary['outcomes'].values()) == 25
+	assert summary['win_rate'] == summary['outcomes']['win'] / 25
@@ -0,0 +1,53 @@
+# Tests for session snapshots and the hibernation store in snapshot.py.
+
+import random
+
+import pytest
+
+from Dr_Eaton_vs_Ton_Drump import GameSession
+from replay import WORLD_SETUPS
+from snapshot import SnapshotStore, check_round_trips, restore_session, snapshot_session
+
+
+# Every turn of these games is snapshotted and restored, and the copies have to carry on the same
+# way (check_round_trips() raises AssertionError if they don't).
+@pytest.mark.parametrize('world', ('classic', 'compact'))
+def test_snapshots_round_trip_every_turn(world):
+	assert check_round_trips(10, WORLD_SETUPS[world], random.Random(5)) > 0
+
+
+def played_session(world='classic', seed=21):
+	session = GameSession(quiet=True, seed=seed, world_setup=WORLD_SETUPS[world], record=True)
+	for command in ('', 'SEARCH', 'yes', 'EAST', 'SEARCH', 'yes', 'NORTH'):
+		if session.finished:
+			break
+		session.feed(command)
+	return session
+
+
+def test_restored_sessions_keep_their_replay_log():
+	session = played_session()
+	restored = restore_session(snapshot_session(session))
+	assert restored.command_log == session.command_log
+	assert restored.seed == session.seed
+
+
+@pytest.mark.parametrize('in_files', (False, True))
+def test_the_store_hibernates_and_wakes_sessions(tmp_path, in_files):
+	store = SnapshotStore(str(tmp_path) if in_files else None)
+	session = played_session()
+	expected = snapshot_session(session)
+	assert store.hibernate('player-1', session) == len(expected)
+	assert len(store) == 1
+	woken = store.wake('player-1', quiet=True)
+	assert snapshot_session(woken) == expected
+	assert len(store) == 0
+	assert (store.hibernated, store.woken) == (1, 1)
+
+
+def test_the_store_discards_snapshots():
+	store = SnapshotStore()
+	store.hibernate('gone', played_session())
+	store.discard('gone')
+	store.discard('never there')
+	assert len(store) == 0
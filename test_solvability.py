@@ -0,0 +1,101 @@
+# Tests for the world solvability checker in solvability.py.
+
+import random
+
+from building import setup_building_game
+from Dr_Eaton_vs_Ton_Drump import FOCUS_VIALS, QUEST_ITEMS, ROBOTS, START_LOCATION
+from solvability import CUT_OFF, NEEDS_PORTAL, SOLVABLE, TOO_HARD, check_world, setup_fair_game
+
+OFFICE = 'Office'
+
+
+# This builds a world by hand: a corridor running east from the start through one room per quest
+# component, with the rooms listed in order and the office wherever it's put in the list.
+def corridor_world(order, robot=None, portal=False):
+	game_map = {}
+	for room_key in order:
+		game_map[room_key] = {'exits': {}, 'room_name': room_key, 'special_exit': None, 'item': None,
+		                      'robot': None, 'villain': room_key == OFFICE}
+	for west, east in zip(order, order[1:]):
+		game_map[west]['exits']['EAST'] = east
+		game_map[east]['exits']['WEST'] = west
+	for number, item in enumerate(QUEST_ITEMS, 1):
+		room = game_map[f"Room {number}"]
+		room['item'] = item
+		if robot is not None:
+			room['robot'] = dict(robot)
+	if portal:
+		game_map[START_LOCATION]['special_exit'] = 'Portal'
+	return game_map, OFFICE, {vial: 1 for vial in FOCUS_VIALS}
+
+
+QUEST_ROOMS = [f"Room {number}" for number in range(1, len(QUEST_ITEMS) + 1)]
+WEAKEST_ROBOT = min(ROBOTS, key=lambda robot: (robot['corruption'], robot['max_focus_drain']))
+STRONGEST_ROBOT = max(ROBOTS, key=lambda robot: (robot['corruption'], robot['max_focus_drain']))
+
+
+def test_an_open_corridor_is_solvable():
+	verdict = check_world(corridor_world([START_LOCATION] + QUEST_ROOMS + [OFFICE]))
+	assert verdict.result == SOLVABLE
+	assert verdict.fair
+	assert not verdict.needs_portal
+	assert verdict.robots == []
+
+
+def test_one_weak_robot_on_the_way_is_still_solvable():
+	game_map, villain_location, potion_map = corridor_world([START_LOCATION] + QUEST_ROOMS + [OFFICE])
+	game_map['Room 1']['robot'] = dict(WEAKEST_ROBOT)
+	verdict = check_world((game_map, villain_location, potion_map))
+	assert verdict.result == SOLVABLE
+	assert verdict.robots == ['Room 1']
+	assert 0 < verdict.focus_cost < verdict.focus_budget
+
+
+def test_the_toughest_robot_in_every_room_is_too_hard():
+	verdict = check_world(corridor_world([START_LOCATION] + QUEST_ROOMS + [OFFICE], robot=STRONGEST_ROBOT))
+	assert verdict.result == TOO_HARD
+	assert not verdict.fair
+	assert verdict.focus_cost >= verdict.focus_budget
+
+
+def test_the_office_in_the_way_cuts_the_world_off():
+	verdict = check_world(corridor_world([START_LOCATION, OFFICE] + QUEST_ROOMS))
+	assert verdict.result == CUT_OFF
+	assert not verdict.fair
+
+
+# The same world, but the start is cut off from the corridor except through its portal. A portal
+# drops the player somewhere at random, so the world isn't fair.
+def test_a_world_that_needs_a_portal_is_not_fair():
+	world = corridor_world([START_LOCATION] + QUEST_ROOMS + [OFFICE], portal=True)
+	world[0][START_LOCATION]['exits'].clear()
+	world[0]['Room 1']['exits'].pop('WEST')
+	verdict = check_world(world)
+	assert verdict.result == NEEDS_PORTAL
+	assert verdict.needs_portal
+	assert not verdict.fair
+
+
+def test_fair_worlds_pass_the_check():
+	rng = random.Random(8)
+	for _ in range(20):
+		verdict = check_world(setup_fair_game(rng))
+		assert verdict.result == SOLVABLE
+		assert not verdict.needs_portal
+
+
+# Buildings only get the reachability check, since there are far too many robots to try.
+def test_buildings_are_checked_on_foot():
+	rng = random.Random(3)
+	for _ in range(5):
+		assert check_world(setup_building_game(rng, 3, 6, 5)).result == SOLVABLE
+	assert check_world(setup_fair_game(rng, setup_building_game)).fair
+
+
+# The only way up from the ground floor is its staircase, so an office there cuts off the floors above.
+def test_a_building_with_the_office_on_the_stairs_is_cut_off():
+	game_map, villain_location, potion_map = setup_building_game(random.Random(4), 3, 6, 5)
+	building = game_map.building
+	building.villain = building.stairs_up(0)
+	assert any(room >= building.rooms_per_floor for room in building.items)
+	assert check_world((game_map, villain_location, potion_map)).result == CUT_OFF
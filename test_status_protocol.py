@@ -0,0 +1,79 @@
+# Tests for the status updates sent to remote clients in status_protocol.py.
+
+import random
+
+from Dr_Eaton_vs_Ton_Drump import GameSession
+from replay import WORLD_SETUPS, record_bot_games
+from status_protocol import (STATUS_MARK, StatusChannel, apply_update, decode_update, encode_update, measure, splice,
+                             status_fields, status_update)
+
+
+# A splice has to turn any list into any other, since a client only ever sees the splices.
+def test_splices_turn_one_list_into_another():
+	rng = random.Random(2)
+	for _ in range(500):
+		old = [rng.choice('abc') for _ in range(rng.randrange(6))]
+		new = [rng.choice('abc') for _ in range(rng.randrange(6))]
+		start, deleted, inserted = splice(old, new)
+		patched = old[:]
+		patched[start:start + deleted] = inserted
+		assert patched == new
+
+
+def test_splices_are_small_for_one_change():
+	assert splice(['a', 'b', 'c'], ['a', 'x', 'c']) == [1, 1, ['x']]
+	assert splice(['a', 'b'], ['a', 'b', 'c']) == [2, 0, ['c']]
+	assert splice(['a', 'b', 'c'], ['a', 'c']) == [1, 1, []]
+	assert splice(['a'], ['a']) == [1, 0, []]
+
+
+def test_the_first_update_is_full_and_unchanged_fields_send_nothing():
+	session = GameSession(quiet=True, seed=8)
+	session.feed('')
+	channel = StatusChannel()
+	first = decode_update(channel.update_line(session))
+	assert first['full'] == 1
+	assert set(first) - {'full'} == set(status_fields(session))
+	assert channel.update_line(session) is None
+	channel.reset()
+	assert 'full' in decode_update(channel.update_line(session))
+
+
+def test_update_lines_start_with_the_mark():
+	line = encode_update({'focus': 3, 'room': 'Den'})
+	assert line.startswith(STATUS_MARK)
+	assert '\n' not in line
+	assert decode_update(line) == {'focus': 3, 'room': 'Den'}
+
+
+# A client that applies every update it's sent has the same status as the server, all game long.
+def test_a_client_keeps_up_with_whole_games():
+	random.seed(6)
+	for record in record_bot_games(15, 'greedy', 'classic'):
+		session = GameSession(quiet=True, seed=record.seed, world_setup=WORLD_SETUPS[record.world])
+		channel = StatusChannel()
+		client = None
+		for command in record.commands:
+			if session.finished:
+				break
+			line = channel.update_line(session)
+			if line is not None:
+				client = apply_update(client, decode_update(line))
+			assert client == status_fields(session)
+			session.feed(command)
+
+
+def test_updates_only_carry_what_changed():
+	old = {'room': 'Den', 'focus': 15, 'inv': ['a', 'b']}
+	new = {'room': 'Den', 'focus': 11, 'inv': ['a', 'c']}
+	assert status_update(old, new) == {'focus': 11, 'inv': [1, 1, ['c']]}
+
+
+# The whole point: update lines cost fewer bytes than status blocks for the same game.
+def test_updates_send_fewer_bytes_than_status_blocks():
+	random.seed(9)
+	for record in record_bot_games(5, 'greedy', 'classic'):
+		screens_text, screens_status, turns = measure(record, False)
+		delta_text, delta_status, delta_turns = measure(record, True)
+		assert turns == delta_turns
+		assert delta_text + delta_status < screens_text + screens_status
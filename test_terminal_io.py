@@ -0,0 +1,88 @@
+# Tests for the terminal front end in Dr_Eaton_vs_Ton_Drump.py: frames, colors and cached screens.
+
+import io
+
+import Dr_Eaton_vs_Ton_Drump as game
+from Dr_Eaton_vs_Ton_Drump import (GameSession, Pacer, TerminalIO, colorize, get_player_input, play_session,
+                                   render_screen, show_instructions, strip_ansi)
+
+
+# This stands in for the player: it answers prompts from a list and keeps everything written.
+class ScriptedIO:
+	def __init__(self, answers):
+		self.answers = list(answers)
+		self.lines = []
+		self.pauses = []
+		self.prompts = []
+
+	def write(self, text):
+		self.lines.append(text)
+
+	def pause(self, seconds):
+		self.pauses.append(seconds)
+
+	def read(self, prompt):
+		self.prompts.append(prompt)
+		return self.answers.pop(0)
+
+
+def test_lines_wait_in_the_frame_until_a_pause(monkeypatch):
+	monkeypatch.setattr(game.time, 'sleep', lambda seconds: None)
+	stream = io.StringIO()
+	terminal = TerminalIO(Pacer(), stream, color=False)
+	terminal.write("one")
+	terminal.write("two")
+	assert stream.getvalue() == ""
+	terminal.pause(1)
+	assert stream.getvalue() == "one\ntwo\n"
+	terminal.write("three")
+	terminal.flush()
+	assert stream.getvalue() == "one\ntwo\nthree\n"
+
+
+def test_reading_shows_the_frame_first(monkeypatch):
+	stream = io.StringIO()
+	prompts = []
+	monkeypatch.setattr('builtins.input', lambda prompt: prompts.append((prompt, stream.getvalue())) or "north")
+	terminal = TerminalIO(stream=stream, color=False)
+	terminal.write(colorize("You see a robot.", 'red'))
+	assert terminal.read(colorize("> What do you do? ", 'magenta')) == "north"
+	assert prompts == [("> What do you do? ", "You see a robot.\n")]
+
+
+def test_colors_are_kept_only_when_asked_for():
+	for color in (True, False):
+		stream = io.StringIO()
+		terminal = TerminalIO(stream=stream, color=color)
+		terminal.write(colorize("Focus restored.", 'green'))
+		terminal.flush()
+		assert strip_ansi(stream.getvalue()) == "Focus restored.\n"
+		assert (stream.getvalue() != "Focus restored.\n") == color
+
+
+def test_pipes_get_no_colors_by_default():
+	assert TerminalIO(stream=io.StringIO()).color is False
+
+
+def test_screens_are_rendered_once_per_style():
+	lines = []
+	show_instructions(out=lines.append)
+	plain = render_screen(show_instructions, color=False, newline='\r\n')
+	assert plain == strip_ansi('\n'.join(lines) + '\n').replace('\n', '\r\n')
+	assert '\033[' not in plain and '\n' not in plain.replace('\r\n', '')
+	assert render_screen(show_instructions, color=False, newline='\r\n') is plain
+	assert render_screen(show_instructions) == '\n'.join(lines) + '\n'
+
+
+def test_player_input_asks_again_until_it_gets_a_choice():
+	script = ScriptedIO(["maybe", "y"])
+	assert get_player_input("Get it? ", ['yes', 'no'], script) == 'yes'
+	assert script.prompts == ["Get it? ", "Get it? "]
+	assert script.lines == ["Invalid command. Please enter one of the following: yes, no"]
+
+
+def test_a_session_plays_through_any_front_end():
+	script = ScriptedIO(["EXIT"])
+	assert play_session(GameSession(seed=1), script) == 'quit'
+	assert script.prompts == ["> What do you do? "]
+	assert any("Vestibule" in line for line in script.lines)
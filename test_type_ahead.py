@@ -0,0 +1,195 @@
+# Tests for command abbreviations and the type-ahead queue in Dr_Eaton_vs_Ton_Drump.py.
+
+from collections import deque
+
+import pytest
+
+from Dr_Eaton_vs_Ton_Drump import COMMAND_TRIE, GameSession, PrefixTrie, TypeAhead, resolve_choice
+from snapshot import restore_session, snapshot_session
+
+STATUS_LINE = "> You are in the:"
+OPPOSITE = {'NORTH': 'SOUTH', 'SOUTH': 'NORTH', 'EAST': 'WEST', 'WEST': 'EAST'}
+
+
+@pytest.mark.parametrize('text, command', (
+	('N', 'NORTH'), ('NOR', 'NORTH'), ('SE', 'SEARCH'), ('SO', 'SOUTH'), ('US', 'USE'), ('HI', 'HINT'),
+	('EXIT', 'EXIT'), ('WEST', 'WEST')))
+def test_abbreviations_expand(text, command):
+	assert COMMAND_TRIE.lookup(text) == command
+
+
+# Answers to a yes/no question, one-letter words and bits of EXIT must never walk or quit.
+@pytest.mark.parametrize('text', ('NO', 'YES', 'Y', 'EX', 'EXI', 'U', 'H', 'NORTHWEST', 'XYZZY', ''))
+def test_risky_abbreviations_are_refused(text):
+	assert COMMAND_TRIE.lookup(text) is None
+
+
+def test_ambiguous_prefixes_are_refused():
+	trie = PrefixTrie(('SEARCH', 'SEAL'))
+	assert trie.lookup('SEA') is None
+	assert trie.lookup('SEAR') == 'SEARCH'
+
+
+# A whole word counts as itself even when it starts a longer word.
+def test_whole_words_win_over_longer_ones():
+	trie = PrefixTrie(('USE', 'USER'))
+	assert trie.lookup('USE') == 'USE'
+	assert trie.lookup('USER') == 'USER'
+
+
+def test_choices_expand_from_their_first_letters():
+	assert resolve_choice(' Y ', ('yes', 'no')) == 'yes'
+	assert resolve_choice('n', ('yes', 'no')) == 'no'
+	assert resolve_choice('maybe', ('yes', 'no')) == 'maybe'
+	assert resolve_choice('2', ('1', '2', '3')) == '2'
+
+
+def test_a_line_holds_several_commands():
+	session = GameSession(quiet=True, seed=4)
+	session.feed('')
+	typed = TypeAhead()
+	typed.add_line('hi; hi ;;hi')
+	commands = []
+	command = typed.next_command(session)
+	while command is not None:
+		commands.append(command)
+		session.feed(command)
+		command = typed.next_command(session)
+	assert commands == ['HINT', 'HINT', 'HINT']
+
+
+# A command that doesn't fit the prompt it reaches is fed as typed, and the rest of the line is dropped.
+def test_the_rest_of_a_line_is_dropped_after_a_bad_command():
+	session = GameSession(quiet=True, seed=4)
+	session.feed('')
+	typed = TypeAhead()
+	typed.add_line('no; hint')
+	assert typed.next_command(session) == 'no'
+	assert typed.next_command(session) is None
+
+
+def test_an_empty_line_is_still_an_answer():
+	typed = TypeAhead()
+	typed.add_line(' ; ')
+	assert typed.next_command(GameSession(quiet=True, seed=4)) == ''
+
+
+# This plays everything typed ahead, the way play_session() does, and returns the text it printed.
+def drain(typed, session):
+	text = []
+	while not typed.waiting() and not session.finished:
+		command = typed.next_command(session)
+		if command is not None:
+			session.feed(command)
+	for line in session.take_output():
+		if isinstance(line, str):
+			text.append(line)
+	return '\n'.join(text)
+
+
+# This returns a new game at its first command prompt, with text on, and a way out of the start
+# into a room that's safe to walk into and back out of.
+def game_with_a_safe_room():
+	for seed in range(100):
+		session = GameSession(seed=seed)
+		session.feed('')
+		session.take_output()
+		for direction, room_key in session.game_map[session.current_location]['exits'].items():
+			room = session.game_map[room_key]
+			if room['robot'] is None and not room['villain'] and room['special_exit'] is None:
+				return session, direction
+	raise AssertionError("no world with a safe room next to the start")
+
+
+# A line of several moves only draws the status screen at the end.
+def test_only_the_last_status_screen_is_drawn():
+	session, direction = game_with_a_safe_room()
+	typed = TypeAhead()
+	typed.add_line(f"{direction};{OPPOSITE[direction]};{direction}")
+	text = drain(typed, session)
+	assert text.count(STATUS_LINE) == 1
+	assert text.rindex(STATUS_LINE) > text.rindex(f"? {direction}")
+	assert session.turns == 4
+
+
+# Restoring a session turns its status screens back on, and the type-ahead queue decides again
+# with the next command: a client that draws its own status still gets none.
+@pytest.mark.parametrize('status_screens, screens', ((True, 1), (False, 0)))
+def test_restored_sessions_follow_the_type_ahead(status_screens, screens):
+	session, direction = game_with_a_safe_room()
+	restored = restore_session(snapshot_session(session))
+	assert restored.show_status
+	typed = TypeAhead(status_screens)
+	typed.add_line(f"{direction};{OPPOSITE[direction]}")
+	assert drain(typed, restored).count(STATUS_LINE) == screens
+	assert restored.show_status == status_screens
+
+
+# This walks a new game into the nearest robot's room, keeping out of the office.
+def session_in_a_fight():
+	for seed in range(100):
+		session = GameSession(quiet=True, seed=seed)
+		session.feed('')
+		game_map = session.game_map
+		paths = {session.current_location: []}
+		queue = deque([session.current_location])
+		while queue and not session.in_combat:
+			room_key = queue.popleft()
+			for direction, next_room in game_map[room_key]['exits'].items():
+				if next_room in paths or game_map[next_room]['villain']:
+					continue
+				paths[next_room] = paths[room_key] + [direction]
+				if game_map[next_room]['robot'] is not None:
+					for step in paths[next_room]:
+						session.feed(step)
+					break
+				queue.append(next_room)
+		if session.in_combat:
+			return session
+	raise AssertionError("no world with a robot to walk to")
+
+
+# SCAN only ever scans with the player's Focus at or above its floor.
+@pytest.mark.parametrize('floor', (1, 8, 13))
+def test_scan_stops_at_its_floor(floor):
+	session = session_in_a_fight()
+	typed = TypeAhead()
+	typed.add_line(f"scan {floor}")
+	scans = 0
+	while not typed.waiting():
+		focus = session.player_stats['focus']
+		command = typed.next_command(session)
+		if command is None:
+			break
+		assert command == '1'
+		assert focus >= floor
+		scans += 1
+		session.feed(command)
+	assert scans > 0
+	assert typed.scan_floor is None
+	assert not session.in_combat or session.player_stats['focus'] < floor
+
+
+# Without a number, SCAN stops while one more hit from the robot could still be survived.
+def test_scan_without_a_floor_stops_before_a_hit_could_finish_the_player():
+	session = session_in_a_fight()
+	robot = session.game_map[session.current_location]['robot']
+	typed = TypeAhead()
+	typed.add_line('scan')
+	drain(typed, session)
+	if session.in_combat:
+		assert 0 < session.player_stats['focus'] <= robot['max_focus_drain']
+
+
+# With Focus already under the floor, the macro stops before its first scan and sends nothing.
+def test_scan_below_its_floor_sends_nothing():
+	session = session_in_a_fight()
+	session.quiet = False
+	typed = TypeAhead()
+	typed.add_line('scan 99; 1')
+	assert typed.next_command(session) is None
+	assert typed.waiting()
+	text = drain(typed, session)
+	assert 'stop scanning' in text
+	assert 'Invalid' not in text
+	assert session.phase == 'combat'
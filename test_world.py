@@ -0,0 +1,86 @@
+# Tests for the compact worlds in world.py.
+
+import random
+
+from Dr_Eaton_vs_Ton_Drump import (FOCUS_VIALS, MAP_LAYOUT, PORTAL_COUNT, ROBOTS, START_LOCATION, VILLAIN_SAFE_ZONES,
+                                   GameSession)
+from replay import check_record, record_from_session
+from simulation import make_policy
+from world import (ITEM_NAMES, PORTAL, ROBOT_CORRUPTION, TOPOLOGY, OverlayMap, generate_overlay,
+                   setup_compact_game)
+
+
+# This is a copy of everything in the topology, to check nothing a game does ever changes it.
+def topology_state():
+	return (TOPOLOGY.room_names, {direction: list(rooms) for direction, rooms in TOPOLOGY.neighbours.items()},
+	        [dict(exits) for exits in TOPOLOGY.exit_maps], TOPOLOGY.special_exits, list(TOPOLOGY.stairs_to))
+
+
+def test_the_topology_matches_the_map():
+	for name, layout in MAP_LAYOUT.items():
+		room_id = TOPOLOGY.room_ids[name]
+		for direction, rooms in TOPOLOGY.neighbours.items():
+			neighbour = layout['exits'].get(direction)
+			assert rooms[room_id] == (TOPOLOGY.room_ids[neighbour] if neighbour else -1)
+
+
+def test_overlays_follow_the_placement_rules():
+	rng = random.Random(4)
+	for _ in range(200):
+		game_map, villain, potion_map = setup_compact_game(rng)
+		assert villain != START_LOCATION and villain not in VILLAIN_SAFE_ZONES
+		assert [name for name in game_map if game_map[name]['villain']] == [villain]
+		items = [game_map[name]['item'] for name in game_map if game_map[name]['item']]
+		assert sorted(items) == sorted(ITEM_NAMES)
+		robot_rooms = [name for name in game_map if game_map[name]['robot']]
+		assert len(robot_rooms) == len(ROBOTS)
+		assert all(game_map[name]['item'] for name in robot_rooms)
+		portals = [name for name in game_map if game_map[name]['special_exit'] == 'Portal']
+		assert len(portals) == PORTAL_COUNT and not set(portals) & set(robot_rooms)
+		assert sorted(potion_map) == sorted(FOCUS_VIALS)
+
+
+def test_the_same_seed_makes_the_same_world():
+	first, second = generate_overlay(random.Random(9)), generate_overlay(random.Random(9))
+	for field in ('items', 'robots', 'corruption', 'special_exits', 'villain', 'potion_effects'):
+		assert getattr(first, field) == getattr(second, field)
+
+
+# Clearing a room or wearing a robot down only changes that game's overlay.
+def test_writes_go_to_the_overlay_and_not_the_topology():
+	before = topology_state()
+	rng = random.Random(2)
+	overlay, other = generate_overlay(rng), generate_overlay(rng)
+	game_map = OverlayMap(overlay)
+	room = next(name for name in game_map if game_map[name]['robot'])
+	robot = game_map[room]['robot']
+	robot['corruption'] -= 3
+	assert game_map[room]['robot']['corruption'] == ROBOT_CORRUPTION[robot.robot_id] - 3
+	assert other.corruption[robot.robot_id] == ROBOT_CORRUPTION[robot.robot_id]
+	game_map[room]['item'] = None
+	game_map[room]['robot'] = None
+	assert game_map[room]['item'] is None and game_map[room]['robot'] is None
+	assert overlay.items[TOPOLOGY.room_ids[room]] == 0
+	assert topology_state() == before
+
+
+def test_a_portal_hides_the_stairs_only_in_its_own_world():
+	rng = random.Random(6)
+	overlay = generate_overlay(rng)
+	portal_rooms = [room_id for room_id, code in enumerate(overlay.special_exits) if code == PORTAL]
+	for room_id in portal_rooms:
+		assert OverlayMap(overlay)[TOPOLOGY.room_names[room_id]]['special_exit'] == 'Portal'
+		assert TOPOLOGY.special_exits[room_id] != PORTAL
+
+
+# Compact worlds are drawn from the session's seeded generator too, so their games replay.
+def test_compact_games_replay_from_their_seed():
+	before = topology_state()
+	for seed in range(20):
+		session = GameSession(quiet=True, seed=seed, world_setup=setup_compact_game, record=True)
+		policy = make_policy('greedy', seed)
+		while not session.finished and session.commands < 2000:
+			session.feed(policy(session))
+		assert session.finished
+		assert check_record(record_from_session(session, 'compact')) is None
+	assert topology_state() == before
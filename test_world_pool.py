@@ -0,0 +1,86 @@
+# Tests for the pool of pre-generated worlds in world_pool.py.
+
+import threading
+import time
+
+import pytest
+
+from Dr_Eaton_vs_Ton_Drump import GameSession
+from replay import check_record, record_from_session
+from simulation import make_policy
+from world_pool import WorldPool, check_world
+
+
+@pytest.fixture
+def pool():
+	pool = WorldPool(min_size=4, max_size=64, horizon=0.5).start()
+	yield pool
+	pool.stop()
+
+
+def test_pooled_worlds_are_different(pool):
+	seeds = set()
+	for _ in range(30):
+		seed, rng, world = pool.take()
+		assert check_world(world)
+		seeds.add(seed)
+	assert len(seeds) == 30
+	assert pool.hits + pool.misses == 30
+
+
+# A game on a pooled world has to replay from its seed and commands like any other game.
+def test_pooled_games_replay_exactly(pool):
+	for _ in range(10):
+		seed, rng, world = pool.take()
+		session = GameSession(quiet=True, seed=seed, rng=rng, world=world, record=True)
+		policy = make_policy('greedy', seed)
+		while not session.finished and session.commands < 2000:
+			session.feed(policy(session))
+		assert check_record(record_from_session(session)) is None
+
+
+# Many threads take worlds while the worker fills the pool. Every world is handed out once, and
+# the demand estimate stays a sensible number.
+def test_takes_from_many_threads(pool):
+	taken = []
+	lock = threading.Lock()
+
+	def take_some():
+		for _ in range(50):
+			seed = pool.take()[0]
+			with lock:
+				taken.append(seed)
+
+	threads = [threading.Thread(target=take_some) for _ in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert len(taken) == len(set(taken)) == 400
+	assert pool.hits + pool.misses == 400
+	assert pool.gap > 0
+	assert pool.min_size <= pool.target <= pool.max_size
+
+
+def test_the_pool_grows_with_demand_and_fills_up(pool):
+	for _ in range(40):
+		pool.take()
+	assert pool.target > pool.min_size
+	deadline = time.monotonic() + 5.0
+	while len(pool.ready) < pool.target and time.monotonic() < deadline:
+		time.sleep(0.01)
+	assert len(pool.ready) >= pool.target
+
+
+def test_worlds_that_fail_the_check_are_thrown_away():
+	checked = []
+
+	def every_other(world):
+		checked.append(world)
+		return len(checked) % 2 == 0
+
+	pool = WorldPool(min_size=2, validate=every_other)
+	for _ in range(3):
+		pool.take()
+	assert pool.rejected == 3
+	assert pool.misses == 3
@@ -0,0 +1,264 @@
+# Compact world representation for Dr. Eaton vs. Ton Drump.
+#
+# The static map is compiled once, at import time, into a Topology: integer room ids,
+# one array of neighbours per direction and small tables for the stairs. Each game then
+# only needs a WorldOverlay, a handful of flat byte arrays saying where the items, robots,
+# portals and villain are. Generating a world is a few shuffles and array stores.
+#
+# OverlayMap wraps an overlay so GameSession can play on it exactly like on the dictionary
+# that setup_game() builds.
+#
+# Example:  python world.py     (compares setup time and per-game memory of both worlds)
+
+import random
+import time
+import tracemalloc
+from array import array
+
+from Dr_Eaton_vs_Ton_Drump import (FOCUS_VIALS, MAP_LAYOUT, POTION_EFFECTS, PORTAL_COUNT, QUEST_ITEMS, ROBOTS,
+                                   START_LOCATION, STAIRS_DESTINATIONS, VILLAIN_SAFE_ZONES, WILDCARD_ITEMS,
+                                   setup_game)
+
+DIRECTIONS = ('NORTH', 'SOUTH', 'EAST', 'WEST')
+
+# These are the codes stored in a room's special exit slot.
+NO_EXIT, STAIRS_UP, STAIRS_DOWN, PORTAL = 0, 1, 2, 3
+SPECIAL_EXIT_NAMES = (None, 'Stairs Up', 'Stairs Down', 'Portal')
+
+# Every item and robot gets an integer id. In the overlay arrays 0 means "nothing",
+# so the id stored for an item or robot is its index plus one.
+ITEM_NAMES = tuple(QUEST_ITEMS + WILDCARD_ITEMS + FOCUS_VIALS)
+ROBOT_NAMES = tuple(robot['name'] for robot in ROBOTS)
+ROBOT_CORRUPTION = tuple(robot['corruption'] for robot in ROBOTS)
+ROBOT_MAX_FOCUS_DRAIN = tuple(robot['max_focus_drain'] for robot in ROBOTS)
+
+
+# This is the static, shared part of the world. There is only ever one of these.
+class Topology:
+	__slots__ = ('room_names', 'room_ids', 'neighbours', 'exit_maps', 'special_exits', 'stairs_to', 'start',
+	             'placement_rooms', 'villain_rooms')
+
+	def __init__(self, layout):
+		self.room_names = tuple(layout)
+		self.room_ids = {name: room_id for room_id, name in enumerate(self.room_names)}
+		room_count = len(self.room_names)
+
+		# This is one array per direction. neighbours['NORTH'][room] is the room to the north, or -1.
+		self.neighbours = {direction: array('h', [-1] * room_count) for direction in DIRECTIONS}
+		for room_id, name in enumerate(self.room_names):
+			for direction, neighbour in layout[name]['exits'].items():
+				self.neighbours[direction][room_id] = self.room_ids[neighbour]
+
+		# The exit dictionaries never change, so every game shares these read-only copies.
+		self.exit_maps = tuple(layout[name]['exits'] for name in self.room_names)
+
+		# This is the special exit each room starts with, and where each staircase leads (-1 for none).
+		self.special_exits = bytes(SPECIAL_EXIT_NAMES.index(layout[name].get('special_exit'))
+		                           for name in self.room_names)
+		self.stairs_to = array('h', [-1] * room_count)
+		for room_id, name in enumerate(self.room_names):
+			special_exit = layout[name].get('special_exit')
+			if special_exit in STAIRS_DESTINATIONS:
+				self.stairs_to[room_id] = self.room_ids[STAIRS_DESTINATIONS[special_exit]]
+
+		self.start = self.room_ids[START_LOCATION]
+		self.placement_rooms = tuple(room_id for room_id in range(room_count) if room_id != self.start)
+		self.villain_rooms = tuple(room_id for room_id in self.placement_rooms
+		                           if self.room_names[room_id] not in VILLAIN_SAFE_ZONES)
+
+
+TOPOLOGY = Topology(MAP_LAYOUT)
+
+
+# This is everything about one game's world that isn't in the topology.
+class WorldOverlay:
+	__slots__ = ('items', 'robots', 'corruption', 'special_exits', 'villain', 'potion_effects')
+
+	def __init__(self, items, robots, corruption, special_exits, villain, potion_effects):
+		self.items = items  # bytearray: item id + 1 per room, 0 for none
+		self.robots = robots  # bytearray: robot id + 1 per room, 0 for none
+		self.corruption = corruption  # array('b'): current corruption per robot id
+		self.special_exits = special_exits  # bytearray: special exit code per room
+		self.villain = villain  # room id of Mr. Ton Drump's office
+		self.potion_effects = potion_effects  # tuple: effect of each focus vial, in FOCUS_VIALS order
+
+	# This is roughly how many bytes the overlay holds, counting its arrays.
+	def nbytes(self):
+		return (len(self.items) + len(self.robots) + len(self.special_exits) +
+		        self.corruption.itemsize * len(self.corruption) + 8 * (len(self.potion_effects) + 1))
+
+
+# These are reused by every call to generate_overlay() and never changed.
+_ITEM_IDS = list(range(1, len(ITEM_NAMES) + 1))
+_ROBOT_IDS = list(range(1, len(ROBOT_NAMES) + 1))
+_EMPTY_ROOMS = bytes(len(TOPOLOGY.room_names))
+_STARTING_CORRUPTION = array('b', ROBOT_CORRUPTION)
+
+
+# This generates a new world with the same rules as setup_game(): the villain avoids the safe
+# zones, every other room except the start gets an item, robots share rooms with items and
+# portals go in rooms without robots (replacing any staircase there).
+def generate_overlay(rng=random):
+	topology = TOPOLOGY
+	villain = rng.choice(topology.villain_rooms)
+	available_rooms = [room_id for room_id in topology.placement_rooms if room_id != villain]
+	rng.shuffle(available_rooms)
+
+	item_ids = _ITEM_IDS[:]
+	rng.shuffle(item_ids)
+	items = bytearray(_EMPTY_ROOMS)
+	for room_id, item_id in zip(available_rooms, item_ids):
+		items[room_id] = item_id
+
+	robot_ids = _ROBOT_IDS[:]
+	rng.shuffle(robot_ids)
+	robots = bytearray(_EMPTY_ROOMS)
+	for room_id, robot_id in zip(available_rooms, robot_ids):
+		robots[room_id] = robot_id
+
+	special_exits = bytearray(topology.special_exits)
+	for room_id in rng.sample(available_rooms[len(robot_ids):], PORTAL_COUNT):
+		special_exits[room_id] = PORTAL
+
+	potion_effects = POTION_EFFECTS[:]
+	rng.shuffle(potion_effects)
+	return WorldOverlay(items, robots, array('b', _STARTING_CORRUPTION), special_exits, villain,
+	                    tuple(potion_effects))
+
+
+# This lets the game treat a robot in the overlay like the robot dictionaries from setup_game().
+class RobotView:
+	__slots__ = ('overlay', 'robot_id')
+
+	def __init__(self, overlay, robot_id):
+		self.overlay = overlay
+		self.robot_id = robot_id
+
+	def __getitem__(self, key):
+		if key == 'corruption':
+			return self.overlay.corruption[self.robot_id]
+		if key == 'name':
+			return ROBOT_NAMES[self.robot_id]
+		if key == 'max_focus_drain':
+			return ROBOT_MAX_FOCUS_DRAIN[self.robot_id]
+		raise KeyError(key)
+
+	def __setitem__(self, key, value):
+		if key != 'corruption':
+			raise KeyError(key)
+		self.overlay.corruption[self.robot_id] = value
+
+	def __eq__(self, other):
+		return isinstance(other, RobotView) and other.overlay is self.overlay and other.robot_id == self.robot_id
+
+	def __hash__(self):
+		return hash((id(self.overlay), self.robot_id))
+
+
+# This lets the game treat one room of the overlay like a room dictionary from setup_game().
+class RoomView:
+	__slots__ = ('overlay', 'room_id')
+
+	def __init__(self, overlay, room_id):
+		self.overlay = overlay
+		self.room_id = room_id
+
+	def __getitem__(self, key):
+		overlay = self.overlay
+		room_id = self.room_id
+		if key == 'exits':
+			return TOPOLOGY.exit_maps[room_id]
+		if key == 'special_exit':
+			return SPECIAL_EXIT_NAMES[overlay.special_exits[room_id]]
+		if key == 'robot':
+			robot_id = overlay.robots[room_id]
+			return RobotView(overlay, robot_id - 1) if robot_id else None
+		if key == 'item':
+			item_id = overlay.items[room_id]
+			return ITEM_NAMES[item_id - 1] if item_id else None
+		if key == 'villain':
+			return overlay.villain == room_id
+		if key == 'room_name':
+			return TOPOLOGY.room_names[room_id]
+		raise KeyError(key)
+
+	def get(self, key, default=None):
+		try:
+			return self[key]
+		except KeyError:
+			return default
+
+	# The game only ever clears a room's item or robot.
+	def __setitem__(self, key, value):
+		if value is not None:
+			raise ValueError("only clearing an item or robot is supported")
+		if key == 'item':
+			self.overlay.items[self.room_id] = 0
+		elif key == 'robot':
+			self.overlay.robots[self.room_id] = 0
+		else:
+			raise KeyError(key)
+
+
+# This is a read-mostly mapping from room name to RoomView, shaped like setup_game()'s game_map.
+class OverlayMap:
+	__slots__ = ('overlay',)
+
+	def __init__(self, overlay):
+		self.overlay = overlay
+
+	def __getitem__(self, room_name):
+		return RoomView(self.overlay, TOPOLOGY.room_ids[room_name])
+
+	def __contains__(self, room_name):
+		return room_name in TOPOLOGY.room_ids
+
+	def __iter__(self):
+		return iter(TOPOLOGY.room_names)
+
+	def __len__(self):
+		return len(TOPOLOGY.room_names)
+
+	def keys(self):
+		return TOPOLOGY.room_names
+
+	def values(self):
+		return [RoomView(self.overlay, room_id) for room_id in range(len(TOPOLOGY.room_names))]
+
+	def items(self):
+		return zip(TOPOLOGY.room_names, self.values())
+
+
+# This is the compact replacement for setup_game(). It returns the same three things.
+def setup_compact_game(rng=random):
+	overlay = generate_overlay(rng)
+	game_map = OverlayMap(overlay)
+	potion_map = dict(zip(FOCUS_VIALS, overlay.potion_effects))
+	return game_map, TOPOLOGY.room_names[overlay.villain], potion_map
+
+
+# This measures how many worlds per second a setup function makes and how much memory one world holds.
+def measure_setup(setup, worlds=20000):
+	start = time.perf_counter()
+	for _ in range(worlds):
+		setup()
+	rate = worlds / (time.perf_counter() - start)
+
+	tracemalloc.start()
+	before = tracemalloc.take_snapshot()
+	kept = [setup() for _ in range(1000)]
+	after = tracemalloc.take_snapshot()
+	tracemalloc.stop()
+	per_world = sum(stat.size_diff for stat in after.compare_to(before, 'filename')) / len(kept)
+	return rate, per_world
+
+
+def main():
+	for label, setup in (('setup_game()', setup_game), ('setup_compact_game()', setup_compact_game),
+	                     ('generate_overlay()', generate_overlay)):
+		rate, per_world = measure_setup(setup)
+		print(f"{label:<22} {rate:>10,.0f} worlds/s {per_world:>8,.0f} bytes/world")
+
+
+if __name__ == "__main__":
+	main()
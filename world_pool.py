@@ -0,0 +1,219 @@
+# A pool of worlds made ahead of time for Dr. Eaton vs. Ton Drump.
+#
+# Without a pool, a new game calls setup_game() right when the player is waiting for it. A
+# WorldPool keeps a queue of ready worlds that a background thread fills, so starting a game is
+# just taking one off the front of the queue. Each world comes with its seed and the generator that
+# built it (already past setup), so a game on a pooled world replays exactly like any other.
+#
+# The pool follows demand: it keeps track of how fast worlds are being taken, and aims to hold
+# enough for the next `horizon` seconds of them, between min_size and max_size. When it runs dry
+# the world is made on the spot, which counts as a miss.
+#
+# Example:  python world_pool.py     (compares starting games with and without a pool)
+
+import argparse
+import math
+import random
+import threading
+import time
+from collections import deque
+
+from Dr_Eaton_vs_Ton_Drump import FOCUS_VIALS, QUEST_ITEMS, setup_game
+from instrumentation import Histogram
+from replay import WORLD_SETUPS
+
+
+# This is the check every world passes before it goes into the pool: the villain is where the
+# world says, every focus vial has an effect and (on setup_game() worlds, where it's cheap to look)
+# every quest component is in some room.
+def check_world(world):
+	game_map, villain_location, potion_map = world
+	if villain_location not in game_map or not game_map[villain_location]['villain']:
+		return False
+	if sorted(potion_map) != sorted(FOCUS_VIALS):
+		return False
+	if isinstance(game_map, dict):
+		placed = {room['item'] for room in game_map.values()}
+		return all(item in placed for item in QUEST_ITEMS)
+	return True
+
+
+class WorldPool:
+	def __init__(self, world_setup=setup_game, min_size=4, max_size=256, horizon=2.0, validate=check_world):
+		self.world_setup = world_setup
+		self.min_size = min_size
+		self.max_size = max_size
+		self.horizon = horizon  # Seconds of demand the pool tries to have ready.
+		self.validate = validate
+		self.ready = deque()  # (seed, rng, world) entries, oldest first.
+		self.target = min_size
+		self.wakeup = threading.Condition()
+		self.thread = None
+		self.running = False
+
+		# This is the smoothed time between takes, in seconds. Demand is one over it. It starts at
+		# the gap that would make min_size the right target.
+		self.gap = horizon / max(min_size, 1)
+		self.last_take = None
+
+		# These are the pool's metrics.
+		self.hits = 0
+		self.misses = 0
+		self.generated = 0
+		self.rejected = 0
+		self.refill_latency = Histogram()  # Seconds the worker spent making each world.
+
+	def start(self):
+		self.running = True
+		self.thread = threading.Thread(target=self.run, name='world-pool', daemon=True)
+		self.thread.start()
+		return self
+
+	def stop(self):
+		with self.wakeup:
+			self.running = False
+			self.wakeup.notify()
+		if self.thread is not None:
+			self.thread.join()
+			self.thread = None
+
+	# This makes one world that passes the check, with its seed and generator.
+	def make(self):
+		while True:
+			seed = random.getrandbits(64)
+			rng = random.Random(seed)
+			world = self.world_setup(rng)
+			if self.validate is None or self.validate(world):
+				return seed, rng, world
+			self.rejected += 1
+
+	# This hands out a (seed, rng, world) entry, ready for GameSession(seed=..., rng=..., world=...).
+	# The pool's lock covers the demand estimate, the target and the queue; a world made on the spot
+	# is made outside it, so the worker can keep filling the pool meanwhile.
+	def take(self):
+		with self.wakeup:
+			self.note_demand()
+			entry = self.ready.popleft() if self.ready else None
+			if entry is not None:
+				self.hits += 1
+			else:
+				self.misses += 1
+			if len(self.ready) < self.target:
+				self.wakeup.notify()
+		if entry is None:
+			entry = self.make()
+		return entry
+
+	# This updates the demand estimate and the pool's target size after a take. Smoothing the gaps
+	# (rather than the rates) keeps a burst of back-to-back takes from sending the target to max_size.
+	# The gap is changed by both take() and the worker, so this and resize() need the pool's lock held.
+	def note_demand(self):
+		now = time.monotonic()
+		if self.last_take is not None:
+			gap = now - self.last_take
+			self.gap = 0.9 * self.gap + 0.1 * gap
+			self.resize()
+		self.last_take = now
+
+	def resize(self):
+		demand = 1.0 / max(self.gap, 1e-6)
+		self.target = max(self.min_size, min(self.max_size, math.ceil(demand * self.horizon)))
+
+	# This is the background worker. It sleeps while the pool is full and tops it up when it isn't.
+	# When nobody has taken a world for a second, the demand estimate (and the target) shrinks.
+	def run(self):
+		while True:
+			with self.wakeup:
+				while self.running and len(self.ready) >= self.target:
+					if not self.wakeup.wait(timeout=1.0):
+						self.gap *= 2.0
+						self.resize()
+				if not self.running:
+					return
+			start = time.perf_counter()
+			entry = self.make()
+			self.refill_latency.observe(time.perf_counter() - start)
+			with self.wakeup:
+				self.generated += 1
+				self.ready.append(entry)
+
+	def hit_rate(self):
+		taken = self.hits + self.misses
+		return self.hits / taken if taken else 0.0
+
+	def summary(self):
+		return {
+			'hits': self.hits,
+			'misses': self.misses,
+			'hit_rate': round(self.hit_rate(), 4),
+			'ready': len(self.ready),
+			'target': self.target,
+			'generated': self.generated,
+			'rejected': self.rejected,
+			'refill_p50_us': self.refill_latency.percentile(0.50) * 1e6,
+			'refill_p99_us': self.refill_latency.percentile(0.99) * 1e6,
+		}
+
+	def report(self):
+		return (f"world pool: {self.hits} hits, {self.misses} misses ({self.hit_rate():.1%}), {len(self.ready)} ready "
+		        f"of {self.target}, {self.rejected} rejected, refill p50 {self.refill_latency.percentile(0.50) * 1e6:g}us "
+		        f"p99 {self.refill_latency.percentile(0.99) * 1e6:g}us")
+
+	# These are the pool's metrics in the Prometheus text format, for instrumentation.Metrics.
+	def prometheus_lines(self):
+		lines = ["# TYPE dr_eaton_world_pool_takes_total counter",
+		         f'dr_eaton_world_pool_takes_total{{result="hit"}} {self.hits}',
+		         f'dr_eaton_world_pool_takes_total{{result="miss"}} {self.misses}',
+		         "# TYPE dr_eaton_world_pool_ready gauge",
+		         f"dr_eaton_world_pool_ready {len(self.ready)}",
+		         "# TYPE dr_eaton_world_pool_target gauge",
+		         f"dr_eaton_world_pool_target {self.target}",
+		         "# TYPE dr_eaton_world_pool_refill_seconds summary",
+		         f"dr_eaton_world_pool_refill_seconds_sum {self.refill_latency.sum:.9f}",
+		         f"dr_eaton_world_pool_refill_seconds_count {self.refill_latency.count}"]
+		return lines
+
+
+# This starts `games` games in bursts, the way players arrive at a server, and times how long each
+# start takes: with a pool, that's taking a world; without one, it's making it.
+def time_starts(games, burst, pause, take):
+	latencies = []
+	clock = time.perf_counter
+	for i in range(games):
+		if i % burst == 0:
+			time.sleep(pause)
+		start = clock()
+		take()
+		latencies.append(clock() - start)
+	latencies.sort()
+	return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Compare starting games with and without a world pool.")
+	parser.add_argument('--world', choices=sorted(WORLD_SETUPS), default='classic')
+	parser.add_argument('--games', type=int, default=5000)
+	parser.add_argument('--burst', type=int, default=20, help="games started back to back")
+	parser.add_argument('--pause', type=float, default=0.01, help="seconds between bursts")
+	args = parser.parse_args()
+
+	world_setup = WORLD_SETUPS[args.world]
+
+	def make_world():
+		seed = random.getrandbits(64)
+		return seed, world_setup(random.Random(seed))
+
+	p50, p99 = time_starts(args.games, args.burst, args.pause, make_world)
+	print(f"without a pool  start p50 {p50 * 1e6:8.1f}us  p99 {p99 * 1e6:8.1f}us")
+
+	pool = WorldPool(world_setup).start()
+	try:
+		p50, p99 = time_starts(args.games, args.burst, args.pause, pool.take)
+	finally:
+		pool.stop()
+	print(f"with a pool     start p50 {p50 * 1e6:8.1f}us  p99 {p99 * 1e6:8.1f}us")
+	print(pool.report())
+
+
+if __name__ == "__main__":
+	main()